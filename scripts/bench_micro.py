@@ -0,0 +1,196 @@
+"""
+Micro-benchmarks de los helpers y modelos que corren en cada request, con
+baseline en JSON y gate de regresión.
+
+Mide (ns por llamada) normalize_ci/normalize_ci_list, _time_to_str,
+_fmt_time, _parse_hms, _validar_reglas_turno y la validación de ReservaIn
+(30 CIs), ParticipanteBase y SancionBase. Cada benchmark toma --muestras
+muestras; cada muestra repite la llamada las veces necesarias para durar
+~--ms-muestra ms, con el GC apagado.
+
+No necesita base de datos:
+    python scripts/bench_micro.py --guardar        # fija la baseline en esta máquina
+    python scripts/bench_micro.py                  # compara; sale con 1 si hay regresión
+
+Una regresión es un benchmark cuya mediana empeora más que --tolerancia
+(10% por defecto) y que además es significativa según un test de
+Mann-Whitney unilateral (p < --alfa) entre las muestras actuales y las de
+la baseline. Las baselines dependen de la máquina y del intérprete: se
+guardan en .bench/ (ignorado por git) y no se comparan entre equipos.
+"""
+
+import argparse
+import gc
+import json
+import math
+import platform
+import statistics
+import sys
+import time
+from datetime import time as dtime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src import app as app_module  # noqa: E402
+
+BASELINE_DEFAULT = Path(__file__).resolve().parent.parent / ".bench" / "micro_baseline.json"
+
+CIS_30 = [f"4.{i:03d}.{i % 1000:03d}-{i % 10}" for i in range(100, 130)]
+RESERVA = {
+    "nombre_sala": "Sala A-004",
+    "edificio": "Sede Central",
+    "fecha": "2025-11-04",
+    "id_turno": 3,
+    "participantes": CIS_30,
+}
+PARTICIPANTE = {
+    "ci": "4.000.001-2",
+    "nombre": "Sofía",
+    "apellido": "González Díaz",
+    "email": "sofia.gonzalez@ucu.edu.uy",
+    "tipo_participante": "estudiante",
+}
+SANCION = {"ci_participante": "4.000.001-2", "fecha_inicio": "2025-11-01", "fecha_fin": "2026-01-01"}
+
+
+def benchmarks() -> dict:
+    m = app_module
+    delta = timedelta(hours=17, minutes=30)
+    return {
+        "normalize_ci": lambda: m.normalize_ci("4.000.001-2"),
+        "normalize_ci_list_30": lambda: m.normalize_ci_list(CIS_30),
+        "time_to_str_timedelta": lambda: m._time_to_str(delta),
+        "time_to_str_time": lambda: m._time_to_str(dtime(17, 30)),
+        "fmt_time": lambda: m._fmt_time(delta),
+        "parse_hms": lambda: m._parse_hms("17:30:00"),
+        "validar_reglas_turno": lambda: m._validar_reglas_turno("17:00:00", "18:00:00"),
+        "ReservaIn_30_cis": lambda: m.ReservaIn.model_validate(RESERVA),
+        "ParticipanteBase": lambda: m.ParticipanteBase.model_validate(PARTICIPANTE),
+        "SancionBase": lambda: m.SancionBase.model_validate(SANCION),
+    }
+
+
+def medir(fn, muestras: int, ms_muestra: float) -> list[float]:
+    """ns por llamada en cada muestra."""
+    fn()
+    # Calibración: repeticiones para que una muestra dure ~ms_muestra.
+    n = 1
+    while True:
+        inicio = time.perf_counter_ns()
+        for _ in range(n):
+            fn()
+        transcurrido = time.perf_counter_ns() - inicio
+        if transcurrido >= ms_muestra * 1e6 / 4 or n >= 1 << 24:
+            break
+        n *= 2
+    n = max(1, int(n * ms_muestra * 1e6 / max(transcurrido, 1)))
+
+    resultado = []
+    gc_activo = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(muestras):
+            inicio = time.perf_counter_ns()
+            for _ in range(n):
+                fn()
+            resultado.append((time.perf_counter_ns() - inicio) / n)
+    finally:
+        if gc_activo:
+            gc.enable()
+    return resultado
+
+
+def mann_whitney_mayor(actual: list[float], base: list[float]) -> float:
+    """p-valor unilateral de H1: `actual` tiende a valores mayores que `base`.
+
+    Aproximación normal con corrección por empates y por continuidad
+    (suficiente desde ~10 muestras por grupo).
+    """
+    n1, n2 = len(actual), len(base)
+    todos = sorted([(v, 0) for v in actual] + [(v, 1) for v in base])
+    rangos = [0.0] * len(todos)
+    empates = 0.0
+    i = 0
+    while i < len(todos):
+        j = i
+        while j + 1 < len(todos) and todos[j + 1][0] == todos[i][0]:
+            j += 1
+        rango = (i + j) / 2 + 1
+        for k in range(i, j + 1):
+            rangos[k] = rango
+        t = j - i + 1
+        empates += t**3 - t
+        i = j + 1
+    r1 = sum(r for r, (_, grupo) in zip(rangos, todos) if grupo == 0)
+    u1 = r1 - n1 * (n1 + 1) / 2
+    media = n1 * n2 / 2
+    n = n1 + n2
+    varianza = n1 * n2 / 12 * ((n + 1) - empates / (n * (n - 1)))
+    if varianza <= 0:
+        return 1.0
+    z = (u1 - media - 0.5) / math.sqrt(varianza)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_DEFAULT)
+    parser.add_argument("--guardar", action="store_true", help="guardar los resultados como baseline")
+    parser.add_argument("--filtro", default="", help="solo benchmarks cuyo nombre contenga este texto")
+    parser.add_argument("--muestras", type=int, default=25)
+    parser.add_argument("--ms-muestra", type=float, default=20)
+    parser.add_argument("--alfa", type=float, default=0.01)
+    parser.add_argument("--tolerancia", type=float, default=0.10, help="empeoramiento mínimo de la mediana")
+    args = parser.parse_args()
+
+    casos = {k: v for k, v in benchmarks().items() if args.filtro in k}
+    actuales = {nombre: medir(fn, args.muestras, args.ms_muestra) for nombre, fn in casos.items()}
+
+    entorno = {"python": platform.python_version(), "maquina": platform.machine(), "sistema": platform.system()}
+    if args.guardar:
+        previos = {}
+        if args.baseline.exists():
+            previos = json.loads(args.baseline.read_text(encoding="utf-8")).get("benchmarks", {})
+        previos.update(
+            {n: {"mediana_ns": statistics.median(m), "muestras_ns": m} for n, m in actuales.items()}
+        )
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(
+            json.dumps({"entorno": entorno, "benchmarks": previos}, indent=2) + "\n", encoding="utf-8"
+        )
+        for nombre, muestras in actuales.items():
+            print(f"{nombre:<26}{statistics.median(muestras):>12.0f} ns")
+        print(f"\nBaseline guardada en {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        raise SystemExit(f"No hay baseline en {args.baseline}: correr primero con --guardar")
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    if baseline.get("entorno") != entorno:
+        print(f"Aviso: baseline tomada en {baseline.get('entorno')}, ahora {entorno}", file=sys.stderr)
+
+    regresiones = []
+    print(f"{'benchmark':<26}{'base ns':>12}{'actual ns':>12}{'cambio':>9}{'p':>9}")
+    for nombre, muestras in actuales.items():
+        base = baseline["benchmarks"].get(nombre)
+        actual = statistics.median(muestras)
+        if base is None:
+            print(f"{nombre:<26}{'-':>12}{actual:>12.0f}{'nuevo':>9}")
+            continue
+        cambio = actual / base["mediana_ns"] - 1
+        p = mann_whitney_mayor(muestras, base["muestras_ns"])
+        marca = ""
+        if p < args.alfa and cambio > args.tolerancia:
+            regresiones.append(nombre)
+            marca = "  REGRESIÓN"
+        print(f"{nombre:<26}{base['mediana_ns']:>12.0f}{actual:>12.0f}{cambio:>+9.1%}{p:>9.3g}{marca}")
+
+    if regresiones:
+        print(f"\n{len(regresiones)} regresión(es): {', '.join(regresiones)}")
+        sys.exit(1)
+    print("\nSin regresiones significativas.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmark de serialización de listados grandes.
+
+Compara, para 10k filas como las que devuelven /reservas y los reportes:
+  * camino FastAPI por defecto: validación con el response_model + json stdlib;
+  * JSONRapida (orjson si está instalado) sin revalidar;
+y el tamaño en bytes sin comprimir, con gzip y con brotli (si está instalado).
+
+No necesita base de datos:
+    python scripts/bench_serializacion.py [--filas 10000] [--repeticiones 20]
+"""
+
+import argparse
+import gzip
+import json
+import sys
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+from typing import List
+
+from pydantic import TypeAdapter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src import app as app_module  # noqa: E402
+
+
+def filas_reservas(n: int) -> list[dict]:
+    base = date(2024, 3, 1)
+    return [
+        {
+            "id_reserva": i,
+            "nombre_sala": f"Sala {chr(65 + i % 5)}-{i % 40:03d}",
+            "edificio": ("Sede Central", "Campus Pocitos", "Campus Norte")[i % 3],
+            "fecha": base + timedelta(days=i % 120),
+            "id_turno": 1 + i % 15,
+            "estado": ("activa", "finalizada", "cancelada", "sin_asistencia")[i % 4],
+            "participantes": ",".join(str(40000000 + i + k) for k in range(1 + i % 4)),
+        }
+        for i in range(n)
+    ]
+
+
+def filas_reporte(n: int) -> list[dict]:
+    return [
+        {
+            "rol": ("alumno", "docente")[i % 2],
+            "tipo_programa": ("grado", "posgrado")[i % 2],
+            "total_reservas": Decimal(i),
+            "con_asistencia": Decimal(i // 2),
+            "sin_asistencia": Decimal(i // 3),
+            "canceladas": Decimal(i // 5),
+        }
+        for i in range(n)
+    ]
+
+
+def camino_fastapi(adapter: TypeAdapter, filas: list[dict]) -> bytes:
+    validado = adapter.validate_python(filas)
+    contenido = adapter.dump_python(validado, mode="json")
+    return json.dumps(contenido, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def camino_rapido(filas: list[dict]) -> bytes:
+    return app_module.JSONRapida(filas).body
+
+
+def cpu_ms(fn, repeticiones: int) -> float:
+    fn()
+    inicio = time.process_time()
+    for _ in range(repeticiones):
+        fn()
+    return (time.process_time() - inicio) * 1000 / repeticiones
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=10_000)
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"orjson: {'sí' if app_module.orjson else 'no'} | brotli: {'sí' if app_module.brotli else 'no'}")
+    print(f"{args.filas} filas, {args.repeticiones} repeticiones (CPU ms por respuesta)\n")
+    casos = [
+        ("reservas", filas_reservas(args.filas), TypeAdapter(List[app_module.ReservaOut])),
+        ("reporte por rol", filas_reporte(args.filas), TypeAdapter(List[app_module.ReportReservasAsistenciasRol])),
+    ]
+    print(f"{'caso':<18}{'fastapi ms':>12}{'rápida ms':>12}{'bytes':>10}{'gzip':>10}{'br':>10}{'gzip ms':>10}")
+    for nombre, filas, adapter in casos:
+        t_fastapi = cpu_ms(lambda: camino_fastapi(adapter, filas), args.repeticiones)
+        t_rapida = cpu_ms(lambda: camino_rapido(filas), args.repeticiones)
+        cuerpo = camino_rapido(filas)
+        assert json.loads(cuerpo) == json.loads(camino_fastapi(adapter, filas)), "las salidas difieren"
+        comprimido = gzip.compress(cuerpo, compresslevel=app_module.COMPRESION_NIVEL_GZIP)
+        t_gzip = cpu_ms(lambda: gzip.compress(cuerpo, compresslevel=app_module.COMPRESION_NIVEL_GZIP), 5)
+        br = (
+            len(app_module.brotli.compress(cuerpo, quality=app_module.COMPRESION_NIVEL_BROTLI))
+            if app_module.brotli
+            else "-"
+        )
+        print(
+            f"{nombre:<18}{t_fastapi:>12.1f}{t_rapida:>12.1f}{len(cuerpo):>10}{len(comprimido):>10}{br:>10}{t_gzip:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
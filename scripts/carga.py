@@ -0,0 +1,290 @@
+"""
+Generador de carga para la API de reservas.
+
+Manda una mezcla configurable de operaciones contra una API levantada
+localmente (uvicorn + MySQL, idealmente con un dataset de
+scripts/generar_dataset.py):
+  * disponibilidad: GET /disponibilidad de una sala/fecha;
+  * reserva:        POST /reservas (los 409 por reglas de negocio son esperables);
+  * cancelacion:    PATCH /reservas/{id} a 'cancelada' sobre una reserva creada por la prueba;
+  * asistencia:     POST /reservas/{id}/asistencia sobre una reserva creada por la prueba;
+  * reporte:        GET de uno de los /reportes/*.
+Salas y turnos se eligen con popularidad Zipf. Al final informa throughput,
+percentiles de latencia, errores (409 / otros 4xx / 5xx / de red) y las
+sentencias SQL y el tiempo de base por request (headers X-DB-Statements y
+X-DB-Time de la API).
+
+ESCRIBE en la base: crea, cancela y cierra reservas. La API aplica rate
+limiting por IP/CI; para medir throughput levantarla con
+RATE_IP_POR_SEG=0 RATE_CI_POR_SEG=0 (si no, se ven 429).
+
+    RATE_IP_POR_SEG=0 RATE_CI_POR_SEG=0 uvicorn src.app:app --workers 4
+    python scripts/carga.py --duracion 60 --concurrencia 64
+    python scripts/carga.py --tasa 500 --mezcla disponibilidad=80,reserva=20 --json resultado.json
+
+Sin --tasa cada usuario virtual manda el siguiente request apenas recibe la
+respuesta (lazo cerrado). Con --tasa los requests llegan a ritmo Poisson
+independientemente de las respuestas (lazo abierto), y la latencia se mide
+desde el momento en que el request debía salir.
+"""
+
+import argparse
+import asyncio
+import bisect
+import itertools
+import json
+import random
+import sys
+import time
+from collections import deque
+from datetime import date, timedelta
+
+import httpx
+
+MEZCLA_DEFAULT = "disponibilidad=55,reserva=20,cancelacion=8,asistencia=7,reporte=10"
+REPORTES = (
+    "turnos-mas-demandados", "promedio-participantes-por-sala", "reservas-por-carrera-facultad",
+    "reservas-y-asistencias-por-rol", "sanciones-por-rol", "efectividad-reservas",
+    "salas-mas-usadas", "ocupacion-por-edificio", "uso-por-rol", "top-participantes",
+    "salas-no-show", "distribucion-semana-turno",
+)
+# Quién puede reservar cada tipo de sala (sin mirar programas de posgrado).
+TIPOS_HABILITADOS = {"libre": ("estudiante", "posgrado", "docente"), "posgrado": ("posgrado",), "docente": ("docente",)}
+
+
+def pesos_zipf(n: int, s: float) -> list[float]:
+    return list(itertools.accumulate(1 / (k + 1) ** s for k in range(n)))
+
+
+def percentil(ordenados: list[float], p: float) -> float:
+    if not ordenados:
+        return 0.0
+    return ordenados[min(len(ordenados) - 1, max(0, int(round(p / 100 * len(ordenados) + 0.5)) - 1))]
+
+
+class Resultados:
+    def __init__(self):
+        self.latencias: dict[str, list[float]] = {}
+        self.status: dict[str, dict[str, int]] = {}
+        self.sentencias: dict[str, int] = {}
+        self.db_ms: dict[str, float] = {}
+        self.descartados = 0
+
+    def registrar(self, op: str, segundos: float, clase: str, resp: httpx.Response | None) -> None:
+        self.latencias.setdefault(op, []).append(segundos)
+        conteo = self.status.setdefault(op, {})
+        conteo[clase] = conteo.get(clase, 0) + 1
+        if resp is not None:
+            self.sentencias[op] = self.sentencias.get(op, 0) + int(resp.headers.get("x-db-statements", 0))
+            self.db_ms[op] = self.db_ms.get(op, 0.0) + float(resp.headers.get("x-db-time", 0))
+
+    def resumen(self, duracion: float) -> dict:
+        ops = {}
+        for op, lat in sorted(self.latencias.items()):
+            lat = sorted(lat)
+            n = len(lat)
+            ops[op] = {
+                "requests": n,
+                "rps": round(n / duracion, 1),
+                "p50_ms": round(percentil(lat, 50) * 1000, 1),
+                "p90_ms": round(percentil(lat, 90) * 1000, 1),
+                "p99_ms": round(percentil(lat, 99) * 1000, 1),
+                "max_ms": round(lat[-1] * 1000, 1),
+                "status": self.status[op],
+                "sentencias_por_req": round(self.sentencias.get(op, 0) / n, 1),
+                "db_ms_por_req": round(self.db_ms.get(op, 0.0) / n, 2),
+            }
+        total = sum(o["requests"] for o in ops.values())
+        return {
+            "duracion_s": round(duracion, 1),
+            "requests": total,
+            "rps": round(total / duracion, 1),
+            "descartados": self.descartados,
+            "operaciones": ops,
+        }
+
+
+def clase_status(status: int) -> str:
+    if status < 400:
+        return "2xx"
+    if status in (409, 429):
+        return str(status)
+    return "4xx" if status < 500 else "5xx"
+
+
+class Escenario:
+    """Datos de referencia (salas, turnos, participantes) y generación de cada operación."""
+
+    def __init__(self, rng: random.Random, salas, turnos, participantes, desde: date, dias: int):
+        self.rng = rng
+        self.salas = salas
+        rng.shuffle(self.salas)
+        self.pesos_sala = pesos_zipf(len(salas), 1.0)
+        # Turnos del medio del día primero: son los más demandados.
+        turnos = sorted(turnos)
+        self.turnos = sorted(turnos, key=lambda t: abs(turnos.index(t) - len(turnos) // 2))
+        self.pesos_turno = pesos_zipf(len(self.turnos), 0.8)
+        self.por_tipo: dict[str, list[str]] = {}
+        for p in participantes:
+            self.por_tipo.setdefault(p["tipo_participante"], []).append(p["ci"])
+        self.fechas = [desde + timedelta(days=i) for i in range(dias)]
+        self.creadas: deque[tuple[int, list[str]]] = deque(maxlen=10_000)
+
+    def _zipf(self, pesos: list[float]) -> int:
+        return bisect.bisect(pesos, self.rng.random() * pesos[-1])
+
+    def sala(self) -> dict:
+        return self.salas[self._zipf(self.pesos_sala)]
+
+    def turno(self) -> int:
+        return self.turnos[self._zipf(self.pesos_turno)]
+
+    def participantes_para(self, tipo_sala: str) -> list[str]:
+        tipos = [t for t in TIPOS_HABILITADOS[tipo_sala] if self.por_tipo.get(t)]
+        if not tipos:
+            return []
+        candidatos = self.por_tipo[self.rng.choice(tipos)]
+        return self.rng.sample(candidatos, min(len(candidatos), self.rng.choice((1, 1, 2, 2, 3, 4))))
+
+    def request(self, op: str) -> tuple[str, str, str, dict]:
+        """(operación, método, url, kwargs de httpx); sin reservas propias, cancelar/asistir pasa a reservar."""
+        if op in ("cancelacion", "asistencia") and not self.creadas:
+            op = "reserva"
+        if op == "disponibilidad":
+            sala = self.sala()
+            params = {"fecha": self.rng.choice(self.fechas).isoformat(), "edificio": sala["edificio"], "nombre_sala": sala["nombre_sala"]}
+            return op, "GET", "/disponibilidad", {"params": params}
+        if op == "reserva":
+            sala = self.sala()
+            payload = {
+                "nombre_sala": sala["nombre_sala"],
+                "edificio": sala["edificio"],
+                "fecha": self.rng.choice(self.fechas).isoformat(),
+                "id_turno": self.turno(),
+                "participantes": self.participantes_para(sala["tipo_sala"]),
+            }
+            return op, "POST", "/reservas", {"json": payload}
+        if op == "cancelacion":
+            id_reserva, _ = self.creadas.popleft()
+            return op, "PATCH", f"/reservas/{id_reserva}", {"json": {"estado": "cancelada"}}
+        if op == "asistencia":
+            id_reserva, cis = self.creadas.popleft()
+            presentes = cis[: max(1, len(cis) - self.rng.randint(0, 1))]
+            return op, "POST", f"/reservas/{id_reserva}/asistencia", {"json": {"presentes": presentes}}
+        return op, "GET", f"/reportes/{self.rng.choice(REPORTES)}", {}
+
+
+async def ejecutar(cliente: httpx.AsyncClient, escenario: Escenario, res: Resultados, op: str, inicio: float) -> None:
+    op, metodo, url, kwargs = escenario.request(op)
+    try:
+        resp = await cliente.request(metodo, url, **kwargs)
+    except httpx.HTTPError:
+        res.registrar(op, time.perf_counter() - inicio, "red", None)
+        return
+    res.registrar(op, time.perf_counter() - inicio, clase_status(resp.status_code), resp)
+    if op == "reserva" and resp.status_code == 201:
+        escenario.creadas.append((resp.json()["id_reserva"], kwargs["json"]["participantes"]))
+
+
+async def correr(args) -> dict:
+    rng = random.Random(args.semilla)
+    mezcla = {}
+    for parte in args.mezcla.split(","):
+        op, _, peso = parte.partition("=")
+        mezcla[op.strip()] = float(peso)
+    invalidas = set(mezcla) - {"disponibilidad", "reserva", "cancelacion", "asistencia", "reporte"}
+    if invalidas:
+        raise SystemExit(f"Operaciones desconocidas en --mezcla: {', '.join(sorted(invalidas))}")
+    ops, pesos = list(mezcla), list(itertools.accumulate(mezcla.values()))
+
+    limites = httpx.Limits(max_connections=args.concurrencia, max_keepalive_connections=args.concurrencia)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limites) as cliente:
+        salas = (await cliente.get("/salas")).raise_for_status().json()
+        turnos = [t["id_turno"] for t in (await cliente.get("/turnos")).raise_for_status().json()]
+        participantes = (await cliente.get("/participantes")).raise_for_status().json()
+        if not salas or not turnos or not participantes:
+            raise SystemExit("La base no tiene salas, turnos o participantes: cargar un dataset primero")
+        escenario = Escenario(rng, salas, turnos, participantes, args.desde, args.dias)
+        print(
+            f"{len(salas)} salas, {len(turnos)} turnos, {len(participantes)} participantes; "
+            f"{'tasa ' + str(args.tasa) + ' req/s' if args.tasa else 'lazo cerrado'}, "
+            f"concurrencia {args.concurrencia}, {args.duracion} s",
+            file=sys.stderr,
+        )
+
+        def elegir_op() -> str:
+            return ops[bisect.bisect(pesos, rng.random() * pesos[-1])]
+
+        res = Resultados()
+        t0 = time.perf_counter()
+        fin = t0 + args.duracion
+
+        if args.tasa:
+            en_vuelo: set[asyncio.Task] = set()
+            proximo = t0
+            while proximo < fin:
+                proximo += rng.expovariate(args.tasa)
+                espera = proximo - time.perf_counter()
+                if espera > 0:
+                    await asyncio.sleep(espera)
+                if len(en_vuelo) >= args.concurrencia:
+                    res.descartados += 1
+                    continue
+                tarea = asyncio.create_task(ejecutar(cliente, escenario, res, elegir_op(), proximo))
+                en_vuelo.add(tarea)
+                tarea.add_done_callback(en_vuelo.discard)
+            await asyncio.gather(*en_vuelo)
+        else:
+
+            async def usuario():
+                while time.perf_counter() < fin:
+                    await ejecutar(cliente, escenario, res, elegir_op(), time.perf_counter())
+
+            await asyncio.gather(*(usuario() for _ in range(args.concurrencia)))
+
+        return res.resumen(time.perf_counter() - t0)
+
+
+def imprimir(resumen: dict) -> None:
+    print(f"\n{resumen['requests']} requests en {resumen['duracion_s']} s -> {resumen['rps']} req/s")
+    if resumen["descartados"]:
+        print(f"{resumen['descartados']} llegadas descartadas por tope de concurrencia")
+    print(
+        f"\n{'operación':<16}{'req':>8}{'req/s':>8}{'p50':>8}{'p90':>8}{'p99':>8}{'max':>9}"
+        f"{'2xx':>7}{'409':>6}{'429':>6}{'4xx':>6}{'5xx':>6}{'red':>6}{'sql/req':>9}{'db ms':>8}"
+    )
+    for op, o in resumen["operaciones"].items():
+        s = o["status"]
+        print(
+            f"{op:<16}{o['requests']:>8}{o['rps']:>8}{o['p50_ms']:>8}{o['p90_ms']:>8}{o['p99_ms']:>8}{o['max_ms']:>9}"
+            f"{s.get('2xx', 0):>7}{s.get('409', 0):>6}{s.get('429', 0):>6}{s.get('4xx', 0):>6}"
+            f"{s.get('5xx', 0):>6}{s.get('red', 0):>6}{o['sentencias_por_req']:>9}{o['db_ms_por_req']:>8}"
+        )
+    print("\nLatencias en ms.")
+    if any(o["status"].get("429") for o in resumen["operaciones"].values()):
+        print("Hubo 429: levantar la API con RATE_IP_POR_SEG=0 RATE_CI_POR_SEG=0 para medir throughput.")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--duracion", type=float, default=30)
+    parser.add_argument("--concurrencia", type=int, default=32, help="usuarios virtuales / requests en vuelo")
+    parser.add_argument("--tasa", type=float, default=0, help="req/s en lazo abierto (0 = lazo cerrado)")
+    parser.add_argument("--mezcla", default=MEZCLA_DEFAULT)
+    parser.add_argument("--desde", type=date.fromisoformat, default=date.today() + timedelta(days=1))
+    parser.add_argument("--dias", type=int, default=14, help="ventana de fechas para reservas y consultas")
+    parser.add_argument("--timeout", type=float, default=10)
+    parser.add_argument("--semilla", type=int, default=7)
+    parser.add_argument("--json", help="guardar el resumen en este archivo")
+    args = parser.parse_args()
+
+    resumen = asyncio.run(correr(args))
+    imprimir(resumen)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"parametros": {k: str(v) for k, v in vars(args).items()}, **resumen}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+"""
+Generador determinístico de datasets sintéticos para pruebas de carga.
+
+Produce archivos TSV en el formato por defecto de LOAD DATA (tabs, `\\n`,
+fechas ISO) y un `cargar.sql` que vacía las tablas, los carga y reconstruye
+los contadores mensuales. La misma semilla y los mismos parámetros generan
+exactamente los mismos archivos.
+
+El dataset respeta el schema y las reglas de POST /reservas:
+  * una reserva por (sala, edificio, fecha, turno) y nadie en dos reservas del mismo turno;
+  * participantes <= capacidad y exclusividad de salas de posgrado/docentes;
+  * salas libres: máx. 2 horas por día y 3 reservas por semana por persona;
+  * sin reservas para participantes sancionados; cada reserva sin_asistencia
+    sanciona 2 meses a sus participantes (como el barrido de no-show).
+La demanda está sesgada: picos de turno a media mañana y a la tarde, menos
+uso el sábado y casi nada el domingo, y popularidad tipo Zipf de salas y
+participantes.
+
+Uso:
+    python scripts/generar_dataset.py --escala grande --salida data/dataset
+    cd data/dataset && mysql --local-infile=1 -h127.0.0.1 -uroot -proot salas_db < cargar.sql
+
+Escalas: chica (5k participantes, 100 salas, 50k reservas), media (20k, 500, 1M)
+y grande (100k, 2k, 5M). --participantes/--salas/--reservas pisan la escala.
+"""
+
+import argparse
+import bisect
+import calendar
+import itertools
+import json
+import math
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+ESCALAS = {
+    "chica": (5_000, 100, 50_000),
+    "media": (20_000, 500, 1_000_000),
+    "grande": (100_000, 2_000, 5_000_000),
+}
+
+TURNOS = 15  # bloques de 1h de 08:00 a 23:00, como seed_demo.sql
+# Demanda relativa por turno (08:00 ... 22:00) y por día (lunes ... domingo).
+PESO_TURNO = (3, 6, 9, 10, 8, 5, 6, 7, 8, 9, 10, 9, 6, 3, 1)
+PESO_DIA = (10, 10, 9, 9, 7, 3, 0.5)
+# Ocupación máxima de los slots de un día, para que las salas populares se llenen
+# sin que el generador quede reintentando sobre slots ocupados.
+OCUPACION_MAX = 0.6
+
+TAMANO_GRUPO = ((1, 2, 3, 4, 5, 6, 8, 10), (30, 25, 15, 10, 8, 5, 4, 3))
+CAPACIDADES = ((4, 6, 8, 10, 12, 16, 20, 30, 40), (10, 20, 20, 15, 12, 10, 6, 4, 3))
+
+P_CANCELADA = 0.08
+P_SIN_ASISTENCIA = 0.05
+P_CANCELADA_FUTURA = 0.05
+
+NOMBRES = (
+    "Sofia", "Mateo", "Valentina", "Lucas", "Camila", "Juan", "Martina", "Diego", "Isabela",
+    "Santiago", "Lucia", "Bruno", "Emilia", "Agustin", "Victoria", "Nicolas", "Julieta",
+    "Felipe", "Catalina", "Benjamin", "Mia", "Thiago", "Renata", "Joaquin", "Paula",
+)
+APELLIDOS = (
+    "Gonzalez", "Rodriguez", "Fernandez", "Lopez", "Martinez", "Perez", "Garcia", "Sanchez",
+    "Romero", "Sosa", "Diaz", "Alvarez", "Torres", "Ruiz", "Ramirez", "Flores", "Acosta",
+    "Benitez", "Medina", "Suarez", "Herrera", "Castro", "Silva", "Pereira", "Cabrera",
+)
+FACULTADES = (
+    "Ingeniería y Tecnologías", "Ciencias Empresariales", "Ciencias Humanas",
+    "Ciencias de la Salud", "Derecho", "Psicología",
+)
+AREAS = (
+    "Informática", "Datos", "Electrónica", "Finanzas", "Marketing", "Administración",
+    "Educación", "Comunicación", "Medicina", "Enfermería", "Abogacía", "Psicología Clínica",
+)
+
+TABLAS = (
+    "facultad", "edificio", "programa_academico", "participante",
+    "participante_programa_academico", "sala", "turno", "reserva",
+    "reserva_participante", "sancion_participante",
+)
+# Tablas que se vacían además de las cargadas.
+TABLAS_DERIVADAS = (
+    "contador_participante_mes", "contador_sala_mes", "reserva_historica",
+    "reserva_participante_historica", "resumen_sala_dia", "resumen_turno_dia",
+    "archivo_estado", "proceso_checkpoint", "lista_espera_participante", "lista_espera",
+    "cambio", "cambio_consumidor",
+)
+
+COLUMNAS = {
+    "facultad": "id_facultad, nombre",
+    "edificio": "nombre_edificio, direccion, departamento",
+    "programa_academico": "nombre_programa, id_facultad, tipo",
+    "participante": "ci, nombre, apellido, email, tipo_participante, es_admin",
+    "participante_programa_academico": "ci_participante, nombre_programa, rol",
+    "sala": "nombre_sala, edificio, capacidad, tipo_sala",
+    "turno": "id_turno, hora_inicio, hora_fin",
+    "reserva": "id_reserva, nombre_sala, edificio, fecha, id_turno, estado",
+    "reserva_participante": "ci_participante, id_reserva, fecha_solicitud_reserva, asistencia",
+    "sancion_participante": "ci_participante, fecha_inicio, fecha_fin",
+}
+
+
+def pesos_zipf(n: int, s: float) -> list[float]:
+    """Pesos acumulados de una Zipf truncada (el índice 0 es el más popular)."""
+    return list(itertools.accumulate(1 / (k + 1) ** s for k in range(n)))
+
+
+def sumar_meses(d: date, meses: int) -> date:
+    """Como DATE_ADD(d, INTERVAL n MONTH) de MySQL: recorta al último día del mes."""
+    mes = d.month - 1 + meses
+    anio, mes = d.year + mes // 12, mes % 12 + 1
+    return date(anio, mes, min(d.day, calendar.monthrange(anio, mes)[1]))
+
+
+class Salida:
+    def __init__(self, carpeta: Path):
+        carpeta.mkdir(parents=True, exist_ok=True)
+        self.carpeta = carpeta
+        self.archivos = {t: open(carpeta / f"{t}.tsv", "w", encoding="utf-8", newline="\n") for t in TABLAS}
+        self.filas = dict.fromkeys(TABLAS, 0)
+
+    def fila(self, tabla: str, *valores) -> None:
+        self.archivos[tabla].write("\t".join(map(str, valores)) + "\n")
+        self.filas[tabla] += 1
+
+    def cerrar(self) -> None:
+        for f in self.archivos.values():
+            f.close()
+
+
+def generar_catalogo(rng: random.Random, out: Salida, n_participantes: int, n_salas: int):
+    """Facultades, programas, edificios, salas, turnos, participantes e inscripciones."""
+    for i, nombre in enumerate(FACULTADES, start=1):
+        out.fila("facultad", i, nombre)
+
+    programas = {"grado": [], "posgrado": []}
+    for i in range(max(12, n_participantes // 1500)):
+        tipo = "posgrado" if i % 4 == 3 else "grado"
+        prefijo = "Maestría en" if tipo == "posgrado" else "Lic. en"
+        nombre = f"{prefijo} {AREAS[i % len(AREAS)]} {i // len(AREAS) + 1}"
+        out.fila("programa_academico", nombre, i % len(FACULTADES) + 1, tipo)
+        programas[tipo].append(nombre)
+
+    n_edificios = max(3, math.ceil(n_salas / 40))
+    edificios = [f"Edificio {i:03d}" for i in range(1, n_edificios + 1)]
+    for i, nombre in enumerate(edificios, start=1):
+        out.fila("edificio", nombre, f"Calle {i} {1000 + i * 17}", "Montevideo")
+
+    # salas[i] = (nombre, edificio, capacidad, tipo); el orden define la popularidad.
+    salas = []
+    for i in range(n_salas):
+        edificio = edificios[i % n_edificios]
+        nombre = f"Sala {chr(65 + (i // n_edificios) // 1000 % 26)}-{(i // n_edificios) % 1000:03d}"
+        tipo = rng.choices(("libre", "posgrado", "docente"), (80, 12, 8))[0]
+        capacidad = rng.choices(*CAPACIDADES)[0]
+        out.fila("sala", nombre, edificio, capacidad, tipo)
+        salas.append((nombre, edificio, capacidad, tipo))
+    rng.shuffle(salas)
+
+    for t in range(TURNOS):
+        out.fila("turno", t + 1, f"{8 + t:02d}:00:00", f"{9 + t:02d}:00:00")
+
+    # Elegibles por tipo de sala (mismas reglas que create_reserva).
+    elegibles = {"libre": [], "posgrado": [], "docente": []}
+    for i in range(n_participantes):
+        ci = str(30_000_000 + i)
+        nombre, apellido = rng.choice(NOMBRES), f"{rng.choice(APELLIDOS)} {rng.choice(APELLIDOS)}"
+        tipo = rng.choices(("estudiante", "docente", "posgrado"), (80, 12, 8))[0]
+        es_admin = 1 if i < 5 else 0
+        email = f"{nombre}.{apellido.replace(' ', '')}.{i}@gen.ucu.edu.uy".lower()
+        out.fila("participante", ci, nombre, apellido, email, tipo, es_admin)
+
+        posgrado = tipo == "posgrado"
+        docente_posgrado = False
+        if tipo == "docente":
+            for programa in rng.sample(programas["grado"] + programas["posgrado"], rng.randint(1, 3)):
+                out.fila("participante_programa_academico", ci, programa, "docente")
+                docente_posgrado = docente_posgrado or programa in programas["posgrado"]
+        elif tipo == "posgrado":
+            out.fila("participante_programa_academico", ci, rng.choice(programas["posgrado"]), "alumno")
+        else:
+            for programa in rng.sample(programas["grado"], 2 if rng.random() < 0.1 else 1):
+                out.fila("participante_programa_academico", ci, programa, "alumno")
+
+        elegibles["libre"].append(ci)
+        if posgrado or docente_posgrado:
+            elegibles["posgrado"].append(ci)
+        if tipo == "docente":
+            elegibles["docente"].append(ci)
+
+    # Popularidad independiente del orden de alta.
+    for lista in elegibles.values():
+        rng.shuffle(lista)
+    return salas, elegibles
+
+
+def generar_reservas(rng, out, salas, elegibles, n_reservas: int, desde: date, dias: int, hoy: date) -> None:
+    pesos_sala = pesos_zipf(len(salas), 0.8)
+    pesos_turno = list(itertools.accumulate(PESO_TURNO))
+    pesos_pers = {tipo: pesos_zipf(len(lista), 0.7) for tipo, lista in elegibles.items() if lista}
+    tamanos, pesos_tamano = TAMANO_GRUPO
+
+    fechas = [desde + timedelta(days=i) for i in range(dias)]
+    peso_fechas = [PESO_DIA[f.weekday()] for f in fechas]
+    total_peso = sum(peso_fechas)
+    tope_dia = int(len(salas) * TURNOS * OCUPACION_MAX)
+
+    id_reserva = 0
+    sancionado_hasta: dict[str, date] = {}
+    semana_libre: dict[str, int] = {}
+    for fecha, peso in zip(fechas, peso_fechas):
+        if fecha.weekday() == 0:
+            semana_libre.clear()
+        objetivo = min(tope_dia, round(n_reservas * peso / total_peso))
+        ocupados: set[tuple[int, int]] = set()
+        en_turno: set[tuple[str, int]] = set()
+        horas_libre: dict[str, int] = {}
+        pasada = fecha < hoy
+
+        # Los intentos descartados (slot ocupado, nadie habilitado) se reintentan
+        # hasta un tope, para acercarse al objetivo sin romper las reglas.
+        creadas = 0
+        for _ in range(objetivo * 3):
+            if creadas == objetivo:
+                break
+            for _intento in range(5):
+                sala_idx = bisect.bisect(pesos_sala, rng.random() * pesos_sala[-1])
+                turno = bisect.bisect(pesos_turno, rng.random() * pesos_turno[-1]) + 1
+                if (sala_idx, turno) not in ocupados:
+                    break
+            else:
+                continue
+            nombre_sala, edificio, capacidad, tipo_sala = salas[sala_idx]
+            candidatos = elegibles[tipo_sala]
+            if not candidatos:
+                continue
+
+            if pasada:
+                estado = rng.choices(
+                    ("finalizada", "cancelada", "sin_asistencia"),
+                    (1 - P_CANCELADA - P_SIN_ASISTENCIA, P_CANCELADA, P_SIN_ASISTENCIA),
+                )[0]
+            else:
+                estado = "cancelada" if rng.random() < P_CANCELADA_FUTURA else "activa"
+            cuenta = estado != "cancelada"
+
+            tamano = min(capacidad, rng.choices(tamanos, pesos_tamano)[0])
+            grupo: list[str] = []
+            for ci in rng.choices(candidatos, cum_weights=pesos_pers[tipo_sala], k=tamano * 3):
+                if len(grupo) == tamano:
+                    break
+                if ci in grupo or (ci, turno) in en_turno or sancionado_hasta.get(ci, date.min) >= fecha:
+                    continue
+                if tipo_sala == "libre" and cuenta and (
+                    horas_libre.get(ci, 0) >= 2 or semana_libre.get(ci, 0) >= 3
+                ):
+                    continue
+                grupo.append(ci)
+            if not grupo:
+                continue
+
+            id_reserva += 1
+            creadas += 1
+            ocupados.add((sala_idx, turno))
+            out.fila("reserva", id_reserva, nombre_sala, edificio, fecha.isoformat(), turno, estado)
+            for ci in grupo:
+                if cuenta:
+                    en_turno.add((ci, turno))
+                    if tipo_sala == "libre":
+                        horas_libre[ci] = horas_libre.get(ci, 0) + 1
+                        semana_libre[ci] = semana_libre.get(ci, 0) + 1
+                solicitud = datetime.combine(fecha, datetime.min.time()) - timedelta(
+                    days=rng.randint(0, 14), minutes=rng.randint(0, 14 * 60)
+                )
+                out.fila(
+                    "reserva_participante",
+                    ci,
+                    id_reserva,
+                    solicitud.isoformat(sep=" "),
+                    1 if estado == "finalizada" else 0,
+                )
+                if estado == "sin_asistencia" and sancionado_hasta.get(ci, date.min) < fecha:
+                    fin = sumar_meses(fecha, 2)
+                    sancionado_hasta[ci] = fin
+                    out.fila("sancion_participante", ci, fecha.isoformat(), fin.isoformat())
+
+
+def escribir_carga(out: Salida, parametros: dict) -> None:
+    lineas = [
+        f"-- Generado por scripts/generar_dataset.py: {json.dumps(parametros, ensure_ascii=False)}",
+        "-- Reemplaza TODOS los datos de salas_db. Ejecutar desde esta carpeta:",
+        "--   mysql --local-infile=1 -h127.0.0.1 -uroot -proot salas_db < cargar.sql",
+        "SET NAMES utf8mb4 COLLATE utf8mb4_unicode_ci;",
+        "SET GLOBAL local_infile = 1;",
+        "SET FOREIGN_KEY_CHECKS = 0;",
+        "SET UNIQUE_CHECKS = 0;",
+    ]
+    lineas += [f"TRUNCATE TABLE {t};" for t in (*TABLAS, *TABLAS_DERIVADAS)]
+    for tabla in TABLAS:
+        lineas.append(
+            f"LOAD DATA LOCAL INFILE '{tabla}.tsv' INTO TABLE {tabla} "
+            f"CHARACTER SET utf8mb4 ({COLUMNAS[tabla]});"
+        )
+    # Misma reconstrucción que _recalcular_contadores (sin histórico: recién se vació).
+    lineas += [
+        "INSERT INTO contador_participante_mes (mes, ci_participante, total_reservas)",
+        "SELECT DATE_SUB(r.fecha, INTERVAL DAY(r.fecha) - 1 DAY) AS mes, rp.ci_participante, COUNT(*)",
+        "FROM reserva r JOIN reserva_participante rp ON rp.id_reserva = r.id_reserva",
+        "WHERE r.estado IN ('activa', 'finalizada', 'sin_asistencia')",
+        "GROUP BY mes, rp.ci_participante;",
+        "INSERT INTO contador_sala_mes (mes, edificio, nombre_sala, total_sin_asistencia)",
+        "SELECT DATE_SUB(r.fecha, INTERVAL DAY(r.fecha) - 1 DAY) AS mes, r.edificio, r.nombre_sala, COUNT(*)",
+        "FROM reserva r WHERE r.estado = 'sin_asistencia'",
+        "GROUP BY mes, r.edificio, r.nombre_sala;",
+        "SET UNIQUE_CHECKS = 1;",
+        "SET FOREIGN_KEY_CHECKS = 1;",
+        "ANALYZE TABLE reserva, reserva_participante, sancion_participante, participante;",
+    ]
+    (out.carpeta / "cargar.sql").write_text("\n".join(lineas) + "\n", encoding="utf-8")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escala", choices=sorted(ESCALAS), default="chica")
+    parser.add_argument("--participantes", type=int)
+    parser.add_argument("--salas", type=int)
+    parser.add_argument("--reservas", type=int)
+    parser.add_argument("--desde", type=date.fromisoformat, default=date(2024, 3, 1))
+    parser.add_argument("--dias", type=int, help="por defecto, los necesarios para no pasar ~40%% de ocupación")
+    parser.add_argument("--hoy", type=date.fromisoformat, help="antes: reservas cerradas; después: activas (default: 30 días antes del final)")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--salida", type=Path, default=Path("data/dataset"))
+    args = parser.parse_args()
+
+    n_participantes, n_salas, n_reservas = ESCALAS[args.escala]
+    n_participantes = args.participantes or n_participantes
+    n_salas = args.salas or n_salas
+    n_reservas = args.reservas if args.reservas is not None else n_reservas
+    # Suficientes días para que el día de más demanda no pase el 40% de los slots.
+    dias = args.dias or max(
+        30, math.ceil(n_reservas * 7 * max(PESO_DIA) / (sum(PESO_DIA) * 0.4 * n_salas * TURNOS))
+    )
+    hoy = args.hoy or args.desde + timedelta(days=max(0, dias - 30))
+    parametros = {
+        "semilla": args.semilla,
+        "participantes": n_participantes,
+        "salas": n_salas,
+        "reservas_objetivo": n_reservas,
+        "desde": args.desde.isoformat(),
+        "dias": dias,
+        "hoy": hoy.isoformat(),
+    }
+
+    inicio = time.perf_counter()
+    rng = random.Random(args.semilla)
+    out = Salida(args.salida)
+    try:
+        salas, elegibles = generar_catalogo(rng, out, n_participantes, n_salas)
+        generar_reservas(rng, out, salas, elegibles, n_reservas, args.desde, dias, hoy)
+    finally:
+        out.cerrar()
+    escribir_carga(out, parametros)
+    (args.salida / "resumen.json").write_text(
+        json.dumps({"parametros": parametros, "filas": out.filas}, ensure_ascii=False, indent=2) + "\n",
+        encoding="utf-8",
+    )
+    for tabla, filas in out.filas.items():
+        print(f"{tabla:<34}{filas:>12,}")
+    if out.filas["reserva"] < n_reservas * 0.95:
+        print(
+            f"\nAviso: {out.filas['reserva']:,} de {n_reservas:,} reservas; con estas reglas faltan "
+            "participantes o salas (subir --participantes/--salas o --dias)",
+            file=sys.stderr,
+        )
+    print(f"\n{args.salida}/cargar.sql listo en {time.perf_counter() - inicio:.1f} s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
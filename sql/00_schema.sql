@@ -65,7 +65,11 @@ CREATE TABLE reserva (
   fecha        DATE NOT NULL,
   id_turno     INT NOT NULL,
   estado       ENUM('activa','cancelada','sin_asistencia','finalizada') NOT NULL DEFAULT 'activa',
-  UNIQUE KEY uq_reserva_unica (nombre_sala, edificio, fecha, id_turno),
+  -- 1 mientras la reserva ocupa el turno, NULL si se canceló: el índice único
+  -- no compara NULLs, así que un turno cancelado se puede volver a reservar.
+  slot_ocupado TINYINT GENERATED ALWAYS AS (CASE WHEN estado = 'cancelada' THEN NULL ELSE 1 END) STORED,
+  UNIQUE KEY uq_reserva_unica (nombre_sala, edificio, fecha, id_turno, slot_ocupado),
+  KEY idx_reserva_estado_fecha (estado, fecha),
   FOREIGN KEY (nombre_sala, edificio) REFERENCES sala(nombre_sala, edificio),
   FOREIGN KEY (id_turno)              REFERENCES turno(id_turno)
 ) DEFAULT CHARSET = utf8mb4 COLLATE = utf8mb4_unicode_ci;
@@ -90,6 +94,126 @@ CREATE TABLE sancion_participante (
   fecha_inicio    DATE NOT NULL,
   fecha_fin       DATE NOT NULL,
   PRIMARY KEY (ci_participante, fecha_inicio),
+  KEY idx_sancion_fin (fecha_fin, fecha_inicio),
+  KEY idx_sancion_inicio (fecha_inicio, ci_participante),
   FOREIGN KEY (ci_participante) REFERENCES participante(ci),
   CHECK (fecha_fin > fecha_inicio)
 ) DEFAULT CHARSET = utf8mb4 COLLATE = utf8mb4_unicode_ci;
+
+-- Rollups mensuales para los reportes top-k (top-participantes, salas-no-show).
+-- Se mantienen en la misma transacción que escribe la reserva.
+CREATE TABLE contador_participante_mes (
+  mes             DATE NOT NULL,
+  ci_participante VARCHAR(20) NOT NULL,
+  total_reservas  INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (mes, ci_participante)
+) DEFAULT CHARSET = utf8mb4 COLLATE = utf8mb4_unicode_ci;
+
+CREATE TABLE contador_sala_mes (
+  mes                  DATE NOT NULL,
+  edificio             VARCHAR(80) NOT NULL,
+  nombre_sala          VARCHAR(80) NOT NULL,
+  total_sin_asistencia INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (mes, edificio, nombre_sala)
+) DEFAULT CHARSET = utf8mb4 COLLATE = utf8mb4_unicode_ci;
+
+-- Archivo histórico: reservas cerradas más viejas que el horizonte configurado
+-- se mueven a estas tablas; los resúmenes diarios alimentan los reportes.
+CREATE TABLE reserva_historica (
+  id_reserva   INT PRIMARY KEY,
+  nombre_sala  VARCHAR(80) NOT NULL,
+  edificio     VARCHAR(80) NOT NULL,
+  fecha        DATE NOT NULL,
+  id_turno     INT NOT NULL,
+  estado       ENUM('activa','cancelada','sin_asistencia','finalizada') NOT NULL,
+  archivada_en DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  KEY idx_reserva_historica_fecha (fecha)
+) DEFAULT CHARSET = utf8mb4 COLLATE = utf8mb4_unicode_ci;
+
+CREATE TABLE reserva_participante_historica (
+  ci_participante          VARCHAR(20) NOT NULL,
+  id_reserva               INT NOT NULL,
+  fecha_solicitud_reserva  DATETIME NOT NULL,
+  asistencia               BOOLEAN NOT NULL DEFAULT FALSE,
+  PRIMARY KEY (ci_participante, id_reserva),
+  KEY idx_rp_historica_reserva (id_reserva)
+) DEFAULT CHARSET = utf8mb4 COLLATE = utf8mb4_unicode_ci;
+
+CREATE TABLE resumen_sala_dia (
+  fecha               DATE NOT NULL,
+  edificio            VARCHAR(80) NOT NULL,
+  nombre_sala         VARCHAR(80) NOT NULL,
+  estado              ENUM('activa','cancelada','sin_asistencia','finalizada') NOT NULL,
+  total_reservas      INT NOT NULL DEFAULT 0,
+  total_participantes INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (fecha, edificio, nombre_sala, estado)
+) DEFAULT CHARSET = utf8mb4 COLLATE = utf8mb4_unicode_ci;
+
+CREATE TABLE resumen_turno_dia (
+  fecha          DATE NOT NULL,
+  id_turno       INT NOT NULL,
+  estado         ENUM('activa','cancelada','sin_asistencia','finalizada') NOT NULL,
+  total_reservas INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (fecha, id_turno, estado)
+) DEFAULT CHARSET = utf8mb4 COLLATE = utf8mb4_unicode_ci;
+
+CREATE TABLE archivo_estado (
+  id               TINYINT PRIMARY KEY,
+  archivado_hasta  DATE NULL,
+  total_archivadas INT NOT NULL DEFAULT 0
+) DEFAULT CHARSET = utf8mb4 COLLATE = utf8mb4_unicode_ci;
+
+-- Checkpoints de procesos en segundo plano (barrido de no-show, etc.).
+CREATE TABLE proceso_checkpoint (
+  proceso     VARCHAR(40) PRIMARY KEY,
+  marca       DATETIME NULL,
+  actualizado DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) DEFAULT CHARSET = utf8mb4 COLLATE = utf8mb4_unicode_ci;
+
+-- Feed de cambios (outbox): una fila por cambio de reserva o sanción, escrita
+-- en la misma transacción. Se sirve en GET /cambios y se compacta cuando todos
+-- los consumidores la confirmaron (POST /cambios/ack).
+CREATE TABLE cambio (
+  seq             BIGINT PRIMARY KEY AUTO_INCREMENT,
+  creado          DATETIME(3) NOT NULL,
+  tipo            VARCHAR(30) NOT NULL,
+  id_reserva      INT NULL,
+  nombre_sala     VARCHAR(80) NULL,
+  edificio        VARCHAR(80) NULL,
+  fecha           DATE NULL,
+  id_turno        INT NULL,
+  estado          VARCHAR(20) NULL,
+  ci_participante VARCHAR(20) NULL,
+  fecha_fin       DATE NULL,
+  KEY idx_cambio_creado (creado)
+) DEFAULT CHARSET = utf8mb4 COLLATE = utf8mb4_unicode_ci;
+
+CREATE TABLE cambio_consumidor (
+  consumidor  VARCHAR(60) PRIMARY KEY,
+  ultimo_seq  BIGINT NOT NULL DEFAULT 0,
+  actualizado DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) DEFAULT CHARSET = utf8mb4 COLLATE = utf8mb4_unicode_ci;
+
+-- Lista de espera por turno (sala, fecha, turno): al cancelarse la reserva
+-- que lo ocupa se promueve al primer grupo que cumpla las reglas.
+CREATE TABLE lista_espera (
+  id_espera   INT PRIMARY KEY AUTO_INCREMENT,
+  nombre_sala VARCHAR(80) NOT NULL,
+  edificio    VARCHAR(80) NOT NULL,
+  fecha       DATE NOT NULL,
+  id_turno    INT NOT NULL,
+  estado      ENUM('esperando','promovida','cancelada') NOT NULL DEFAULT 'esperando',
+  id_reserva  INT NULL,
+  creada      DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  KEY idx_espera_turno (nombre_sala, edificio, fecha, id_turno, estado, id_espera),
+  FOREIGN KEY (nombre_sala, edificio) REFERENCES sala(nombre_sala, edificio),
+  FOREIGN KEY (id_turno)              REFERENCES turno(id_turno)
+) DEFAULT CHARSET = utf8mb4 COLLATE = utf8mb4_unicode_ci;
+
+CREATE TABLE lista_espera_participante (
+  id_espera       INT NOT NULL,
+  ci_participante VARCHAR(20) NOT NULL,
+  PRIMARY KEY (id_espera, ci_participante),
+  FOREIGN KEY (id_espera)       REFERENCES lista_espera(id_espera),
+  FOREIGN KEY (ci_participante) REFERENCES participante(ci)
+) DEFAULT CHARSET = utf8mb4 COLLATE = utf8mb4_unicode_ci;
@@ -1,39 +1,584 @@
+import asyncio
+import base64
+import bisect
+import codecs
+import cProfile
+import csv
+import functools
+import gzip
+import hashlib
+import heapq
+import hmac
+import io
+import json
 import logging
+import logging.handlers
+import marshal
+import mimetypes
 import os
+import pstats
 import re
-from datetime import timedelta, date, time
+import secrets
+import threading
+import time as time_mod
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta, date, time
+from decimal import Decimal
 from pathlib import Path as FilePath
-from typing import Any, List, Literal
+from typing import Any, AsyncIterator, Iterable, List, Literal
 
+import anyio.to_thread
 import mysql.connector
-from fastapi import FastAPI, HTTPException, Header, Path, Query
-from fastapi.responses import HTMLResponse
-from fastapi.staticfiles import StaticFiles
-from pydantic import AliasChoices, BaseModel, Field, field_validator
+import mysql.connector.pooling
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Header, Path, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
+from fastapi.routing import APIRoute
+from pydantic import AliasChoices, BaseModel, Field, ValidationError, field_validator
+from starlette.exceptions import HTTPException as StarletteHTTPException
 
-app = FastAPI(title="UCU Salas - BD1", version="0.3.0")
+from src import storage
 
 logger = logging.getLogger(__name__)
 
+# Tareas periódicas en proceso: (nombre, intervalo en segundos, función síncrona).
+# Se registran más abajo junto a cada función y las arranca el lifespan.
+_TAREAS_PERIODICAS: list[tuple[str, float, Any]] = []
+
+
+async def _bucle_periodico(nombre: str, intervalo: float, funcion, detener: asyncio.Event) -> None:
+    while not detener.is_set():
+        try:
+            await run_in_threadpool(funcion)
+        except Exception:
+            logger.exception("Tarea periódica %s falló", nombre)
+        try:
+            await asyncio.wait_for(detener.wait(), timeout=intervalo)
+        except asyncio.TimeoutError:
+            pass
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    detener = asyncio.Event()
+    tareas = [
+        asyncio.create_task(_bucle_periodico(nombre, intervalo, funcion, detener))
+        for nombre, intervalo, funcion in _TAREAS_PERIODICAS
+        if intervalo > 0
+    ]
+    try:
+        yield
+    finally:
+        detener.set()
+        await asyncio.gather(*tareas, return_exceptions=True)
+
+
+app = FastAPI(title="UCU Salas - BD1", version="0.3.0", lifespan=lifespan)
+
 BASE_DIR = FilePath(__file__).parent
 UI_TEMPLATE = BASE_DIR / "templates" / "ui.html"
-app.mount("/static", StaticFiles(directory=BASE_DIR / "static"), name="static")
+STATIC_DIR = BASE_DIR / "static"
+
+# --------- Perfilado bajo demanda ---------
+# Un admin puede perfilar un request puntual mandando `X-Perfilar: 1`: ese
+# request corre bajo cProfile y la respuesta trae `X-Perfil-Id`; el perfil
+# queda en memoria (los últimos PERFILES_MAX) y se descarga desde
+# GET /admin/perfiles/{id_perfil}. Los endpoints se registran con
+# _RutaPerfilable, que envuelve la función para activar el perfilador en el
+# hilo donde realmente corre (los endpoints síncronos van al threadpool).
+# Sin el header el costo es una lectura de contextvar por request.
+PERFILES_MAX = int(os.getenv("PERFILES_MAX", "20"))
+
+_PERFIL_ACTUAL: ContextVar[cProfile.Profile | None] = ContextVar("perfil_actual", default=None)
+_PERFILES: OrderedDict[str, dict[str, Any]] = OrderedDict()
+_PERFILES_LOCK = threading.Lock()
+
+
+def _perfilable(func):
+    if getattr(func, "_perfilable", False):
+        return func
+    if asyncio.iscoroutinefunction(func):
+
+        @functools.wraps(func)
+        async def envoltura(*args, **kwargs):
+            perfil = _PERFIL_ACTUAL.get()
+            if perfil is None:
+                return await func(*args, **kwargs)
+            perfil.enable()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                perfil.disable()
+
+    else:
+
+        @functools.wraps(func)
+        def envoltura(*args, **kwargs):
+            perfil = _PERFIL_ACTUAL.get()
+            if perfil is None:
+                return func(*args, **kwargs)
+            return perfil.runcall(func, *args, **kwargs)
+
+    envoltura._perfilable = True
+    return envoltura
+
+
+class _RutaPerfilable(APIRoute):
+    def get_route_handler(self):
+        self.dependant.call = _perfilable(self.dependant.call)
+        return super().get_route_handler()
+
+
+app.router.route_class = _RutaPerfilable
+
+
+class _PerfilMiddleware:
+    """Activa el perfilado del request si trae X-Perfilar y el actor es admin.
+
+    Se perfila de a un request por vez: cProfile no admite dos perfiles
+    activos en el mismo hilo (el del event loop, para endpoints async).
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.ocupado = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        pedido, ci = False, None
+        for nombre, valor in scope["headers"]:
+            if nombre == b"x-perfilar":
+                pedido = valor not in (b"", b"0")
+            elif nombre == b"x-actor-ci":
+                ci = valor.decode("latin-1")
+        if not pedido:
+            return await self.app(scope, receive, send)
+
+        try:
+            admin = await run_in_threadpool(_requerir_admin, ci)
+            if self.ocupado:
+                raise HTTPException(status_code=409, detail="Ya hay un request perfilándose")
+        except HTTPException as e:
+            return await JSONResponse({"detail": e.detail}, status_code=e.status_code)(scope, receive, send)
+
+        self.ocupado = True
+        id_perfil = secrets.token_hex(6)
+        perfil = cProfile.Profile()
+        ctx = _PERFIL_ACTUAL.set(perfil)
+        inicio = time_mod.perf_counter()
+        # Un request que no llega al handler (404/405/422) deja el perfil
+        # vacío y pstats.Stats lo rechaza: no se guarda ni se anuncia.
+        guardar = None
+
+        async def enviar(mensaje):
+            nonlocal guardar
+            if mensaje["type"] == "http.response.start":
+                guardar = bool(perfil.getstats())
+                if guardar:
+                    mensaje = {**mensaje, "headers": [*mensaje.get("headers", []), (b"x-perfil-id", id_perfil.encode())]}
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _PERFIL_ACTUAL.reset(ctx)
+            self.ocupado = False
+            if guardar is None:
+                guardar = bool(perfil.getstats())
+            if guardar:
+                self._guardar(id_perfil, perfil, scope, admin, time_mod.perf_counter() - inicio)
+
+    @staticmethod
+    def _guardar(id_perfil: str, perfil: cProfile.Profile, scope, admin: dict, segundos: float) -> None:
+        estadisticas = pstats.Stats(perfil)
+        with _PERFILES_LOCK:
+            _PERFILES[id_perfil] = {
+                "id": id_perfil,
+                "metodo": scope["method"],
+                "ruta": scope["path"],
+                "actor": admin.get("ci"),
+                "duracion_ms": round(segundos * 1000, 1),
+                "creado": datetime.now().isoformat(timespec="seconds"),
+                "stats": estadisticas,
+            }
+            while len(_PERFILES) > PERFILES_MAX:
+                _PERFILES.popitem(last=False)
+
+
+app.add_middleware(_PerfilMiddleware)
+
+
+@app.get("/admin/perfiles")
+def listar_perfiles(x_actor_ci: str | None = Header(None, alias="X-Actor-CI")):
+    """Perfiles guardados, del más reciente al más viejo."""
+    _requerir_admin(x_actor_ci)
+    with _PERFILES_LOCK:
+        return [{k: v for k, v in p.items() if k != "stats"} for p in reversed(_PERFILES.values())]
+
+
+@app.get("/admin/perfiles/{id_perfil}")
+def descargar_perfil(
+    id_perfil: str,
+    formato: Literal["pstats", "texto"] = Query("pstats"),
+    limite: int = Query(40, ge=1, le=500),
+    x_actor_ci: str | None = Header(None, alias="X-Actor-CI"),
+):
+    """El perfil como archivo .pstats (para snakeviz/pstats) o como texto ordenado por tiempo acumulado."""
+    _requerir_admin(x_actor_ci)
+    with _PERFILES_LOCK:
+        guardado = _PERFILES.get(id_perfil)
+    if guardado is None:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    if formato == "texto":
+        salida = io.StringIO()
+        # Copia: sort_stats/print_stats modifican el objeto Stats.
+        pstats.Stats(stream=salida).add(guardado["stats"]).sort_stats("cumulative").print_stats(limite)
+        return Response(salida.getvalue(), media_type="text/plain; charset=utf-8")
+    return Response(
+        marshal.dumps(guardado["stats"].stats),
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="perfil-{id_perfil}.pstats"'},
+    )
+
+
+# --------- Respuestas JSON rápidas y compresión ---------
+# orjson y brotli son opcionales: sin ellos se usa json de la stdlib y gzip.
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende del entorno
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depende del entorno
+    brotli = None
+
+COMPRESION_MINIMO = int(os.getenv("COMPRESION_MINIMO", "1024"))
+COMPRESION_NIVEL_GZIP = int(os.getenv("COMPRESION_NIVEL_GZIP", "5"))
+COMPRESION_NIVEL_BROTLI = int(os.getenv("COMPRESION_NIVEL_BROTLI", "4"))
+
+
+def _json_default(v):
+    if isinstance(v, Decimal):
+        # SUM()/COUNT() de MySQL llegan como Decimal sin decimales: van como enteros.
+        return int(v) if v.as_tuple().exponent >= 0 else float(v)
+    if isinstance(v, (datetime, date, time)):
+        return v.isoformat()
+    if isinstance(v, timedelta):
+        return _time_to_str(v)
+    if isinstance(v, (bytes, bytearray)):
+        return v.decode()
+    raise TypeError(f"Tipo no serializable: {type(v).__name__}")
+
+
+class JSONRapida(JSONResponse):
+    """JSONResponse que serializa con orjson si está instalado."""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, default=_json_default)
+        return json.dumps(
+            content, default=_json_default, ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+
+
+def _get_confiable(path: str, **kwargs):
+    """Como `app.get`, para endpoints que devuelven filas SQL con la forma exacta del response_model.
+
+    La ruta registrada envuelve el resultado en JSONRapida, con lo que FastAPI
+    no vuelve a validar fila por fila contra el modelo (que queda para la
+    documentación). La función del módulo no cambia y sigue devolviendo
+    dicts, así los tests la pueden llamar directamente.
+    """
+
+    def decorador(func):
+        @functools.wraps(func)
+        def ruta(*args, **kw):
+            return JSONRapida(func(*args, **kw))
+
+        app.get(path, response_class=JSONRapida, **kwargs)(ruta)
+        return func
+
+    return decorador
+
+
+def _codificacion_aceptada(accept_encoding: str) -> str | None:
+    aceptadas = set()
+    for parte in accept_encoding.split(","):
+        nombre, _, params = parte.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        aceptadas.add(nombre.strip().lower())
+    if brotli is not None and "br" in aceptadas:
+        return "br"
+    if "gzip" in aceptadas:
+        return "gzip"
+    return None
+
+
+class _CompresionMiddleware:
+    """Comprime con brotli o gzip las respuestas de un solo bloque mayores a `minimo` bytes.
+
+    Las respuestas en streaming (varios bloques, p. ej. NDJSON o
+    text/event-stream) y las que ya traen Content-Encoding pasan sin tocar.
+    """
+
+    def __init__(self, app, minimo: int = COMPRESION_MINIMO):
+        self.app = app
+        self.minimo = minimo
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        codificacion = None
+        for nombre, valor in scope["headers"]:
+            if nombre == b"accept-encoding":
+                codificacion = _codificacion_aceptada(valor.decode("latin-1"))
+                break
+        if codificacion is None:
+            return await self.app(scope, receive, send)
+
+        inicio: dict | None = None
+        pasar = False
+
+        async def enviar(mensaje):
+            nonlocal inicio, pasar
+            if mensaje["type"] == "http.response.start":
+                headers = mensaje.get("headers", [])
+                nombres = {k.lower() for k, _ in headers}
+                tipo = next((v for k, v in headers if k.lower() == b"content-type"), b"")
+                if b"content-encoding" in nombres or tipo.startswith(b"text/event-stream"):
+                    pasar = True
+                    await send(mensaje)
+                else:
+                    inicio = mensaje
+                return
+            if pasar or mensaje["type"] != "http.response.body":
+                await send(mensaje)
+                return
+            if mensaje.get("more_body", False):
+                # Streaming: se manda tal cual.
+                pasar = True
+                await send(inicio)
+                await send(mensaje)
+                return
+            cuerpo = mensaje.get("body", b"")
+            headers = [(k, v) for k, v in inicio.get("headers", []) if k.lower() != b"content-length"]
+            if len(cuerpo) >= self.minimo:
+                if codificacion == "br":
+                    cuerpo = brotli.compress(cuerpo, quality=COMPRESION_NIVEL_BROTLI)
+                else:
+                    cuerpo = gzip.compress(cuerpo, compresslevel=COMPRESION_NIVEL_GZIP, mtime=0)
+                headers.append((b"content-encoding", codificacion.encode()))
+                headers.append((b"vary", b"Accept-Encoding"))
+            headers.append((b"content-length", str(len(cuerpo)).encode()))
+            await send({**inicio, "headers": headers})
+            await send({"type": "http.response.body", "body": cuerpo})
+
+        await self.app(scope, receive, enviar)
+
+
+app.add_middleware(_CompresionMiddleware)
 
 # --------- DB ---------
+# get_conn pide la conexión al backend de almacenamiento (src/storage.py),
+# elegido con DB_BACKEND: "mysql" (por defecto; pool de DB_POOL_SIZE
+# conexiones, 0 = sin pool, close() la devuelve al pool) o "sqlite"
+# (embebido, mismo schema, para tests y benchmarks sin contenedores).
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "16"))
+
+_BACKEND = storage.backend_desde_entorno(pool_size=DB_POOL_SIZE)
+
+
 def get_conn():
-    conn = mysql.connector.connect(
-        host=os.getenv("DB_HOST", "127.0.0.1"),
-        port=int(os.getenv("DB_PORT", "3306")),
-        user=os.getenv("DB_USER", "root"),
-        password=os.getenv("DB_PASS", "root"),
-        database=os.getenv("DB_NAME", "salas_db"),
-        autocommit=True,
-        charset="utf8mb4",
-        collation="utf8mb4_unicode_ci",
-        use_unicode=True,
-    )
+    conn = _BACKEND.conectar()
     ensure_schema_migrations(conn)
-    return conn
+    return _ConexionInstrumentada(conn)
+
+# --------- Instrumentación SQL ---------
+# get_conn devuelve la conexión envuelta: cada execute/executemany se cuenta
+# y se cronometra en las estadísticas del request en curso (contextvar que
+# abre _InstrumentacionSQLMiddleware; run_in_threadpool copia el contexto,
+# así que los endpoints síncronos ven el mismo objeto). Con eso:
+# - headers Server-Timing, X-DB-Time (ms) y X-DB-Statements en la respuesta,
+#   más X-DB-Slowest con la huella de la sentencia más lenta (su duración va
+#   como `db-lenta` en Server-Timing);
+# - log de consultas lentas (>= SLOW_QUERY_MS) con la huella de la sentencia,
+#   a archivo rotativo si se define SLOW_QUERY_LOG;
+# - aviso de N+1 cuando una misma huella corre más de DB_N_MAS_1_UMBRAL
+#   veces en un request.
+# Los parámetros nunca se loguean: la huella reemplaza literales por `?`.
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG", "")
+SLOW_QUERY_LOG_MAX_BYTES = int(os.getenv("SLOW_QUERY_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+SLOW_QUERY_LOG_BACKUPS = int(os.getenv("SLOW_QUERY_LOG_BACKUPS", "5"))
+DB_N_MAS_1_UMBRAL = int(os.getenv("DB_N_MAS_1_UMBRAL", "10"))
+DB_HUELLA_HEADER_MAX = int(os.getenv("DB_HUELLA_HEADER_MAX", "200"))
+
+slow_query_logger = logging.getLogger(__name__ + ".slow_query")
+if SLOW_QUERY_LOG:
+    _handler_lentas = logging.handlers.RotatingFileHandler(
+        SLOW_QUERY_LOG,
+        maxBytes=SLOW_QUERY_LOG_MAX_BYTES,
+        backupCount=SLOW_QUERY_LOG_BACKUPS,
+        encoding="utf-8",
+    )
+    _handler_lentas.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    slow_query_logger.addHandler(_handler_lentas)
+    slow_query_logger.setLevel(logging.INFO)
+
+_HUELLA_RES = (
+    (re.compile(r"'(?:[^'\\]|\\.|'')*'"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"%s|%\(\w+\)s"), "?"),
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)"), "(?+)"),
+    (re.compile(r"\s+"), " "),
+)
+
+
+@functools.lru_cache(maxsize=1024)
+def huella_sql(sql: str) -> str:
+    """Sentencia normalizada: literales y placeholders a `?`, listas IN colapsadas."""
+    for patron, reemplazo in _HUELLA_RES:
+        sql = patron.sub(reemplazo, sql)
+    return sql.strip()
+
+
+class _EstadisticasSQL:
+    __slots__ = ("ruta", "sentencias", "segundos", "mas_lenta", "mas_lenta_seg", "por_huella", "_lock")
+
+    def __init__(self, ruta: str = ""):
+        self.ruta = ruta
+        self.sentencias = 0
+        self.segundos = 0.0
+        self.mas_lenta = ""
+        self.mas_lenta_seg = 0.0
+        self.por_huella: dict[str, int] = {}
+        # absorber() llega desde los sub-requests de un /batch en paralelo.
+        self._lock = threading.Lock()
+
+    def registrar(self, sql: str, segundos: float) -> None:
+        huella = huella_sql(sql if isinstance(sql, str) else sql.decode())
+        with self._lock:
+            self.sentencias += 1
+            self.segundos += segundos
+            self.por_huella[huella] = self.por_huella.get(huella, 0) + 1
+            if segundos > self.mas_lenta_seg:
+                self.mas_lenta, self.mas_lenta_seg = huella, segundos
+        if segundos * 1000 >= SLOW_QUERY_MS:
+            slow_query_logger.warning(
+                "consulta lenta %.1f ms ruta=%s sql=%s", segundos * 1000, self.ruta or "-", huella
+            )
+
+    def n_mas_1(self, umbral: int = DB_N_MAS_1_UMBRAL) -> list[tuple[str, int]]:
+        return [(h, n) for h, n in self.por_huella.items() if n > umbral]
+
+    def avisar_n_mas_1(self, metodo: str) -> None:
+        for huella, veces in self.n_mas_1():
+            logger.warning(
+                "Posible N+1 en %s %s: %d ejecuciones de %s (más lenta del request: %.1f ms %s)",
+                metodo, self.ruta, veces, huella, self.mas_lenta_seg * 1000, self.mas_lenta,
+            )
+
+    def header_mas_lenta(self) -> bytes:
+        """Huella de la sentencia más lenta, apta para un header (ASCII, acotada)."""
+        huella = self.mas_lenta[:DB_HUELLA_HEADER_MAX]
+        return huella.encode("ascii", errors="replace")
+
+    def absorber(self, otra: "_EstadisticasSQL") -> None:
+        """Suma las estadísticas de un sub-request (batch) a las de este request."""
+        with self._lock:
+            self.sentencias += otra.sentencias
+            self.segundos += otra.segundos
+            for huella, veces in otra.por_huella.items():
+                self.por_huella[huella] = self.por_huella.get(huella, 0) + veces
+            if otra.mas_lenta_seg > self.mas_lenta_seg:
+                self.mas_lenta, self.mas_lenta_seg = otra.mas_lenta, otra.mas_lenta_seg
+
+
+_SQL_ACTUAL: ContextVar[_EstadisticasSQL | None] = ContextVar("sql_actual", default=None)
+
+
+class _CursorInstrumentado:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def _medir(self, metodo, sql, *args, **kwargs):
+        estadisticas = _SQL_ACTUAL.get()
+        if estadisticas is None:
+            return metodo(sql, *args, **kwargs)
+        inicio = time_mod.perf_counter()
+        try:
+            return metodo(sql, *args, **kwargs)
+        finally:
+            estadisticas.registrar(sql, time_mod.perf_counter() - inicio)
+
+    def execute(self, sql, *args, **kwargs):
+        return self._medir(self._cursor.execute, sql, *args, **kwargs)
+
+    def executemany(self, sql, *args, **kwargs):
+        return self._medir(self._cursor.executemany, sql, *args, **kwargs)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, nombre):
+        return getattr(self._cursor, nombre)
+
+
+class _ConexionInstrumentada:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, *args, **kwargs):
+        return _CursorInstrumentado(self._conn.cursor(*args, **kwargs))
+
+    def __getattr__(self, nombre):
+        return getattr(self._conn, nombre)
+
+
+class _InstrumentacionSQLMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        estadisticas = _EstadisticasSQL(scope["path"])
+        ctx = _SQL_ACTUAL.set(estadisticas)
+        inicio = time_mod.perf_counter()
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start" and estadisticas.sentencias:
+                db_ms = estadisticas.segundos * 1000
+                app_ms = (time_mod.perf_counter() - inicio) * 1000
+                mensaje = {
+                    **mensaje,
+                    "headers": [
+                        *mensaje.get("headers", []),
+                        (
+                            b"server-timing",
+                            f"db;dur={db_ms:.1f}, db-lenta;dur={estadisticas.mas_lenta_seg * 1000:.1f}, "
+                            f"app;dur={app_ms:.1f}".encode(),
+                        ),
+                        (b"x-db-time", f"{db_ms:.1f}".encode()),
+                        (b"x-db-statements", str(estadisticas.sentencias).encode()),
+                        (b"x-db-slowest", estadisticas.header_mas_lenta()),
+                    ],
+                }
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _SQL_ACTUAL.reset(ctx)
+            estadisticas.avisar_n_mas_1(scope["method"])
+
+
+app.add_middleware(_InstrumentacionSQLMiddleware)
 
 # Para compatibilidad con el código existente
 def get_reservas_connection():
@@ -46,8 +591,129 @@ CI_CLEAN_RE = re.compile(r"\D")
 
 _MIGRATIONS_APPLIED = False
 
+_INDICES_EXTRA = (
+    # Barridos por estado/fecha (archivo histórico, no-show).
+    ("reserva", "idx_reserva_estado_fecha", "estado, fecha"),
+    # "Vigente en D" como rango sobre fecha_fin y orden keyset por fecha_inicio.
+    ("sancion_participante", "idx_sancion_fin", "fecha_fin, fecha_inicio"),
+    ("sancion_participante", "idx_sancion_inicio", "fecha_inicio, ci_participante"),
+)
+
+_DDL_ARCHIVO = (
+    """
+    CREATE TABLE IF NOT EXISTS reserva_historica (
+      id_reserva   INT PRIMARY KEY,
+      nombre_sala  VARCHAR(80) NOT NULL,
+      edificio     VARCHAR(80) NOT NULL,
+      fecha        DATE NOT NULL,
+      id_turno     INT NOT NULL,
+      estado       ENUM('activa','cancelada','sin_asistencia','finalizada') NOT NULL,
+      archivada_en DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+      KEY idx_reserva_historica_fecha (fecha)
+    ) DEFAULT CHARSET = utf8mb4 COLLATE = utf8mb4_unicode_ci
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS reserva_participante_historica (
+      ci_participante          VARCHAR(20) NOT NULL,
+      id_reserva               INT NOT NULL,
+      fecha_solicitud_reserva  DATETIME NOT NULL,
+      asistencia               BOOLEAN NOT NULL DEFAULT FALSE,
+      PRIMARY KEY (ci_participante, id_reserva),
+      KEY idx_rp_historica_reserva (id_reserva)
+    ) DEFAULT CHARSET = utf8mb4 COLLATE = utf8mb4_unicode_ci
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS resumen_sala_dia (
+      fecha               DATE NOT NULL,
+      edificio            VARCHAR(80) NOT NULL,
+      nombre_sala         VARCHAR(80) NOT NULL,
+      estado              ENUM('activa','cancelada','sin_asistencia','finalizada') NOT NULL,
+      total_reservas      INT NOT NULL DEFAULT 0,
+      total_participantes INT NOT NULL DEFAULT 0,
+      PRIMARY KEY (fecha, edificio, nombre_sala, estado)
+    ) DEFAULT CHARSET = utf8mb4 COLLATE = utf8mb4_unicode_ci
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS resumen_turno_dia (
+      fecha          DATE NOT NULL,
+      id_turno       INT NOT NULL,
+      estado         ENUM('activa','cancelada','sin_asistencia','finalizada') NOT NULL,
+      total_reservas INT NOT NULL DEFAULT 0,
+      PRIMARY KEY (fecha, id_turno, estado)
+    ) DEFAULT CHARSET = utf8mb4 COLLATE = utf8mb4_unicode_ci
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS archivo_estado (
+      id               TINYINT PRIMARY KEY,
+      archivado_hasta  DATE NULL,
+      total_archivadas INT NOT NULL DEFAULT 0
+    ) DEFAULT CHARSET = utf8mb4 COLLATE = utf8mb4_unicode_ci
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS proceso_checkpoint (
+      proceso     VARCHAR(40) PRIMARY KEY,
+      marca       DATETIME NULL,
+      actualizado DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    ) DEFAULT CHARSET = utf8mb4 COLLATE = utf8mb4_unicode_ci
+    """,
+)
+
+_DDL_CAMBIOS = (
+    """
+    CREATE TABLE IF NOT EXISTS cambio (
+      seq             BIGINT PRIMARY KEY AUTO_INCREMENT,
+      creado          DATETIME(3) NOT NULL,
+      tipo            VARCHAR(30) NOT NULL,
+      id_reserva      INT NULL,
+      nombre_sala     VARCHAR(80) NULL,
+      edificio        VARCHAR(80) NULL,
+      fecha           DATE NULL,
+      id_turno        INT NULL,
+      estado          VARCHAR(20) NULL,
+      ci_participante VARCHAR(20) NULL,
+      fecha_fin       DATE NULL,
+      KEY idx_cambio_creado (creado)
+    ) DEFAULT CHARSET = utf8mb4 COLLATE = utf8mb4_unicode_ci
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS cambio_consumidor (
+      consumidor  VARCHAR(60) PRIMARY KEY,
+      ultimo_seq  BIGINT NOT NULL DEFAULT 0,
+      actualizado DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    ) DEFAULT CHARSET = utf8mb4 COLLATE = utf8mb4_unicode_ci
+    """,
+)
+
+
+_DDL_ESPERA = (
+    """
+    CREATE TABLE IF NOT EXISTS lista_espera (
+      id_espera   INT PRIMARY KEY AUTO_INCREMENT,
+      nombre_sala VARCHAR(80) NOT NULL,
+      edificio    VARCHAR(80) NOT NULL,
+      fecha       DATE NOT NULL,
+      id_turno    INT NOT NULL,
+      estado      ENUM('esperando','promovida','cancelada') NOT NULL DEFAULT 'esperando',
+      id_reserva  INT NULL,
+      creada      DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+      KEY idx_espera_turno (nombre_sala, edificio, fecha, id_turno, estado, id_espera),
+      FOREIGN KEY (nombre_sala, edificio) REFERENCES sala(nombre_sala, edificio),
+      FOREIGN KEY (id_turno)              REFERENCES turno(id_turno)
+    ) DEFAULT CHARSET = utf8mb4 COLLATE = utf8mb4_unicode_ci
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS lista_espera_participante (
+      id_espera       INT NOT NULL,
+      ci_participante VARCHAR(20) NOT NULL,
+      PRIMARY KEY (id_espera, ci_participante),
+      FOREIGN KEY (id_espera)       REFERENCES lista_espera(id_espera),
+      FOREIGN KEY (ci_participante) REFERENCES participante(ci)
+    ) DEFAULT CHARSET = utf8mb4 COLLATE = utf8mb4_unicode_ci
+    """,
+)
+
 
-def ensure_schema_migrations(conn: mysql.connector.MySQLConnection) -> None:
+def ensure_schema_migrations(conn) -> None:
     """
     Aplica migraciones ligeras para entornos ya inicializados con un schema
     anterior (por ejemplo, bases levantadas antes de agregar el campo
@@ -62,53 +728,125 @@ def ensure_schema_migrations(conn: mysql.connector.MySQLConnection) -> None:
 
     cur = conn.cursor()
     try:
-        # MySQL no soporta "ADD COLUMN IF NOT EXISTS". Para que la migración
-        # sea idempotente, verificamos primero si la columna está presente y
-        # solo ejecutamos el ALTER cuando falta.
-        cur.execute("SHOW COLUMNS FROM participante LIKE 'tipo_participante'")
-        if cur.fetchone() is None:
-            cur.execute(
-                """
-                ALTER TABLE participante
-                ADD COLUMN tipo_participante
-                ENUM('estudiante','docente','posgrado')
-                NOT NULL DEFAULT 'estudiante'
-                """
-            )
+        # Las columnas, CIs e índices agregados después del schema original
+        # solo pueden faltar en volúmenes MySQL viejos; una base SQLite se
+        # crea siempre con el schema actual.
+        if _BACKEND.nombre == "mysql":
+            # MySQL no soporta "ADD COLUMN IF NOT EXISTS". Para que la migración
+            # sea idempotente, verificamos primero si la columna está presente y
+            # solo ejecutamos el ALTER cuando falta.
+            cur.execute("SHOW COLUMNS FROM participante LIKE 'tipo_participante'")
+            if cur.fetchone() is None:
+                cur.execute(
+                    """
+                    ALTER TABLE participante
+                    ADD COLUMN tipo_participante
+                    ENUM('estudiante','docente','posgrado')
+                    NOT NULL DEFAULT 'estudiante'
+                    """
+                )
 
-        cur.execute("SHOW COLUMNS FROM participante LIKE 'es_admin'")
-        if cur.fetchone() is None:
-            cur.execute(
-                """
-                ALTER TABLE participante
-                ADD COLUMN es_admin TINYINT(1) NOT NULL DEFAULT 0
-                """
-            )
+            cur.execute("SHOW COLUMNS FROM participante LIKE 'es_admin'")
+            if cur.fetchone() is None:
+                cur.execute(
+                    """
+                    ALTER TABLE participante
+                    ADD COLUMN es_admin TINYINT(1) NOT NULL DEFAULT 0
+                    """
+                )
 
-        # Normalizar CIs existentes (seeds viejos podían tener puntos/guiones).
-        cur.execute("SET FOREIGN_KEY_CHECKS=0")
-        for table, column in [
-            ("participante", "ci"),
-            ("participante_programa_academico", "ci_participante"),
-            ("reserva_participante", "ci_participante"),
-            ("sancion_participante", "ci_participante"),
-        ]:
-            cur.execute(
-                f"""
-                UPDATE {table}
-                SET {column} = REGEXP_REPLACE({column}, '[^0-9]', '')
-                WHERE {column} REGEXP '[^0-9]'
-                """
-            )
-        cur.execute("SET FOREIGN_KEY_CHECKS=1")
+            # Normalizar CIs existentes (seeds viejos podían tener puntos/guiones).
+            cur.execute("SET FOREIGN_KEY_CHECKS=0")
+            for table, column in [
+                ("participante", "ci"),
+                ("participante_programa_academico", "ci_participante"),
+                ("reserva_participante", "ci_participante"),
+                ("sancion_participante", "ci_participante"),
+            ]:
+                cur.execute(
+                    f"""
+                    UPDATE {table}
+                    SET {column} = REGEXP_REPLACE({column}, '[^0-9]', '')
+                    WHERE {column} REGEXP '[^0-9]'
+                    """
+                )
+            cur.execute("SET FOREIGN_KEY_CHECKS=1")
 
-        try:
-            cur.execute(
-                "UPDATE participante SET es_admin = 1 WHERE ci = '59876543'"
-            )
-        except mysql.connector.Error:
-            # Si no existe el CI en una base vieja, no interrumpimos el flujo
-            pass
+            try:
+                cur.execute(
+                    "UPDATE participante SET es_admin = 1 WHERE ci = '59876543'"
+                )
+            except mysql.connector.Error:
+                # Si no existe el CI en una base vieja, no interrumpimos el flujo
+                pass
+
+            # uq_reserva_unica pasó a ignorar las reservas canceladas (columna
+            # generada slot_ocupado) para poder volver a reservar el turno.
+            cur.execute("SHOW COLUMNS FROM reserva LIKE 'slot_ocupado'")
+            if cur.fetchone() is None:
+                cur.execute(
+                    """
+                    ALTER TABLE reserva
+                    ADD COLUMN slot_ocupado TINYINT
+                      GENERATED ALWAYS AS (CASE WHEN estado = 'cancelada' THEN NULL ELSE 1 END) STORED,
+                    DROP INDEX uq_reserva_unica,
+                    ADD UNIQUE KEY uq_reserva_unica (nombre_sala, edificio, fecha, id_turno, slot_ocupado)
+                    """
+                )
+
+            # Índices agregados después del schema original.
+            for tabla, indice, columnas in _INDICES_EXTRA:
+                cur.execute(f"SHOW INDEX FROM {tabla} WHERE Key_name = %s", (indice,))
+                if not cur.fetchall():
+                    cur.execute(f"ALTER TABLE {tabla} ADD KEY {indice} ({columnas})")
+
+        # Tablas del archivo histórico (ver archivar_reservas).
+        for ddl in _DDL_ARCHIVO:
+            cur.execute(ddl)
+
+        # Feed de cambios (ver GET /cambios).
+        for ddl in _DDL_CAMBIOS:
+            cur.execute(ddl)
+
+        # Lista de espera (ver POST /reservas/espera).
+        for ddl in _DDL_ESPERA:
+            cur.execute(ddl)
+
+        # Rollups mensuales de los reportes top-k. Si están vacíos pero ya hay
+        # reservas (volumen previo o seed recién cargado) se reconstruyen.
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS contador_participante_mes (
+              mes             DATE NOT NULL,
+              ci_participante VARCHAR(20) NOT NULL,
+              total_reservas  INT NOT NULL DEFAULT 0,
+              PRIMARY KEY (mes, ci_participante)
+            ) DEFAULT CHARSET = utf8mb4 COLLATE = utf8mb4_unicode_ci
+            """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS contador_sala_mes (
+              mes                  DATE NOT NULL,
+              edificio             VARCHAR(80) NOT NULL,
+              nombre_sala          VARCHAR(80) NOT NULL,
+              total_sin_asistencia INT NOT NULL DEFAULT 0,
+              PRIMARY KEY (mes, edificio, nombre_sala)
+            ) DEFAULT CHARSET = utf8mb4 COLLATE = utf8mb4_unicode_ci
+            """
+        )
+        cur.execute(
+            """
+            SELECT EXISTS(SELECT 1 FROM contador_participante_mes)
+                OR EXISTS(SELECT 1 FROM contador_sala_mes),
+                   EXISTS(SELECT 1 FROM reserva)
+            """
+        )
+        hay_contadores, hay_reservas = cur.fetchone()
+        if hay_reservas and not hay_contadores:
+            conn.start_transaction()
+            _recalcular_contadores(cur)
+            conn.commit()
         _MIGRATIONS_APPLIED = True
     except mysql.connector.Error as e:
         raise HTTPException(
@@ -149,6 +887,34 @@ def _fetch_participante(conn: mysql.connector.MySQLConnection, ci: str) -> dict[
     return row
 
 
+# Actor autenticado por token de sesión (lo fija _SesionMiddleware).
+_ACTOR_ACTUAL: ContextVar[dict[str, Any] | None] = ContextVar("actor_actual", default=None)
+
+
+def _requerir_admin(ci: str | None) -> dict[str, Any]:
+    """Valida que el actor sea administrador; devuelve su fila.
+
+    Si el request trae un token de sesión válido se usa el actor del token
+    (sin consultar la base); si no, se busca la CI de X-Actor-CI.
+    """
+    actor = _ACTOR_ACTUAL.get()
+    if actor is not None:
+        if not actor.get("es_admin"):
+            raise HTTPException(status_code=403, detail="Solo administradores pueden realizar esta acción")
+        return actor
+    if not ci:
+        raise HTTPException(status_code=401, detail="Debe indicar la CI del actor (X-Actor-CI)")
+    norm = normalize_ci(ci)
+    conn = get_conn()
+    try:
+        row = _fetch_participante(conn, norm)
+    finally:
+        conn.close()
+    if not row or not row.get("es_admin"):
+        raise HTTPException(status_code=403, detail="Solo administradores pueden realizar esta acción")
+    return row
+
+
 ESTADOS_OCUPAN_DIA = ("activa", "sin_asistencia", "finalizada")
 
 
@@ -223,11 +989,107 @@ def _row_to_turno(r):
     }
 
 
+# --------- UI y estáticos ---------
+# La plantilla y los archivos de /static se leen una sola vez y quedan en
+# memoria junto con sus variantes gzip/brotli. Cada estático se publica
+# además con una huella de contenido en el nombre (app.<sha>.js) y
+# Cache-Control immutable; la plantilla se reescribe para apuntar a esas
+# URLs. Con UI_DEV=1 se recarga todo cuando cambia algún archivo.
+
+UI_DEV = os.getenv("UI_DEV", "0") == "1"
+_CACHE_INMUTABLE = "public, max-age=31536000, immutable"
+_CACHE_REVALIDAR = "no-cache"
+_PRECOMPRIMIR_MINIMO = 256
+_TIPOS_COMPRIMIBLES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+
+_UI_LOCK = threading.Lock()
+_UI_CACHE: dict[str, Any] = {}
+
+
+def _variantes(contenido: bytes, tipo: str) -> dict[str, bytes]:
+    variantes = {"identity": contenido}
+    if len(contenido) >= _PRECOMPRIMIR_MINIMO and tipo.startswith(_TIPOS_COMPRIMIBLES):
+        variantes["gzip"] = gzip.compress(contenido, compresslevel=9, mtime=0)
+        if brotli is not None:
+            variantes["br"] = brotli.compress(contenido, quality=11)
+    return variantes
+
+
+def _firma_archivos() -> tuple:
+    archivos = [UI_TEMPLATE, *sorted(p for p in STATIC_DIR.rglob("*") if p.is_file())]
+    return tuple((str(p), p.stat().st_mtime_ns) for p in archivos)
+
+
+def _cargar_ui() -> dict[str, Any]:
+    activos: dict[str, dict[str, Any]] = {}
+    rutas: dict[str, str] = {}
+    for archivo in sorted(p for p in STATIC_DIR.rglob("*") if p.is_file()):
+        rel = archivo.relative_to(STATIC_DIR).as_posix()
+        contenido = archivo.read_bytes()
+        huella = hashlib.sha256(contenido).hexdigest()[:12]
+        base, punto, ext = rel.rpartition(".")
+        con_huella = f"{base}.{huella}.{ext}" if punto else f"{rel}.{huella}"
+        tipo = mimetypes.guess_type(rel)[0] or "application/octet-stream"
+        if tipo.startswith("text/") or tipo == "application/javascript":
+            tipo += "; charset=utf-8"
+        activo = {"tipo": tipo, "etag": f'"{huella}"', "variantes": _variantes(contenido, tipo)}
+        activos[con_huella] = {**activo, "cache": _CACHE_INMUTABLE}
+        activos[rel] = {**activo, "cache": _CACHE_REVALIDAR}
+        rutas[rel] = con_huella
+
+    html = re.sub(
+        r"""(["'])/static/([^"'?#]+)""",
+        lambda m: f"{m.group(1)}/static/{rutas.get(m.group(2), m.group(2))}",
+        UI_TEMPLATE.read_text(encoding="utf-8"),
+    ).encode("utf-8")
+    tipo_html = "text/html; charset=utf-8"
+    ui = {
+        "tipo": tipo_html,
+        "etag": f'"{hashlib.sha256(html).hexdigest()[:16]}"',
+        "variantes": _variantes(html, tipo_html),
+        "cache": _CACHE_REVALIDAR,
+    }
+    return {"ui": ui, "activos": activos, "rutas": rutas}
+
+
+def _ui_cache() -> dict[str, Any]:
+    if _UI_CACHE and not UI_DEV:
+        return _UI_CACHE
+    with _UI_LOCK:
+        firma = _firma_archivos() if UI_DEV else None
+        if not _UI_CACHE or firma != _UI_CACHE.get("firma"):
+            _UI_CACHE.update(_cargar_ui(), firma=firma)
+    return _UI_CACHE
+
+
+def _responder_activo(request: Request, activo: dict[str, Any]) -> Response:
+    headers = {"ETag": activo["etag"], "Cache-Control": activo["cache"], "Vary": "Accept-Encoding"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match == "*" or activo["etag"] in (t.strip().removeprefix("W/") for t in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    variantes = activo["variantes"]
+    codificacion = _codificacion_aceptada(request.headers.get("accept-encoding", ""))
+    if codificacion not in variantes:
+        codificacion = "identity"
+    if codificacion != "identity":
+        headers["Content-Encoding"] = codificacion
+    return Response(variantes[codificacion], media_type=activo["tipo"], headers=headers)
+
+
 @app.get("/", response_class=HTMLResponse)
 @app.get("/ui", response_class=HTMLResponse)
-def render_ui():
+def render_ui(request: Request):
     """Interfaz mínima en HTML que consume la API."""
-    return HTMLResponse(content=UI_TEMPLATE.read_text(encoding="utf-8"))
+    return _responder_activo(request, _ui_cache()["ui"])
+
+
+@app.api_route("/static/{archivo:path}", methods=["GET", "HEAD"], include_in_schema=False)
+def servir_estatico(request: Request, archivo: str):
+    """Estáticos desde memoria; los nombres con huella se cachean como inmutables."""
+    activo = _ui_cache()["activos"].get(archivo)
+    if activo is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return _responder_activo(request, activo)
 
 # --------- MODELOS ---------
 class TurnoIn(BaseModel):
@@ -341,6 +1203,11 @@ class SesionOut(BaseModel):
     tipo_participante: str
     es_admin: bool = False
 
+
+class LoginOut(SesionOut):
+    token: str
+    expira: datetime
+
 # --------- MODELOS REPORTES ---------
 class ReportSalaUso(BaseModel):
     edificio: str
@@ -596,11 +1463,17 @@ class SancionResumen(BaseModel):
     fecha_fin: date
 
 
+class PromocionEspera(BaseModel):
+    id_espera: int
+    reserva: ReservaOut
+
+
 class ReservaConSanciones(BaseModel):
     reserva: ReservaOut
     sanciones_creadas: List[SancionResumen] = []
+    promocion: PromocionEspera | None = None    # grupo de la lista de espera que tomó el turno
 
-@app.get("/reservas", response_model=List[ReservaOut])
+@_get_confiable("/reservas", response_model=List[ReservaOut])
 def list_reservas(
     fecha: date | None = None,
     edificio: str | None = None,
@@ -661,17 +1534,6 @@ def list_reservas(
         )
         sql += f" ORDER BY {order_clause}"
 
-        if limit is not None:
-            sql += " LIMIT %s"
-            params.append(limit)
-            if offset is not None:
-                sql += " OFFSET %s"
-                params.append(offset)
-        elif offset is not None:
-            # Aplicar offset sin perder filas: LIMIT máximo permitido por MySQL
-            sql += " LIMIT 18446744073709551615 OFFSET %s"
-            params.append(offset)
-
         if limit is not None:
             sql += " LIMIT %s"
             params.append(limit)
@@ -938,6 +1800,235 @@ def eliminar_sala(
     finally:
         conn.close()
 
+# ==========================
+#  RETENCIONES DE TURNO
+# ==========================
+# Al abrir el formulario de reserva la UI retiene el turno elegido por
+# RETENCION_TTL_SEGUNDOS (2 minutos): mientras tanto /disponibilidad lo
+# muestra como retenido y create_reserva lo rechaza para cualquiera que no
+# sea su titular (mismo actor o mismo id_retencion). Cada retención es de un
+# actor (token o X-Actor-CI) y cada actor tiene a lo sumo una: pedir otra la
+# mueve. Las renovaciones no la estiran más allá de RETENCION_VIDA_MAX_SEGUNDOS
+# desde que se creó. Las retenciones viven solo en memoria de este proceso
+# (dict por turno + heap de vencimientos con borrado perezoso): una retención
+# abandonada vence sola, sin escribir en la base. Con varios workers cada uno
+# ve solo las suyas, así que no reemplazan la validación de create_reserva
+# (uq_reserva_unica sigue siendo la garantía). Cada alta, liberación o
+# vencimiento queda en `novedades` (último estado por turno) hasta que el
+# difusor de /disponibilidad/stream las publica; quien cambia una retención
+# llama a _DIFUSOR.despertar() y los vencimientos los levanta el difusor
+# solo, esperando como mucho hasta el próximo.
+
+RETENCION_TTL_SEGUNDOS = float(os.getenv("RETENCION_TTL_SEGUNDOS", "120"))
+RETENCION_VIDA_MAX_SEGUNDOS = float(os.getenv("RETENCION_VIDA_MAX_SEGUNDOS", "600"))
+RETENCION_MAX = int(os.getenv("RETENCION_MAX", "10000"))
+
+
+class _Retenciones:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.por_turno: dict[tuple, tuple[str, float]] = {}
+        # id -> (turno, actor, creada)
+        self.por_id: dict[str, tuple[tuple, str, float]] = {}
+        self.por_actor: dict[str, str] = {}
+        self.vencimientos: list[tuple[float, str]] = []
+        self.estadisticas = {"creadas": 0, "vencidas": 0}
+        # turno -> retenido, pendientes de publicar (acotado como _Suscripcion).
+        self.novedades: dict[tuple, bool] = {}
+        self.desbordada = False
+
+    def _anotar(self, turno: tuple, retenido: bool) -> None:
+        if self.desbordada:
+            return
+        self.novedades[turno] = retenido
+        if len(self.novedades) > RETENCION_MAX:
+            self.novedades.clear()
+            self.desbordada = True
+
+    def _quitar(self, id_retencion: str) -> tuple:
+        turno, actor, _ = self.por_id.pop(id_retencion)
+        del self.por_turno[turno]
+        del self.por_actor[actor]
+        self._anotar(turno, False)
+        return turno
+
+    def _purgar(self, ahora: float) -> None:
+        while self.vencimientos and self.vencimientos[0][0] <= ahora:
+            vence, id_retencion = heapq.heappop(self.vencimientos)
+            entrada = self.por_id.get(id_retencion)
+            # Entrada vieja de una retención renovada, movida o liberada.
+            if entrada is None or self.por_turno[entrada[0]] != (id_retencion, vence):
+                continue
+            self._quitar(id_retencion)
+            self.estadisticas["vencidas"] += 1
+
+    def retener(self, turno: tuple, actor: str, id_retencion: str | None = None) -> tuple[str, float]:
+        """
+        Retiene `turno` para `actor`. Si el actor ya tiene una retención la
+        renueva o la mueve a este turno (conserva id y hora de creación).
+        Devuelve (id, segundos hasta el vencimiento).
+        """
+        ahora = time_mod.monotonic()
+        with self.lock:
+            self._purgar(ahora)
+            if id_retencion in self.por_id and self.por_id[id_retencion][1] != actor:
+                raise HTTPException(status_code=403, detail="La retención es de otra persona")
+            propia = self.por_actor.get(actor)
+            titular = self.por_turno.get(turno)
+            if titular is not None and titular[0] != propia:
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"Turno retenido por otra persona ({titular[1] - ahora:.0f} s restantes)",
+                )
+            if propia is None:
+                if len(self.por_id) >= RETENCION_MAX:
+                    raise HTTPException(status_code=429, detail="Demasiadas retenciones activas")
+                propia, creada = secrets.token_urlsafe(12), ahora
+                self.estadisticas["creadas"] += 1
+            else:
+                anterior, _, creada = self.por_id[propia]
+                if creada + RETENCION_VIDA_MAX_SEGUNDOS - ahora < 1:
+                    raise HTTPException(
+                        status_code=409, detail="La retención llegó a su duración máxima y no se renueva"
+                    )
+                del self.por_turno[anterior]
+                if anterior != turno:
+                    self._anotar(anterior, False)
+            vence = min(ahora + RETENCION_TTL_SEGUNDOS, creada + RETENCION_VIDA_MAX_SEGUNDOS)
+            self.por_id[propia] = (turno, actor, creada)
+            self.por_turno[turno] = (propia, vence)
+            self._anotar(turno, True)
+            self.por_actor[actor] = propia
+            heapq.heappush(self.vencimientos, (vence, propia))
+            return propia, vence - ahora
+
+    def liberar(self, id_retencion: str, actor: str | None = None) -> bool:
+        """Libera la retención; con `actor`, solo si es suya."""
+        with self.lock:
+            entrada = self.por_id.get(id_retencion)
+            if entrada is None or (actor is not None and entrada[1] != actor):
+                return False
+            self._quitar(id_retencion)
+            return True
+
+    def titular(self, turno: tuple) -> str | None:
+        """id de la retención vigente sobre `turno`, si hay."""
+        titular = self.por_turno.get(turno)
+        if titular is None or titular[1] <= time_mod.monotonic():
+            return None
+        return titular[0]
+
+    def de_actor(self, actor: str) -> str | None:
+        """id de la retención de `actor`, si tiene una."""
+        return self.por_actor.get(actor)
+
+    def activas(self) -> int:
+        with self.lock:
+            self._purgar(time_mod.monotonic())
+            return len(self.por_id)
+
+    def tomar_novedades(self) -> tuple[bool, dict[tuple, bool], float | None]:
+        """
+        Purga las vencidas y devuelve (desbordada, novedades, segundos hasta
+        el próximo vencimiento o None), dejando las novedades vacías.
+        """
+        ahora = time_mod.monotonic()
+        with self.lock:
+            self._purgar(ahora)
+            desbordada, novedades = self.desbordada, self.novedades
+            self.novedades, self.desbordada = {}, False
+            proximo = self.vencimientos[0][0] - ahora if self.vencimientos else None
+        return desbordada, novedades, proximo
+
+
+_RETENCIONES = _Retenciones()
+
+
+def _actor_retencion(x_actor_ci: str | None) -> str:
+    """CI del actor del token o, sin token, la de X-Actor-CI."""
+    actor = _ACTOR_ACTUAL.get()
+    if actor is not None:
+        return actor["ci"]
+    if not x_actor_ci:
+        raise HTTPException(status_code=401, detail="Debe indicar la CI del actor (X-Actor-CI)")
+    return normalize_ci(x_actor_ci)
+
+
+class RetencionIn(BaseModel):
+    nombre_sala: str
+    edificio: str
+    fecha: date
+    id_turno: int
+    id_retencion: str | None = None   # opcional: la retención propia se reconoce por el actor
+
+
+class RetencionOut(BaseModel):
+    id_retencion: str
+    nombre_sala: str
+    edificio: str
+    fecha: date
+    id_turno: int
+    segundos: float
+
+
+@app.post("/reservas/retenciones", response_model=RetencionOut, status_code=201)
+def retener_turno(payload: RetencionIn, x_actor_ci: str | None = Header(None, alias="X-Actor-CI")):
+    """
+    Retiene un turno libre por RETENCION_TTL_SEGUNDOS mientras se completa la reserva.
+
+    - 401 sin actor (token o X-Actor-CI).
+    - 404 si la sala o el turno no existen; 422 si el turno ya empezó.
+    - 409 si ya está reservado o lo retiene otra persona.
+    - Si el actor ya tiene una retención la renueva o la mueve a este turno,
+      hasta RETENCION_VIDA_MAX_SEGUNDOS desde que la creó.
+    """
+    actor = _actor_retencion(x_actor_ci)
+    turno = (payload.nombre_sala, payload.edificio, payload.fecha, payload.id_turno)
+    conn = get_reservas_connection()
+    try:
+        cur = conn.cursor(dictionary=True)
+        cur.execute(
+            "SELECT 1 FROM sala WHERE nombre_sala = %s AND edificio = %s",
+            (payload.nombre_sala, payload.edificio),
+        )
+        if cur.fetchone() is None:
+            raise HTTPException(status_code=404, detail="Sala no encontrada")
+        cur.execute("SELECT hora_inicio FROM turno WHERE id_turno = %s", (payload.id_turno,))
+        turno_row = cur.fetchone()
+        if turno_row is None:
+            raise HTTPException(status_code=404, detail="Turno no encontrado")
+        inicio = datetime.combine(payload.fecha, time()) + timedelta(
+            seconds=_parse_hms(_time_to_str(turno_row["hora_inicio"]))
+        )
+        if inicio <= datetime.now():
+            raise HTTPException(status_code=422, detail="No se puede retener un turno que ya empezó")
+        cur.execute(
+            """
+            SELECT 1 FROM reserva
+            WHERE nombre_sala = %s AND edificio = %s AND fecha = %s AND id_turno = %s AND slot_ocupado = 1
+            """,
+            turno,
+        )
+        if cur.fetchone() is not None:
+            raise HTTPException(status_code=409, detail="El turno ya está reservado")
+    except mysql.connector.Error as e:
+        raise HTTPException(status_code=500, detail=f"Error reteniendo turno: {e}")
+    finally:
+        conn.close()
+    id_retencion, segundos = _RETENCIONES.retener(turno, actor, payload.id_retencion)
+    _DIFUSOR.despertar()
+    return {**payload.model_dump(), "id_retencion": id_retencion, "segundos": segundos}
+
+
+@app.delete("/reservas/retenciones/{id_retencion}", status_code=204)
+def liberar_turno(id_retencion: str, x_actor_ci: str | None = Header(None, alias="X-Actor-CI")):
+    """Libera una retención propia (p. ej. al cerrar el formulario)."""
+    if not _RETENCIONES.liberar(id_retencion, _actor_retencion(x_actor_ci)):
+        raise HTTPException(status_code=404, detail="Retención no encontrada o vencida")
+    _DIFUSOR.despertar()
+    return
+
+
 # ==========================
 # POST /reservas - crear reserva
 # ==========================
@@ -948,6 +2039,7 @@ class ReservaIn(BaseModel):
     id_turno: int
     participantes: List[str]          # CIs de los participantes
     estado: str | None = None         # opcional, default "activa"
+    id_retencion: str | None = None   # retención del turno (POST /reservas/retenciones)
 
     @field_validator("participantes")
     @classmethod
@@ -967,267 +2059,479 @@ class AsistenciaIn(BaseModel):
     def _val_presentes(cls, v):
         return normalize_ci_list(v)
 
-@app.post("/reservas", response_model=ReservaOut, status_code=201)
-def create_reserva(payload: ReservaIn):
-    """
-    Crea una reserva nueva aplicando reglas de negocio:
+class AsistenciaLoteItem(BaseModel):
+    id_reserva: int
+    presentes: List[str] = []              # se normalizan por ítem en el endpoint
 
-    - Valida sala, turno y estado.
-    - Valida que los participantes existan.
-    - No se puede superar la capacidad de la sala.
-    - No se puede reservar si el participante está sancionado en esa fecha.
-    - Salas de uso libre: máx. 2 horas/día y 3 reservas activas/semana por persona.
-      * Docentes y alumnos de posgrado NO tienen estos límites en salas exclusivas para ellos.
-    """
-    conn = get_reservas_connection()
-    try:
-        cur = conn.cursor(dictionary=True)
 
-        def horas_reservadas_libre(ci: str) -> float:
-            placeholders_estados = ",".join(["%s"] * len(ESTADOS_OCUPAN_DIA))
-            cur.execute(
-                f"""
-                SELECT COALESCE(SUM(TIME_TO_SEC(t.hora_fin) - TIME_TO_SEC(t.hora_inicio)) / 3600, 0) AS horas
-                FROM reserva r
-                JOIN reserva_participante rp
-                  ON rp.id_reserva = r.id_reserva
-                JOIN sala s
-                  ON s.nombre_sala = r.nombre_sala
-                 AND s.edificio = r.edificio
-                JOIN turno t
-                  ON t.id_turno = r.id_turno
-                WHERE rp.ci_participante = %s
-                  AND r.fecha = %s
-                  AND r.nombre_sala = %s
-                  AND r.edificio = %s
-                  AND r.estado IN ({placeholders_estados})
-                  AND s.tipo_sala = 'libre'
-                """,
-                (
-                    ci,
-                    payload.fecha,
-                    payload.nombre_sala,
-                    payload.edificio,
-                    *ESTADOS_OCUPAN_DIA,
-                ),
-            )
-            row = cur.fetchone()
-            return float(row["horas"]) if row else 0.0
+class AsistenciaLoteIn(BaseModel):
+    reservas: List[AsistenciaLoteItem] = Field(..., min_length=1, max_length=500)
+    sancionar_ausentes: bool = True
+
+
+class AsistenciaLoteResultado(BaseModel):
+    id_reserva: int
+    ok: bool
+    error: str | None = None
+    reserva: ReservaOut | None = None
+    sanciones_creadas: List[SancionResumen] = []
+
+
+# --------- Alternativas ante conflictos ---------
+# Cuando la reserva choca con otra (uq_reserva_unica) o con una retención,
+# con la capacidad o con los límites de salas libres, el 409 trae además
+# `alternativas`: turnos cercanos en la misma sala, otras salas del edificio
+# con lugar en el mismo turno y el próximo día con el turno libre. Se
+# calculan sobre un índice en memoria armado con tres consultas (salas,
+# turnos y reservas del horizonte), en la misma conexión, así el cliente no
+# tiene que salir a recorrer /disponibilidad. Son sugerencias: los límites
+# por persona se vuelven a validar al reservar.
+
+ALTERNATIVAS_DIAS = int(os.getenv("ALTERNATIVAS_DIAS", "14"))
+ALTERNATIVAS_MAX_TURNOS = 2
+ALTERNATIVAS_MAX_SALAS = 3
+
+# Qué sugerencias tienen sentido según el motivo del conflicto.
+_ALTERNATIVAS_POR_MOTIVO = {
+    "ocupado": ("turno_adyacente", "otra_sala", "otro_dia"),
+    "capacidad": ("otra_sala",),
+    "horas_dia": ("otra_sala", "otro_dia"),
+    "semana": ("otro_dia",),
+}
+
+
+class AlternativaReserva(BaseModel):
+    tipo: Literal["turno_adyacente", "otra_sala", "otro_dia"]
+    nombre_sala: str
+    edificio: str
+    fecha: date
+    id_turno: int
+    hora_inicio: str
+    hora_fin: str
 
-        def reservas_semana_libre(ci: str) -> int:
-            cur.execute(
-                """
-                SELECT COUNT(*) AS cant
-                FROM reserva r
-                JOIN reserva_participante rp
-                  ON rp.id_reserva = r.id_reserva
-                JOIN sala s
-                  ON s.nombre_sala = r.nombre_sala
-                 AND s.edificio = r.edificio
-                WHERE rp.ci_participante = %s
-                  AND r.estado = 'activa'
-                  AND s.tipo_sala = 'libre'
-                  AND YEARWEEK(r.fecha, 3) = YEARWEEK(%s, 3)
-                """,
-                (ci, payload.fecha),
-            )
-            row = cur.fetchone()
-            return int(row["cant"] or 0)
 
-        # 1) Validar sala y obtener capacidad + tipo_sala
+class ConflictoReservaOut(BaseModel):
+    detail: str
+    alternativas: List[AlternativaReserva] = []
+
+
+class ConflictoReserva(HTTPException):
+    """409 de create_reserva con alternativas; `detail` sigue siendo el texto de siempre."""
+
+    def __init__(self, detail: str, alternativas: list[dict[str, Any]]):
+        super().__init__(status_code=409, detail=detail)
+        self.alternativas = alternativas
+
+
+@app.exception_handler(ConflictoReserva)
+async def _responder_conflicto_reserva(request: Request, exc: ConflictoReserva):
+    return JSONRapida(
+        {"detail": exc.detail, "alternativas": exc.alternativas}, status_code=exc.status_code, headers=exc.headers
+    )
+
+
+def _alternativas_reserva(
+    cur, payload: "ReservaIn", motivo: str, participantes: int, tipo_sala: str
+) -> list[dict[str, Any]]:
+    """Sugerencias ordenadas para un create_reserva rechazado por `motivo`.
+
+    Solo propone salas del mismo tipo o de uso libre con capacidad para
+    `participantes`, y turnos que todavía no empezaron.
+    """
+    tipos = _ALTERNATIVAS_POR_MOTIVO[motivo]
+    if motivo == "semana":
+        # El límite es por semana ISO: recién sirve desde el lunes siguiente.
+        desde = payload.fecha + timedelta(days=7 - payload.fecha.weekday())
+    else:
+        desde = payload.fecha + timedelta(days=1)
+    hasta = desde + timedelta(days=ALTERNATIVAS_DIAS)
+    try:
+        cur.execute(
+            "SELECT nombre_sala, capacidad, tipo_sala FROM sala WHERE edificio = %s",
+            (payload.edificio,),
+        )
+        salas = sorted(
+            (
+                s
+                for s in cur.fetchall()
+                if s["nombre_sala"] != payload.nombre_sala
+                and s["capacidad"] >= participantes
+                and s["tipo_sala"] in (tipo_sala, "libre")
+            ),
+            key=lambda s: (s["tipo_sala"] != tipo_sala, s["capacidad"], s["nombre_sala"]),
+        )
+        cur.execute("SELECT id_turno, hora_inicio, hora_fin FROM turno ORDER BY hora_inicio")
+        turnos = cur.fetchall()
         cur.execute(
             """
-            SELECT capacidad, tipo_sala
-            FROM sala
-            WHERE nombre_sala = %s
-              AND edificio = %s
+            SELECT nombre_sala, fecha, id_turno FROM reserva
+            WHERE edificio = %s AND fecha BETWEEN %s AND %s AND slot_ocupado = 1
             """,
-            (payload.nombre_sala, payload.edificio),
+            (payload.edificio, payload.fecha, hasta),
         )
-        sala_row = cur.fetchone()
-        if not sala_row:
-            raise HTTPException(status_code=404, detail="Sala no encontrada")
+        ocupados = {(r["nombre_sala"], r["fecha"], r["id_turno"]) for r in cur.fetchall()}
+    except mysql.connector.Error:
+        logger.warning("No se pudieron calcular alternativas de reserva", exc_info=True)
+        return []
+
+    pos = next((i for i, t in enumerate(turnos) if t["id_turno"] == payload.id_turno), None)
+    if pos is None:
+        return []
+    ahora = datetime.now()
+
+    def libre(sala: str, fecha: date, turno: dict[str, Any]) -> bool:
+        inicio = datetime.combine(fecha, time()) + timedelta(seconds=_parse_hms(_time_to_str(turno["hora_inicio"])))
+        return (
+            (sala, fecha, turno["id_turno"]) not in ocupados
+            and inicio > ahora
+            and _RETENCIONES.titular((sala, payload.edificio, fecha, turno["id_turno"])) is None
+        )
+
+    def alternativa(tipo: str, sala: str, fecha: date, turno: dict[str, Any]) -> dict[str, Any]:
+        return {"tipo": tipo, "nombre_sala": sala, "edificio": payload.edificio, "fecha": fecha, **_row_to_turno(turno)}
+
+    alternativas = []
+    if "turno_adyacente" in tipos:
+        cercanos = sorted(range(len(turnos)), key=lambda i: (abs(i - pos), i))[1:]
+        alternativas += [
+            alternativa("turno_adyacente", payload.nombre_sala, payload.fecha, turnos[i])
+            for i in cercanos
+            if libre(payload.nombre_sala, payload.fecha, turnos[i])
+        ][:ALTERNATIVAS_MAX_TURNOS]
+    if "otra_sala" in tipos:
+        alternativas += [
+            alternativa("otra_sala", s["nombre_sala"], payload.fecha, turnos[pos])
+            for s in salas
+            if libre(s["nombre_sala"], payload.fecha, turnos[pos])
+        ][:ALTERNATIVAS_MAX_SALAS]
+    if "otro_dia" in tipos:
+        fecha = desde
+        while fecha <= hasta:
+            if libre(payload.nombre_sala, fecha, turnos[pos]):
+                alternativas.append(alternativa("otro_dia", payload.nombre_sala, fecha, turnos[pos]))
+                break
+            fecha += timedelta(days=1)
+    return alternativas
+
+
+def _validar_reserva(cur, payload: ReservaIn, con_alternativas: bool = True) -> dict[str, Any]:
+    """
+    Aplica las reglas de negocio de una reserva nueva sobre `payload`:
+
+    - Valida sala, turno y estado.
+    - Valida que los participantes existan.
+    - No se puede superar la capacidad de la sala.
+    - No se puede reservar si el participante está sancionado en esa fecha.
+    - Salas de uso libre: máx. 2 horas/día y 3 reservas activas/semana por persona.
+      * Docentes y alumnos de posgrado NO tienen estos límites en salas exclusivas para ellos.
+
+    Lanza HTTPException (ConflictoReserva en los 409 que admiten
+    alternativas; sin calcularlas si `con_alternativas` es False). Lo usan
+    create_reserva y la promoción de la lista de espera. Devuelve el estado
+    normalizado, los participantes y el tipo de sala.
+    """
+
+    def alternativas(motivo: str) -> list[dict[str, Any]]:
+        if not con_alternativas:
+            return []
+        return _alternativas_reserva(cur, payload, motivo, len(participantes), tipo_sala)
 
-        capacidad = sala_row["capacidad"]
-        tipo_sala = sala_row["tipo_sala"]  # 'libre', 'posgrado', 'docente'
+    def horas_reservadas_libre(ci: str) -> float:
+        placeholders_estados = ",".join(["%s"] * len(ESTADOS_OCUPAN_DIA))
+        cur.execute(
+            f"""
+            SELECT COALESCE(SUM(TIME_TO_SEC(t.hora_fin) - TIME_TO_SEC(t.hora_inicio)) / 3600, 0) AS horas
+            FROM reserva r
+            JOIN reserva_participante rp
+              ON rp.id_reserva = r.id_reserva
+            JOIN sala s
+              ON s.nombre_sala = r.nombre_sala
+             AND s.edificio = r.edificio
+            JOIN turno t
+              ON t.id_turno = r.id_turno
+            WHERE rp.ci_participante = %s
+              AND r.fecha = %s
+              AND r.nombre_sala = %s
+              AND r.edificio = %s
+              AND r.estado IN ({placeholders_estados})
+              AND s.tipo_sala = 'libre'
+            """,
+            (
+                ci,
+                payload.fecha,
+                payload.nombre_sala,
+                payload.edificio,
+                *ESTADOS_OCUPAN_DIA,
+            ),
+        )
+        row = cur.fetchone()
+        return float(row["horas"]) if row else 0.0
 
-        # 2) Validar turno
+    def reservas_semana_libre(ci: str) -> int:
         cur.execute(
-            "SELECT id_turno, hora_inicio, hora_fin FROM turno WHERE id_turno = %s",
-            (payload.id_turno,),
+            """
+            SELECT COUNT(*) AS cant
+            FROM reserva r
+            JOIN reserva_participante rp
+              ON rp.id_reserva = r.id_reserva
+            JOIN sala s
+              ON s.nombre_sala = r.nombre_sala
+             AND s.edificio = r.edificio
+            WHERE rp.ci_participante = %s
+              AND r.estado = 'activa'
+              AND s.tipo_sala = 'libre'
+              AND YEARWEEK(r.fecha, 3) = YEARWEEK(%s, 3)
+            """,
+            (ci, payload.fecha),
         )
-        turno_row = cur.fetchone()
-        if not turno_row:
-            raise HTTPException(status_code=404, detail="Turno no encontrado")
+        row = cur.fetchone()
+        return int(row["cant"] or 0)
 
-        turno_duracion_horas = (
-            _parse_hms(_time_to_str(turno_row["hora_fin"]))
-            - _parse_hms(_time_to_str(turno_row["hora_inicio"]))
-        ) / 3600
+    # 1) Validar sala y obtener capacidad + tipo_sala
+    cur.execute(
+        """
+        SELECT capacidad, tipo_sala
+        FROM sala
+        WHERE nombre_sala = %s
+          AND edificio = %s
+        """,
+        (payload.nombre_sala, payload.edificio),
+    )
+    sala_row = cur.fetchone()
+    if not sala_row:
+        raise HTTPException(status_code=404, detail="Sala no encontrada")
 
-        # 3) Normalizar y validar estado
-        estado = (payload.estado or "activa").strip().lower()
-        if estado not in ALLOWED_ESTADOS_RESERVA:
-            raise HTTPException(
-                status_code=422,
-                detail=f"Estado inválido. Debe ser uno de: {', '.join(sorted(ALLOWED_ESTADOS_RESERVA))}",
-            )
+    capacidad = sala_row["capacidad"]
+    tipo_sala = sala_row["tipo_sala"]  # 'libre', 'posgrado', 'docente'
+
+    # 2) Validar turno
+    cur.execute(
+        "SELECT id_turno, hora_inicio, hora_fin FROM turno WHERE id_turno = %s",
+        (payload.id_turno,),
+    )
+    turno_row = cur.fetchone()
+    if not turno_row:
+        raise HTTPException(status_code=404, detail="Turno no encontrado")
+
+    turno_duracion_horas = (
+        _parse_hms(_time_to_str(turno_row["hora_fin"]))
+        - _parse_hms(_time_to_str(turno_row["hora_inicio"]))
+    ) / 3600
+
+    # 3) Normalizar y validar estado
+    estado = (payload.estado or "activa").strip().lower()
+    if estado not in ALLOWED_ESTADOS_RESERVA:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Estado inválido. Debe ser uno de: {', '.join(sorted(ALLOWED_ESTADOS_RESERVA))}",
+        )
+
+    # 4) Lista de participantes
+    participantes = normalize_ci_list(payload.participantes)
+    if not participantes:
+        raise HTTPException(
+            status_code=400,
+            detail="Debe indicar al menos un participante para la reserva.",
+        )
+
+    # 5) Validar existencia de participantes + metadata de programas (grado/posgrado)
+    placeholders = ",".join(["%s"] * len(participantes))
+    cur.execute(
+        f"""
+        SELECT
+          p.ci,
+          p.tipo_participante,
+          MAX(CASE WHEN pa.tipo = 'posgrado' AND ppa.rol = 'docente' THEN 1 ELSE 0 END) AS es_docente_posgrado,
+          MAX(CASE WHEN pa.tipo = 'posgrado' AND ppa.rol = 'alumno'  THEN 1 ELSE 0 END) AS es_alumno_posgrado
+        FROM participante p
+        LEFT JOIN participante_programa_academico ppa
+          ON ppa.ci_participante = p.ci
+        LEFT JOIN programa_academico pa
+          ON pa.nombre_programa = ppa.nombre_programa
+        WHERE p.ci IN ({placeholders})
+        GROUP BY p.ci, p.tipo_participante
+        """,
+        tuple(participantes),
+    )
+    participantes_info = {}
+    for row in cur.fetchall():
+        participantes_info[row["ci"]] = {
+            "ci": row["ci"],
+            "tipo_participante": row["tipo_participante"],
+            "es_docente_posgrado": bool(row["es_docente_posgrado"]),
+            "es_alumno_posgrado": bool(row["es_alumno_posgrado"]),
+        }
+    faltantes = [ci for ci in participantes if ci not in participantes_info]
+    if faltantes:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Participantes no encontrados: {', '.join(faltantes)}",
+        )
 
-        # 4) Lista de participantes
-        participantes = normalize_ci_list(payload.participantes)
-        if not participantes:
+    # 5.b) Validar exclusividad por tipo de sala
+    def _es_posgrado(info: dict[str, Any]) -> bool:
+        return (
+            info["tipo_participante"] == "posgrado"
+            or info.get("es_alumno_posgrado")
+            or info.get("es_docente_posgrado")
+        )
+
+    exclusividades: dict[str, Any] = {
+        "posgrado": lambda info: _es_posgrado(info),
+        "docente": lambda info: info["tipo_participante"] == "docente"
+        or info.get("es_docente_posgrado"),
+    }
+
+    if tipo_sala in exclusividades:
+        habilitador = exclusividades[tipo_sala]
+        no_aptos = [
+            ci
+            for ci, info in participantes_info.items()
+            if not habilitador(info)
+        ]
+        if no_aptos:
             raise HTTPException(
-                status_code=400,
-                detail="Debe indicar al menos un participante para la reserva.",
+                status_code=409,
+                detail=(
+                    f"La sala {payload.nombre_sala} en {payload.edificio} es exclusiva para {tipo_sala}. "
+                    f"CIs no aptas: {', '.join(no_aptos)}."
+                ),
             )
 
-        # 5) Validar existencia de participantes + metadata de programas (grado/posgrado)
+    # 6) Validar capacidad de la sala
+    if len(participantes) > capacidad:
+        raise ConflictoReserva(
+            f"La sala {payload.nombre_sala} en {payload.edificio} tiene capacidad {capacidad}. "
+            f"Cantidad solicitada: {len(participantes)}.",
+            alternativas("capacidad"),
+        )
+
+    # 7) Reglas de negocio por persona (solo si la reserva será ACTIVA)
+    if estado == "activa":
         placeholders = ",".join(["%s"] * len(participantes))
         cur.execute(
             f"""
-            SELECT
-              p.ci,
-              p.tipo_participante,
-              MAX(CASE WHEN pa.tipo = 'posgrado' AND ppa.rol = 'docente' THEN 1 ELSE 0 END) AS es_docente_posgrado,
-              MAX(CASE WHEN pa.tipo = 'posgrado' AND ppa.rol = 'alumno'  THEN 1 ELSE 0 END) AS es_alumno_posgrado
-            FROM participante p
-            LEFT JOIN participante_programa_academico ppa
-              ON ppa.ci_participante = p.ci
-            LEFT JOIN programa_academico pa
-              ON pa.nombre_programa = ppa.nombre_programa
-            WHERE p.ci IN ({placeholders})
-            GROUP BY p.ci, p.tipo_participante
+            SELECT ci_participante, fecha_inicio, fecha_fin
+            FROM sancion_participante
+            WHERE ci_participante IN ({placeholders})
+              AND %s BETWEEN fecha_inicio AND fecha_fin
             """,
-            tuple(participantes),
-        )
-        participantes_info = {}
-        for row in cur.fetchall():
-            participantes_info[row["ci"]] = {
-                "ci": row["ci"],
-                "tipo_participante": row["tipo_participante"],
-                "es_docente_posgrado": bool(row["es_docente_posgrado"]),
-                "es_alumno_posgrado": bool(row["es_alumno_posgrado"]),
-            }
-        faltantes = [ci for ci in participantes if ci not in participantes_info]
-        if faltantes:
+            (*participantes, payload.fecha),
+        )
+        sancionados = cur.fetchall()
+        if sancionados:
+            detalles = ", ".join(
+                f"{row['ci_participante']} ({row['fecha_inicio']} a {row['fecha_fin']})"
+                for row in sancionados
+            )
             raise HTTPException(
-                status_code=404,
-                detail=f"Participantes no encontrados: {', '.join(faltantes)}",
+                status_code=409,
+                detail=f"Participantes con sanción activa: {detalles}",
             )
 
-        # 5.b) Validar exclusividad por tipo de sala
-        def _es_posgrado(info: dict[str, Any]) -> bool:
-            return (
-                info["tipo_participante"] == "posgrado"
-                or info.get("es_alumno_posgrado")
-                or info.get("es_docente_posgrado")
-            )
+        for ci in participantes:
+            # 7.a) Límite diario/semanal solo para salas de uso libre
+            if tipo_sala == "libre":
+                horas_dia = horas_reservadas_libre(ci)
+                if horas_dia + turno_duracion_horas > 2:
+                    raise ConflictoReserva(
+                        f"El participante {ci} ya tiene {horas_dia:.0f} horas reservadas "
+                        "en salas de uso libre para ese día.",
+                        alternativas("horas_dia"),
+                    )
 
-        exclusividades: dict[str, Any] = {
-            "posgrado": lambda info: _es_posgrado(info),
-            "docente": lambda info: info["tipo_participante"] == "docente"
-            or info.get("es_docente_posgrado"),
-        }
+                cant_semana = reservas_semana_libre(ci)
+                if cant_semana >= 3:
+                    raise ConflictoReserva(
+                        "4ª reserva semanal: límite de 3 reservas activas por semana excedido.",
+                        alternativas("semana"),
+                    )
 
-        if tipo_sala in exclusividades:
-            habilitador = exclusividades[tipo_sala]
-            no_aptos = [
-                ci
-                for ci, info in participantes_info.items()
-                if not habilitador(info)
-            ]
-            if no_aptos:
-                raise HTTPException(
-                    status_code=409,
-                    detail=(
-                        f"La sala {payload.nombre_sala} en {payload.edificio} es exclusiva para {tipo_sala}. "
-                        f"CIs no aptas: {', '.join(no_aptos)}."
-                    ),
-                )
+    return {"estado": estado, "participantes": participantes, "tipo_sala": tipo_sala}
 
-        # 6) Validar capacidad de la sala
-        if len(participantes) > capacidad:
-            raise HTTPException(
-                status_code=409,
-                detail=(
-                    f"La sala {payload.nombre_sala} en {payload.edificio} tiene capacidad {capacidad}. "
-                    f"Cantidad solicitada: {len(participantes)}."
-                ),
-            )
 
-        # 7) Reglas de negocio por persona (solo si la reserva será ACTIVA)
-        if estado == "activa":
-            placeholders = ",".join(["%s"] * len(participantes))
-            cur.execute(
-                f"""
-                SELECT ci_participante, fecha_inicio, fecha_fin
-                FROM sancion_participante
-                WHERE ci_participante IN ({placeholders})
-                  AND %s BETWEEN fecha_inicio AND fecha_fin
-                """,
-                (*participantes, payload.fecha),
-            )
-            sancionados = cur.fetchall()
-            if sancionados:
-                detalles = ", ".join(
-                    f"{row['ci_participante']} ({row['fecha_inicio']} a {row['fecha_fin']})"
-                    for row in sancionados
-                )
-                raise HTTPException(
-                    status_code=409,
-                    detail=f"Participantes con sanción activa: {detalles}",
-                )
+def _insertar_reserva(cur, payload: ReservaIn, estado: str, participantes: list[str]) -> int:
+    """Inserta la reserva, sus participantes, los contadores y el evento del feed.
 
-            for ci in participantes:
-                # 7.a) Límite diario/semanal solo para salas de uso libre
-                if tipo_sala == "libre":
-                    horas_dia = horas_reservadas_libre(ci)
-                    if horas_dia + turno_duracion_horas > 2:
-                        raise HTTPException(
-                            status_code=409,
-                            detail=(
-                                f"El participante {ci} ya tiene {horas_dia:.0f} horas reservadas "
-                                "en salas de uso libre para ese día."
-                            ),
-                        )
-
-                    cant_semana = reservas_semana_libre(ci)
-                    if cant_semana >= 3:
-                        raise HTTPException(
-                            status_code=409,
-                            detail=(
-                                "4ª reserva semanal: límite de 3 reservas activas por semana excedido."
-                            ),
-                        )
-
-        # 8) Insertar reserva + participantes
-        try:
-            cur.execute(
-                """
-                INSERT INTO reserva (nombre_sala, edificio, fecha, id_turno, estado)
-                VALUES (%s, %s, %s, %s, %s)
-                """,
-                (payload.nombre_sala, payload.edificio, payload.fecha, payload.id_turno, estado),
-            )
-            id_reserva = cur.lastrowid
+    Va dentro de la transacción de quien llama; devuelve el id_reserva.
+    """
+    cur.execute(
+        """
+        INSERT INTO reserva (nombre_sala, edificio, fecha, id_turno, estado)
+        VALUES (%s, %s, %s, %s, %s)
+        """,
+        (payload.nombre_sala, payload.edificio, payload.fecha, payload.id_turno, estado),
+    )
+    id_reserva = cur.lastrowid
+    cur.executemany(
+        """
+        INSERT INTO reserva_participante (ci_participante, id_reserva)
+        VALUES (%s, %s)
+        """,
+        [(ci, id_reserva) for ci in participantes],
+    )
+    _ajustar_contadores(cur, [(id_reserva, None, estado)])
+    _emitir_cambios_reserva(cur, "reserva_creada", [id_reserva])
+    return id_reserva
 
-            valores = [(ci, id_reserva) for ci in participantes]
-            cur.executemany(
-                """
-                INSERT INTO reserva_participante (ci_participante, id_reserva)
-                VALUES (%s, %s)
-                """,
-                valores,
+
+@app.post(
+    "/reservas",
+    response_model=ReservaOut,
+    status_code=201,
+    responses={409: {"model": ConflictoReservaOut}},
+)
+def create_reserva(payload: ReservaIn):
+    """
+    Crea una reserva nueva aplicando reglas de negocio:
+
+    - Valida sala, turno y estado.
+    - Valida que los participantes existan.
+    - No se puede superar la capacidad de la sala.
+    - No se puede reservar si el participante está sancionado en esa fecha.
+    - Salas de uso libre: máx. 2 horas/día y 3 reservas activas/semana por persona.
+      * Docentes y alumnos de posgrado NO tienen estos límites en salas exclusivas para ellos.
+    """
+    conn = get_reservas_connection()
+    try:
+        cur = conn.cursor(dictionary=True)
+        validada = _validar_reserva(cur, payload)
+
+        # Un turno retenido solo lo puede reservar quien tiene la retención
+        # (por el id o por el actor del token).
+        turno = (payload.nombre_sala, payload.edificio, payload.fecha, payload.id_turno)
+        titular = _RETENCIONES.titular(turno)
+        actor = _ACTOR_ACTUAL.get()
+        if (
+            titular is not None
+            and titular != payload.id_retencion
+            and (actor is None or _RETENCIONES.de_actor(actor["ci"]) != titular)
+        ):
+            raise ConflictoReserva(
+                "El turno está retenido por otra persona mientras completa su reserva",
+                _alternativas_reserva(
+                    cur, payload, "ocupado", len(validada["participantes"]), validada["tipo_sala"]
+                ),
             )
 
+        # 8) Insertar reserva + participantes (+ contadores) en una transacción
+        try:
+            conn.start_transaction()
+            id_reserva = _insertar_reserva(cur, payload, validada["estado"], validada["participantes"])
             conn.commit()
+            _avisar_cambios((payload.edificio,))
+            if titular is not None:
+                _RETENCIONES.liberar(titular)
+                _DIFUSOR.despertar()
         except mysql.connector.IntegrityError as e:
             conn.rollback()
             if getattr(e, "errno", None) == 1062:
-                # UNIQUE (nombre_sala, edificio, fecha, id_turno)
-                raise HTTPException(
-                    status_code=409,
-                    detail="Ya existe una reserva para esa sala, edificio, fecha y turno",
+                # UNIQUE (nombre_sala, edificio, fecha, id_turno, slot_ocupado)
+                raise ConflictoReserva(
+                    "Ya existe una reserva para esa sala, edificio, fecha y turno",
+                    _alternativas_reserva(
+                        cur, payload, "ocupado", len(validada["participantes"]), validada["tipo_sala"]
+                    ),
                 )
             raise
 
@@ -1255,42 +2559,312 @@ def create_reserva(payload: ReservaIn):
         conn.close()
 
 # ==========================
-# PATCH /reservas/{id_reserva} - cambiar estado
+# LISTA DE ESPERA
 # ==========================
-class ReservaEstadoIn(BaseModel):
+# Un grupo se anota para un turno (sala, fecha, turno) ocupado. Cuando la
+# reserva que lo ocupa pasa a 'cancelada', update_reserva_estado promueve en
+# la misma transacción al primer grupo anotado que cumpla las mismas reglas
+# que create_reserva (_validar_reserva). La búsqueda usa idx_espera_turno y
+# mira como mucho ESPERA_CANDIDATOS grupos: un grupo que hoy no cumple
+# (sanción, límite semanal) se saltea pero sigue anotado.
+
+ESPERA_CANDIDATOS = int(os.getenv("ESPERA_CANDIDATOS", "5"))
+
+
+class EsperaIn(BaseModel):
+    nombre_sala: str
+    edificio: str
+    fecha: date
+    id_turno: int
+    participantes: List[str]
+
+    @field_validator("participantes")
+    @classmethod
+    def _val_cis(cls, v):
+        norm = normalize_ci_list(v)
+        if not norm:
+            raise ValueError("Debe indicar al menos un participante")
+        return norm
+
+
+class EsperaOut(BaseModel):
+    id_espera: int
+    nombre_sala: str
+    edificio: str
+    fecha: date
+    id_turno: int
     estado: str
+    id_reserva: int | None = None
+    creada: datetime
+    participantes: List[str]
+    posicion: int | None = None    # 1 = próximo en ser promovido; None si ya no espera
 
-ALLOWED_ESTADOS_RESERVA = {"activa", "cancelada", "sin_asistencia", "finalizada"}
 
+def _leer_esperas(cur, where: str, params: tuple) -> list[dict[str, Any]]:
+    cur.execute(
+        f"""
+        SELECT e.id_espera, e.nombre_sala, e.edificio, e.fecha, e.id_turno, e.estado, e.id_reserva, e.creada,
+               (SELECT COUNT(*) FROM lista_espera a
+                WHERE a.nombre_sala = e.nombre_sala AND a.edificio = e.edificio
+                  AND a.fecha = e.fecha AND a.id_turno = e.id_turno
+                  AND a.estado = 'esperando' AND a.id_espera <= e.id_espera) AS posicion
+        FROM lista_espera e
+        WHERE {where}
+        ORDER BY e.id_espera
+        """,
+        params,
+    )
+    esperas = cur.fetchall()
+    if not esperas:
+        return []
+    ids = [e["id_espera"] for e in esperas]
+    cur.execute(
+        f"""
+        SELECT id_espera, ci_participante FROM lista_espera_participante
+        WHERE id_espera IN ({",".join(["%s"] * len(ids))})
+        ORDER BY ci_participante
+        """,
+        tuple(ids),
+    )
+    participantes: dict[int, list[str]] = {}
+    for row in cur.fetchall():
+        participantes.setdefault(row["id_espera"], []).append(row["ci_participante"])
+    for e in esperas:
+        e["participantes"] = participantes.get(e["id_espera"], [])
+        e["posicion"] = int(e["posicion"]) if e["estado"] == "esperando" else None
+    return esperas
 
-def crear_sanciones_por_ausencia(
-    conn: mysql.connector.MySQLConnection,
-    id_reserva: int,
-    presentes: set[str] | None = None,
-) -> list[dict[str, Any]]:
-    """Crea sanciones de 2 meses para los participantes ausentes de la reserva.
 
-    - Usa la fecha de la propia reserva como inicio de la sanción.
-    - Evita sancionar a participantes declarados como presentes.
-    - Inserta con INSERT IGNORE para no duplicar sanciones idénticas.
-    Devuelve el detalle de sanciones creadas.
+def _promover_lista_espera(cur, reserva: dict[str, Any]) -> dict[str, Any] | None:
+    """Da el turno de `reserva` (recién cancelada) al primer grupo apto de la lista.
+
+    Corre dentro de la transacción de la cancelación. Devuelve
+    {"id_espera", "reserva"} o None si nadie esperaba o ningún candidato cumple.
     """
+    turno = (reserva["nombre_sala"], reserva["edificio"], reserva["fecha"], reserva["id_turno"])
+    cur.execute(
+        """
+        SELECT id_espera FROM lista_espera
+        WHERE nombre_sala = %s AND edificio = %s AND fecha = %s AND id_turno = %s AND estado = 'esperando'
+        ORDER BY id_espera
+        LIMIT %s
+        FOR UPDATE
+        """,
+        (*turno, ESPERA_CANDIDATOS),
+    )
+    candidatos = [row["id_espera"] for row in cur.fetchall()]
+    if not candidatos:
+        return None
+    cur.execute(
+        f"""
+        SELECT id_espera, ci_participante FROM lista_espera_participante
+        WHERE id_espera IN ({",".join(["%s"] * len(candidatos))})
+        """,
+        tuple(candidatos),
+    )
+    grupos: dict[int, list[str]] = {}
+    for row in cur.fetchall():
+        grupos.setdefault(row["id_espera"], []).append(row["ci_participante"])
+
+    for id_espera in candidatos:
+        payload = ReservaIn(
+            nombre_sala=reserva["nombre_sala"],
+            edificio=reserva["edificio"],
+            fecha=reserva["fecha"],
+            id_turno=reserva["id_turno"],
+            participantes=grupos[id_espera],
+        )
+        try:
+            validada = _validar_reserva(cur, payload, con_alternativas=False)
+            id_reserva = _insertar_reserva(cur, payload, "activa", validada["participantes"])
+        except HTTPException as e:
+            logger.info("Lista de espera %s salteada: %s", id_espera, e.detail)
+            continue
+        except mysql.connector.IntegrityError as e:
+            if e.errno != 1062:
+                raise
+            # Otra transacción tomó el turno primero: la cancelación sigue igual.
+            logger.info("Lista de espera %s: el turno ya fue reservado", id_espera)
+            return None
+        cur.execute(
+            "UPDATE lista_espera SET estado = 'promovida', id_reserva = %s WHERE id_espera = %s",
+            (id_reserva, id_espera),
+        )
+        return {
+            "id_espera": id_espera,
+            "reserva": {
+                "id_reserva": id_reserva,
+                "nombre_sala": reserva["nombre_sala"],
+                "edificio": reserva["edificio"],
+                "fecha": reserva["fecha"],
+                "id_turno": reserva["id_turno"],
+                "estado": "activa",
+            },
+        }
+    return None
 
-    cur = conn.cursor(dictionary=True)
+
+@app.post("/reservas/espera", response_model=EsperaOut, status_code=201)
+def anotar_en_espera(payload: EsperaIn):
+    """
+    Anota un grupo en la lista de espera de un turno ocupado.
+
+    - 409 si el turno está libre (reservarlo directamente) o si alguno de los
+      participantes ya está en la reserva o en la lista de ese turno.
+    - El grupo tiene que cumplir hoy las reglas de create_reserva; se vuelven
+      a validar al promoverlo.
+    """
+    turno = (payload.nombre_sala, payload.edificio, payload.fecha, payload.id_turno)
+    conn = get_reservas_connection()
     try:
+        cur = conn.cursor(dictionary=True)
+        _validar_reserva(cur, ReservaIn(**payload.model_dump()), con_alternativas=False)
+
         cur.execute(
             """
-            SELECT r.fecha, rp.ci_participante
-            FROM reserva r
-            JOIN reserva_participante rp ON rp.id_reserva = r.id_reserva
-            WHERE r.id_reserva = %s
+            SELECT id_reserva FROM reserva
+            WHERE nombre_sala = %s AND edificio = %s AND fecha = %s AND id_turno = %s AND slot_ocupado = 1
             """,
-            (id_reserva,),
+            turno,
         )
-        rows = cur.fetchall()
-        if not rows:
-            raise HTTPException(
-                status_code=400,
+        ocupante = cur.fetchone()
+        if ocupante is None:
+            raise HTTPException(status_code=409, detail="El turno está libre: se puede reservar directamente")
+
+        placeholders = ",".join(["%s"] * len(payload.participantes))
+        cur.execute(
+            f"""
+            SELECT rp.ci_participante FROM reserva_participante rp
+            WHERE rp.id_reserva = %s AND rp.ci_participante IN ({placeholders})
+            UNION
+            SELECT ep.ci_participante FROM lista_espera e
+            JOIN lista_espera_participante ep ON ep.id_espera = e.id_espera
+            WHERE e.nombre_sala = %s AND e.edificio = %s AND e.fecha = %s AND e.id_turno = %s
+              AND e.estado = 'esperando' AND ep.ci_participante IN ({placeholders})
+            """,
+            (ocupante["id_reserva"], *payload.participantes, *turno, *payload.participantes),
+        )
+        repetidos = sorted(row["ci_participante"] for row in cur.fetchall())
+        if repetidos:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Participantes que ya tienen o esperan este turno: {', '.join(repetidos)}",
+            )
+
+        conn.start_transaction()
+        cur.execute(
+            "INSERT INTO lista_espera (nombre_sala, edificio, fecha, id_turno) VALUES (%s, %s, %s, %s)",
+            turno,
+        )
+        id_espera = cur.lastrowid
+        cur.executemany(
+            "INSERT INTO lista_espera_participante (id_espera, ci_participante) VALUES (%s, %s)",
+            [(id_espera, ci) for ci in payload.participantes],
+        )
+        conn.commit()
+        return _leer_esperas(cur, "e.id_espera = %s", (id_espera,))[0]
+    except mysql.connector.Error as e:
+        raise HTTPException(status_code=500, detail=f"Error anotando en lista de espera: {e}")
+    finally:
+        conn.close()
+
+
+@app.get("/reservas/espera", response_model=List[EsperaOut])
+def listar_espera(nombre_sala: str, edificio: str, fecha: date, id_turno: int):
+    """Grupos que esperan un turno, en orden de promoción."""
+    conn = get_reservas_connection()
+    try:
+        cur = conn.cursor(dictionary=True)
+        return _leer_esperas(
+            cur,
+            """
+            e.nombre_sala = %s AND e.edificio = %s AND e.fecha = %s AND e.id_turno = %s
+            AND e.estado = 'esperando'
+            """,
+            (nombre_sala, edificio, fecha, id_turno),
+        )
+    except mysql.connector.Error as e:
+        raise HTTPException(status_code=500, detail=f"Error consultando lista de espera: {e}")
+    finally:
+        conn.close()
+
+
+@app.get("/reservas/espera/{id_espera}", response_model=EsperaOut)
+def obtener_espera(id_espera: int):
+    """Estado de una anotación: posición si sigue esperando, id_reserva si fue promovida."""
+    conn = get_reservas_connection()
+    try:
+        cur = conn.cursor(dictionary=True)
+        esperas = _leer_esperas(cur, "e.id_espera = %s", (id_espera,))
+        if not esperas:
+            raise HTTPException(status_code=404, detail="Anotación no encontrada")
+        return esperas[0]
+    except mysql.connector.Error as e:
+        raise HTTPException(status_code=500, detail=f"Error consultando lista de espera: {e}")
+    finally:
+        conn.close()
+
+
+@app.delete("/reservas/espera/{id_espera}", status_code=204)
+def salir_de_espera(id_espera: int):
+    """Baja de la lista de espera. 409 si la anotación ya fue promovida."""
+    conn = get_reservas_connection()
+    try:
+        cur = conn.cursor(dictionary=True)
+        cur.execute("SELECT estado FROM lista_espera WHERE id_espera = %s", (id_espera,))
+        row = cur.fetchone()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Anotación no encontrada")
+        if row["estado"] == "promovida":
+            raise HTTPException(status_code=409, detail="La anotación ya fue promovida a reserva")
+        cur.execute(
+            "UPDATE lista_espera SET estado = 'cancelada' WHERE id_espera = %s AND estado = 'esperando'",
+            (id_espera,),
+        )
+        conn.commit()
+        return
+    except mysql.connector.Error as e:
+        raise HTTPException(status_code=500, detail=f"Error actualizando lista de espera: {e}")
+    finally:
+        conn.close()
+
+# ==========================
+# PATCH /reservas/{id_reserva} - cambiar estado
+# ==========================
+class ReservaEstadoIn(BaseModel):
+    estado: str
+
+ALLOWED_ESTADOS_RESERVA = {"activa", "cancelada", "sin_asistencia", "finalizada"}
+
+
+def crear_sanciones_por_ausencia(
+    conn: mysql.connector.MySQLConnection,
+    id_reserva: int,
+    presentes: set[str] | None = None,
+) -> list[dict[str, Any]]:
+    """Crea sanciones de 2 meses para los participantes ausentes de la reserva.
+
+    - Usa la fecha de la propia reserva como inicio de la sanción.
+    - Evita sancionar a participantes declarados como presentes.
+    - Inserta con INSERT IGNORE para no duplicar sanciones idénticas.
+    Devuelve el detalle de sanciones creadas.
+    """
+
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute(
+            """
+            SELECT r.fecha, rp.ci_participante
+            FROM reserva r
+            JOIN reserva_participante rp ON rp.id_reserva = r.id_reserva
+            WHERE r.id_reserva = %s
+            """,
+            (id_reserva,),
+        )
+        rows = cur.fetchall()
+        if not rows:
+            raise HTTPException(
+                status_code=400,
                 detail="La reserva no tiene participantes; no se pueden generar sanciones.",
             )
 
@@ -1334,10 +2908,186 @@ def crear_sanciones_por_ausencia(
             """,
             tuple([fecha_reserva] + a_insertar),
         )
-        return cur.fetchall()
+        creadas = cur.fetchall()
+        _emitir_cambios_sancion(
+            cur, "sancion_creada", [(row["ci"], row["fecha_inicio"], row["fecha_fin"]) for row in creadas]
+        )
+        return creadas
     finally:
         cur.close()
 
+
+def _sancionar_ausentes_lote(cur, ids_reserva: list[int]) -> dict[int, list[dict[str, Any]]]:
+    """Sanciona (2 meses) a los participantes sin asistencia de varias reservas.
+
+    Versión por lotes de crear_sanciones_por_ausencia: toma como ausentes a
+    quienes tienen `asistencia = FALSE`, omite sanciones ya existentes con la
+    misma fecha de inicio e inserta todo con un único INSERT ... SELECT.
+    `cur` debe ser un cursor dictionary. Devuelve las sanciones creadas por reserva.
+    """
+    if not ids_reserva:
+        return {}
+    placeholders = ",".join(["%s"] * len(ids_reserva))
+    ausentes_sql = f"""
+        FROM reserva r
+        JOIN reserva_participante rp ON rp.id_reserva = r.id_reserva
+        WHERE r.id_reserva IN ({placeholders})
+          AND rp.asistencia = FALSE
+          AND NOT EXISTS (
+            SELECT 1
+            FROM sancion_participante sp
+            WHERE sp.ci_participante = rp.ci_participante
+              AND sp.fecha_inicio = r.fecha
+          )
+    """
+    cur.execute(
+        f"""
+        SELECT rp.id_reserva,
+               rp.ci_participante AS ci,
+               r.fecha AS fecha_inicio,
+               DATE_ADD(r.fecha, INTERVAL 2 MONTH) AS fecha_fin
+        {ausentes_sql}
+        ORDER BY rp.id_reserva, rp.ci_participante
+        """,
+        tuple(ids_reserva),
+    )
+    creadas: dict[int, list[dict[str, Any]]] = {}
+    vistas: set[tuple[str, date]] = set()
+    for row in cur.fetchall():
+        # Un mismo CI ausente en dos reservas del mismo día genera una sola sanción.
+        clave = (row["ci"], row["fecha_inicio"])
+        if clave in vistas:
+            continue
+        vistas.add(clave)
+        creadas.setdefault(row["id_reserva"], []).append(
+            {"ci": row["ci"], "fecha_inicio": row["fecha_inicio"], "fecha_fin": row["fecha_fin"]}
+        )
+    if creadas:
+        cur.execute(
+            f"""
+            INSERT IGNORE INTO sancion_participante (ci_participante, fecha_inicio, fecha_fin)
+            SELECT rp.ci_participante, r.fecha, DATE_ADD(r.fecha, INTERVAL 2 MONTH)
+            {ausentes_sql}
+            """,
+            tuple(ids_reserva),
+        )
+        _emitir_cambios_sancion(
+            cur,
+            "sancion_creada",
+            [(san["ci"], san["fecha_inicio"], san["fecha_fin"]) for lista in creadas.values() for san in lista],
+        )
+    return creadas
+
+
+# --------- Contadores mensuales (top-k de reportes) ---------
+# top-participantes y salas-no-show se responden sumando buckets mensuales
+# que se actualizan en la misma transacción que modifica la reserva.
+
+ESTADOS_CUENTAN_RESERVA = ("activa", "finalizada", "sin_asistencia")
+
+_PRIMER_DIA_MES_SQL = "DATE_SUB(r.fecha, INTERVAL DAY(r.fecha) - 1 DAY)"
+
+
+def _deltas_contadores(estado_anterior: str | None, estado_nuevo: str | None) -> tuple[int, int]:
+    """Devuelve (delta por participante, delta no-show de la sala) de una transición."""
+    delta_participante = int(estado_nuevo in ESTADOS_CUENTAN_RESERVA) - int(
+        estado_anterior in ESTADOS_CUENTAN_RESERVA
+    )
+    delta_no_show = int(estado_nuevo == "sin_asistencia") - int(estado_anterior == "sin_asistencia")
+    return delta_participante, delta_no_show
+
+
+def _ajustar_contadores(cur, cambios: list[tuple[int, str | None, str | None]]) -> None:
+    """Aplica transiciones (id_reserva, estado_anterior, estado_nuevo) a los contadores.
+
+    Los cambios se agrupan por delta, así que un lote de N reservas cuesta a lo
+    sumo cuatro sentencias. Debe llamarse con los participantes todavía
+    vinculados a la reserva.
+    """
+    por_delta_participante: dict[int, list[int]] = {}
+    por_delta_no_show: dict[int, list[int]] = {}
+    for id_reserva, anterior, nuevo in cambios:
+        delta_participante, delta_no_show = _deltas_contadores(anterior, nuevo)
+        if delta_participante:
+            por_delta_participante.setdefault(delta_participante, []).append(id_reserva)
+        if delta_no_show:
+            por_delta_no_show.setdefault(delta_no_show, []).append(id_reserva)
+
+    for delta, ids in por_delta_participante.items():
+        placeholders = ",".join(["%s"] * len(ids))
+        cur.execute(
+            f"""
+            INSERT INTO contador_participante_mes (mes, ci_participante, total_reservas)
+            SELECT {_PRIMER_DIA_MES_SQL}, rp.ci_participante, %s
+            FROM reserva r
+            JOIN reserva_participante rp ON rp.id_reserva = r.id_reserva
+            WHERE r.id_reserva IN ({placeholders})
+            ON DUPLICATE KEY UPDATE total_reservas = total_reservas + VALUES(total_reservas)
+            """,
+            (delta, *ids),
+        )
+
+    for delta, ids in por_delta_no_show.items():
+        placeholders = ",".join(["%s"] * len(ids))
+        cur.execute(
+            f"""
+            INSERT INTO contador_sala_mes (mes, edificio, nombre_sala, total_sin_asistencia)
+            SELECT {_PRIMER_DIA_MES_SQL}, r.edificio, r.nombre_sala, %s
+            FROM reserva r
+            WHERE r.id_reserva IN ({placeholders})
+            ON DUPLICATE KEY UPDATE total_sin_asistencia = total_sin_asistencia + VALUES(total_sin_asistencia)
+            """,
+            (delta, *ids),
+        )
+
+
+def _recalcular_contadores(cur, meses: list[date] | None = None) -> None:
+    """Reconstruye los contadores (todos los meses o solo `meses`).
+
+    Incluye las reservas archivadas para no perder meses ya movidos al archivo.
+    """
+    filtro = ""
+    params: list[Any] = []
+    if meses is not None:
+        meses = sorted(set(meses))
+        if not meses:
+            return
+        placeholders = ",".join(["%s"] * len(meses))
+        cur.execute(f"DELETE FROM contador_participante_mes WHERE mes IN ({placeholders})", tuple(meses))
+        cur.execute(f"DELETE FROM contador_sala_mes WHERE mes IN ({placeholders})", tuple(meses))
+        filtro = " AND (" + " OR ".join(
+            ["(r.fecha >= %s AND r.fecha < DATE_ADD(%s, INTERVAL 1 MONTH))"] * len(meses)
+        ) + ")"
+        for mes in meses:
+            params.extend([mes, mes])
+    else:
+        cur.execute("DELETE FROM contador_participante_mes")
+        cur.execute("DELETE FROM contador_sala_mes")
+
+    placeholders_estados = ",".join(["%s"] * len(ESTADOS_CUENTAN_RESERVA))
+    cur.execute(
+        f"""
+        INSERT INTO contador_participante_mes (mes, ci_participante, total_reservas)
+        SELECT {_PRIMER_DIA_MES_SQL} AS mes, rp.ci_participante, COUNT(*)
+        FROM {_RESERVAS_CON_HISTORICO} r
+        JOIN {_PARTICIPANTES_CON_HISTORICO} rp ON rp.id_reserva = r.id_reserva
+        WHERE r.estado IN ({placeholders_estados}){filtro}
+        GROUP BY mes, rp.ci_participante
+        """,
+        (*ESTADOS_CUENTAN_RESERVA, *params),
+    )
+    cur.execute(
+        f"""
+        INSERT INTO contador_sala_mes (mes, edificio, nombre_sala, total_sin_asistencia)
+        SELECT {_PRIMER_DIA_MES_SQL} AS mes, r.edificio, r.nombre_sala, COUNT(*)
+        FROM {_RESERVAS_CON_HISTORICO} r
+        WHERE r.estado = 'sin_asistencia'{filtro}
+        GROUP BY mes, r.edificio, r.nombre_sala
+        """,
+        tuple(params),
+    )
+
+
 @app.patch("/reservas/{id_reserva}", response_model=ReservaConSanciones)
 def update_reserva_estado(id_reserva: int, payload: ReservaEstadoIn):
     """
@@ -1345,6 +3095,8 @@ def update_reserva_estado(id_reserva: int, payload: ReservaEstadoIn):
 
     - Solo toca el campo `estado`.
     - Estados válidos: activa, cancelada, sin_asistencia, finalizada.
+    - Al cancelar, el turno se promueve al primer grupo apto de la lista de
+      espera (`promocion` en la respuesta).
     """
     # Normalizar estado (trim + lower)
     raw = (payload.estado or "").strip().lower()
@@ -1378,20 +3130,36 @@ def update_reserva_estado(id_reserva: int, payload: ReservaEstadoIn):
             raise HTTPException(status_code=404, detail="Reserva no encontrada")
 
         # 2) Actualizar solo el estado
-        cur.execute(
-            "UPDATE reserva SET estado = %s WHERE id_reserva = %s",
-            (estado, id_reserva),
-        )
+        conn.start_transaction()
+        try:
+            cur.execute(
+                "UPDATE reserva SET estado = %s WHERE id_reserva = %s",
+                (estado, id_reserva),
+            )
+        except mysql.connector.IntegrityError as e:
+            conn.rollback()
+            if e.errno == 1062:
+                # Se reactivó una cancelada cuyo turno ya tomó otra reserva.
+                raise HTTPException(status_code=409, detail="El turno ya fue reservado por otra reserva")
+            raise
 
         sanciones: list[dict[str, Any]] = []
         if estado == "sin_asistencia" and row.get("estado") != "sin_asistencia":
             sanciones = crear_sanciones_por_ausencia(conn, id_reserva)
 
+        _ajustar_contadores(cur, [(id_reserva, row.get("estado"), estado)])
+        _emitir_cambios_reserva(cur, "reserva_estado", [id_reserva])
+
+        # 3) Un turno cancelado pasa al primer grupo apto de la lista de espera
+        promocion = None
+        if estado == "cancelada" and row.get("estado") != "cancelada":
+            promocion = _promover_lista_espera(cur, row)
         conn.commit()
+        _avisar_cambios((row["edificio"],))
 
-        # 3) Devolver la reserva actualizada
+        # 4) Devolver la reserva actualizada
         row["estado"] = estado
-        return {"reserva": row, "sanciones_creadas": sanciones}
+        return {"reserva": row, "sanciones_creadas": sanciones, "promocion": promocion}
 
     except HTTPException:
         raise
@@ -1417,7 +3185,7 @@ def registrar_asistencia(id_reserva: int, payload: AsistenciaIn):
         # 1) Verificar que la reserva exista
         cur.execute(
             """
-            SELECT id_reserva, fecha, estado
+            SELECT id_reserva, edificio, fecha, estado
             FROM reserva
             WHERE id_reserva = %s
             """,
@@ -1454,6 +3222,7 @@ def registrar_asistencia(id_reserva: int, payload: AsistenciaIn):
             )
 
         # 3) Marcar asistencia: primero todos en FALSE, luego los presentes en TRUE
+        conn.start_transaction()
         cur.execute(
             "UPDATE reserva_participante SET asistencia = FALSE WHERE id_reserva = %s",
             (id_reserva,),
@@ -1497,7 +3266,10 @@ def registrar_asistencia(id_reserva: int, payload: AsistenciaIn):
         if payload.sancionar_ausentes:
             sanciones_creadas = crear_sanciones_por_ausencia(conn, id_reserva, presentes)
 
+        _ajustar_contadores(cur, [(id_reserva, reserva["estado"], nuevo_estado)])
+        _emitir_cambios_reserva(cur, "reserva_estado", [id_reserva])
         conn.commit()
+        _avisar_cambios((reserva["edificio"],))
 
         # 7) Devolver la reserva actualizada
         cur.execute(
@@ -1523,6 +3295,141 @@ def registrar_asistencia(id_reserva: int, payload: AsistenciaIn):
     finally:
         conn.close()
 
+@app.post("/reservas/asistencia", response_model=List[AsistenciaLoteResultado])
+def registrar_asistencia_lote(payload: AsistenciaLoteIn):
+    """
+    Registra la asistencia de muchas reservas a la vez (cierre de turno).
+
+    Aplica las mismas reglas que POST /reservas/{id}/asistencia, pero con una
+    cantidad fija de sentencias para todo el lote y en una sola transacción:
+    lectura de reservas+participantes, marcado de asistencia, cambio de
+    estado, contadores y sanciones. Los errores de validación se informan por
+    reserva y no impiden procesar el resto.
+    """
+    resultados: dict[int, dict[str, Any]] = {}
+    orden: list[int] = []
+    pedidos: dict[int, set[str]] = {}
+    duplicadas: list[int] = []
+    for item in payload.reservas:
+        if item.id_reserva in resultados:
+            duplicadas.append(item.id_reserva)
+            continue
+        orden.append(item.id_reserva)
+        resultados[item.id_reserva] = {"id_reserva": item.id_reserva, "ok": False}
+        try:
+            pedidos[item.id_reserva] = set(normalize_ci_list(item.presentes))
+        except HTTPException as e:
+            resultados[item.id_reserva]["error"] = e.detail
+
+    conn = get_reservas_connection()
+    try:
+        cur = conn.cursor(dictionary=True)
+        conn.start_transaction()
+
+        # 1) Reservas + participantes del lote
+        ids = list(pedidos)
+        reservas: dict[int, dict[str, Any]] = {}
+        if ids:
+            placeholders = ",".join(["%s"] * len(ids))
+            cur.execute(
+                f"""
+                SELECT r.id_reserva, r.nombre_sala, r.edificio, r.fecha, r.id_turno, r.estado,
+                       rp.ci_participante
+                FROM reserva r
+                LEFT JOIN reserva_participante rp ON rp.id_reserva = r.id_reserva
+                WHERE r.id_reserva IN ({placeholders})
+                FOR UPDATE
+                """,
+                tuple(ids),
+            )
+            for row in cur.fetchall():
+                ci = row.pop("ci_participante")
+                reserva = reservas.setdefault(row["id_reserva"], {**row, "participantes": set()})
+                if ci:
+                    reserva["participantes"].add(ci)
+
+        validos: list[int] = []
+        for id_reserva, presentes in pedidos.items():
+            reserva = reservas.get(id_reserva)
+            if reserva is None:
+                resultados[id_reserva]["error"] = "Reserva no encontrada"
+            elif not reserva["participantes"]:
+                resultados[id_reserva]["error"] = (
+                    "La reserva no tiene participantes; no se puede registrar asistencia."
+                )
+            elif presentes - reserva["participantes"]:
+                desconocidos = ", ".join(sorted(presentes - reserva["participantes"]))
+                resultados[id_reserva]["error"] = f"Las CIs {desconocidos} no pertenecen a la reserva."
+            else:
+                validos.append(id_reserva)
+
+        sanciones: dict[int, list[dict[str, Any]]] = {}
+        if validos:
+            placeholders = ",".join(["%s"] * len(validos))
+
+            # 2) Marcar asistencia de todo el lote
+            pares = [(id_reserva, ci) for id_reserva in validos for ci in sorted(pedidos[id_reserva])]
+            if pares:
+                presente_sql = "(id_reserva, ci_participante) IN (" + ",".join(["(%s, %s)"] * len(pares)) + ")"
+            else:
+                presente_sql = "FALSE"
+            cur.execute(
+                f"""
+                UPDATE reserva_participante
+                SET asistencia = {presente_sql}
+                WHERE id_reserva IN ({placeholders})
+                """,
+                (*[v for par in pares for v in par], *validos),
+            )
+
+            # 3) Estado: finalizada si asistió alguien, sin_asistencia si no
+            finalizadas = [id_reserva for id_reserva in validos if pedidos[id_reserva]]
+            if finalizadas:
+                estado_sql = (
+                    "IF(id_reserva IN (" + ",".join(["%s"] * len(finalizadas)) + "), 'finalizada', 'sin_asistencia')"
+                )
+            else:
+                estado_sql = "'sin_asistencia'"
+            cur.execute(
+                f"UPDATE reserva SET estado = {estado_sql} WHERE id_reserva IN ({placeholders})",
+                (*finalizadas, *validos),
+            )
+
+            cambios = []
+            for id_reserva in validos:
+                nuevo_estado = "finalizada" if pedidos[id_reserva] else "sin_asistencia"
+                cambios.append((id_reserva, reservas[id_reserva]["estado"], nuevo_estado))
+                reservas[id_reserva]["estado"] = nuevo_estado
+            _ajustar_contadores(cur, cambios)
+            _emitir_cambios_reserva(cur, "reserva_estado", validos)
+
+            # 4) Sanciones de 2 meses para los ausentes
+            if payload.sancionar_ausentes:
+                sanciones = _sancionar_ausentes_lote(cur, validos)
+
+        conn.commit()
+        _avisar_cambios({reservas[id_reserva]["edificio"] for id_reserva in validos})
+    except mysql.connector.Error as e:
+        conn.rollback()
+        raise HTTPException(status_code=500, detail=f"Error registrando asistencia en lote: {e}")
+    finally:
+        conn.close()
+
+    for id_reserva in validos:
+        reserva = reservas[id_reserva]
+        reserva.pop("participantes", None)
+        resultados[id_reserva].update(
+            ok=True,
+            reserva=reserva,
+            sanciones_creadas=sanciones.get(id_reserva, []),
+        )
+    salida = [resultados[id_reserva] for id_reserva in orden]
+    salida.extend(
+        {"id_reserva": id_reserva, "ok": False, "error": "Reserva repetida en el lote"}
+        for id_reserva in duplicadas
+    )
+    return salida
+
 from datetime import time
 
 class TurnoDisponibilidad(BaseModel):
@@ -1531,6 +3438,7 @@ class TurnoDisponibilidad(BaseModel):
     hora_fin: str      # antes: time
     reservado: bool
     estado_reserva: str | None = None
+    retenido: bool = False            # libre pero retenido por un formulario abierto
 
 
 class LimpiarSmokeIn(BaseModel):
@@ -1556,6 +3464,8 @@ def disponibilidad(
     Reglas:
     - Si la sala no existe en ese edificio -> 404.
     - reservado = True solo si hay reserva ACTIVA de esa sala en ese turno.
+    - Las reservas canceladas no aparecen: el turno vuelve a estar libre.
+    - retenido = True si está libre pero alguien lo retuvo (POST /reservas/retenciones).
     """
     conn = get_reservas_connection()
     try:
@@ -1593,6 +3503,7 @@ def disponibilidad(
              AND r.fecha       = %s
              AND r.edificio    = %s
              AND r.nombre_sala = %s
+             AND r.slot_ocupado = 1
             ORDER BY t.id_turno
             """,
             (fecha, edificio, nombre_sala),
@@ -1602,6 +3513,10 @@ def disponibilidad(
         result = []
         for row in rows:
             reservado = row["id_reserva"] is not None and row["estado"] == "activa"
+            retenido = (
+                row["id_reserva"] is None
+                and _RETENCIONES.titular((nombre_sala, edificio, fecha, row["id_turno"])) is not None
+            )
             result.append(
                 {
                     "id_turno": row["id_turno"],
@@ -1609,6 +3524,7 @@ def disponibilidad(
                     "hora_fin": _time_to_str(row["hora_fin"]),
                     "reservado": reservado,
                     "estado_reserva": row["estado"],
+                    "retenido": retenido,
                 }
             )
         return result
@@ -1677,18 +3593,21 @@ def limpiar_smoke(payload: LimpiarSmokeIn):
             params_reserva.extend(fechas)
 
         reserva_ids: list[int] = []
+        meses_afectados = {f.replace(day=1) for f in fechas}
         if filtros_reserva:
             where_clause = " AND ".join(filtros_reserva)
             cur.execute(
                 f"""
-                SELECT DISTINCT r.id_reserva
+                SELECT DISTINCT r.id_reserva, r.fecha
                 FROM reserva r
                 JOIN reserva_participante rp ON rp.id_reserva = r.id_reserva
                 WHERE {where_clause}
                 """,
                 tuple(params_reserva),
             )
-            reserva_ids = [row[0] for row in cur.fetchall()]
+            for id_reserva, fecha_reserva in cur.fetchall():
+                reserva_ids.append(id_reserva)
+                meses_afectados.add(fecha_reserva.replace(day=1))
 
         # 2) Borrar reservas_participantes específicos aun si no se identificaron
         #    previamente los IDs (por ejemplo, cuando el volumen tiene fechas
@@ -1736,6 +3655,9 @@ def limpiar_smoke(payload: LimpiarSmokeIn):
                 participantes,
             )
 
+        # 5) Reconstruir los contadores mensuales de los meses tocados.
+        conn.start_transaction()
+        _recalcular_contadores(cur, list(meses_afectados))
         conn.commit()
         return {
             "detail": "Datos de smoke limpiados",
@@ -1750,12 +3672,1440 @@ def limpiar_smoke(payload: LimpiarSmokeIn):
         conn.close()
 
 
-# ==========================
-#  AUTH LÓGICO
-# ==========================
+# ==========================
+#  ARCHIVO HISTÓRICO
+# ==========================
+# Las reservas cerradas (no activas) con fecha anterior al horizonte se mueven
+# a reserva_historica / reserva_participante_historica en lotes chicos, cada
+# uno en su propia transacción para no retener locks largos. Cada lote suma su
+# aporte a resumen_sala_dia / resumen_turno_dia, que es lo que usan los
+# reportes agregados para cubrir el período archivado.
+
+ARCHIVO_HORIZONTE_DIAS = int(os.getenv("ARCHIVO_HORIZONTE_DIAS", "365"))
+ARCHIVO_LOTE = int(os.getenv("ARCHIVO_LOTE", "500"))
+
+ESTADOS_ARCHIVABLES = ("cancelada", "finalizada", "sin_asistencia")
+
+_ARCHIVO_LOCK = threading.Lock()
+_ARCHIVO_PROGRESO: dict[str, Any] = {
+    "en_curso": False,
+    "fecha_corte": None,
+    "lote": None,
+    "lotes_procesados": 0,
+    "reservas_archivadas": 0,
+    "iniciado": None,
+    "finalizado": None,
+    "error": None,
+}
+
+
+class ArchivoIn(BaseModel):
+    horizonte_dias: int = Field(ARCHIVO_HORIZONTE_DIAS, ge=30, description="Antigüedad mínima en días")
+    lote: int = Field(ARCHIVO_LOTE, ge=1, le=5000, description="Reservas por transacción")
+    max_lotes: int | None = Field(None, ge=1, description="Cortar luego de N lotes (None = hasta terminar)")
+
+
+def _archivar_lote(conn, cur, fecha_corte: date, lote: int) -> int:
+    """Mueve un lote de reservas al archivo en una transacción. Devuelve cuántas movió."""
+    global _ARCHIVADO_HASTA, _ARCHIVADO_HASTA_CARGADO
+
+    conn.start_transaction()
+    placeholders_estados = ",".join(["%s"] * len(ESTADOS_ARCHIVABLES))
+    cur.execute(
+        f"""
+        SELECT id_reserva, fecha
+        FROM reserva
+        WHERE estado IN ({placeholders_estados})
+          AND fecha < %s
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+        """,
+        (*ESTADOS_ARCHIVABLES, fecha_corte, lote),
+    )
+    filas = cur.fetchall()
+    if not filas:
+        conn.commit()
+        return 0
+
+    ids = [row[0] for row in filas]
+    max_fecha = max(row[1] for row in filas)
+    placeholders = ",".join(["%s"] * len(ids))
+    ids_t = tuple(ids)
+
+    cur.execute(
+        f"""
+        INSERT INTO reserva_historica (id_reserva, nombre_sala, edificio, fecha, id_turno, estado)
+        SELECT id_reserva, nombre_sala, edificio, fecha, id_turno, estado
+        FROM reserva
+        WHERE id_reserva IN ({placeholders})
+        """,
+        ids_t,
+    )
+    cur.execute(
+        f"""
+        INSERT INTO reserva_participante_historica
+          (ci_participante, id_reserva, fecha_solicitud_reserva, asistencia)
+        SELECT ci_participante, id_reserva, fecha_solicitud_reserva, asistencia
+        FROM reserva_participante
+        WHERE id_reserva IN ({placeholders})
+        """,
+        ids_t,
+    )
+    cur.execute(
+        f"""
+        INSERT INTO resumen_sala_dia
+          (fecha, edificio, nombre_sala, estado, total_reservas, total_participantes)
+        SELECT r.fecha, r.edificio, r.nombre_sala, r.estado,
+               COUNT(*),
+               SUM((SELECT COUNT(*) FROM reserva_participante rp WHERE rp.id_reserva = r.id_reserva))
+        FROM reserva r
+        WHERE r.id_reserva IN ({placeholders})
+        GROUP BY r.fecha, r.edificio, r.nombre_sala, r.estado
+        ON DUPLICATE KEY UPDATE
+          total_reservas = total_reservas + VALUES(total_reservas),
+          total_participantes = total_participantes + VALUES(total_participantes)
+        """,
+        ids_t,
+    )
+    cur.execute(
+        f"""
+        INSERT INTO resumen_turno_dia (fecha, id_turno, estado, total_reservas)
+        SELECT r.fecha, r.id_turno, r.estado, COUNT(*)
+        FROM reserva r
+        WHERE r.id_reserva IN ({placeholders})
+        GROUP BY r.fecha, r.id_turno, r.estado
+        ON DUPLICATE KEY UPDATE total_reservas = total_reservas + VALUES(total_reservas)
+        """,
+        ids_t,
+    )
+    cur.execute(f"DELETE FROM reserva_participante WHERE id_reserva IN ({placeholders})", ids_t)
+    cur.execute(f"DELETE FROM reserva WHERE id_reserva IN ({placeholders})", ids_t)
+    cur.execute(
+        """
+        INSERT INTO archivo_estado (id, archivado_hasta, total_archivadas)
+        VALUES (1, %s, %s)
+        ON DUPLICATE KEY UPDATE
+          archivado_hasta = GREATEST(COALESCE(archivado_hasta, VALUES(archivado_hasta)), VALUES(archivado_hasta)),
+          total_archivadas = total_archivadas + VALUES(total_archivadas)
+        """,
+        (max_fecha, len(ids)),
+    )
+    conn.commit()
+
+    # Los reportes empiezan a leer los resúmenes en cuanto el lote es visible.
+    if _ARCHIVADO_HASTA is None or max_fecha > _ARCHIVADO_HASTA:
+        _ARCHIVADO_HASTA = max_fecha
+        _ARCHIVADO_HASTA_CARGADO = True
+    return len(ids)
+
+
+def archivar_reservas(fecha_corte: date, lote: int = ARCHIVO_LOTE, max_lotes: int | None = None) -> None:
+    """Ejecuta el archivo por lotes actualizando _ARCHIVO_PROGRESO."""
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        while max_lotes is None or _ARCHIVO_PROGRESO["lotes_procesados"] < max_lotes:
+            movidas = _archivar_lote(conn, cur, fecha_corte, lote)
+            if not movidas:
+                break
+            _ARCHIVO_PROGRESO["lotes_procesados"] += 1
+            _ARCHIVO_PROGRESO["reservas_archivadas"] += movidas
+            logger.info("Archivo: lote movido", extra={"reservas": movidas})
+    except mysql.connector.Error as e:
+        conn.rollback()
+        _ARCHIVO_PROGRESO["error"] = str(e)
+        logger.exception("Archivo: error moviendo lote")
+    finally:
+        conn.close()
+        _ARCHIVO_PROGRESO["en_curso"] = False
+        _ARCHIVO_PROGRESO["finalizado"] = datetime.now().isoformat(timespec="seconds")
+
+
+@app.post("/admin/archivo", status_code=202)
+def iniciar_archivo(
+    background_tasks: BackgroundTasks,
+    payload: ArchivoIn = ArchivoIn(),
+    x_actor_ci: str | None = Header(None, alias="X-Actor-CI"),
+):
+    """Lanza el archivo de reservas cerradas más viejas que `horizonte_dias`.
+
+    - 403 si el actor no es administrador.
+    - 409 si ya hay una corrida en curso.
+    El avance se consulta con GET /admin/archivo.
+    """
+    _requerir_admin(x_actor_ci)
+    fecha_corte = date.today() - timedelta(days=payload.horizonte_dias)
+    with _ARCHIVO_LOCK:
+        if _ARCHIVO_PROGRESO["en_curso"]:
+            raise HTTPException(status_code=409, detail="Ya hay un archivo en curso")
+        _ARCHIVO_PROGRESO.update(
+            en_curso=True,
+            fecha_corte=fecha_corte.isoformat(),
+            lote=payload.lote,
+            lotes_procesados=0,
+            reservas_archivadas=0,
+            iniciado=datetime.now().isoformat(timespec="seconds"),
+            finalizado=None,
+            error=None,
+        )
+    background_tasks.add_task(archivar_reservas, fecha_corte, payload.lote, payload.max_lotes)
+    return dict(_ARCHIVO_PROGRESO)
+
+
+@app.get("/admin/archivo")
+def estado_archivo(x_actor_ci: str | None = Header(None, alias="X-Actor-CI")):
+    """Progreso de la última corrida de archivo y reservas pendientes de archivar."""
+    _requerir_admin(x_actor_ci)
+    progreso = dict(_ARCHIVO_PROGRESO)
+    conn = get_conn()
+    try:
+        cur = conn.cursor(dictionary=True)
+        cur.execute("SELECT archivado_hasta, total_archivadas FROM archivo_estado WHERE id = 1")
+        progreso.update(cur.fetchone() or {"archivado_hasta": None, "total_archivadas": 0})
+        if progreso["fecha_corte"]:
+            placeholders_estados = ",".join(["%s"] * len(ESTADOS_ARCHIVABLES))
+            cur.execute(
+                f"""
+                SELECT COUNT(*) AS pendientes
+                FROM reserva
+                WHERE estado IN ({placeholders_estados})
+                  AND fecha < %s
+                """,
+                (*ESTADOS_ARCHIVABLES, progreso["fecha_corte"]),
+            )
+            progreso["pendientes"] = cur.fetchone()["pendientes"]
+        return progreso
+    except mysql.connector.Error as e:
+        raise HTTPException(status_code=500, detail=f"Error consultando archivo: {e}")
+    finally:
+        conn.close()
+
+
+# ==========================
+#  BARRIDO DE NO-SHOW
+# ==========================
+# Reservas que siguen 'activa' cuando su turno ya terminó y nadie registró
+# asistencia pasan a 'sin_asistencia' y sus participantes reciben la sanción
+# de 2 meses. Corre en proceso cada NO_SHOW_INTERVALO_SEGUNDOS (0 = apagado).
+# El checkpoint en proceso_checkpoint acota el barrido a fechas posteriores a
+# la última corrida completa (con NO_SHOW_MARGEN_DIAS de margen para reservas
+# cargadas con fecha pasada); repetir una corrida no duplica nada.
+
+NO_SHOW_INTERVALO_SEGUNDOS = float(os.getenv("NO_SHOW_INTERVALO_SEGUNDOS", "300"))
+NO_SHOW_LOTE = int(os.getenv("NO_SHOW_LOTE", "200"))
+NO_SHOW_MARGEN_DIAS = int(os.getenv("NO_SHOW_MARGEN_DIAS", "7"))
+
+_NO_SHOW_LOCK = threading.Lock()
+_NO_SHOW_STATS: dict[str, Any] = {
+    "corridas": 0,
+    "reservas_marcadas": 0,
+    "sanciones_emitidas": 0,
+    "ultima_corrida": None,
+    "ultima_duracion_ms": None,
+    "ultimo_resultado": None,
+    "ultimo_error": None,
+    "checkpoint": None,
+}
+
+
+def barrer_no_show(lote: int = NO_SHOW_LOTE) -> dict[str, Any]:
+    """Marca como sin_asistencia las reservas vencidas y emite sus sanciones en bloque."""
+    if not _NO_SHOW_LOCK.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="Ya hay un barrido de no-show en curso")
+    inicio = time_mod.perf_counter()
+    ahora = datetime.now().replace(microsecond=0)
+    marcadas = 0
+    sanciones_emitidas = 0
+    try:
+        conn = get_conn()
+        try:
+            cur = conn.cursor(dictionary=True)
+            cur.execute("SELECT marca FROM proceso_checkpoint WHERE proceso = 'no_show'")
+            row = cur.fetchone()
+            desde = row["marca"].date() - timedelta(days=NO_SHOW_MARGEN_DIAS) if row and row["marca"] else None
+
+            filtro_desde = " AND r.fecha >= %s" if desde else ""
+            while True:
+                conn.start_transaction()
+                # OF r: solo se bloquean las reservas del lote; las filas de
+                # turno las comparten todas las reservas del día.
+                cur.execute(
+                    f"""
+                    SELECT r.id_reserva, r.edificio
+                    FROM reserva r
+                    JOIN turno t ON t.id_turno = r.id_turno
+                    WHERE r.estado = 'activa'
+                      AND r.fecha <= %s{filtro_desde}
+                      AND TIMESTAMP(r.fecha, t.hora_fin) <= %s
+                      AND NOT EXISTS (
+                        SELECT 1
+                        FROM reserva_participante rp
+                        WHERE rp.id_reserva = r.id_reserva
+                          AND rp.asistencia = TRUE
+                      )
+                    ORDER BY r.id_reserva
+                    LIMIT %s
+                    FOR UPDATE OF r SKIP LOCKED
+                    """,
+                    (ahora.date(), *([desde] if desde else []), ahora, lote),
+                )
+                filas = cur.fetchall()
+                ids = [r["id_reserva"] for r in filas]
+                if not ids:
+                    conn.commit()
+                    break
+
+                placeholders = ",".join(["%s"] * len(ids))
+                cur.execute(
+                    f"UPDATE reserva SET estado = 'sin_asistencia' WHERE id_reserva IN ({placeholders})",
+                    tuple(ids),
+                )
+                _ajustar_contadores(cur, [(id_reserva, "activa", "sin_asistencia") for id_reserva in ids])
+                _emitir_cambios_reserva(cur, "reserva_estado", ids)
+                creadas = _sancionar_ausentes_lote(cur, ids)
+                conn.commit()
+                _avisar_cambios({r["edificio"] for r in filas})
+
+                marcadas += len(ids)
+                sanciones_emitidas += sum(len(v) for v in creadas.values())
+                if len(ids) < lote:
+                    break
+
+            cur.execute(
+                """
+                INSERT INTO proceso_checkpoint (proceso, marca)
+                VALUES ('no_show', %s)
+                ON DUPLICATE KEY UPDATE marca = VALUES(marca)
+                """,
+                (ahora,),
+            )
+        except mysql.connector.Error as e:
+            conn.rollback()
+            _NO_SHOW_STATS["ultimo_error"] = str(e)
+            raise
+        finally:
+            conn.close()
+
+        resultado = {"reservas_marcadas": marcadas, "sanciones_emitidas": sanciones_emitidas}
+        _NO_SHOW_STATS.update(
+            ultimo_resultado=resultado,
+            ultimo_error=None,
+            checkpoint=ahora.isoformat(),
+        )
+        if marcadas:
+            logger.info("Barrido no-show", extra=resultado)
+        return resultado
+    finally:
+        _NO_SHOW_STATS["corridas"] += 1
+        _NO_SHOW_STATS["reservas_marcadas"] += marcadas
+        _NO_SHOW_STATS["sanciones_emitidas"] += sanciones_emitidas
+        _NO_SHOW_STATS["ultima_corrida"] = ahora.isoformat()
+        _NO_SHOW_STATS["ultima_duracion_ms"] = round((time_mod.perf_counter() - inicio) * 1000, 1)
+        _NO_SHOW_LOCK.release()
+
+
+_TAREAS_PERIODICAS.append(("no_show", NO_SHOW_INTERVALO_SEGUNDOS, barrer_no_show))
+
+
+@app.get("/admin/no-show")
+def estado_no_show(x_actor_ci: str | None = Header(None, alias="X-Actor-CI")):
+    """Estadísticas acumuladas del barrido de no-show (desde que arrancó el proceso)."""
+    _requerir_admin(x_actor_ci)
+    return {**_NO_SHOW_STATS, "intervalo_segundos": NO_SHOW_INTERVALO_SEGUNDOS}
+
+
+@app.post("/admin/no-show")
+def ejecutar_no_show(x_actor_ci: str | None = Header(None, alias="X-Actor-CI")):
+    """Ejecuta un barrido de no-show inmediato."""
+    _requerir_admin(x_actor_ci)
+    try:
+        return barrer_no_show()
+    except mysql.connector.Error as e:
+        raise HTTPException(status_code=500, detail=f"Error en barrido de no-show: {e}")
+
+
+# ==========================
+#  FEED DE CAMBIOS
+# ==========================
+# Outbox de eventos de reservas y sanciones: create_reserva, el cambio de
+# estado, la asistencia (individual y en lote), el barrido de no-show y el
+# ABM de sanciones insertan en `cambio` dentro de su propia transacción, así
+# que un evento existe si y solo si el cambio se confirmó.
+# - GET /cambios?since=<seq>&limit=&espera= devuelve los eventos con seq > since;
+#   con `espera` hace long-polling hasta que haya alguno. Dentro del proceso
+#   los escritores despiertan a los que esperan después del commit; los
+#   cambios de otros workers se ven al re-consultar cada CAMBIOS_SONDEO_SEGUNDOS.
+# - Un seq se asigna al insertar pero se vuelve visible al commit, así que
+#   puede aparecer un seq mayor antes que uno menor todavía en vuelo. Si hay
+#   un hueco seguido de un evento de hace menos de CAMBIOS_HUECO_SEGUNDOS, la
+#   respuesta corta ahí; pasado ese plazo el hueco se da por descartado
+#   (rollback) y se sigue.
+# - POST /cambios/ack guarda hasta qué seq procesó cada consumidor; la
+#   compactación periódica borra lo confirmado por todos y, como tope, lo
+#   más viejo que CAMBIOS_RETENCION_DIAS.
+
+CAMBIOS_ESPERA_MAX = float(os.getenv("CAMBIOS_ESPERA_MAX", "30"))
+CAMBIOS_SONDEO_SEGUNDOS = float(os.getenv("CAMBIOS_SONDEO_SEGUNDOS", "5"))
+CAMBIOS_HUECO_SEGUNDOS = float(os.getenv("CAMBIOS_HUECO_SEGUNDOS", "5"))
+CAMBIOS_RETENCION_DIAS = int(os.getenv("CAMBIOS_RETENCION_DIAS", "30"))
+CAMBIOS_COMPACTAR_LOTE = int(os.getenv("CAMBIOS_COMPACTAR_LOTE", "5000"))
+CAMBIOS_COMPACTAR_SEGUNDOS = float(os.getenv("CAMBIOS_COMPACTAR_SEGUNDOS", "3600"))
+
+_CAMBIOS_ESPERAS: set[tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+_CAMBIOS_ESPERAS_LOCK = threading.Lock()
+
+
+def _emitir_cambios_reserva(cur, tipo: str, ids_reserva: list[int]) -> None:
+    """Agrega al feed el estado actual de las reservas (dentro de la transacción del cambio)."""
+    if not ids_reserva:
+        return
+    placeholders = ",".join(["%s"] * len(ids_reserva))
+    cur.execute(
+        f"""
+        INSERT INTO cambio (creado, tipo, id_reserva, nombre_sala, edificio, fecha, id_turno, estado)
+        SELECT %s, %s, id_reserva, nombre_sala, edificio, fecha, id_turno, estado
+        FROM reserva
+        WHERE id_reserva IN ({placeholders})
+        ORDER BY id_reserva
+        """,
+        (datetime.now(), tipo, *ids_reserva),
+    )
+
+
+def _emitir_cambios_sancion(cur, tipo: str, sanciones: list[tuple[str, date, date | None]]) -> None:
+    """Agrega al feed sanciones (ci, fecha_inicio, fecha_fin)."""
+    if not sanciones:
+        return
+    ahora = datetime.now()
+    cur.execute(
+        "INSERT INTO cambio (creado, tipo, ci_participante, fecha, fecha_fin) VALUES "
+        + ",".join(["(%s, %s, %s, %s, %s)"] * len(sanciones)),
+        tuple(v for ci, inicio, fin in sanciones for v in (ahora, tipo, ci, inicio, fin)),
+    )
+
+
+def _avisar_cambios(edificios: Iterable[str] | None = None) -> None:
+    """
+    Despierta a los long-polls de /cambios e invalida los tableros de
+    `edificios` (todos si es None). Llamar después del commit.
+    """
+    _invalidar_tableros(edificios)
+    with _CAMBIOS_ESPERAS_LOCK:
+        esperas = list(_CAMBIOS_ESPERAS)
+    for loop, evento in esperas:
+        try:
+            loop.call_soon_threadsafe(evento.set)
+        except RuntimeError:
+            # Loop ya cerrado (request cancelado durante el apagado).
+            pass
+
+
+class CambioOut(BaseModel):
+    seq: int
+    creado: datetime
+    tipo: str
+    id_reserva: int | None = None
+    nombre_sala: str | None = None
+    edificio: str | None = None
+    fecha: date | None = None
+    id_turno: int | None = None
+    estado: str | None = None
+    ci_participante: str | None = None
+    fecha_fin: date | None = None
+
+
+class CambiosOut(BaseModel):
+    cambios: List[CambioOut]
+    ultimo_seq: int
+
+
+class CambiosAckIn(BaseModel):
+    consumidor: str = Field(..., min_length=1, max_length=60)
+    seq: int = Field(..., ge=0)
+
+
+def _leer_cambios(since: int, limit: int) -> list[dict[str, Any]]:
+    conn = get_conn()
+    try:
+        cur = conn.cursor(dictionary=True)
+        cur.execute(
+            """
+            SELECT seq, creado, tipo, id_reserva, nombre_sala, edificio, fecha,
+                   id_turno, estado, ci_participante, fecha_fin
+            FROM cambio
+            WHERE seq > %s
+            ORDER BY seq
+            LIMIT %s
+            """,
+            (since, limit),
+        )
+        filas = cur.fetchall()
+    finally:
+        conn.close()
+
+    reciente = datetime.now() - timedelta(seconds=CAMBIOS_HUECO_SEGUNDOS)
+    previo = since
+    for i, fila in enumerate(filas):
+        if fila["seq"] != previo + 1 and fila["creado"] > reciente:
+            return filas[:i]
+        previo = fila["seq"]
+    return filas
+
+
+@app.get("/cambios", response_model=CambiosOut)
+async def listar_cambios(
+    since: int = Query(0, ge=0, description="Último seq ya procesado"),
+    limit: int = Query(100, ge=1, le=1000, description="Máximo de eventos a devolver"),
+    espera: float = Query(0, ge=0, le=CAMBIOS_ESPERA_MAX, description="Segundos de long-polling si no hay eventos"),
+    x_actor_ci: str | None = Header(None, alias="X-Actor-CI"),
+):
+    """Eventos del feed de cambios posteriores a `since`, en orden de seq."""
+    await run_in_threadpool(_requerir_admin, x_actor_ci)
+    vence = time_mod.monotonic() + espera
+    registro = (asyncio.get_running_loop(), asyncio.Event())
+    with _CAMBIOS_ESPERAS_LOCK:
+        _CAMBIOS_ESPERAS.add(registro)
+    try:
+        while True:
+            registro[1].clear()
+            try:
+                cambios = await run_in_threadpool(_leer_cambios, since, limit)
+            except mysql.connector.Error as e:
+                raise HTTPException(status_code=500, detail=f"Error leyendo cambios: {e}")
+            restante = vence - time_mod.monotonic()
+            if cambios or restante <= 0:
+                break
+            try:
+                await asyncio.wait_for(registro[1].wait(), timeout=min(restante, CAMBIOS_SONDEO_SEGUNDOS))
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        with _CAMBIOS_ESPERAS_LOCK:
+            _CAMBIOS_ESPERAS.discard(registro)
+    return {"cambios": cambios, "ultimo_seq": cambios[-1]["seq"] if cambios else since}
+
+
+@app.post("/cambios/ack")
+def confirmar_cambios(
+    payload: CambiosAckIn,
+    x_actor_ci: str | None = Header(None, alias="X-Actor-CI"),
+):
+    """Registra que `consumidor` procesó los eventos hasta `seq` inclusive."""
+    _requerir_admin(x_actor_ci)
+    conn = get_conn()
+    try:
+        cur = conn.cursor(dictionary=True)
+        cur.execute(
+            """
+            INSERT INTO cambio_consumidor (consumidor, ultimo_seq)
+            VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE
+              ultimo_seq = GREATEST(ultimo_seq, VALUES(ultimo_seq)),
+              actualizado = CURRENT_TIMESTAMP
+            """,
+            (payload.consumidor, payload.seq),
+        )
+        cur.execute(
+            "SELECT consumidor, ultimo_seq FROM cambio_consumidor WHERE consumidor = %s",
+            (payload.consumidor,),
+        )
+        return cur.fetchone()
+    except mysql.connector.Error as e:
+        raise HTTPException(status_code=500, detail=f"Error confirmando cambios: {e}")
+    finally:
+        conn.close()
+
+
+def compactar_cambios(lote: int = CAMBIOS_COMPACTAR_LOTE) -> dict[str, Any]:
+    """Borra del feed lo confirmado por todos los consumidores y lo vencido por retención."""
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT MIN(ultimo_seq) FROM cambio_consumidor")
+        hasta = cur.fetchone()[0] or 0
+        if CAMBIOS_RETENCION_DIAS > 0:
+            cur.execute(
+                "SELECT MAX(seq) FROM cambio WHERE creado < %s",
+                (datetime.now() - timedelta(days=CAMBIOS_RETENCION_DIAS),),
+            )
+            hasta = max(hasta, cur.fetchone()[0] or 0)
+        cur.execute("SELECT MIN(seq) FROM cambio")
+        desde = cur.fetchone()[0]
+        eliminados = 0
+        # Por rangos de seq, cada DELETE en su propia transacción (autocommit).
+        while desde is not None and desde <= hasta:
+            tope = min(hasta, desde + lote - 1)
+            cur.execute("DELETE FROM cambio WHERE seq BETWEEN %s AND %s", (desde, tope))
+            eliminados += cur.rowcount
+            desde = tope + 1
+    finally:
+        conn.close()
+    if eliminados:
+        logger.info("Feed de cambios compactado: %d eventos hasta seq %d", eliminados, hasta)
+    return {"eliminados": eliminados, "hasta_seq": hasta}
+
+
+_TAREAS_PERIODICAS.append(("cambios", CAMBIOS_COMPACTAR_SEGUNDOS, compactar_cambios))
+
+
+# ==========================
+#  DISPONIBILIDAD EN VIVO (SSE)
+# ==========================
+# GET /disponibilidad/stream?edificio=&fecha= abre un text/event-stream con los
+# cambios de ocupación de ese edificio y día. Un único difusor por proceso lee
+# el feed de cambios (despierta con el mismo aviso post-commit que /cambios y
+# re-consulta cada CAMBIOS_SONDEO_SEGUNDOS, así que también ve lo que escriben
+# otros workers) y reparte a los suscriptores del tópico (edificio, fecha):
+# - coalescing: cada suscripción guarda solo el último estado de cada
+#   (sala, turno) pendiente de enviar; varias escrituras sobre el mismo turno
+#   antes de que el cliente lea llegan como un solo delta;
+# - backpressure: el difusor nunca espera a un cliente. Si una suscripción
+#   acumula más de DISPONIBILIDAD_SSE_MAX_PENDIENTES turnos sin enviar, se
+#   descartan y se le manda `resync` para que vuelva a pedir /disponibilidad.
+# El difusor arranca con el primer suscriptor y se detiene con el último. El
+# evento `listo` se manda cuando el difusor ya sigue el feed: el cliente pide
+# /disponibilidad recién ahí y no pierde cambios entre la consulta y el stream.
+
+DISPONIBILIDAD_SSE_MAX_PENDIENTES = int(os.getenv("DISPONIBILIDAD_SSE_MAX_PENDIENTES", "256"))
+DISPONIBILIDAD_SSE_KEEPALIVE = float(os.getenv("DISPONIBILIDAD_SSE_KEEPALIVE", "15"))
+DISPONIBILIDAD_SSE_LOTE = 500
+
+
+class _Suscripcion:
+    __slots__ = ("pendientes", "desbordada", "evento")
+
+    def __init__(self):
+        self.pendientes: dict[tuple[str, int], dict[str, Any]] = {}
+        self.desbordada = False
+        self.evento = asyncio.Event()
+
+    def ofrecer(self, delta: dict[str, Any]) -> bool:
+        """Encola un delta; devuelve False si la suscripción quedó desbordada."""
+        if not self.desbordada:
+            # Un delta de retención ({retenido}) y uno de reserva del mismo
+            # turno se combinan en vez de pisarse.
+            clave = (delta["nombre_sala"], delta["id_turno"])
+            previo = self.pendientes.get(clave)
+            self.pendientes[clave] = delta if previo is None else {**previo, **delta}
+            if len(self.pendientes) > DISPONIBILIDAD_SSE_MAX_PENDIENTES:
+                self.pendientes.clear()
+                self.desbordada = True
+        self.evento.set()
+        return not self.desbordada
+
+    def resync(self) -> None:
+        self.pendientes.clear()
+        self.desbordada = True
+        self.evento.set()
+
+    def tomar(self) -> tuple[bool, list[dict[str, Any]]]:
+        """(desbordada, deltas pendientes) y deja la suscripción vacía."""
+        desbordada, deltas = self.desbordada, list(self.pendientes.values())
+        self.pendientes = {}
+        self.desbordada = False
+        self.evento.clear()
+        return desbordada, deltas
+
+
+def _ultimo_seq_cambios() -> int:
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT COALESCE(MAX(seq), 0) FROM cambio")
+        return cur.fetchone()[0]
+    finally:
+        conn.close()
+
+
+class _DifusorDisponibilidad:
+    def __init__(self):
+        self.topicos: dict[tuple[str, str], set[_Suscripcion]] = {}
+        self.tarea: asyncio.Task | None = None
+        self.listo = asyncio.Event()
+        self.estadisticas = {"deltas": 0, "resyncs": 0}
+        # (loop, evento) de la tarea en curso, para despertarla desde otros hilos.
+        self.registro: tuple[asyncio.AbstractEventLoop, asyncio.Event] | None = None
+
+    def despertar(self) -> None:
+        """Hace que el difusor publique ya las novedades de retenciones (desde cualquier hilo)."""
+        registro = self.registro
+        if registro is None:
+            return
+        try:
+            registro[0].call_soon_threadsafe(registro[1].set)
+        except RuntimeError:
+            # Loop ya cerrado.
+            pass
+
+    def suscribir(self, edificio: str, fecha: str) -> _Suscripcion:
+        sub = _Suscripcion()
+        self.topicos.setdefault((edificio, fecha), set()).add(sub)
+        if self.tarea is None or self.tarea.done():
+            self.listo = asyncio.Event()
+            self.tarea = asyncio.get_running_loop().create_task(self._seguir_feed(self.listo))
+        return sub
+
+    def desuscribir(self, edificio: str, fecha: str, sub: _Suscripcion) -> None:
+        subs = self.topicos.get((edificio, fecha))
+        if subs is not None:
+            subs.discard(sub)
+            if not subs:
+                del self.topicos[(edificio, fecha)]
+        if not self.topicos and self.tarea is not None:
+            self.tarea.cancel()
+            self.tarea = None
+
+    def suscriptores(self) -> int:
+        return sum(len(s) for s in self.topicos.values())
+
+    def publicar(self, cambio: dict[str, Any]) -> None:
+        if cambio["id_reserva"] is None or cambio["fecha"] is None:
+            return
+        subs = self.topicos.get((cambio["edificio"], cambio["fecha"].isoformat()))
+        if not subs:
+            return
+        delta = {
+            "nombre_sala": cambio["nombre_sala"],
+            "id_turno": cambio["id_turno"],
+            "id_reserva": cambio["id_reserva"],
+            "estado": cambio["estado"],
+            "reservado": cambio["estado"] == "activa",
+        }
+        for sub in subs:
+            if sub.ofrecer(delta):
+                self.estadisticas["deltas"] += 1
+
+    def publicar_retenciones(self) -> float | None:
+        """
+        Publica altas, liberaciones y vencimientos de retenciones. Devuelve
+        los segundos hasta el próximo vencimiento (None si no hay).
+        """
+        desbordada, novedades, proximo = _RETENCIONES.tomar_novedades()
+        if desbordada:
+            for subs in self.topicos.values():
+                for sub in subs:
+                    sub.resync()
+            return proximo
+        for (nombre_sala, edificio, fecha, id_turno), retenido in novedades.items():
+            subs = self.topicos.get((edificio, fecha.isoformat()))
+            if not subs:
+                continue
+            delta = {"nombre_sala": nombre_sala, "id_turno": id_turno, "retenido": retenido}
+            for sub in subs:
+                if sub.ofrecer(delta):
+                    self.estadisticas["deltas"] += 1
+        return proximo
+
+    async def _seguir_feed(self, listo: asyncio.Event) -> None:
+        registro = (asyncio.get_running_loop(), asyncio.Event())
+        self.registro = registro
+        with _CAMBIOS_ESPERAS_LOCK:
+            _CAMBIOS_ESPERAS.add(registro)
+        try:
+            since = None
+            while True:
+                registro[1].clear()
+                cambios: list[dict[str, Any]] = []
+                try:
+                    if since is None:
+                        since = await run_in_threadpool(_ultimo_seq_cambios)
+                        # Lo anterior a la suscripción ya lo trae /disponibilidad.
+                        _RETENCIONES.tomar_novedades()
+                        listo.set()
+                    else:
+                        cambios = await run_in_threadpool(_leer_cambios, since, DISPONIBILIDAD_SSE_LOTE)
+                except mysql.connector.Error:
+                    logger.exception("Difusor de disponibilidad: error leyendo el feed de cambios")
+                for cambio in cambios:
+                    self.publicar(cambio)
+                if cambios:
+                    since = cambios[-1]["seq"]
+                # Después del feed: la liberación de una retención consumida
+                # por una reserva se combina con el delta de esa reserva.
+                proximo = self.publicar_retenciones()
+                if len(cambios) < DISPONIBILIDAD_SSE_LOTE:
+                    espera = CAMBIOS_SONDEO_SEGUNDOS
+                    if proximo is not None:
+                        espera = max(min(espera, proximo), 0.05)
+                    try:
+                        await asyncio.wait_for(registro[1].wait(), timeout=espera)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            if self.registro is registro:
+                self.registro = None
+            with _CAMBIOS_ESPERAS_LOCK:
+                _CAMBIOS_ESPERAS.discard(registro)
+
+
+_DIFUSOR = _DifusorDisponibilidad()
+
+
+def _evento_sse(evento: str, datos: Any) -> str:
+    return f"event: {evento}\ndata: {json.dumps(datos, separators=(',', ':'))}\n\n"
+
+
+@app.get("/disponibilidad/stream")
+async def disponibilidad_stream(
+    edificio: str = Query(..., description="Edificio a seguir"),
+    fecha: date = Query(..., description="Día a seguir"),
+):
+    """Stream SSE de cambios de ocupación de (edificio, fecha).
+
+    Eventos: `listo` (suscripción activa: pedir /disponibilidad), `disponibilidad`
+    (`{"cambios": [...]}`, por turno `{nombre_sala, id_turno}` más
+    `id_reserva, estado, reservado` si cambió la reserva y/o `retenido` si
+    cambió la retención) y `resync` (se perdieron deltas: volver a pedir
+    /disponibilidad).
+    """
+    clave = (edificio, fecha.isoformat())
+
+    async def eventos():
+        sub = _DIFUSOR.suscribir(*clave)
+        try:
+            await _DIFUSOR.listo.wait()
+            yield "retry: 3000\n" + _evento_sse("listo", {"edificio": edificio, "fecha": clave[1]})
+            while True:
+                try:
+                    await asyncio.wait_for(sub.evento.wait(), timeout=DISPONIBILIDAD_SSE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                desbordada, deltas = sub.tomar()
+                if desbordada:
+                    _DIFUSOR.estadisticas["resyncs"] += 1
+                    yield _evento_sse("resync", {})
+                elif deltas:
+                    yield _evento_sse("disponibilidad", {"cambios": deltas})
+        finally:
+            _DIFUSOR.desuscribir(*clave, sub)
+
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ==========================
+#  TABLERO DE OCUPACIÓN
+# ==========================
+# GET /tablero/{edificio} alimenta las pantallas de cada edificio con el turno
+# actual y el siguiente de todas sus salas. Cada pantalla consulta por su
+# cuenta, así que la respuesta se arma una sola vez como snapshot inmutable
+# (JSON ya serializado + variantes gzip/brotli + ETag) y se sirve desde
+# memoria con _responder_activo, igual que los estáticos. El snapshot vence en
+# el próximo borde de turno (o a medianoche), a más tardar a los
+# TABLERO_TTL_SEGUNDOS (lo que escriben otros workers) y se descarta cuando
+# este proceso hace commit de un cambio de reservas en ese edificio
+# (_avisar_cambios). El armado es de a uno por edificio: los pedidos que
+# llegan mientras se arma esperan y se llevan el mismo snapshot.
+
+TABLERO_TTL_SEGUNDOS = float(os.getenv("TABLERO_TTL_SEGUNDOS", "10"))
+_ESTADOS_OCUPADA = ("activa", "finalizada")
+
+_TABLERO_LOCK = threading.Lock()
+_TABLERO: dict[str, dict[str, Any]] = {}
+# Locks de armado en franjas por hash del edificio (el nombre viene de la URL:
+# un dict de locks por edificio crecería con cada nombre inventado).
+_TABLERO_ARMADO = [threading.Lock() for _ in range(16)]
+# Generación por edificio (y una global para invalidar todo): se incrementa
+# en cada invalidación y un snapshot que se empezó a armar antes no se guarda
+# (pudo leer datos previos al commit).
+_TABLERO_GENERACION: dict[str, int] = {}
+_TABLERO_GENERACION_GLOBAL = 0
+_TABLERO_STATS = {"construidos": 0}
+
+
+def _invalidar_tableros(edificios: Iterable[str] | None = None) -> None:
+    global _TABLERO_GENERACION_GLOBAL
+    with _TABLERO_LOCK:
+        if edificios is None:
+            _TABLERO_GENERACION_GLOBAL += 1
+            _TABLERO.clear()
+            return
+        for edificio in edificios:
+            _TABLERO_GENERACION[edificio] = _TABLERO_GENERACION.get(edificio, 0) + 1
+            _TABLERO.pop(edificio, None)
+
+
+def _generacion_tablero(edificio: str) -> tuple[int, int]:
+    return _TABLERO_GENERACION_GLOBAL, _TABLERO_GENERACION.get(edificio, 0)
+
+
+def _segundos_del_dia(v) -> int:
+    return _parse_hms(_time_to_str(v))
+
+
+def _construir_tablero(edificio: str, ahora: datetime) -> dict[str, Any]:
+    hoy = ahora.date()
+    segundo = ahora.hour * 3600 + ahora.minute * 60 + ahora.second
+    conn = get_conn()
+    try:
+        cur = conn.cursor(dictionary=True)
+        cur.execute(
+            "SELECT nombre_sala, tipo_sala, capacidad FROM sala WHERE edificio = %s ORDER BY nombre_sala",
+            (edificio,),
+        )
+        salas = cur.fetchall()
+        if not salas:
+            cur.execute("SELECT 1 FROM edificio WHERE nombre_edificio = %s", (edificio,))
+            if cur.fetchone() is None:
+                raise HTTPException(status_code=404, detail=f"Edificio '{edificio}' no existe")
+        cur.execute("SELECT id_turno, hora_inicio, hora_fin FROM turno ORDER BY hora_inicio")
+        turnos = cur.fetchall()
+        cur.execute(
+            """
+            SELECT r.nombre_sala, r.id_turno, r.id_reserva, COUNT(rp.ci_participante) AS participantes
+            FROM reserva r
+            LEFT JOIN reserva_participante rp ON rp.id_reserva = r.id_reserva
+            WHERE r.edificio = %s AND r.fecha = %s AND r.estado IN (%s, %s)
+            GROUP BY r.nombre_sala, r.id_turno, r.id_reserva
+            """,
+            (edificio, hoy, *_ESTADOS_OCUPADA),
+        )
+        ocupadas = {(r["nombre_sala"], r["id_turno"]): r for r in cur.fetchall()}
+    finally:
+        conn.close()
+
+    actual = siguiente = None
+    bordes = []
+    for t in turnos:
+        inicio, fin = _segundos_del_dia(t["hora_inicio"]), _segundos_del_dia(t["hora_fin"])
+        bordes += [inicio, fin]
+        if inicio <= segundo < fin:
+            actual = t
+        elif inicio > segundo and siguiente is None:
+            siguiente = t
+    proximo_borde = min((b for b in bordes if b > segundo), default=24 * 3600)
+    vence = datetime.combine(hoy, time()) + timedelta(seconds=proximo_borde)
+
+    def turno(t):
+        return None if t is None else _row_to_turno(t)
+
+    def ocupacion(sala, t):
+        if t is None:
+            return None
+        r = ocupadas.get((sala, t["id_turno"]))
+        if r is None:
+            return {"ocupada": False, "id_reserva": None, "participantes": 0}
+        return {"ocupada": True, "id_reserva": r["id_reserva"], "participantes": int(r["participantes"])}
+
+    cuerpo = {
+        "edificio": edificio,
+        "fecha": hoy,
+        "actual": turno(actual),
+        "siguiente": turno(siguiente),
+        "vigente_hasta": vence,
+        "salas": [
+            {
+                "nombre_sala": s["nombre_sala"],
+                "tipo_sala": s["tipo_sala"],
+                "capacidad": s["capacidad"],
+                "actual": ocupacion(s["nombre_sala"], actual),
+                "siguiente": ocupacion(s["nombre_sala"], siguiente),
+            }
+            for s in salas
+        ],
+    }
+    contenido = JSONRapida(cuerpo).body
+    tipo = "application/json"
+    return {
+        "tipo": tipo,
+        "etag": f'"{hashlib.sha256(contenido).hexdigest()[:16]}"',
+        "variantes": _variantes(contenido, tipo),
+        "cache": _CACHE_REVALIDAR,
+        "vence": min(vence, ahora + timedelta(seconds=TABLERO_TTL_SEGUNDOS)),
+    }
+
+
+def _tablero(edificio: str) -> dict[str, Any]:
+    snapshot = _TABLERO.get(edificio)
+    if snapshot is not None and datetime.now() < snapshot["vence"]:
+        return snapshot
+    with _TABLERO_ARMADO[hash(edificio) % len(_TABLERO_ARMADO)]:
+        # Otro hilo pudo armarlo mientras se esperaba el lock.
+        with _TABLERO_LOCK:
+            snapshot = _TABLERO.get(edificio)
+            ahora = datetime.now()
+            if snapshot is not None and ahora < snapshot["vence"]:
+                return snapshot
+            generacion = _generacion_tablero(edificio)
+        snapshot = _construir_tablero(edificio, ahora)
+        with _TABLERO_LOCK:
+            _TABLERO_STATS["construidos"] += 1
+            if generacion == _generacion_tablero(edificio):
+                _TABLERO[edificio] = snapshot
+    return snapshot
+
+
+@app.get("/tablero/{edificio}")
+async def tablero(request: Request, edificio: str):
+    """Turno actual y siguiente de cada sala del edificio, para las pantallas.
+
+    Respuesta servida desde un snapshot en memoria, con ETag (If-None-Match
+    -> 304) y la variante gzip/brotli ya comprimida.
+    """
+    snapshot = _TABLERO.get(edificio)
+    if snapshot is None or datetime.now() >= snapshot["vence"]:
+        snapshot = await run_in_threadpool(_tablero, edificio)
+    return _responder_activo(request, snapshot)
+
+
+# ==========================
+#  CONTROL DE ADMISIÓN
+# ==========================
+# Dos defensas en proceso antes de llegar al handler:
+# - token bucket por CI (X-Actor-CI o actor del token) y por IP -> 429;
+# - tope de requests concurrentes por clase de endpoint -> 503.
+# Los reportes tienen además un umbral sobre el total en curso: con carga
+# alta se rechazan reportes antes que reservas. /health, /metrics, /static,
+# /cambios y /disponibilidad/stream (long-polling y SSE ocuparían un lugar
+# mientras esperan) no pasan por acá. /batch tampoco se cobra entero: cada
+# sub-request paga sus tokens y su lugar según su propia clase. El middleware
+# se registra antes que el de sesión, así que corre dentro de él y ve
+# request.state.actor.
+
+RATE_CI_POR_SEG = float(os.getenv("RATE_CI_POR_SEG", "10"))
+RATE_CI_RAFAGA = float(os.getenv("RATE_CI_RAFAGA", "20"))
+RATE_IP_POR_SEG = float(os.getenv("RATE_IP_POR_SEG", "30"))
+RATE_IP_RAFAGA = float(os.getenv("RATE_IP_RAFAGA", "60"))
+RATE_MAX_CLAVES = int(os.getenv("RATE_MAX_CLAVES", "50000"))
+ADMISION_CONFIAR_PROXY = os.getenv("ADMISION_CONFIAR_PROXY", "0") == "1"
+
+ADMISION_MAX_CONCURRENTES = {
+    "reportes": int(os.getenv("ADMISION_MAX_REPORTES", "8")),
+    "reservas": int(os.getenv("ADMISION_MAX_RESERVAS", "32")),
+    "admin": int(os.getenv("ADMISION_MAX_ADMIN", "4")),
+    "lecturas": int(os.getenv("ADMISION_MAX_LECTURAS", "32")),
+}
+# Con más de este total en curso, los reportes se rechazan aunque su clase tenga lugar.
+ADMISION_UMBRAL_REPORTES = int(os.getenv("ADMISION_UMBRAL_REPORTES", "24"))
+
+_RUTAS_SIN_ADMISION = ("/health", "/metrics", "/static/", "/cambios", "/disponibilidad/stream")
+_RUTA_BATCH = "/batch"
+
+
+class _BucketsRayados:
+    """Token buckets en N franjas, cada una con su lock y un máximo de claves (LRU)."""
+
+    def __init__(self, franjas: int = 16, max_claves: int = RATE_MAX_CLAVES):
+        self._franjas = [(threading.Lock(), OrderedDict()) for _ in range(franjas)]
+        self._max_por_franja = max(1, max_claves // franjas)
+
+    def tomar(self, clave: str, tasa: float, rafaga: float, ahora: float | None = None) -> float:
+        """Consume un token; devuelve 0 si se admite o los segundos a esperar."""
+        ahora = time_mod.monotonic() if ahora is None else ahora
+        lock, buckets = self._franjas[hash(clave) % len(self._franjas)]
+        with lock:
+            estado = buckets.get(clave)
+            if estado is None:
+                if len(buckets) >= self._max_por_franja:
+                    buckets.popitem(last=False)
+                estado = buckets[clave] = [rafaga, ahora]
+            else:
+                buckets.move_to_end(clave)
+                estado[0] = min(rafaga, estado[0] + (ahora - estado[1]) * tasa)
+                estado[1] = ahora
+            if estado[0] >= 1:
+                estado[0] -= 1
+                return 0.0
+            return (1 - estado[0]) / tasa
+
+    def __len__(self) -> int:
+        return sum(len(b) for _, b in self._franjas)
+
+
+def _clase_endpoint(metodo: str, ruta: str) -> str:
+    if ruta.rstrip("/") == _RUTA_BATCH:
+        # Solo contiene GETs; la admisión lo cobra por sub-request (ver BATCH).
+        return "lecturas"
+    if ruta.startswith("/reportes"):
+        return "reportes"
+    if ruta.startswith("/admin"):
+        return "admin"
+    if metodo != "GET" or ruta.startswith("/disponibilidad"):
+        return "reservas"
+    return "lecturas"
+
+
+class _AdmisionMiddleware:
+    def __init__(
+        self,
+        app,
+        tasa_ci: float = RATE_CI_POR_SEG,
+        rafaga_ci: float = RATE_CI_RAFAGA,
+        tasa_ip: float = RATE_IP_POR_SEG,
+        rafaga_ip: float = RATE_IP_RAFAGA,
+        max_concurrentes: dict[str, int] | None = None,
+        umbral_reportes: int = ADMISION_UMBRAL_REPORTES,
+    ):
+        self.app = app
+        self.tasa_ci, self.rafaga_ci = tasa_ci, rafaga_ci
+        self.tasa_ip, self.rafaga_ip = tasa_ip, rafaga_ip
+        self.max_concurrentes = max_concurrentes or ADMISION_MAX_CONCURRENTES
+        self.umbral_reportes = umbral_reportes
+        self.buckets = _BucketsRayados()
+        # Solo se tocan desde el event loop: no necesitan lock.
+        self.en_curso = {clase: 0 for clase in self.max_concurrentes}
+        self.rechazos = {"429": 0, "503": 0}
+        _ADMISION_INSTANCIAS.append(self)
+
+    def _identidades(self, scope) -> list[tuple[str, float, float]]:
+        claves = []
+        actor = (scope.get("state") or {}).get("actor")
+        ci = actor["ci"] if actor else None
+        ip = scope["client"][0] if scope.get("client") else None
+        for nombre, valor in scope["headers"]:
+            if nombre == b"x-actor-ci" and ci is None:
+                ci = CI_CLEAN_RE.sub("", valor.decode("latin-1")) or None
+            elif nombre == b"x-forwarded-for" and ADMISION_CONFIAR_PROXY:
+                ip = valor.decode("latin-1").split(",")[0].strip() or ip
+        if ci and self.tasa_ci > 0:
+            claves.append((f"ci:{ci}", self.tasa_ci, self.rafaga_ci))
+        if ip and self.tasa_ip > 0:
+            claves.append((f"ip:{ip}", self.tasa_ip, self.rafaga_ip))
+        return claves
+
+    def ocupar(self, scope, clase: str) -> tuple[int, float, str] | None:
+        """
+        Cobra los tokens del request y toma un lugar de `clase`. Devuelve
+        (status, espera, detalle) si se rechaza; si admite, el llamador
+        debe devolver el lugar con liberar(clase).
+        """
+        for clave, tasa, rafaga in self._identidades(scope):
+            espera = self.buckets.tomar(clave, tasa, rafaga)
+            if espera:
+                self.rechazos["429"] += 1
+                return 429, espera, "Demasiadas solicitudes, intente más tarde"
+
+        total = sum(self.en_curso.values())
+        if self.en_curso[clase] >= self.max_concurrentes[clase] or (
+            clase == "reportes" and total >= self.umbral_reportes
+        ):
+            self.rechazos["503"] += 1
+            return 503, 1, "Servicio saturado, intente nuevamente en unos segundos"
+        self.en_curso[clase] += 1
+        return None
+
+    def liberar(self, clase: str) -> None:
+        self.en_curso[clase] -= 1
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(_RUTAS_SIN_ADMISION):
+            return await self.app(scope, receive, send)
+        if scope["path"].rstrip("/") == _RUTA_BATCH:
+            # El batch se admite por contenido: cada sub-request cobra sus
+            # tokens y su lugar según su propia clase.
+            scope.setdefault("state", {})["admision"] = self
+            return await self.app(scope, receive, send)
+
+        clase = _clase_endpoint(scope["method"], scope["path"])
+        rechazo = self.ocupar(scope, clase)
+        if rechazo is not None:
+            status, espera, detalle = rechazo
+            resp = JSONResponse(
+                {"detail": detalle},
+                status_code=status,
+                headers={"Retry-After": str(max(1, int(espera + 0.999)))},
+            )
+            return await resp(scope, receive, send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.liberar(clase)
+
+
+_ADMISION_INSTANCIAS: list[_AdmisionMiddleware] = []
+
+app.add_middleware(_AdmisionMiddleware)
+
+
+@app.get("/admin/admision")
+def estado_admision(x_actor_ci: str | None = Header(None, alias="X-Actor-CI")):
+    """Requests en curso por clase, rechazos acumulados y claves con bucket."""
+    _requerir_admin(x_actor_ci)
+    return [
+        {
+            "en_curso": dict(m.en_curso),
+            "max_concurrentes": dict(m.max_concurrentes),
+            "rechazos": dict(m.rechazos),
+            "claves": len(m.buckets),
+        }
+        for m in _ADMISION_INSTANCIAS
+    ]
+
+
+# ==========================
+#  BATCH DE CONSULTAS
+# ==========================
+# POST /batch ejecuta varios GET de la propia API en un solo round trip.
+# Cada sub-request se despacha directo al router, con BATCH_CONCURRENCIA en
+# paralelo sobre el pool de conexiones. No vuelve a pasar por la pila de
+# middlewares, así que _sub_request hace a mano lo que corresponde:
+# - admisión: tokens y lugar de la clase de la sub-ruta (429/503 por ítem);
+# - métricas HTTP con la plantilla de la sub-ruta;
+# - estadísticas SQL propias (log de lentas y N+1 con la sub-ruta), que se
+#   suman a las del batch para sus headers.
+# Compresión y sesión no hacen falta: el cuerpo va dentro del JSON del batch
+# y el actor del token se hereda en el state.
+
+BATCH_MAX = int(os.getenv("BATCH_MAX", "30"))
+BATCH_CONCURRENCIA = int(os.getenv("BATCH_CONCURRENCIA", "6"))
+_HEADERS_HEREDADOS = (b"authorization", b"x-actor-ci", b"x_actor_ci", b"accept-language")
+
+
+class BatchItem(BaseModel):
+    method: Literal["GET"] = "GET"
+    url: str = Field(..., description="Ruta relativa con query string, p. ej. /salas?edificio=Sede%20Central")
+
+    @field_validator("url")
+    @classmethod
+    def _val_url(cls, v):
+        if not v.startswith("/") or v.startswith("//"):
+            raise ValueError("url debe ser una ruta relativa de la API")
+        ruta = v.split("?", 1)[0]
+        # Streams y long-polling dejarían al batch colgado esperando.
+        if ruta.rstrip("/") == _RUTA_BATCH or ruta.startswith(_RUTAS_SIN_ADMISION):
+            raise ValueError(f"{ruta} no se puede pedir dentro de un batch")
+        return v
+
+
+class BatchIn(BaseModel):
+    requests: List[BatchItem] = Field(..., min_length=1)
+
+
+async def _sub_request(request: Request, url: str) -> dict[str, Any]:
+    ruta, _, query = url.partition("?")
+    scope = {
+        **{k: v for k, v in request.scope.items() if k not in ("headers", "path", "raw_path", "query_string", "method", "route", "endpoint", "path_params")},
+        "method": "GET",
+        "path": ruta,
+        "raw_path": ruta.encode(),
+        "query_string": query.encode(),
+        "headers": [(k, v) for k, v in request.scope["headers"] if k in _HEADERS_HEREDADOS],
+        "state": dict(request.scope.get("state") or {}),
+    }
+    estado = 500
+    partes: list[bytes] = []
+    tipo = b""
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(mensaje):
+        nonlocal estado, tipo
+        if mensaje["type"] == "http.response.start":
+            estado = mensaje["status"]
+            tipo = next((v for k, v in mensaje.get("headers", []) if k.lower() == b"content-type"), b"")
+        elif mensaje["type"] == "http.response.body":
+            partes.append(mensaje.get("body", b""))
+
+    admision: _AdmisionMiddleware | None = scope["state"].get("admision")
+    clase = _clase_endpoint("GET", ruta)
+    if admision is not None:
+        rechazo = admision.ocupar(scope, clase)
+        if rechazo is not None:
+            return {"url": url, "status": rechazo[0], "body": {"detail": rechazo[2]}}
+    padre = _SQL_ACTUAL.get()
+    estadisticas = _EstadisticasSQL(ruta)
+    ctx = _SQL_ACTUAL.set(estadisticas)
+    inicio = time_mod.perf_counter()
+    try:
+        await app.router(scope, receive, send)
+    except StarletteHTTPException as e:
+        # Errores del router (404/405) que normalmente resuelve ExceptionMiddleware.
+        estado = e.status_code
+        return {"url": url, "status": e.status_code, "body": {"detail": e.detail}}
+    finally:
+        _SQL_ACTUAL.reset(ctx)
+        if admision is not None:
+            admision.liberar(clase)
+        _METRICAS.observar("GET", _METRICAS.plantilla(scope), estado, time_mod.perf_counter() - inicio)
+        estadisticas.avisar_n_mas_1("GET")
+        if padre is not None:
+            padre.absorber(estadisticas)
+    cuerpo = b"".join(partes)
+    if tipo.startswith(b"application/json") and cuerpo:
+        contenido: Any = json.loads(cuerpo)
+    else:
+        contenido = cuerpo.decode("utf-8", errors="replace")
+    return {"url": url, "status": estado, "body": contenido}
+
+
+@app.post("/batch")
+async def batch(payload: BatchIn, request: Request):
+    """
+    Ejecuta varios GET en paralelo y devuelve todas las respuestas juntas,
+    en el mismo orden: `{"responses": [{"url", "status", "body"}, ...]}`.
+    Un sub-request que falla no afecta a los demás.
+    """
+    if len(payload.requests) > BATCH_MAX:
+        raise HTTPException(status_code=422, detail=f"Máximo {BATCH_MAX} sub-requests por batch")
+    semaforo = asyncio.Semaphore(BATCH_CONCURRENCIA)
+
+    async def ejecutar(item: BatchItem) -> dict[str, Any]:
+        async with semaforo:
+            try:
+                return await _sub_request(request, item.url)
+            except Exception as e:
+                logger.exception("Sub-request de batch falló", extra={"url": item.url})
+                return {"url": item.url, "status": 500, "body": {"detail": str(e)}}
+
+    respuestas = await asyncio.gather(*(ejecutar(item) for item in payload.requests))
+    return JSONRapida({"responses": respuestas})
+
+
+# ==========================
+#  AUTH LÓGICO
+# ==========================
+
+
+# Tokens de sesión firmados (HMAC-SHA256): `v1.<payload>.<firma>` en base64url.
+# El payload lleva los datos del participante, la expiración, un jti y la
+# época de clave. Se verifican sin ir a la base. Revocación:
+# - logout agrega el jti a una denylist en memoria hasta que expire;
+# - rotar la época (POST /auth/rotar o SESSION_EPOCH) invalida todos los
+#   tokens emitidos antes, porque la clave de firma se deriva de la época.
+# Denylist y época rotada en caliente son por proceso.
+
+SESSION_SECRET = os.getenv("SESSION_SECRET", "").encode() or secrets.token_bytes(32)
+if not os.getenv("SESSION_SECRET"):
+    logger.warning("SESSION_SECRET no definido: los tokens no sobreviven a un reinicio")
+SESSION_TTL_MINUTOS = int(os.getenv("SESSION_TTL_MINUTOS", "480"))
+SESSION_DENYLIST_MAX = int(os.getenv("SESSION_DENYLIST_MAX", "10000"))
+
+_SESION_LOCK = threading.Lock()
+_SESION_EPOCA = {"epoca": int(os.getenv("SESSION_EPOCH", "1")), "clave": b""}
+_TOKENS_REVOCADOS: dict[str, int] = {}
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _unb64(texto: str) -> bytes:
+    return base64.urlsafe_b64decode(texto + "=" * (-len(texto) % 4))
+
+
+def _clave_epoca(epoca: int) -> bytes:
+    return hmac.new(SESSION_SECRET, f"epoca:{epoca}".encode(), hashlib.sha256).digest()
+
+
+_SESION_EPOCA["clave"] = _clave_epoca(_SESION_EPOCA["epoca"])
+
+
+def _nueva_epoca() -> int:
+    # Llamar con _SESION_LOCK tomado.
+    _SESION_EPOCA["epoca"] += 1
+    _SESION_EPOCA["clave"] = _clave_epoca(_SESION_EPOCA["epoca"])
+    _TOKENS_REVOCADOS.clear()
+    return _SESION_EPOCA["epoca"]
+
+
+def rotar_epoca_sesion() -> int:
+    with _SESION_LOCK:
+        return _nueva_epoca()
+
+
+def emitir_token(row: dict[str, Any]) -> tuple[str, datetime]:
+    expira = datetime.now().replace(microsecond=0) + timedelta(minutes=SESSION_TTL_MINUTOS)
+    payload = {
+        "ci": row["ci"],
+        "nom": row["nombre"],
+        "ape": row["apellido"],
+        "eml": row["email"],
+        "tip": row["tipo_participante"],
+        "adm": bool(row.get("es_admin")),
+        "exp": int(expira.timestamp()),
+        "ep": _SESION_EPOCA["epoca"],
+        "jti": _b64(secrets.token_bytes(9)),
+    }
+    cuerpo = "v1." + _b64(json.dumps(payload, separators=(",", ":")).encode())
+    firma = hmac.new(_SESION_EPOCA["clave"], cuerpo.encode(), hashlib.sha256).digest()
+    return f"{cuerpo}.{_b64(firma)}", expira
+
+
+def verificar_token(token: str) -> dict[str, Any]:
+    """Valida firma, época, expiración y denylist; devuelve el actor."""
+    try:
+        version, payload_b64, firma_b64 = token.split(".")
+        if version != "v1":
+            raise ValueError
+        esperada = hmac.new(_SESION_EPOCA["clave"], f"v1.{payload_b64}".encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(esperada, _unb64(firma_b64)):
+            raise ValueError
+        payload = json.loads(_unb64(payload_b64))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=401, detail="Token de sesión inválido")
+    if payload.get("ep") != _SESION_EPOCA["epoca"]:
+        raise HTTPException(status_code=401, detail="Token de sesión inválido")
+    if payload.get("exp", 0) <= time_mod.time():
+        raise HTTPException(status_code=401, detail="La sesión expiró")
+    if payload.get("jti") in _TOKENS_REVOCADOS:
+        raise HTTPException(status_code=401, detail="La sesión fue cerrada")
+    return {
+        "ci": payload["ci"],
+        "nombre": payload["nom"],
+        "apellido": payload["ape"],
+        "email": payload["eml"],
+        "tipo_participante": payload["tip"],
+        "es_admin": bool(payload["adm"]),
+        "exp": payload["exp"],
+        "jti": payload["jti"],
+    }
+
+
+def revocar_token(actor: dict[str, Any]) -> None:
+    with _SESION_LOCK:
+        if len(_TOKENS_REVOCADOS) >= SESSION_DENYLIST_MAX:
+            ahora = time_mod.time()
+            for jti, exp in list(_TOKENS_REVOCADOS.items()):
+                if exp <= ahora:
+                    del _TOKENS_REVOCADOS[jti]
+        if len(_TOKENS_REVOCADOS) >= SESSION_DENYLIST_MAX:
+            # Sin lugar para otra revocación: se invalida todo rotando la época.
+            logger.warning("Denylist de sesiones llena: se rota la época de clave")
+            _nueva_epoca()
+            return
+        _TOKENS_REVOCADOS[actor["jti"]] = actor["exp"]
+
+
+class _SesionMiddleware:
+    """Verifica `Authorization: Bearer <token>` y deja el actor en request.state.actor."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        token = None
+        for nombre, valor in scope["headers"]:
+            if nombre == b"authorization":
+                esquema, _, resto = valor.decode("latin-1").partition(" ")
+                if esquema.lower() == "bearer" and resto.strip():
+                    token = resto.strip()
+                break
+        if token is None:
+            return await self.app(scope, receive, send)
+        try:
+            actor = verificar_token(token)
+        except HTTPException as e:
+            resp = JSONResponse({"detail": e.detail}, status_code=401, headers={"WWW-Authenticate": "Bearer"})
+            return await resp(scope, receive, send)
+        scope.setdefault("state", {})["actor"] = actor
+        ctx = _ACTOR_ACTUAL.set(actor)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _ACTOR_ACTUAL.reset(ctx)
+
 
+app.add_middleware(_SesionMiddleware)
 
-@app.post("/auth/login", response_model=SesionOut)
+
+@app.post("/auth/login", response_model=LoginOut)
 def login(payload: LoginPayload):
     ci = normalize_ci(payload.ci)
     conn = get_conn()
@@ -1764,7 +5114,8 @@ def login(payload: LoginPayload):
         if not row:
             raise HTTPException(status_code=404, detail="Participante no encontrado")
         logger.info("Login exitoso", extra={"ci": ci, "es_admin": row.get("es_admin")})
-        return row
+        token, expira = emitir_token(row)
+        return {**row, "token": token, "expira": expira}
     finally:
         conn.close()
 
@@ -1774,6 +5125,9 @@ def auth_me(
     ci: str | None = Query(None, description="CI del actor", alias="ci"),
     x_actor_ci: str | None = Header(None, convert_underscores=False),
 ):
+    actor = _ACTOR_ACTUAL.get()
+    if actor is not None:
+        return actor
     ci = ci or x_actor_ci
     if ci is None:
         raise HTTPException(status_code=422, detail="Debe indicar CI")
@@ -1788,11 +5142,234 @@ def auth_me(
     finally:
         conn.close()
 
+
+@app.post("/auth/logout")
+def logout():
+    """Revoca el token de sesión con el que se hace el request."""
+    actor = _ACTOR_ACTUAL.get()
+    if actor is None:
+        raise HTTPException(status_code=401, detail="Se requiere un token de sesión")
+    revocar_token(actor)
+    return {"detail": "Sesión cerrada"}
+
+
+@app.post("/auth/rotar")
+def rotar_sesiones(x_actor_ci: str | None = Header(None, alias="X-Actor-CI")):
+    """Invalida todos los tokens emitidos rotando la época de clave (solo admin)."""
+    _requerir_admin(x_actor_ci)
+    return {"epoca": rotar_epoca_sesion()}
+
+
+# ==========================
+#  MÉTRICAS (PROMETHEUS)
+# ==========================
+# GET /metrics expone en formato texto de Prometheus:
+# - requests y latencia (histograma) por método, plantilla de ruta y status;
+# - requests en curso por clase de endpoint;
+# - saturación del threadpool de anyio (donde corren los endpoints síncronos);
+# - pool de conexiones MySQL, admisión y barrido de no-show.
+# El middleware es el más externo (se registra después del de sesión), así
+# que también cuenta los 401/429/503 que cortan los middlewares internos.
+# Los contadores solo se tocan desde el event loop, sin locks: cada worker
+# de uvicorn tiene los suyos y Prometheus los agrega por instancia.
+
+METRICAS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_SIN_RUTA = "<sin_ruta>"
+_METODOS_HTTP = frozenset({"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"})
+
+
+class _MetricasHTTP:
+    def __init__(self, buckets: tuple[float, ...] = METRICAS_BUCKETS):
+        self.buckets = buckets
+        # (método, ruta, status) -> [cuentas por bucket..., +Inf, suma]
+        self.series: dict[tuple[str, str, str], list[float]] = {}
+        self.en_curso = {clase: 0 for clase in ADMISION_MAX_CONCURRENTES}
+        self._rutas: dict[Any, list] = {}
+        self._n_rutas = -1
+
+    def observar(self, metodo: str, ruta: str, status: int, segundos: float) -> None:
+        clave = (metodo, ruta, str(status))
+        serie = self.series.get(clave)
+        if serie is None:
+            serie = self.series[clave] = [0] * (len(self.buckets) + 2)
+            serie[-1] = 0.0
+        serie[bisect.bisect_left(self.buckets, segundos)] += 1
+        serie[-1] += segundos
+
+    def plantilla(self, scope) -> str:
+        """Plantilla de la ruta (`/reservas/{id_reserva}`), no el path concreto."""
+        rutas = app.router.routes
+        if len(rutas) != self._n_rutas:
+            self._rutas = {}
+            for r in rutas:
+                if getattr(r, "endpoint", None) is not None:
+                    self._rutas.setdefault(r.endpoint, []).append(r)
+            self._n_rutas = len(rutas)
+        endpoint = scope.get("endpoint")
+        candidatas = self._rutas.get(endpoint) if endpoint is not None else None
+        if candidatas and len(candidatas) == 1:
+            return candidatas[0].path
+        # Endpoint compartido por varias rutas, o request cortado antes del router
+        # (429/503/401): se resuelve contra las rutas.
+        for r in candidatas or rutas:
+            if getattr(r, "path_regex", None) is not None and r.path_regex.match(scope["path"]):
+                return r.path
+        return _SIN_RUTA
+
+
+_METRICAS = _MetricasHTTP()
+
+
+class _MetricasMiddleware:
+    def __init__(self, app, metricas: _MetricasHTTP = _METRICAS):
+        self.app = app
+        self.metricas = metricas
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = 500
+        metodo = scope["method"] if scope["method"] in _METODOS_HTTP else "OTRO"
+        clase = _clase_endpoint(metodo, scope["path"])
+
+        async def enviar(mensaje):
+            nonlocal status
+            if mensaje["type"] == "http.response.start":
+                status = mensaje["status"]
+            await send(mensaje)
+
+        inicio = time_mod.perf_counter()
+        self.metricas.en_curso[clase] += 1
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            self.metricas.en_curso[clase] -= 1
+            self.metricas.observar(
+                metodo, self.metricas.plantilla(scope), status, time_mod.perf_counter() - inicio
+            )
+
+
+app.add_middleware(_MetricasMiddleware)
+
+
+def _etiquetas(**kw) -> str:
+    pares = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in kw.items()
+    )
+    return "{" + pares + "}" if pares else ""
+
+
+def _texto_metricas(metricas: _MetricasHTTP, threadpool: dict[str, int] | None = None) -> str:
+    lineas: list[str] = []
+
+    def familia(nombre: str, tipo: str, ayuda: str, muestras) -> None:
+        lineas.append(f"# HELP {nombre} {ayuda}")
+        lineas.append(f"# TYPE {nombre} {tipo}")
+        for sufijo, etiquetas, valor in muestras:
+            valor = valor if isinstance(valor, int) else repr(float(valor))
+            lineas.append(f"{nombre}{sufijo}{_etiquetas(**etiquetas)} {valor}")
+
+    series = sorted(metricas.series.items())
+    familia(
+        "salas_http_requests_total",
+        "counter",
+        "Requests HTTP atendidos.",
+        [("", {"method": m, "route": r, "status": s}, sum(v[:-1])) for (m, r, s), v in series],
+    )
+    histograma = []
+    for (m, r, s), v in series:
+        acumulado = 0
+        for limite, cuenta in zip((*metricas.buckets, "+Inf"), v[:-1]):
+            acumulado += cuenta
+            le = limite if isinstance(limite, str) else f"{limite:g}"
+            histograma.append(("_bucket", {"method": m, "route": r, "status": s, "le": le}, acumulado))
+        histograma.append(("_sum", {"method": m, "route": r, "status": s}, v[-1]))
+        histograma.append(("_count", {"method": m, "route": r, "status": s}, acumulado))
+    familia(
+        "salas_http_request_duration_seconds",
+        "histogram",
+        "Latencia de los requests HTTP, de punta a punta en el proceso.",
+        histograma,
+    )
+    familia(
+        "salas_http_requests_in_flight",
+        "gauge",
+        "Requests en curso por clase de endpoint.",
+        [("", {"clase": c}, n) for c, n in sorted(metricas.en_curso.items())],
+    )
+
+    if threadpool is not None:
+        familia("salas_threadpool_tokens", "gauge", "Hilos disponibles para endpoints síncronos.",
+                [("", {}, threadpool["total"])])
+        familia("salas_threadpool_tokens_in_use", "gauge", "Hilos ocupados.",
+                [("", {}, threadpool["ocupados"])])
+        familia("salas_threadpool_tasks_waiting", "gauge", "Tareas esperando un hilo libre.",
+                [("", {}, threadpool["esperando"])])
+
+    pool = _BACKEND.pool
+    if pool is not None:
+        cola = getattr(pool, "_cnx_queue", None)
+        familia("salas_db_pool_size", "gauge", "Tamaño del pool de conexiones MySQL.",
+                [("", {}, pool.pool_size)])
+        if cola is not None:
+            familia("salas_db_pool_idle", "gauge", "Conexiones libres en el pool.",
+                    [("", {}, cola.qsize())])
+    familia(
+        "salas_db_connections_total",
+        "counter",
+        "Conexiones entregadas por get_conn, del pool o directas (pool agotado o desactivado).",
+        [("", {"origen": origen}, n) for origen, n in sorted(_BACKEND.estadisticas.items())],
+    )
+
+    familia(
+        "salas_admission_rejected_total",
+        "counter",
+        "Requests rechazados por el control de admisión.",
+        [
+            ("", {"status": status}, sum(m.rechazos[status] for m in _ADMISION_INSTANCIAS))
+            for status in ("429", "503")
+        ],
+    )
+    familia("salas_no_show_runs_total", "counter", "Corridas del barrido de no-show.",
+            [("", {}, _NO_SHOW_STATS["corridas"])])
+    familia("salas_no_show_marked_total", "counter", "Reservas marcadas sin_asistencia por el barrido.",
+            [("", {}, _NO_SHOW_STATS["reservas_marcadas"])])
+    familia("salas_tablero_snapshots_built_total", "counter", "Snapshots de /tablero armados.",
+            [("", {}, _TABLERO_STATS["construidos"])])
+    familia("salas_retenciones_activas", "gauge", "Retenciones de turno vigentes en este proceso.",
+            [("", {}, _RETENCIONES.activas())])
+    familia("salas_disponibilidad_sse_subscribers", "gauge", "Clientes suscriptos a /disponibilidad/stream.",
+            [("", {}, _DIFUSOR.suscriptores())])
+    familia("salas_disponibilidad_sse_resyncs_total", "counter",
+            "Suscripciones desbordadas a las que se mandó resync.",
+            [("", {}, _DIFUSOR.estadisticas["resyncs"])])
+    return "\n".join(lineas) + "\n"
+
+
+def _estado_threadpool() -> dict[str, int]:
+    limitador = anyio.to_thread.current_default_thread_limiter()
+    return {
+        "total": int(limitador.total_tokens),
+        "ocupados": limitador.borrowed_tokens,
+        "esperando": limitador.statistics().tasks_waiting,
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metricas():
+    """Métricas del proceso en formato de exposición de Prometheus."""
+    return Response(
+        _texto_metricas(_METRICAS, _estado_threadpool()),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
 # ==========================
 #  PARTICIPANTES - ABM
 # ==========================
 
-@app.get("/participantes", response_model=List[ParticipanteBase])
+@_get_confiable("/participantes", response_model=List[ParticipanteBase])
 def listar_participantes():
     """
     Lista todos los participantes.
@@ -1882,6 +5459,257 @@ def crear_participante(p: ParticipanteCreate):
         conn.close()
 
 
+# --------- Importación masiva ---------
+# El cuerpo se lee como stream (CSV con encabezado o NDJSON, un registro por
+# línea), cada fila pasa por ParticipanteCreate y se escribe en INSERTs
+# multi-fila de IMPORT_CHUNK filas con upsert por CI. El reporte de errores
+# por línea se devuelve como NDJSON al terminar de leer la entrada: Starlette
+# no permite seguir leyendo el request una vez que empezó la respuesta.
+
+IMPORT_CHUNK = int(os.getenv("IMPORT_CHUNK", "1000"))
+
+
+def _formato_import(formato: str | None, content_type: str | None) -> str:
+    if formato:
+        return formato
+    ct = (content_type or "").lower()
+    if "csv" in ct:
+        return "csv"
+    if "json" in ct:
+        return "ndjson"
+    raise HTTPException(
+        status_code=415,
+        detail="Formato no soportado: use text/csv o application/x-ndjson (o ?formato=)",
+    )
+
+
+async def _lineas_stream(request: Request) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pendiente = ""
+    async for bloque in request.stream():
+        pendiente += decoder.decode(bloque)
+        *lineas, pendiente = pendiente.split("\n")
+        for linea in lineas:
+            yield linea.rstrip("\r")
+    pendiente += decoder.decode(b"", final=True)
+    if pendiente:
+        yield pendiente.rstrip("\r")
+
+
+async def _filas_stream(request: Request, formato: str) -> AsyncIterator[tuple[int, dict | None, str | None]]:
+    """Devuelve (número de línea, fila, error de parseo) por cada registro no vacío."""
+    encabezado: list[str] | None = None
+    numero = 0
+    async for linea in _lineas_stream(request):
+        numero += 1
+        if not linea.strip():
+            continue
+        if formato == "ndjson":
+            try:
+                fila = json.loads(linea)
+            except ValueError as e:
+                yield numero, None, f"JSON inválido: {e}"
+                continue
+            if not isinstance(fila, dict):
+                yield numero, None, "Se esperaba un objeto JSON"
+                continue
+            yield numero, fila, None
+            continue
+
+        valores = next(csv.reader([linea]))
+        if encabezado is None:
+            encabezado = [v.strip().lower() for v in valores]
+            continue
+        if len(valores) != len(encabezado):
+            yield numero, None, f"Se esperaban {len(encabezado)} columnas y hay {len(valores)}"
+            continue
+        yield numero, dict(zip(encabezado, (v.strip() for v in valores))), None
+
+
+def _error_validacion(exc: Exception) -> str:
+    if isinstance(exc, HTTPException):
+        return str(exc.detail)
+    if isinstance(exc, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(x) for x in err['loc'])}: {err['msg']}" for err in exc.errors()
+        )
+    return str(exc)
+
+
+def _upsert_participantes(conn, filas: list[tuple[int, ParticipanteCreate]]) -> dict[str, Any]:
+    """Escribe un chunk de participantes validados con un único INSERT ... ON DUPLICATE KEY UPDATE.
+
+    Antes del INSERT se descartan las filas cuyo email ya pertenece a otra CI
+    (en la base o más arriba en el mismo chunk): el upsert por la clave única
+    de email pisaría los datos de ese otro participante.
+    """
+    errores: list[dict[str, Any]] = []
+    if not filas:
+        return {"insertadas": 0, "actualizadas": 0, "errores": errores}
+
+    cur = conn.cursor()
+    cis = list({p.ci for _, p in filas})
+    emails = list({p.email.lower() for _, p in filas})
+    cur.execute(
+        f"""
+        SELECT ci, email
+        FROM participante
+        WHERE ci IN ({",".join(["%s"] * len(cis))})
+           OR email IN ({",".join(["%s"] * len(emails))})
+        """,
+        (*cis, *emails),
+    )
+    existentes: set[str] = set()
+    duenio_email: dict[str, str] = {}
+    for ci, email in cur.fetchall():
+        if ci in cis:
+            existentes.add(ci)
+        duenio_email[email.lower()] = ci
+
+    # La última aparición de una CI en el chunk es la que queda.
+    por_ci: dict[str, tuple[int, ParticipanteCreate]] = {}
+    for linea, p in filas:
+        email = p.email.lower()
+        duenio = duenio_email.get(email)
+        if duenio and duenio != p.ci:
+            errores.append({"linea": linea, "ci": p.ci, "error": f"El email ya pertenece a la CI {duenio}"})
+            continue
+        duenio_email[email] = p.ci
+        por_ci.pop(p.ci, None)
+        por_ci[p.ci] = (linea, p)
+
+    if por_ci:
+        valores = [
+            (p.ci, p.nombre, p.apellido, p.email, p.tipo_participante) for _, p in por_ci.values()
+        ]
+        conn.start_transaction()
+        try:
+            # mysql.connector reescribe executemany de un INSERT como un único
+            # INSERT multi-fila (conservando el ON DUPLICATE KEY UPDATE).
+            cur.executemany(
+                """
+                INSERT INTO participante (ci, nombre, apellido, email, tipo_participante)
+                VALUES (%s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                  nombre = VALUES(nombre),
+                  apellido = VALUES(apellido),
+                  email = VALUES(email),
+                  tipo_participante = VALUES(tipo_participante)
+                """,
+                valores,
+            )
+            conn.commit()
+        except mysql.connector.Error as e:
+            conn.rollback()
+            if e.errno != 1062:
+                raise
+            # Carrera con otra escritura: se reintenta fila a fila para
+            # atribuir el conflicto a la línea correcta.
+            return _upsert_participantes_fila_a_fila(conn, list(por_ci.values()), errores, existentes)
+
+    insertadas = sum(1 for ci in por_ci if ci not in existentes)
+    return {"insertadas": insertadas, "actualizadas": len(por_ci) - insertadas, "errores": errores}
+
+
+def _upsert_participantes_fila_a_fila(conn, filas, errores, existentes) -> dict[str, Any]:
+    cur = conn.cursor()
+    insertadas = actualizadas = 0
+    for linea, p in filas:
+        try:
+            cur.execute(
+                """
+                INSERT INTO participante (ci, nombre, apellido, email, tipo_participante)
+                VALUES (%s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                  nombre = VALUES(nombre),
+                  apellido = VALUES(apellido),
+                  email = VALUES(email),
+                  tipo_participante = VALUES(tipo_participante)
+                """,
+                (p.ci, p.nombre, p.apellido, p.email, p.tipo_participante),
+            )
+        except mysql.connector.Error as e:
+            if e.errno != 1062:
+                raise
+            errores.append({"linea": linea, "ci": p.ci, "error": "Email duplicado con otro participante"})
+            continue
+        if p.ci in existentes:
+            actualizadas += 1
+        else:
+            insertadas += 1
+    return {"insertadas": insertadas, "actualizadas": actualizadas, "errores": errores}
+
+
+@app.post("/participantes/import")
+async def importar_participantes(
+    request: Request,
+    formato: Literal["csv", "ndjson"] | None = Query(None, description="Si se omite se deduce del Content-Type"),
+    chunk: int = Query(IMPORT_CHUNK, ge=1, le=10000, description="Filas por INSERT"),
+    x_actor_ci: str | None = Header(None, alias="X-Actor-CI"),
+):
+    """
+    Alta/actualización masiva de participantes (solo admin).
+
+    El cuerpo es el archivo crudo: CSV con encabezado
+    `ci,nombre,apellido,email,tipo_participante` o NDJSON con esas claves.
+    Devuelve NDJSON: una línea por fila rechazada (`linea`, `ci`, `error`)
+    y al final `{"resumen": {...}}`.
+    """
+    await run_in_threadpool(_requerir_admin, x_actor_ci)
+    fmt = _formato_import(formato, request.headers.get("content-type"))
+
+    resumen = {"procesadas": 0, "insertadas": 0, "actualizadas": 0, "con_error": 0}
+    errores: list[dict[str, Any]] = []
+
+    def _acumular(resultado: dict[str, Any]) -> None:
+        resumen["insertadas"] += resultado["insertadas"]
+        resumen["actualizadas"] += resultado["actualizadas"]
+        errores.extend(resultado["errores"])
+
+    conn = await run_in_threadpool(get_conn)
+    en_vuelo: asyncio.Future | None = None
+    try:
+        pendientes: list[tuple[int, ParticipanteCreate]] = []
+        async for linea, fila, error in _filas_stream(request, fmt):
+            resumen["procesadas"] += 1
+            if error:
+                errores.append({"linea": linea, "ci": None, "error": error})
+                continue
+            try:
+                pendientes.append((linea, ParticipanteCreate.model_validate(fila)))
+            except (ValidationError, HTTPException) as e:
+                errores.append({"linea": linea, "ci": fila.get("ci"), "error": _error_validacion(e)})
+                continue
+            if len(pendientes) >= chunk:
+                # Un chunk se escribe mientras se parsea el siguiente.
+                if en_vuelo is not None:
+                    _acumular(await en_vuelo)
+                en_vuelo = asyncio.ensure_future(run_in_threadpool(_upsert_participantes, conn, pendientes))
+                pendientes = []
+        if en_vuelo is not None:
+            _acumular(await en_vuelo)
+            en_vuelo = None
+        _acumular(await run_in_threadpool(_upsert_participantes, conn, pendientes))
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="El archivo debe estar codificado en UTF-8")
+    except mysql.connector.Error as e:
+        raise HTTPException(status_code=500, detail=f"Error importando participantes: {e}")
+    finally:
+        if en_vuelo is not None:
+            await asyncio.gather(en_vuelo, return_exceptions=True)
+        conn.close()
+
+    resumen["con_error"] = len(errores)
+    errores.sort(key=lambda e: e["linea"])
+
+    def _reporte():
+        for err in errores:
+            yield json.dumps(err, ensure_ascii=False) + "\n"
+        yield json.dumps({"resumen": resumen}) + "\n"
+
+    return StreamingResponse(_reporte(), media_type="application/x-ndjson")
+
+
 @app.put("/participantes/{ci}", response_model=ParticipanteBase)
 def actualizar_participante(
     ci: str = Path(..., description="CI del participante a actualizar"),
@@ -1993,47 +5821,326 @@ def eliminar_participante(ci: str = Path(..., description="CI del participante a
     finally:
         conn.close()
 
+# ==========================
+#  INSCRIPCIONES A PROGRAMAS
+# ==========================
+# participante_programa_academico se sincroniza contra el snapshot completo
+# que entrega bedelía: clave (ci, programa) -> rol. Solo se escriben las
+# diferencias, en transacciones de a INSCRIPCIONES_CHUNK filas. No hay datos
+# derivados que invalidar: la elegibilidad de create_reserva y los reportes
+# por rol leen la tabla en cada consulta.
+
+INSCRIPCIONES_CHUNK = int(os.getenv("INSCRIPCIONES_CHUNK", "1000"))
+
+
+class InscripcionIn(BaseModel):
+    ci: str = Field(..., validation_alias=AliasChoices("ci", "ci_participante"))
+    nombre_programa: str = Field(..., validation_alias=AliasChoices("nombre_programa", "programa"))
+    rol: Literal["alumno", "docente"]
+
+    @field_validator("ci")
+    @classmethod
+    def _val_ci(cls, v):
+        return normalize_ci(v)
+
+    @field_validator("nombre_programa")
+    @classmethod
+    def _val_programa(cls, v):
+        clean = (v or "").strip()
+        if not clean:
+            raise ValueError("Debe indicar el programa")
+        return clean
+
+
+def _diff_inscripciones(
+    cur, snapshot: dict[tuple[str, str], tuple[int, str]]
+) -> tuple[list[tuple[str, str, str]], dict[str, list[int]], list[int], list[dict[str, Any]]]:
+    """Compara el snapshot con la tabla.
+
+    Devuelve (altas, cambios de rol agrupados por rol nuevo, ids a borrar,
+    errores). Las filas repetidas para una misma (ci, programa) se reducen a
+    una: se conserva la de menor id.
+    """
+    errores: list[dict[str, Any]] = []
+
+    cur.execute("SELECT nombre_programa FROM programa_academico")
+    programas = {row[0].lower(): row[0] for row in cur.fetchall()}
+    cis = sorted({ci for ci, _ in snapshot})
+    existentes: set[str] = set()
+    for i in range(0, len(cis), INSCRIPCIONES_CHUNK):
+        parte = cis[i : i + INSCRIPCIONES_CHUNK]
+        cur.execute(
+            f"SELECT ci FROM participante WHERE ci IN ({','.join(['%s'] * len(parte))})",
+            tuple(parte),
+        )
+        existentes.update(row[0] for row in cur.fetchall())
+
+    deseado: dict[tuple[str, str], str] = {}
+    for (ci, programa), (linea, rol) in snapshot.items():
+        if ci not in existentes:
+            errores.append({"linea": linea, "ci": ci, "error": "Participante no encontrado"})
+            continue
+        canonico = programas.get(programa.lower())
+        if canonico is None:
+            errores.append({"linea": linea, "ci": ci, "error": f"Programa no encontrado: {programa}"})
+            continue
+        deseado[(ci, canonico.lower())] = rol
+
+    cur.execute(
+        """
+        SELECT id_alumno_programa, ci_participante, nombre_programa, rol
+        FROM participante_programa_academico
+        ORDER BY id_alumno_programa
+        """
+    )
+    actuales: set[tuple[str, str]] = set()
+    cambios: dict[str, list[int]] = {}
+    bajas: list[int] = []
+    for id_ap, ci, programa, rol in cur.fetchall():
+        clave = (ci, programa.lower())
+        if clave in actuales or clave not in deseado:
+            bajas.append(id_ap)
+            continue
+        actuales.add(clave)
+        if deseado[clave] != rol:
+            cambios.setdefault(deseado[clave], []).append(id_ap)
+
+    altas = [
+        (ci, programas[programa], rol) for (ci, programa), rol in deseado.items() if (ci, programa) not in actuales
+    ]
+    return altas, cambios, bajas, errores
+
+
+def _aplicar_inscripciones(conn, altas, cambios, bajas, chunk: int) -> None:
+    cur = conn.cursor()
+    for i in range(0, len(altas), chunk):
+        conn.start_transaction()
+        cur.executemany(
+            """
+            INSERT INTO participante_programa_academico (ci_participante, nombre_programa, rol)
+            VALUES (%s, %s, %s)
+            """,
+            altas[i : i + chunk],
+        )
+        conn.commit()
+    for rol, ids in cambios.items():
+        for i in range(0, len(ids), chunk):
+            parte = ids[i : i + chunk]
+            conn.start_transaction()
+            cur.execute(
+                f"""
+                UPDATE participante_programa_academico
+                SET rol = %s
+                WHERE id_alumno_programa IN ({','.join(['%s'] * len(parte))})
+                """,
+                (rol, *parte),
+            )
+            conn.commit()
+    for i in range(0, len(bajas), chunk):
+        parte = bajas[i : i + chunk]
+        conn.start_transaction()
+        cur.execute(
+            f"DELETE FROM participante_programa_academico WHERE id_alumno_programa IN ({','.join(['%s'] * len(parte))})",
+            tuple(parte),
+        )
+        conn.commit()
+
+
+@app.post("/inscripciones/sync")
+async def sincronizar_inscripciones(
+    request: Request,
+    formato: Literal["csv", "ndjson"] | None = Query(None, description="Si se omite se deduce del Content-Type"),
+    chunk: int = Query(INSCRIPCIONES_CHUNK, ge=1, le=10000, description="Filas por transacción"),
+    aplicar: bool = Query(True, description="false = solo calcular el diff"),
+    forzar: bool = Query(False, description="Aplicar aunque haya filas con error"),
+    x_actor_ci: str | None = Header(None, alias="X-Actor-CI"),
+):
+    """
+    Sincroniza participante_programa_academico con un snapshot completo (solo admin).
+
+    El cuerpo es CSV con encabezado `ci,programa,rol` o NDJSON con esas
+    claves. Lo que no está en el snapshot se borra, por eso si alguna fila
+    tiene errores no se aplica nada salvo `forzar=true` (una fila inválida
+    borraría la inscripción vigente de ese participante). Devuelve NDJSON con
+    los errores por línea y un resumen final.
+    """
+    await run_in_threadpool(_requerir_admin, x_actor_ci)
+    fmt = _formato_import(formato, request.headers.get("content-type"))
+
+    snapshot: dict[tuple[str, str], tuple[int, str]] = {}
+    errores: list[dict[str, Any]] = []
+    procesadas = 0
+    try:
+        async for linea, fila, error in _filas_stream(request, fmt):
+            procesadas += 1
+            if error:
+                errores.append({"linea": linea, "ci": None, "error": error})
+                continue
+            try:
+                ins = InscripcionIn.model_validate(fila)
+            except (ValidationError, HTTPException) as e:
+                errores.append({"linea": linea, "ci": fila.get("ci"), "error": _error_validacion(e)})
+                continue
+            clave = (ins.ci, ins.nombre_programa)
+            if clave in snapshot:
+                errores.append({"linea": linea, "ci": ins.ci, "error": "Inscripción repetida en el archivo"})
+                continue
+            snapshot[clave] = (linea, ins.rol)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="El archivo debe estar codificado en UTF-8")
+
+    if not snapshot:
+        raise HTTPException(status_code=422, detail="El snapshot no tiene inscripciones válidas")
+
+    def _sincronizar() -> dict[str, Any]:
+        conn = get_conn()
+        try:
+            cur = conn.cursor()
+            altas, cambios, bajas, errores_db = _diff_inscripciones(cur, snapshot)
+            errores.extend(errores_db)
+            aplicado = aplicar and (forzar or not errores)
+            if aplicado:
+                _aplicar_inscripciones(conn, altas, cambios, bajas, chunk)
+            return {
+                "procesadas": procesadas,
+                "insertadas": len(altas),
+                "actualizadas": sum(len(ids) for ids in cambios.values()),
+                "eliminadas": len(bajas),
+                "con_error": len(errores),
+                "aplicado": aplicado,
+            }
+        except mysql.connector.Error as e:
+            conn.rollback()
+            raise HTTPException(status_code=500, detail=f"Error sincronizando inscripciones: {e}")
+        finally:
+            conn.close()
+
+    resumen = await run_in_threadpool(_sincronizar)
+    errores.sort(key=lambda e: e["linea"])
+
+    def _reporte():
+        for err in errores:
+            yield json.dumps(err, ensure_ascii=False) + "\n"
+        yield json.dumps({"resumen": resumen}) + "\n"
+
+    return StreamingResponse(_reporte(), media_type="application/x-ndjson")
+
+
 # ==========================
 #  SANCIONES
 # ==========================
 
 
-@app.get("/sanciones", response_model=List[SancionOut])
-def listar_sanciones(ci: str | None = Query(None, description="Filtrar por CI")):
+class SancionesPagina(BaseModel):
+    total: int
+    vigentes: int
+    vigente_referencia: date
+    items: List[SancionOut]
+    siguiente_cursor: str | None = None
+
+
+def _parse_cursor_sancion(cursor: str) -> tuple[date, str]:
+    try:
+        fecha_txt, ci = cursor.split("_", 1)
+        return date.fromisoformat(fecha_txt), normalize_ci(ci)
+    except (ValueError, HTTPException):
+        raise HTTPException(status_code=422, detail="cursor inválido")
+
+
+@_get_confiable("/sanciones", response_model=SancionesPagina)
+def listar_sanciones(
+    ci: str | None = Query(None, description="Filtrar por CI"),
+    vigente_en: date | None = Query(None, description="Solo sanciones vigentes en esta fecha"),
+    desde: date | None = Query(None, description="Sanciones que terminan en o después de esta fecha"),
+    hasta: date | None = Query(None, description="Sanciones que empiezan en o antes de esta fecha"),
+    limit: int = Query(50, ge=1, le=500, description="Tamaño de página"),
+    cursor: str | None = Query(None, description="siguiente_cursor de la página anterior"),
+):
     """
-    Devuelve sanciones vigentes o históricas de participantes.
+    Devuelve una página de sanciones ordenada por fecha_inicio DESC, CI DESC.
+
+    `vigente_en` (y `desde`) se resuelven como rango sobre idx_sancion_fin:
+    las sanciones duran semanas, así que `fecha_fin >= D` descarta casi toda
+    la tabla. La paginación es keyset: `cursor` es `fecha_inicio_ci` de la
+    última fila devuelta. `total` y `vigentes` cuentan todas las filas que
+    cumplen los filtros (sin el cursor); `vigentes` usa `vigente_en` o hoy.
     """
 
+    condiciones: list[str] = []
+    params: list[Any] = []
+    if ci:
+        condiciones.append("ci_participante = %s")
+        params.append(normalize_ci(ci))
+    if vigente_en:
+        condiciones.append("fecha_fin >= %s AND fecha_inicio <= %s")
+        params.extend([vigente_en, vigente_en])
+    if desde:
+        condiciones.append("fecha_fin >= %s")
+        params.append(desde)
+    if hasta:
+        condiciones.append("fecha_inicio <= %s")
+        params.append(hasta)
+    referencia = vigente_en or date.today()
+
     conn = get_conn()
     try:
         cur = conn.cursor(dictionary=True)
-        params: list[Any] = []
-        base_query = """
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+
+        cur.execute(
+            f"""
+            SELECT COUNT(*) AS total,
+                   COALESCE(SUM(%s BETWEEN fecha_inicio AND fecha_fin), 0) AS vigentes
+            FROM sancion_participante
+            {where}
+            """,
+            (referencia, *params),
+        )
+        conteo = cur.fetchone() or {"total": 0, "vigentes": 0}
+
+        condiciones_pagina = list(condiciones)
+        params_pagina = list(params)
+        if cursor:
+            cursor_fecha, cursor_ci = _parse_cursor_sancion(cursor)
+            condiciones_pagina.append("(fecha_inicio, ci_participante) < (%s, %s)")
+            params_pagina.extend([cursor_fecha, cursor_ci])
+        where_pagina = f"WHERE {' AND '.join(condiciones_pagina)}" if condiciones_pagina else ""
+
+        cur.execute(
+            f"""
             SELECT ci_participante AS ci_sancionado,
                    ci_participante AS ci,
                    fecha_inicio,
                    fecha_fin
             FROM sancion_participante
-        """
-
-        if ci:
-            ci = normalize_ci(ci)
-            base_query += " WHERE ci_participante = %s"
-            params.append(ci)
-
-        base_query += " ORDER BY fecha_inicio DESC"
-
-        cur.execute(base_query, tuple(params))
+            {where_pagina}
+            ORDER BY fecha_inicio DESC, ci_participante DESC
+            LIMIT %s
+            """,
+            (*params_pagina, limit + 1),
+        )
         rows = cur.fetchall()
-        return [
-            {
-                "ci": row["ci"],
-                "ci_sancionado": row["ci_sancionado"],
-                "fecha_inicio": row["fecha_inicio"],
-                "fecha_fin": row["fecha_fin"],
-            }
-            for row in rows
-        ]
+        siguiente = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            ultima = rows[-1]
+            siguiente = f"{ultima['fecha_inicio'].isoformat()}_{ultima['ci']}"
+
+        return {
+            "total": int(conteo["total"] or 0),
+            "vigentes": int(conteo["vigentes"] or 0),
+            "vigente_referencia": referencia,
+            "items": [
+                {
+                    "ci": row["ci"],
+                    "ci_sancionado": row["ci_sancionado"],
+                    "fecha_inicio": row["fecha_inicio"],
+                    "fecha_fin": row["fecha_fin"],
+                }
+                for row in rows
+            ],
+            "siguiente_cursor": siguiente,
+        }
     except mysql.connector.Error as e:
         raise HTTPException(status_code=500, detail=f"Error consultando sanciones: {e}")
     finally:
@@ -2047,6 +6154,7 @@ def crear_sancion(payload: SancionCreate):
     conn = get_conn()
     try:
         cur = conn.cursor()
+        conn.start_transaction()
         cur.execute(
             """
             INSERT INTO sancion_participante (ci_participante, fecha_inicio, fecha_fin)
@@ -2054,7 +6162,9 @@ def crear_sancion(payload: SancionCreate):
             """,
             (payload.ci, payload.fecha_inicio, payload.fecha_fin),
         )
+        _emitir_cambios_sancion(cur, "sancion_creada", [(payload.ci, payload.fecha_inicio, payload.fecha_fin)])
         conn.commit()
+        _avisar_cambios(edificios=())
         return {
             "ci": payload.ci,
             "ci_sancionado": payload.ci,
@@ -2062,6 +6172,7 @@ def crear_sancion(payload: SancionCreate):
             "fecha_fin": payload.fecha_fin,
         }
     except mysql.connector.Error as e:
+        conn.rollback()
         if e.errno == 1452:
             raise HTTPException(
                 status_code=404,
@@ -2105,6 +6216,7 @@ def actualizar_sancion(
         if not row:
             raise HTTPException(status_code=404, detail="Sanción no encontrada")
 
+        conn.start_transaction()
         cur.execute(
             """
             UPDATE sancion_participante
@@ -2113,7 +6225,9 @@ def actualizar_sancion(
             """,
             (payload.fecha_fin, ci, fecha_inicio),
         )
+        _emitir_cambios_sancion(cur, "sancion_modificada", [(ci, fecha_inicio, payload.fecha_fin)])
         conn.commit()
+        _avisar_cambios(edificios=())
 
         return {
             "ci": ci,
@@ -2140,13 +6254,17 @@ def eliminar_sancion(
     conn = get_conn()
     try:
         cur = conn.cursor()
+        conn.start_transaction()
         cur.execute(
             "DELETE FROM sancion_participante WHERE ci_participante = %s AND fecha_inicio = %s",
             (ci, fecha_inicio),
         )
-        conn.commit()
         if cur.rowcount == 0:
+            conn.rollback()
             raise HTTPException(status_code=404, detail="Sanción no encontrada")
+        _emitir_cambios_sancion(cur, "sancion_eliminada", [(ci, fecha_inicio, None)])
+        conn.commit()
+        _avisar_cambios(edificios=())
         return
     except HTTPException:
         raise
@@ -2172,7 +6290,104 @@ def _fecha_filtros(desde: str | None, hasta: str | None, campo: str = "r.fecha")
     return conditions, params
 
 
-@app.get(
+_ARCHIVADO_HASTA: date | None = None
+_ARCHIVADO_HASTA_CARGADO = False
+
+_RESERVAS_CON_HISTORICO = """(
+    SELECT id_reserva, nombre_sala, edificio, fecha, id_turno, estado FROM reserva
+    UNION ALL
+    SELECT id_reserva, nombre_sala, edificio, fecha, id_turno, estado FROM reserva_historica
+)"""
+
+_PARTICIPANTES_CON_HISTORICO = """(
+    SELECT ci_participante, id_reserva, asistencia FROM reserva_participante
+    UNION ALL
+    SELECT ci_participante, id_reserva, asistencia FROM reserva_participante_historica
+)"""
+
+
+def _archivado_hasta(cur) -> date | None:
+    """Fecha más reciente movida al archivo (se cachea; la actualiza archivar_reservas)."""
+    global _ARCHIVADO_HASTA, _ARCHIVADO_HASTA_CARGADO
+    if not _ARCHIVADO_HASTA_CARGADO:
+        cur.execute("SELECT archivado_hasta FROM archivo_estado WHERE id = 1")
+        row = cur.fetchone()
+        valor = row.get("archivado_hasta") if isinstance(row, dict) else (row[0] if row else None)
+        _ARCHIVADO_HASTA = valor if isinstance(valor, date) else None
+        _ARCHIVADO_HASTA_CARGADO = True
+    return _ARCHIVADO_HASTA
+
+
+def _incluye_archivo(cur, desde: str | None) -> bool:
+    """True si el rango del reporte alcanza el período ya archivado."""
+    archivado_hasta = _archivado_hasta(cur)
+    if archivado_hasta is None:
+        return False
+    try:
+        inicio = date.fromisoformat(desde) if desde else None
+    except (TypeError, ValueError):
+        return True
+    return inicio is None or inicio <= archivado_hasta
+
+
+def _fuente_reservas(cur, desde: str | None, nivel: Literal["sala", "turno"] = "sala") -> str:
+    """Tabla derivada (fecha, estado, ..., total_reservas) para reportes agregados.
+
+    Sin archivo es un SELECT plano sobre `reserva` que MySQL fusiona con la
+    consulta externa; si el rango toca el período archivado se suma el
+    resumen diario con UNION ALL.
+    """
+    if nivel == "turno":
+        vivo = "SELECT fecha, estado, id_turno, 1 AS total_reservas FROM reserva"
+        resumen = "SELECT fecha, estado, id_turno, total_reservas FROM resumen_turno_dia"
+    else:
+        vivo = "SELECT fecha, estado, edificio, nombre_sala, 1 AS total_reservas FROM reserva"
+        resumen = "SELECT fecha, estado, edificio, nombre_sala, total_reservas FROM resumen_sala_dia"
+    if _incluye_archivo(cur, desde):
+        return f"({vivo} UNION ALL {resumen})"
+    return f"({vivo})"
+
+
+def _fuentes_con_participantes(cur, desde: str | None) -> tuple[str, str]:
+    """(reservas, participantes) para reportes que bajan a nivel participante."""
+    if _incluye_archivo(cur, desde):
+        return _RESERVAS_CON_HISTORICO, _PARTICIPANTES_CON_HISTORICO
+    return "reserva", "reserva_participante"
+
+
+def _rango_mensual(desde: str | None, hasta: str | None) -> tuple[date | None, date | None] | None:
+    """Si el rango cubre meses completos devuelve (primer mes, último mes).
+
+    `desde` debe caer en día 1 y `hasta` en el último día del mes; un extremo
+    ausente deja el rango abierto. Devuelve None si no está alineado (o no
+    parsea), en cuyo caso el reporte usa la consulta exacta.
+    """
+    try:
+        inicio = date.fromisoformat(desde) if desde else None
+        fin = date.fromisoformat(hasta) if hasta else None
+    except (TypeError, ValueError):
+        return None
+    if inicio and inicio.day != 1:
+        return None
+    if fin and (fin + timedelta(days=1)).day != 1:
+        return None
+    return inicio, fin.replace(day=1) if fin else None
+
+
+def _filtro_meses(rango: tuple[date | None, date | None], campo: str = "mes"):
+    conditions = []
+    params: list[Any] = []
+    inicio, fin = rango
+    if inicio:
+        conditions.append(f"{campo} >= %s")
+        params.append(inicio)
+    if fin:
+        conditions.append(f"{campo} <= %s")
+        params.append(fin)
+    return " AND ".join(conditions) if conditions else "1=1", params
+
+
+@_get_confiable(
     "/reportes/turnos-mas-demandados",
     response_model=List[ReportTurnoDemandado],
 )
@@ -2187,13 +6402,14 @@ def report_turnos_mas_demandados(
         conditions, params = _fecha_filtros(desde, hasta)
         conditions.insert(0, "r.estado IN ('activa','finalizada','sin_asistencia')")
         where_clause = " AND ".join(conditions) if conditions else "1=1"
+        fuente = _fuente_reservas(cur, desde, nivel="turno")
         query = f"""
             SELECT
               t.id_turno,
               t.hora_inicio,
               t.hora_fin,
-              COUNT(*) AS total_reservas
-            FROM reserva r
+              CAST(SUM(r.total_reservas) AS SIGNED) AS total_reservas
+            FROM {fuente} r
             JOIN turno t ON t.id_turno = r.id_turno
             WHERE {where_clause}
             GROUP BY t.id_turno, t.hora_inicio, t.hora_fin
@@ -2213,7 +6429,7 @@ def report_turnos_mas_demandados(
         conn.close()
 
 
-@app.get(
+@_get_confiable(
     "/reportes/promedio-participantes-por-sala",
     response_model=List[ReportPromedioParticipantes],
 )
@@ -2227,18 +6443,30 @@ def report_promedio_participantes_por_sala(
         conditions, params = _fecha_filtros(desde, hasta)
         conditions.insert(0, "r.estado IN ('activa','finalizada','sin_asistencia')")
         where_clause = " AND ".join(conditions) if conditions else "1=1"
+        resumen_archivo = ""
+        if _incluye_archivo(cur, desde):
+            # El resumen diario guarda reservas y participantes por sala/día.
+            resumen_archivo = f"""
+              UNION ALL
+              SELECT r.edificio, r.nombre_sala, r.total_reservas, r.total_participantes
+              FROM resumen_sala_dia r
+              WHERE {where_clause}
+            """
+            params = params + params
         query = f"""
             SELECT
               sub.edificio,
               sub.nombre_sala,
-              ROUND(AVG(sub.cant_participantes), 2) AS promedio_participantes
+              ROUND(SUM(sub.cant_participantes) / SUM(sub.cant_reservas), 2) AS promedio_participantes
             FROM (
-              SELECT r.id_reserva, r.edificio, r.nombre_sala,
+              SELECT r.edificio, r.nombre_sala,
+                     1 AS cant_reservas,
                      COUNT(rp.ci_participante) AS cant_participantes
               FROM reserva r
               LEFT JOIN reserva_participante rp ON rp.id_reserva = r.id_reserva
               WHERE {where_clause}
               GROUP BY r.id_reserva, r.edificio, r.nombre_sala
+              {resumen_archivo}
             ) sub
             GROUP BY sub.edificio, sub.nombre_sala
             ORDER BY promedio_participantes DESC, sub.edificio, sub.nombre_sala
@@ -2251,7 +6479,7 @@ def report_promedio_participantes_por_sala(
         conn.close()
 
 
-@app.get(
+@_get_confiable(
     "/reportes/reservas-por-carrera-facultad",
     response_model=List[ReportReservasPorCarrera],
 )
@@ -2265,13 +6493,14 @@ def report_reservas_por_carrera_facultad(
         conditions, params = _fecha_filtros(desde, hasta)
         conditions.insert(0, "r.estado IN ('activa','finalizada','sin_asistencia')")
         where_clause = " AND ".join(conditions) if conditions else "1=1"
+        reservas, participantes = _fuentes_con_participantes(cur, desde)
         query = f"""
             SELECT
               f.nombre AS facultad,
               pa.nombre_programa,
               COUNT(DISTINCT r.id_reserva) AS total_reservas
-            FROM reserva r
-            JOIN reserva_participante rp ON rp.id_reserva = r.id_reserva
+            FROM {reservas} r
+            JOIN {participantes} rp ON rp.id_reserva = r.id_reserva
             JOIN participante_programa_academico ppa ON ppa.ci_participante = rp.ci_participante
             JOIN programa_academico pa ON pa.nombre_programa = ppa.nombre_programa
             JOIN facultad f ON f.id_facultad = pa.id_facultad
@@ -2287,7 +6516,7 @@ def report_reservas_por_carrera_facultad(
         conn.close()
 
 
-@app.get(
+@_get_confiable(
     "/reportes/reservas-y-asistencias-por-rol",
     response_model=List[ReportReservasAsistenciasRol],
 )
@@ -2304,6 +6533,7 @@ def report_reservas_y_asistencias_por_rol(
         else:
             conditions = ["r.estado IN ('activa','cancelada','finalizada','sin_asistencia')"]
         where_clause = " AND ".join(conditions)
+        reservas, participantes = _fuentes_con_participantes(cur, desde)
         query = f"""
             SELECT
               detalle.rol,
@@ -2321,8 +6551,8 @@ def report_reservas_y_asistencias_por_rol(
                 CASE WHEN MAX(rp.asistencia) = 1 THEN 1 ELSE 0 END AS tiene_asistencia,
                 CASE WHEN r.estado = 'sin_asistencia' THEN 1 ELSE 0 END AS es_sin_asistencia,
                 CASE WHEN r.estado = 'cancelada' THEN 1 ELSE 0 END AS es_cancelada
-              FROM reserva r
-              JOIN reserva_participante rp ON rp.id_reserva = r.id_reserva
+              FROM {reservas} r
+              JOIN {participantes} rp ON rp.id_reserva = r.id_reserva
               JOIN participante_programa_academico ppa ON ppa.ci_participante = rp.ci_participante
               JOIN programa_academico pa ON pa.nombre_programa = ppa.nombre_programa
               WHERE {where_clause}
@@ -2339,7 +6569,7 @@ def report_reservas_y_asistencias_por_rol(
         conn.close()
 
 
-@app.get(
+@_get_confiable(
     "/reportes/sanciones-por-rol",
     response_model=List[ReportSancionesPorRol],
 )
@@ -2375,7 +6605,7 @@ def report_sanciones_por_rol(
         conn.close()
 
 
-@app.get(
+@_get_confiable(
     "/reportes/efectividad-reservas",
     response_model=ReportEfectividadReservas,
 )
@@ -2388,11 +6618,12 @@ def report_efectividad_reservas(
         cur = conn.cursor(dictionary=True)
         conditions, params = _fecha_filtros(desde, hasta)
         where_clause = " AND ".join(conditions) if conditions else "1=1"
+        fuente = _fuente_reservas(cur, desde)
         query = f"""
-            SELECT estado, COUNT(*) AS total
-            FROM reserva
+            SELECT r.estado, CAST(SUM(r.total_reservas) AS SIGNED) AS total
+            FROM {fuente} r
             WHERE {where_clause}
-            GROUP BY estado
+            GROUP BY r.estado
         """
         cur.execute(query, tuple(params))
         rows = cur.fetchall()
@@ -2417,7 +6648,7 @@ def report_efectividad_reservas(
     finally:
         conn.close()
 
-@app.get(
+@_get_confiable(
     "/reportes/salas-mas-usadas",
     response_model=List[ReportSalaUso],
 )
@@ -2446,12 +6677,13 @@ def report_salas_mas_usadas(
 
         where_clause = " AND ".join(conditions)
 
+        fuente = _fuente_reservas(cur, desde)
         query = f"""
             SELECT
               r.edificio,
               r.nombre_sala,
-              COUNT(*) AS total_reservas
-            FROM reserva r
+              CAST(SUM(r.total_reservas) AS SIGNED) AS total_reservas
+            FROM {fuente} r
             WHERE {where_clause}
             GROUP BY r.edificio, r.nombre_sala
             ORDER BY total_reservas DESC, r.edificio, r.nombre_sala
@@ -2470,7 +6702,7 @@ def report_salas_mas_usadas(
     finally:
         conn.close()
 
-@app.get(
+@_get_confiable(
     "/reportes/ocupacion-por-edificio",
     response_model=List[ReportOcupacionEdificio],
 )
@@ -2499,11 +6731,12 @@ def report_ocupacion_por_edificio(
 
         where_clause = " AND ".join(conditions)
 
+        fuente = _fuente_reservas(cur, desde)
         query = f"""
             SELECT
               r.edificio,
-              COUNT(*) AS total_reservas
-            FROM reserva r
+              CAST(SUM(r.total_reservas) AS SIGNED) AS total_reservas
+            FROM {fuente} r
             WHERE {where_clause}
             GROUP BY r.edificio
             ORDER BY total_reservas DESC, r.edificio
@@ -2530,7 +6763,7 @@ def report_ocupacion_por_edificio(
     finally:
         conn.close()
 
-@app.get(
+@_get_confiable(
     "/reportes/uso-por-rol",
     response_model=List[ReportUsoPorRol],
 )
@@ -2558,13 +6791,14 @@ def report_uso_por_rol(
 
         where_clause = " AND ".join(conditions)
 
+        reservas, participantes = _fuentes_con_participantes(cur, desde)
         query = f"""
             SELECT
               ppa.rol,
               pa.tipo AS tipo_programa,
               COUNT(*) AS total_reservas
-            FROM reserva r
-            JOIN reserva_participante rp
+            FROM {reservas} r
+            JOIN {participantes} rp
               ON rp.id_reserva = r.id_reserva
             JOIN participante_programa_academico ppa
               ON ppa.ci_participante = rp.ci_participante
@@ -2591,9 +6825,10 @@ def report_uso_por_rol(
 # 1) Top participantes por cantidad de reservas.
 # 2) Salas con más inasistencias (no-show) para focalizar capacitaciones.
 # 3) Distribución de reservas por día de la semana y turno (insumo para heatmaps).
+# (1) y (2) usan los contadores mensuales si el rango está alineado a meses.
 
 
-@app.get(
+@_get_confiable(
     "/reportes/top-participantes",
     response_model=List[ReportTopParticipante],
 )
@@ -2605,17 +6840,44 @@ def report_top_participantes(
     conn = get_conn()
     try:
         cur = conn.cursor(dictionary=True)
+        rango = _rango_mensual(desde, hasta)
+        if rango is not None:
+            # Rango alineado a meses: se suman los buckets mensuales.
+            where_meses, params = _filtro_meses(rango)
+            cur.execute(
+                f"""
+                SELECT
+                  p.ci,
+                  p.nombre,
+                  p.apellido,
+                  c.total_reservas
+                FROM (
+                  SELECT ci_participante, CAST(SUM(total_reservas) AS SIGNED) AS total_reservas
+                  FROM contador_participante_mes
+                  WHERE {where_meses}
+                  GROUP BY ci_participante
+                  HAVING SUM(total_reservas) > 0
+                ) c
+                JOIN participante p ON p.ci = c.ci_participante
+                ORDER BY c.total_reservas DESC, p.apellido, p.nombre
+                LIMIT %s
+                """,
+                (*params, limit),
+            )
+            return cur.fetchall()
+
         conditions, params = _fecha_filtros(desde, hasta)
         conditions.insert(0, "r.estado IN ('activa','finalizada','sin_asistencia')")
         where_clause = " AND ".join(conditions) if conditions else "1=1"
+        reservas, participantes = _fuentes_con_participantes(cur, desde)
         query = f"""
             SELECT
               p.ci,
               p.nombre,
               p.apellido,
               COUNT(DISTINCT r.id_reserva) AS total_reservas
-            FROM reserva r
-            JOIN reserva_participante rp ON rp.id_reserva = r.id_reserva
+            FROM {reservas} r
+            JOIN {participantes} rp ON rp.id_reserva = r.id_reserva
             JOIN participante p ON p.ci = rp.ci_participante
             WHERE {where_clause}
             GROUP BY p.ci, p.nombre, p.apellido
@@ -2631,7 +6893,7 @@ def report_top_participantes(
         conn.close()
 
 
-@app.get(
+@_get_confiable(
     "/reportes/salas-no-show",
     response_model=List[ReportSalaNoShow],
 )
@@ -2643,15 +6905,36 @@ def report_salas_no_show(
     conn = get_conn()
     try:
         cur = conn.cursor(dictionary=True)
+        rango = _rango_mensual(desde, hasta)
+        if rango is not None:
+            where_meses, params = _filtro_meses(rango)
+            cur.execute(
+                f"""
+                SELECT
+                  edificio,
+                  nombre_sala,
+                  CAST(SUM(total_sin_asistencia) AS SIGNED) AS total_sin_asistencia
+                FROM contador_sala_mes
+                WHERE {where_meses}
+                GROUP BY edificio, nombre_sala
+                HAVING SUM(total_sin_asistencia) > 0
+                ORDER BY total_sin_asistencia DESC, edificio, nombre_sala
+                LIMIT %s
+                """,
+                (*params, limit),
+            )
+            return cur.fetchall()
+
         conditions, params = _fecha_filtros(desde, hasta)
         conditions.append("r.estado = 'sin_asistencia'")
         where_clause = " AND ".join(conditions) if conditions else "1=1"
+        fuente = _fuente_reservas(cur, desde)
         query = f"""
             SELECT
               r.edificio,
               r.nombre_sala,
-              COUNT(*) AS total_sin_asistencia
-            FROM reserva r
+              CAST(SUM(r.total_reservas) AS SIGNED) AS total_sin_asistencia
+            FROM {fuente} r
             WHERE {where_clause}
             GROUP BY r.edificio, r.nombre_sala
             ORDER BY total_sin_asistencia DESC, r.edificio, r.nombre_sala
@@ -2666,7 +6949,7 @@ def report_salas_no_show(
         conn.close()
 
 
-@app.get(
+@_get_confiable(
     "/reportes/distribucion-semana-turno",
     response_model=List[ReportDistribucionSemana],
 )
@@ -2680,12 +6963,13 @@ def report_distribucion_semana_turno(
         conditions, params = _fecha_filtros(desde, hasta)
         conditions.insert(0, "r.estado IN ('activa','finalizada','sin_asistencia')")
         where_clause = " AND ".join(conditions) if conditions else "1=1"
+        fuente = _fuente_reservas(cur, desde, nivel="turno")
         query = f"""
             SELECT
               DATE_FORMAT(r.fecha, '%W') AS dia_semana,
               r.id_turno,
-              COUNT(*) AS total_reservas
-            FROM reserva r
+              CAST(SUM(r.total_reservas) AS SIGNED) AS total_reservas
+            FROM {fuente} r
             WHERE {where_clause}
             GROUP BY dia_semana, r.id_turno
             ORDER BY total_reservas DESC, dia_semana, r.id_turno
@@ -95,12 +95,39 @@ function showToast(message, tone = 'info') {
   }, 3200);
 }
 
+// Respuestas precargadas con POST /batch al iniciar la app (url -> {status, body}).
+const prefetched = new Map();
+
+async function prefetchBatch(urls) {
+  const unique = [...new Set(urls.filter(Boolean))];
+  prefetched.clear();
+  try {
+    const data = await apiRequest('POST', `${apiBase}/batch`, {
+      requests: unique.map((url) => ({ method: 'GET', url: url.slice(apiBase.length) })),
+    });
+    (data?.responses || []).forEach((r, i) => prefetched.set(unique[i], r));
+  } catch (_) {
+    // Si el batch falla, cada sección hace su propio pedido.
+  }
+  // Solo sirve para el arranque: después cada sección vuelve a pedir datos frescos.
+  setTimeout(() => prefetched.clear(), 2000);
+}
+
 async function apiRequest(method, url, body, msgEl) {
+  if (method === 'GET' && prefetched.get(url)?.status < 400) {
+    if (msgEl) setAlert(msgEl, 'Listo', 'success');
+    return prefetched.get(url).body;
+  }
+  if (method !== 'GET' && !url.endsWith('/batch')) prefetched.clear();
   if (msgEl) setAlert(msgEl, 'Cargando...');
   try {
+    const headers = {};
+    if (body) headers['Content-Type'] = 'application/json';
+    const token = sessionManager.currentUser?.token;
+    if (token) headers.Authorization = `Bearer ${token}`;
     const res = await fetch(url, {
       method,
-      headers: body ? { 'Content-Type': 'application/json' } : undefined,
+      headers,
       body: body ? JSON.stringify(body) : undefined,
     });
     const text = await res.text();
@@ -110,6 +137,10 @@ async function apiRequest(method, url, body, msgEl) {
     } catch (_) {
       payload = text;
     }
+    if (res.status === 401 && token) {
+      // Token vencido o revocado: se vuelve al login.
+      sessionManager.clear();
+    }
     if (!res.ok) {
       const detail = payload?.detail || payload?.message || null;
       const error = new Error(detail || `Error ${res.status}`);
@@ -242,7 +273,10 @@ const combos = {
       fillSelect(select, []);
       return;
     }
-    const data = await apiRequest('GET', `${apiBase}/salas?edificio=${encodeURIComponent(edificio)}`);
+    const todas = prefetched.get(`${apiBase}/salas`);
+    const data = todas?.status < 400
+      ? todas.body.filter((s) => s.edificio === edificio)
+      : await apiRequest('GET', `${apiBase}/salas?edificio=${encodeURIComponent(edificio)}`);
     fillSelect(select, data.map((s) => ({ value: s.nombre_sala, label: `${s.nombre_sala} (${s.tipo_sala}, cap ${s.capacidad})` })));
   },
 };
@@ -602,6 +636,38 @@ const turnosUI = (() => {
 })();
 
 const reservasUI = (() => {
+  // Retención del turno elegido en el formulario (POST /reservas/retenciones):
+  // mientras se cargan los participantes nadie más lo puede reservar. Vence
+  // sola en el servidor si se abandona el formulario.
+  let retencion = null;
+
+  async function retener() {
+    const slot = {
+      fecha: qs('#res-fecha').value,
+      edificio: qs('#res-edificio').value,
+      nombre_sala: qs('#res-sala').value,
+      id_turno: Number(qs('#res-turno').value),
+    };
+    if (!sessionManager.currentUser || !slot.fecha || !slot.edificio || !slot.nombre_sala || !slot.id_turno) return;
+    const msg = qs('#reservas-form-msg');
+    try {
+      const resp = await apiRequest('POST', `${apiBase}/reservas/retenciones`, {
+        ...slot,
+        id_retencion: retencion?.id_retencion,
+      });
+      retencion = resp;
+      setAlert(msg, `Turno retenido por ${Math.round(resp.segundos / 60)} minutos mientras se completa la reserva`, 'success');
+    } catch (err) {
+      setAlert(msg, err.message, 'error');
+    }
+  }
+
+  function liberar() {
+    if (!retencion) return;
+    apiRequest('DELETE', `${apiBase}/reservas/retenciones/${encodeURIComponent(retencion.id_retencion)}`).catch(() => {});
+    retencion = null;
+  }
+
   function normalizeEstado(est) {
     return ALLOWED_ESTADOS.includes(est) ? est : 'activa';
   }
@@ -632,6 +698,18 @@ const reservasUI = (() => {
     }
   }
 
+  function listUrl() {
+    const fecha = qs('#reservas-filtro-fecha').value;
+    const edificio = qs('#reservas-filtro-edificio').value;
+    const params = new URLSearchParams();
+    if (fecha) params.append('fecha', fecha);
+    if (edificio) params.append('edificio', edificio);
+    if (!sessionManager.isAdmin() && sessionManager.currentUser?.ci) {
+      params.append('ci', sessionManager.currentUser.ci);
+    }
+    return `${apiBase}/reservas${params.toString() ? `?${params.toString()}` : ''}`;
+  }
+
   async function list() {
     const msg = qs('#reservas-msg');
     try {
@@ -642,17 +720,8 @@ const reservasUI = (() => {
       if (count) count.textContent = 'Mostrando 0 de 0 reservas.';
       return;
     }
-    const fecha = qs('#reservas-filtro-fecha').value;
-    const edificio = qs('#reservas-filtro-edificio').value;
     const estado = qs('#reservas-filtro-estado').value;
-    const params = new URLSearchParams();
-    if (fecha) params.append('fecha', fecha);
-    if (edificio) params.append('edificio', edificio);
-    if (!sessionManager.isAdmin() && sessionManager.currentUser?.ci) {
-      params.append('ci', sessionManager.currentUser.ci);
-    }
-    const url = `${apiBase}/reservas${params.toString() ? `?${params.toString()}` : ''}`;
-    const data = await apiRequest('GET', url, null, qs('#reservas-msg'));
+    const data = await apiRequest('GET', listUrl(), null, qs('#reservas-msg'));
     const rows = (data || []).filter((r) => !estado || r.estado === estado);
     render(rows, data?.length || 0);
   }
@@ -729,12 +798,15 @@ const reservasUI = (() => {
       id_turno: Number(qs('#res-turno').value),
       participantes: validateCiList(qs('#res-participantes').value, msg),
       estado: normalizeEstado(qs('#res-estado').value),
+      id_retencion: retencion?.id_retencion,
     };
     if (!payload.fecha || !payload.edificio || !payload.nombre_sala || !payload.id_turno || !payload.participantes) {
       return;
     }
     try {
       await apiRequest('POST', `${apiBase}/reservas`, payload, msg);
+      // La reserva consume la retención.
+      retencion = null;
       setAlert(msg, 'Reserva creada', 'success');
       await list();
       qs('#reservas-form').reset();
@@ -794,6 +866,8 @@ const reservasUI = (() => {
       list();
     });
     qs('#reservas-form').addEventListener('submit', submit);
+    qs('#reservas-form').addEventListener('reset', liberar);
+    ['#res-fecha', '#res-sala', '#res-turno'].forEach((sel) => qs(sel).addEventListener('change', retener));
     qs('#reservas-table').addEventListener('click', updateEstado);
     qs('#asistencia-form').addEventListener('submit', registrarAsistencia);
     qs('#res-edificio').addEventListener('change', (e) => combos.loadSalasFor(e.target.value, qs('#res-sala')));
@@ -815,10 +889,16 @@ const reservasUI = (() => {
     list();
   }
 
-  return { init, list };
+  return { init, list, listUrl, retener };
 })();
 
 const disponibilidadUI = (() => {
+  // La tabla se carga con GET /disponibilidad y después se mantiene al día con
+  // /disponibilidad/stream (SSE), que manda solo los turnos que cambian.
+  let actual = null;
+  let stream = null;
+  let streamClave = null;
+
   async function consultar(evt) {
     evt.preventDefault();
     try {
@@ -830,9 +910,71 @@ const disponibilidadUI = (() => {
     const edificio = qs('#disp-edificio').value;
     const sala = qs('#disp-sala').value;
     if (!fecha || !edificio || !sala) return;
-    const url = `${apiBase}/disponibilidad?fecha=${encodeURIComponent(fecha)}&edificio=${encodeURIComponent(edificio)}&nombre_sala=${encodeURIComponent(sala)}`;
+    actual = { fecha, edificio, sala };
+    if (!seguir(edificio, fecha)) await refrescar();
+  }
+
+  async function refrescar() {
+    if (!actual) return;
+    const meta = actual;
+    const url = `${apiBase}/disponibilidad?fecha=${encodeURIComponent(meta.fecha)}&edificio=${encodeURIComponent(meta.edificio)}&nombre_sala=${encodeURIComponent(meta.sala)}`;
     const data = await apiRequest('GET', url, null, qs('#disponibilidad-msg'));
-    render(data || [], { fecha, edificio, sala });
+    if (meta === actual) render(data || [], meta);
+  }
+
+  // Abre (o reutiliza) el stream del edificio y día. Devuelve false si el
+  // navegador no soporta EventSource; en ese caso solo se consulta una vez.
+  function seguir(edificio, fecha) {
+    if (!window.EventSource) return false;
+    const clave = `${edificio}|${fecha}`;
+    if (stream && streamClave === clave) {
+      refrescar();
+      return true;
+    }
+    if (stream) stream.close();
+    streamClave = clave;
+    stream = new EventSource(
+      `${apiBase}/disponibilidad/stream?edificio=${encodeURIComponent(edificio)}&fecha=${encodeURIComponent(fecha)}`
+    );
+    // `listo` llega al conectar y al reconectar: recién ahí se pide la tabla,
+    // así no se pierden cambios entre la consulta y la suscripción.
+    stream.addEventListener('listo', refrescar);
+    stream.addEventListener('resync', refrescar);
+    stream.addEventListener('disponibilidad', (e) => aplicar(JSON.parse(e.data).cambios));
+    return true;
+  }
+
+  // Un delta trae `reservado`/`estado` (cambió la reserva), `retenido`
+  // (cambió la retención) o ambos; lo que no trae se conserva de la fila.
+  function aplicar(cambios) {
+    if (!actual) return;
+    const tbody = qs('#disponibilidad-table');
+    cambios
+      .filter((c) => c.nombre_sala === actual.sala)
+      .forEach((c) => {
+        const tr = tbody.querySelector(`tr[data-turno="${c.id_turno}"]`);
+        if (!tr) return;
+        if ('reservado' in c) {
+          tr.dataset.reservado = c.reservado ? '1' : '';
+          tr.dataset.estado = c.estado || '';
+        }
+        if ('retenido' in c) tr.dataset.retenido = c.retenido ? '1' : '';
+        const { reservado, estado, retenido } = tr.dataset;
+        tr.cells[2].textContent = textoEstado(reservado, estado, retenido);
+        tr.cells[3].innerHTML = reservado || retenido ? '' : botonReservar(c.id_turno, actual);
+        tr.classList.remove('actualizada');
+        void tr.offsetWidth;
+        tr.classList.add('actualizada');
+      });
+  }
+
+  function textoEstado(reservado, estado, retenido) {
+    if (reservado) return `Reservado (${formatEstado(estado) || '—'})`;
+    return retenido ? 'Retenido (reserva en curso)' : 'Libre';
+  }
+
+  function botonReservar(turno, meta) {
+    return `<button class="btn link" data-action="reservar" data-turno="${turno}" data-fecha="${meta.fecha}" data-edificio="${meta.edificio}" data-sala="${meta.sala}">Reservar</button>`;
   }
 
   function render(items, meta) {
@@ -840,17 +982,16 @@ const disponibilidadUI = (() => {
     if (!items.length) return tablePlaceholder(tbody, 'Sin turnos para mostrar');
     tbody.innerHTML = '';
     items.forEach((t) => {
-      const estadoReserva = formatEstado(t.estado_reserva);
       const tr = document.createElement('tr');
+      tr.dataset.turno = t.id_turno;
+      tr.dataset.reservado = t.reservado ? '1' : '';
+      tr.dataset.estado = t.estado_reserva || '';
+      tr.dataset.retenido = t.retenido ? '1' : '';
       tr.innerHTML = `
         <td>${t.id_turno}</td>
         <td>${t.hora_inicio} - ${t.hora_fin}</td>
-        <td>${t.reservado ? `Reservado (${estadoReserva || '—'})` : 'Libre'}</td>
-        <td>${
-          t.reservado
-            ? ''
-            : `<button class="btn link" data-action="reservar" data-turno="${t.id_turno}" data-fecha="${meta.fecha}" data-edificio="${meta.edificio}" data-sala="${meta.sala}">Reservar</button>`
-        }</td>`;
+        <td>${textoEstado(t.reservado, t.estado_reserva, t.retenido)}</td>
+        <td>${t.reservado || t.retenido ? '' : botonReservar(t.id_turno, meta)}</td>`;
       tbody.appendChild(tr);
     });
   }
@@ -860,10 +1001,11 @@ const disponibilidadUI = (() => {
     if (!btn) return;
     qs('#res-fecha').value = btn.dataset.fecha;
     qs('#res-edificio').value = btn.dataset.edificio;
+    qs('#res-turno').value = btn.dataset.turno;
     combos.loadSalasFor(btn.dataset.edificio, qs('#res-sala')).then(() => {
       qs('#res-sala').value = btn.dataset.sala;
+      reservasUI.retener();
     });
-    qs('#res-turno').value = btn.dataset.turno;
     setAlert(qs('#reservas-form-msg'), 'Turno precargado desde disponibilidad', 'success');
     document.querySelector('[data-target="reservas-section"]').click();
   }
@@ -879,6 +1021,22 @@ const disponibilidadUI = (() => {
 
 const sancionesUI = (() => {
   let editing = null;
+  let filtros = null;
+  let siguienteCursor = null;
+
+  function filtrosActuales() {
+    const params = new URLSearchParams();
+    const ci = normalizeCi(qs('#sanciones-filtro-ci').value.trim());
+    const vigente = qs('#sanciones-filtro-vigente').value;
+    if (ci) params.append('ci', ci);
+    if (vigente) params.append('vigente_en', vigente);
+    return params;
+  }
+
+  function listUrl() {
+    if (!sessionManager.isAdmin()) return null;
+    return `${apiBase}/sanciones?${filtrosActuales().toString()}`;
+  }
 
   async function list() {
     const ci = qs('#sanciones-filtro-ci').value.trim();
@@ -889,20 +1047,34 @@ const sancionesUI = (() => {
       return tablePlaceholder(qs('#sanciones-table'), 'Solo administradores');
     }
     setAlert(msg, '');
-    let params = '';
-    if (ci) {
-      const norm = validateCi(ci, msg);
-      if (!norm) return;
-      params = `?ci=${encodeURIComponent(norm)}`;
-    }
-    const data = await apiRequest('GET', `${apiBase}/sanciones${params}`, null, msg);
-    render(data || []);
+    if (ci && !validateCi(ci, msg)) return;
+    filtros = filtrosActuales();
+    const data = await apiRequest('GET', `${apiBase}/sanciones?${filtros.toString()}`, null, msg);
+    render(data?.items || [], false);
+    updatePage(data);
   }
 
-  function render(items) {
+  async function more() {
+    if (!siguienteCursor || !filtros) return;
+    const params = new URLSearchParams(filtros);
+    params.append('cursor', siguienteCursor);
+    const data = await apiRequest('GET', `${apiBase}/sanciones?${params.toString()}`, null, qs('#sanciones-msg'));
+    render(data?.items || [], true);
+    updatePage(data);
+  }
+
+  function updatePage(data) {
+    siguienteCursor = data?.siguiente_cursor || null;
+    qs('#sanciones-mas').hidden = !siguienteCursor;
+    qs('#sanciones-resumen').textContent = data
+      ? `${data.total} sanciones · ${data.vigentes} vigentes al ${data.vigente_referencia}`
+      : '';
+  }
+
+  function render(items, append) {
     const tbody = qs('#sanciones-table');
-    if (!items.length) return tablePlaceholder(tbody, 'Sin sanciones');
-    tbody.innerHTML = '';
+    if (!append && !items.length) return tablePlaceholder(tbody, 'Sin sanciones');
+    if (!append) tbody.innerHTML = '';
     items.forEach((s) => {
       const ciRaw = s.ci_sancionado || s.ci_participante || s.ci || s.sancionado?.ci || '';
       const ci = normalizeCi(ciRaw) || ciRaw;
@@ -991,17 +1163,19 @@ const sancionesUI = (() => {
 
   function init() {
     qs('#sanciones-refresh').addEventListener('click', list);
+    qs('#sanciones-mas').addEventListener('click', more);
     qs('#sanciones-form').addEventListener('submit', submit);
     qs('#sanciones-table').addEventListener('click', handleAction);
     qs('#sancion-reset').addEventListener('click', resetForm);
     list();
   }
 
-  return { init };
+  return { init, listUrl };
 })();
 
 const reportesUI = (() => {
   const loaders = [];
+  const builders = [];
 
   function renderTable(tbody, data, keys) {
     if (!data || !data.length) return tablePlaceholder(tbody, 'Sin datos');
@@ -1044,6 +1218,7 @@ const reportesUI = (() => {
     };
     form?.addEventListener('submit', handler);
     loaders.push(handler);
+    builders.push({ buildUrl, adminOnly: !!opts.adminOnly });
     return handler;
   }
 
@@ -1219,11 +1394,13 @@ const reportesUI = (() => {
       ['dia_semana', 'id_turno', 'total_reservas'],
       '#rep-distribucion-msg',
     );
+  }
 
-    loaders.forEach((fn) => fn());
+  function urls() {
+    return builders.filter((b) => !b.adminOnly || sessionManager.isAdmin()).map((b) => b.buildUrl());
   }
 
-  return { init, reload: () => loaders.forEach((fn) => fn()) };
+  return { init, urls, reload: () => loaders.forEach((fn) => fn()) };
 })();
 
 function setTodayDefaults() {
@@ -1307,11 +1484,25 @@ function applyRoleGuards() {
 
 let appInitialized = false;
 
+function startupUrls() {
+  return [
+    `${apiBase}/edificios`,
+    `${apiBase}/turnos`,
+    `${apiBase}/salas`,
+    `${apiBase}/participantes`,
+    reservasUI.listUrl(),
+    sancionesUI.listUrl(),
+    ...reportesUI.urls(),
+  ];
+}
+
 async function startApp() {
   if (!sessionManager.currentUser) return;
   if (!appInitialized) {
     navigation.init();
     setTodayDefaults();
+    reportesUI.init();
+    await prefetchBatch(startupUrls());
     await combos.loadEdificios();
     await combos.loadTurnos();
     await combos.loadSalasFor(qs('#res-edificio').value, qs('#res-sala'));
@@ -1322,7 +1513,7 @@ async function startApp() {
     reservasUI.init();
     disponibilidadUI.init();
     sancionesUI.init();
-    reportesUI.init();
+    reportesUI.reload();
     qs('#reload-data').addEventListener('click', async (e) => {
       e.preventDefault();
       await combos.loadEdificios();
@@ -1332,6 +1523,7 @@ async function startApp() {
     });
     appInitialized = true;
   } else {
+    await prefetchBatch(startupUrls());
     await combos.loadEdificios();
     await combos.loadTurnos();
     await combos.loadSalasFor(qs('#res-edificio').value, qs('#res-sala'));
@@ -1405,6 +1597,9 @@ function bootstrap() {
     }
   });
   qs('#logout-btn').addEventListener('click', () => {
+    if (sessionManager.currentUser?.token) {
+      apiRequest('POST', `${apiBase}/auth/logout`).catch(() => {});
+    }
     sessionManager.clear();
     updateSessionUI();
   });
@@ -0,0 +1,573 @@
+"""
+Backends de almacenamiento de la API.
+
+get_conn() (src/app.py) pide las conexiones al backend elegido con DB_BACKEND:
+
+- ``mysql`` (por defecto): mysql.connector con pool (DB_POOL_SIZE, 0 = sin
+  pool). Si el pool está agotado se abre una conexión directa.
+- ``sqlite``: SQLite embebido en un archivo (DB_SQLITE_PATH) con el mismo
+  schema de sql/00_schema.sql, traducido al cargarlo. Sirve para correr los
+  tests de reglas y los benchmarks en proceso, sin contenedores.
+
+El SQL de los endpoints está escrito para MySQL. La conexión SQLite lo
+traduce al vuelo (placeholders, ON DUPLICATE KEY UPDATE, INSERT IGNORE,
+DATE_ADD(.., INTERVAL ..), FOR UPDATE, ...), registra las funciones MySQL
+que se usan (YEARWEEK, TIME_TO_SEC, DAY, DATE_FORMAT, TIMESTAMP) y
+convierte los errores de integridad en mysql.connector.errors con el mismo
+errno (1062, 1452, 1451), así los handlers existentes responden igual.
+Las filas vuelven con los mismos tipos que da mysql.connector: date,
+datetime y timedelta para las columnas TIME.
+"""
+
+import calendar
+import functools
+import os
+import re
+import sqlite3
+import threading
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from pathlib import Path
+from typing import Any
+
+import mysql.connector
+import mysql.connector.pooling
+
+SQL_DIR = Path(__file__).resolve().parent.parent / "sql"
+
+
+# ==========================
+#  MYSQL
+# ==========================
+
+
+def _mysql_config() -> dict[str, Any]:
+    return dict(
+        host=os.getenv("DB_HOST", "127.0.0.1"),
+        port=int(os.getenv("DB_PORT", "3306")),
+        user=os.getenv("DB_USER", "root"),
+        password=os.getenv("DB_PASS", "root"),
+        database=os.getenv("DB_NAME", "salas_db"),
+        autocommit=True,
+        charset="utf8mb4",
+        collation="utf8mb4_unicode_ci",
+        use_unicode=True,
+    )
+
+
+class BackendMySQL:
+    nombre = "mysql"
+
+    def __init__(self, pool_size: int = 16, config: dict[str, Any] | None = None):
+        self.pool_size = pool_size
+        self.config = config or _mysql_config()
+        self.pool: mysql.connector.pooling.MySQLConnectionPool | None = None
+        self.estadisticas = {"prestadas": 0, "directas": 0}
+        self._lock = threading.Lock()
+
+    def _pool(self) -> mysql.connector.pooling.MySQLConnectionPool | None:
+        if self.pool_size <= 0:
+            return None
+        if self.pool is None:
+            with self._lock:
+                if self.pool is None:
+                    self.pool = mysql.connector.pooling.MySQLConnectionPool(
+                        pool_name="salas",
+                        pool_size=min(self.pool_size, mysql.connector.pooling.CNX_POOL_MAXSIZE),
+                        **self.config,
+                    )
+        return self.pool
+
+    def conectar(self):
+        pool = self._pool()
+        conn = None
+        if pool is not None:
+            try:
+                conn = pool.get_connection()
+                self.estadisticas["prestadas"] += 1
+            except mysql.connector.errors.PoolError:
+                conn = None
+        if conn is None:
+            conn = mysql.connector.connect(**self.config)
+            self.estadisticas["directas"] += 1
+        return conn
+
+
+# ==========================
+#  SQLITE
+# ==========================
+
+# --------- Traducción del dialecto ---------
+
+_FOR_UPDATE_RE = re.compile(
+    r"\s+FOR\s+UPDATE(\s+OF\s+\w+(\s*,\s*\w+)*)?(\s+SKIP\s+LOCKED|\s+NOWAIT)?", re.I
+)
+_INSERT_IGNORE_RE = re.compile(r"\bINSERT\s+IGNORE\b", re.I)
+_ON_DUPLICATE_RE = re.compile(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", re.I)
+_VALUES_COL_RE = re.compile(r"\bVALUES\s*\(\s*(\w+)\s*\)", re.I)
+_INTERVALO_RE = re.compile(r"\b(DATE_ADD|DATE_SUB)\s*\(", re.I)
+_INTERVALO_ARG_RE = re.compile(
+    r"^\s*INTERVAL\s+(.+?)\s+(SECOND|MINUTE|HOUR|DAY|WEEK|MONTH|YEAR)\s*$", re.I | re.S
+)
+_GROUP_CONCAT_RE = re.compile(r"\bGROUP_CONCAT\s*\(([^()]*?)\s+ORDER\s+BY\s+[^()]*\)", re.I)
+_SIGNED_RE = re.compile(r"\bAS\s+(UNSIGNED|SIGNED)(\s+INTEGER)?\b", re.I)
+_FUNCIONES_RE = (
+    (re.compile(r"\bIF\s*\(", re.I), "IIF("),
+    (re.compile(r"\bGREATEST\s*\(", re.I), "MAX("),
+    (re.compile(r"\bLEAST\s*\(", re.I), "MIN("),
+)
+_WHERE_RE = re.compile(r"\bWHERE\b", re.I)
+
+
+def _cierre(sql: str, abre: int) -> int:
+    """Índice del paréntesis que cierra el abierto en `abre` (ignora literales)."""
+    nivel = 0
+    comilla = None
+    for i in range(abre, len(sql)):
+        c = sql[i]
+        if comilla:
+            if c == comilla:
+                comilla = None
+        elif c in "'\"":
+            comilla = c
+        elif c == "(":
+            nivel += 1
+        elif c == ")":
+            nivel -= 1
+            if nivel == 0:
+                return i
+    raise ValueError(f"Paréntesis sin cerrar en: {sql}")
+
+
+def _coma_principal(texto: str) -> int:
+    nivel = 0
+    for i, c in enumerate(texto):
+        if c == "(":
+            nivel += 1
+        elif c == ")":
+            nivel -= 1
+        elif c == "," and nivel == 0:
+            return i
+    return -1
+
+
+def _traducir_intervalos(sql: str) -> str:
+    # DATE_ADD(x, INTERVAL n UNIDAD) -> _FECHA_MAS(x, n, 'UNIDAD'). Se traduce
+    # de la última aparición hacia atrás para resolver primero las anidadas.
+    while True:
+        coincidencias = list(_INTERVALO_RE.finditer(sql))
+        if not coincidencias:
+            return sql
+        m = coincidencias[-1]
+        abre = m.end() - 1
+        cierra = _cierre(sql, abre)
+        interior = sql[abre + 1:cierra]
+        coma = _coma_principal(interior)
+        intervalo = _INTERVALO_ARG_RE.match(interior[coma + 1:]) if coma >= 0 else None
+        if intervalo is None:
+            raise ValueError(f"{m.group(1)} sin INTERVAL no soportado en SQLite: {sql}")
+        signo = "-" if m.group(1).upper() == "DATE_SUB" else ""
+        reemplazo = (
+            f"_FECHA_MAS({interior[:coma].strip()}, {signo}({intervalo.group(1)}), "
+            f"'{intervalo.group(2).upper()}')"
+        )
+        sql = sql[:m.start()] + reemplazo + sql[cierra + 1:]
+
+
+@functools.lru_cache(maxsize=1024)
+def traducir_sql(sql: str) -> str:
+    """Traduce una sentencia escrita para MySQL al dialecto de SQLite."""
+    sql = _FOR_UPDATE_RE.sub("", sql)
+    sql = _INSERT_IGNORE_RE.sub("INSERT OR IGNORE", sql)
+    partes = _ON_DUPLICATE_RE.split(sql, maxsplit=1)
+    if len(partes) == 2:
+        cabeza, asignaciones = partes
+        # INSERT ... SELECT necesita un WHERE para que el parser de SQLite no
+        # confunda el ON CONFLICT con un ON de JOIN.
+        if re.search(r"\bSELECT\b", cabeza, re.I) and not _WHERE_RE.search(cabeza.rsplit("SELECT", 1)[-1]):
+            cabeza = cabeza.rstrip() + " WHERE true "
+        asignaciones = _VALUES_COL_RE.sub(r"excluded.\1", asignaciones)
+        sql = f"{cabeza}ON CONFLICT DO UPDATE SET{asignaciones}"
+    if "INTERVAL" in sql.upper():
+        sql = _traducir_intervalos(sql)
+    sql = _GROUP_CONCAT_RE.sub(r"_GROUP_CONCAT_ORDENADO(\1)", sql)
+    sql = _SIGNED_RE.sub("AS INTEGER", sql)
+    for patron, reemplazo in _FUNCIONES_RE:
+        sql = patron.sub(reemplazo, sql)
+    return sql.replace("%s", "?")
+
+
+_TIPOS_DDL = (
+    (re.compile(r"\b(?:BIG)?INT\s+PRIMARY\s+KEY\s+AUTO_INCREMENT\b", re.I), "INTEGER PRIMARY KEY AUTOINCREMENT"),
+    (re.compile(r"\bVARCHAR\s*\(\d+\)", re.I), "TEXT COLLATE NOCASE"),
+    (re.compile(r"\bTINYINT\s*\(\d+\)|\bTINYINT\b", re.I), "INTEGER"),
+    (re.compile(r"\s+ON\s+UPDATE\s+CURRENT_TIMESTAMP\b", re.I), ""),
+    (re.compile(r"\bUNIQUE\s+KEY\s+\w+\s*\(", re.I), "UNIQUE ("),
+)
+_ENUM_RE = re.compile(r"^(\s*)(\w+)(\s+)ENUM\s*\(([^)]*)\)", re.I)
+_KEY_RE = re.compile(r"^\s*(?:KEY|INDEX)\s+(\w+)\s*\(([^)]*)\)\s*,?\s*$", re.I)
+_TABLA_RE = re.compile(r"CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)", re.I)
+_OPCIONES_TABLA_RE = re.compile(r"\)\s*(ENGINE|DEFAULT\s+CHARSET|CHARSET)\b.*$", re.I | re.S)
+
+
+def traducir_ddl(sql: str) -> list[str]:
+    """CREATE TABLE de MySQL -> [CREATE TABLE, CREATE INDEX...] para SQLite."""
+    tabla = _TABLA_RE.search(sql).group(1)
+    sql = _OPCIONES_TABLA_RE.sub(")", sql.strip())
+    lineas = []
+    indices = []
+    for linea in sql.splitlines():
+        indice = _KEY_RE.match(linea)
+        if indice:
+            indices.append(
+                f"CREATE INDEX IF NOT EXISTS {indice.group(1)} ON {tabla} ({indice.group(2)})"
+            )
+            continue
+        linea = _ENUM_RE.sub(
+            lambda m: f"{m.group(1)}{m.group(2)}{m.group(3)}TEXT CHECK ({m.group(2)} IN ({m.group(4)}))",
+            linea,
+        )
+        for patron, reemplazo in _TIPOS_DDL:
+            linea = patron.sub(reemplazo, linea)
+        lineas.append(linea)
+    tabla_sql = re.sub(r",(\s*\))\s*$", r"\1", "\n".join(lineas))
+    return [tabla_sql, *indices]
+
+
+def sentencias_script(texto: str) -> list[str]:
+    """Separa un .sql en sentencias, sin comentarios ni SET/USE/CREATE DATABASE."""
+    sin_comentarios = "\n".join(
+        linea for linea in texto.splitlines() if not linea.lstrip().startswith("--")
+    )
+    sentencias = []
+    for sentencia in re.split(r";\s*(?:\n|$)", sin_comentarios):
+        sentencia = sentencia.strip()
+        if not sentencia or re.match(r"(SET|USE|CREATE\s+DATABASE)\b", sentencia, re.I):
+            continue
+        sentencias.append(sentencia)
+    return sentencias
+
+
+# --------- Funciones MySQL ---------
+
+
+def _a_fecha(valor) -> date | None:
+    if valor is None:
+        return None
+    if isinstance(valor, (int, float)):
+        valor = str(int(valor))
+    return date.fromisoformat(str(valor)[:10])
+
+
+def _fecha_mas(valor, cantidad, unidad):
+    if valor is None or cantidad is None:
+        return None
+    texto = str(valor)
+    cantidad = int(cantidad)
+    if len(texto) > 10:
+        base: date = datetime.fromisoformat(texto)
+    else:
+        base = date.fromisoformat(texto)
+    if unidad in ("MONTH", "YEAR"):
+        meses = base.year * 12 + base.month - 1 + (cantidad * 12 if unidad == "YEAR" else cantidad)
+        anio, mes = divmod(meses, 12)
+        dia = min(base.day, calendar.monthrange(anio, mes + 1)[1])
+        resultado = base.replace(year=anio, month=mes + 1, day=dia)
+    else:
+        segundos = {"SECOND": 1, "MINUTE": 60, "HOUR": 3600, "DAY": 86400, "WEEK": 604800}[unidad]
+        resultado = base + timedelta(seconds=cantidad * segundos)
+    if isinstance(resultado, datetime):
+        return resultado.isoformat(" ")
+    return resultado.isoformat()
+
+
+def _yearweek(valor, modo=0):
+    dia = _a_fecha(valor)
+    if dia is None:
+        return None
+    if int(modo) == 3:
+        anio, semana, _ = dia.isocalendar()
+        return anio * 100 + semana
+    # Modo 0: semanas que empiezan en domingo (primer domingo del año = semana 1).
+    inicio = dia - timedelta(days=(dia.weekday() + 1) % 7)
+    if inicio.year < dia.year:
+        return _yearweek(inicio, 0)
+    return inicio.year * 100 + (inicio.timetuple().tm_yday + 6) // 7
+
+
+def _time_to_sec(valor):
+    if valor is None:
+        return None
+    texto = str(valor)
+    if " " in texto:
+        texto = texto.split(" ", 1)[1]
+    h, m, s = texto.split(":")
+    # Real para que SUM(...) / 3600 no haga división entera como en SQLite.
+    return int(h) * 3600 + int(m) * 60 + float(s)
+
+
+_FORMATOS_MYSQL = {
+    "%Y": "%Y", "%y": "%y", "%m": "%m", "%c": "%-m", "%d": "%d", "%e": "%-d",
+    "%H": "%H", "%i": "%M", "%s": "%S", "%S": "%S", "%W": "%A", "%a": "%a",
+    "%M": "%B", "%b": "%b", "%%": "%%",
+}
+
+
+def _date_format(valor, formato):
+    if valor is None or formato is None:
+        return None
+    texto = str(valor)
+    momento = datetime.fromisoformat(texto if len(texto) > 10 else texto + " 00:00:00")
+    return re.sub(r"%.", lambda m: momento.strftime(_FORMATOS_MYSQL.get(m.group(0), m.group(0))), formato)
+
+
+def _timestamp(fecha, hora=None):
+    if fecha is None:
+        return None
+    base = str(fecha)[:10]
+    return f"{base} {hora}" if hora is not None else f"{base} 00:00:00"
+
+
+def _dia(valor):
+    dia = _a_fecha(valor)
+    return None if dia is None else dia.day
+
+
+class _GroupConcatOrdenado:
+    def __init__(self):
+        self.valores = []
+
+    def step(self, valor):
+        if valor is not None:
+            self.valores.append(valor)
+
+    def finalize(self):
+        if not self.valores:
+            return None
+        return ",".join(str(v) for v in sorted(self.valores))
+
+
+def _registrar_funciones(conn: sqlite3.Connection) -> None:
+    conn.create_function("_FECHA_MAS", 3, _fecha_mas, deterministic=True)
+    conn.create_function("YEARWEEK", 1, _yearweek, deterministic=True)
+    conn.create_function("YEARWEEK", 2, _yearweek, deterministic=True)
+    conn.create_function("TIME_TO_SEC", 1, _time_to_sec, deterministic=True)
+    conn.create_function("DATE_FORMAT", 2, _date_format, deterministic=True)
+    conn.create_function("TIMESTAMP", 1, _timestamp, deterministic=True)
+    conn.create_function("TIMESTAMP", 2, _timestamp, deterministic=True)
+    conn.create_function("DAY", 1, _dia, deterministic=True)
+    conn.create_aggregate("_GROUP_CONCAT_ORDENADO", 1, _GroupConcatOrdenado)
+
+
+# --------- Tipos y errores ---------
+
+_FECHA_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_FECHA_HORA_RE = re.compile(r"^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(\.\d+)?$")
+_HORA_RE = re.compile(r"^-?\d{1,3}:\d{2}:\d{2}$")
+
+
+def _parametro(valor):
+    if isinstance(valor, datetime):
+        return valor.isoformat(" ")
+    if isinstance(valor, (date, time)):
+        return valor.isoformat()
+    if isinstance(valor, timedelta):
+        segundos = int(valor.total_seconds())
+        signo = "-" if segundos < 0 else ""
+        h, resto = divmod(abs(segundos), 3600)
+        return f"{signo}{h:02d}:{resto // 60:02d}:{resto % 60:02d}"
+    if isinstance(valor, Decimal):
+        return str(valor)
+    return valor
+
+
+def _parametros(params):
+    if params is None:
+        return ()
+    if isinstance(params, dict):
+        return {k: _parametro(v) for k, v in params.items()}
+    return tuple(_parametro(v) for v in params)
+
+
+def _valor(valor):
+    # Mismos tipos que mysql.connector: DATE -> date, DATETIME -> datetime,
+    # TIME -> timedelta.
+    if type(valor) is not str or len(valor) > 26:
+        return valor
+    if _FECHA_RE.match(valor):
+        return date.fromisoformat(valor)
+    if _FECHA_HORA_RE.match(valor):
+        return datetime.fromisoformat(valor)
+    if _HORA_RE.match(valor):
+        signo = -1 if valor.startswith("-") else 1
+        h, m, s = valor.lstrip("-").split(":")
+        return signo * timedelta(hours=int(h), minutes=int(m), seconds=int(s))
+    return valor
+
+
+def _error_mysql(error: sqlite3.Error, sql: str) -> mysql.connector.Error:
+    mensaje = str(error)
+    if isinstance(error, sqlite3.IntegrityError):
+        if "UNIQUE" in mensaje or "PRIMARY KEY" in mensaje:
+            errno = 1062
+        elif "FOREIGN KEY" in mensaje:
+            errno = 1451 if sql.lstrip()[:6].upper() == "DELETE" else 1452
+        elif "CHECK" in mensaje:
+            errno = 3819
+        else:
+            errno = 1048
+        return mysql.connector.errors.IntegrityError(msg=mensaje, errno=errno)
+    if isinstance(error, sqlite3.OperationalError) and "locked" in mensaje:
+        return mysql.connector.errors.DatabaseError(msg=mensaje, errno=1205)
+    return mysql.connector.errors.DatabaseError(msg=mensaje, errno=1064)
+
+
+# --------- Conexión ---------
+
+
+class _CursorSQLite:
+    def __init__(self, conn: sqlite3.Connection, dictionary: bool = False):
+        self._cur = conn.cursor()
+        self._dictionary = dictionary
+
+    def execute(self, sql, params=None):
+        try:
+            if re.match(r"\s*CREATE\s+TABLE\b", sql, re.I):
+                for sentencia in traducir_ddl(sql):
+                    self._cur.execute(sentencia)
+                return
+            self._cur.execute(traducir_sql(sql), _parametros(params))
+        except sqlite3.Error as e:
+            raise _error_mysql(e, sql) from e
+
+    def executemany(self, sql, seq_params):
+        try:
+            self._cur.executemany(traducir_sql(sql), [_parametros(p) for p in seq_params])
+        except sqlite3.Error as e:
+            raise _error_mysql(e, sql) from e
+
+    def _fila(self, fila):
+        if fila is None:
+            return None
+        valores = tuple(_valor(v) for v in fila)
+        if self._dictionary:
+            return dict(zip(self.column_names, valores))
+        return valores
+
+    def fetchone(self):
+        return self._fila(self._cur.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._fila(f) for f in self._cur.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._fila(f) for f in self._cur.fetchall()]
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    @property
+    def column_names(self):
+        return tuple(d[0] for d in self._cur.description or ())
+
+    @property
+    def description(self):
+        return self._cur.description
+
+    @property
+    def rowcount(self):
+        return self._cur.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cur.lastrowid
+
+    def close(self):
+        self._cur.close()
+
+
+class ConexionSQLite:
+    """Conexión SQLite con la interfaz de mysql.connector que usa la app."""
+
+    def __init__(self, ruta: str):
+        # isolation_level=None: autocommit como la conexión MySQL; las
+        # transacciones se abren explícitamente con start_transaction().
+        self._conn = sqlite3.connect(ruta, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA foreign_keys = ON")
+        self._conn.execute("PRAGMA busy_timeout = 30000")
+        _registrar_funciones(self._conn)
+
+    def cursor(self, dictionary: bool = False, **_kwargs):
+        return _CursorSQLite(self._conn, dictionary=dictionary)
+
+    def start_transaction(self, **_kwargs):
+        # IMMEDIATE toma el lock de escritura al empezar: hace las veces de
+        # los SELECT ... FOR UPDATE, que SQLite no tiene.
+        self._conn.execute("BEGIN IMMEDIATE")
+
+    @property
+    def in_transaction(self) -> bool:
+        return self._conn.in_transaction
+
+    def commit(self):
+        if self._conn.in_transaction:
+            self._conn.execute("COMMIT")
+
+    def rollback(self):
+        if self._conn.in_transaction:
+            self._conn.execute("ROLLBACK")
+
+    def is_connected(self) -> bool:
+        return True
+
+    def close(self):
+        self.rollback()
+        self._conn.close()
+
+
+class BackendSQLite:
+    nombre = "sqlite"
+
+    def __init__(self, ruta: str, seed: str | Path | None = None):
+        self.ruta = str(ruta)
+        self.seed = seed
+        self.estadisticas = {"directas": 0}
+        self.pool = None
+        self._lock = threading.Lock()
+        self._creada = False
+
+    def _crear(self, conn: ConexionSQLite) -> None:
+        cur = conn.cursor()
+        cur._cur.execute("PRAGMA journal_mode = WAL")
+        cur._cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'reserva'")
+        if cur._cur.fetchone() is not None:
+            return
+        conn.start_transaction()
+        for sentencia in sentencias_script((SQL_DIR / "00_schema.sql").read_text(encoding="utf-8")):
+            cur.execute(sentencia)
+        if self.seed:
+            for sentencia in sentencias_script(Path(self.seed).read_text(encoding="utf-8")):
+                cur.execute(sentencia)
+        conn.commit()
+
+    def conectar(self) -> ConexionSQLite:
+        conn = ConexionSQLite(self.ruta)
+        if not self._creada:
+            with self._lock:
+                if not self._creada:
+                    self._crear(conn)
+                    self._creada = True
+        self.estadisticas["directas"] += 1
+        return conn
+
+
+def backend_desde_entorno(pool_size: int = 16):
+    tipo = os.getenv("DB_BACKEND", "mysql").lower()
+    if tipo == "mysql":
+        return BackendMySQL(pool_size=pool_size)
+    if tipo == "sqlite":
+        return BackendSQLite(
+            os.getenv("DB_SQLITE_PATH", "salas.sqlite3"),
+            seed=os.getenv("DB_SQLITE_SEED") or None,
+        )
+    raise ValueError(f"DB_BACKEND desconocido: {tipo!r} (mysql | sqlite)")
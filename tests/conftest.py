@@ -4,3 +4,48 @@ from pathlib import Path
 ROOT = Path(__file__).resolve().parent.parent
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
+
+import pytest  # noqa: E402
+
+from src import app as app_module  # noqa: E402
+from src import storage  # noqa: E402
+
+# Datos mínimos para los tests que corren contra el backend SQLite.
+DATOS_SQLITE = (
+    "INSERT INTO edificio VALUES ('Sede Central', 'Av. 8 de Octubre 2738', 'Montevideo')",
+    """
+    INSERT INTO sala (nombre_sala, edificio, capacidad, tipo_sala) VALUES
+      ('Libre 1', 'Sede Central', 2, 'libre'),
+      ('Libre 2', 'Sede Central', 5, 'libre'),
+      ('Docentes', 'Sede Central', 5, 'docente')
+    """,
+    """
+    INSERT INTO turno (id_turno, hora_inicio, hora_fin) VALUES
+      (1, '08:00:00', '09:00:00'), (2, '09:00:00', '10:00:00'), (3, '10:00:00', '11:00:00')
+    """,
+    """
+    INSERT INTO participante (ci, nombre, apellido, email, tipo_participante, es_admin) VALUES
+      ('11111111', 'Ana', 'Pérez', 'ana@ucu.edu.uy', 'estudiante', 0),
+      ('22222222', 'Bruno', 'Silva', 'bruno@ucu.edu.uy', 'estudiante', 0),
+      ('33333333', 'Carla', 'Díaz', 'carla@ucu.edu.uy', 'docente', 0),
+      ('59876543', 'Ada', 'Lovelace', 'ada@ucu.edu.uy', 'docente', 1)
+    """,
+)
+
+
+@pytest.fixture
+def backend_sqlite(tmp_path, monkeypatch):
+    """Base SQLite nueva con DATOS_SQLITE, conectada como backend de la app."""
+    backend = storage.BackendSQLite(tmp_path / "salas.sqlite3")
+    monkeypatch.setattr(app_module, "_BACKEND", backend)
+    monkeypatch.setattr(app_module, "_MIGRATIONS_APPLIED", False)
+    # Todos los TestClient salen de la misma IP: sin esto, el token bucket
+    # por IP del control de admisión se agota a lo largo de la suite.
+    for middleware in app_module._ADMISION_INSTANCIAS:
+        monkeypatch.setattr(middleware, "buckets", app_module._BucketsRayados())
+    conn = backend.conectar()
+    cur = conn.cursor()
+    for sentencia in DATOS_SQLITE:
+        cur.execute(sentencia)
+    conn.close()
+    return backend
@@ -0,0 +1,80 @@
+import asyncio
+
+from src import app as app_module
+
+
+def test_bucket_recarga_y_respeta_rafaga():
+    buckets = app_module._BucketsRayados(franjas=2, max_claves=4)
+    assert buckets.tomar("ci:1", tasa=1, rafaga=2, ahora=0) == 0
+    assert buckets.tomar("ci:1", tasa=1, rafaga=2, ahora=0) == 0
+    assert buckets.tomar("ci:1", tasa=1, rafaga=2, ahora=0) == 1
+    assert buckets.tomar("ci:1", tasa=1, rafaga=2, ahora=1) == 0
+
+
+def test_buckets_acotados():
+    buckets = app_module._BucketsRayados(franjas=2, max_claves=4)
+    for i in range(50):
+        buckets.tomar(f"ip:{i}", tasa=1, rafaga=1, ahora=0)
+    assert len(buckets) <= 4
+
+
+def _scope(path, method="GET", ci=None):
+    headers = [(b"x-actor-ci", ci.encode())] if ci else []
+    return {"type": "http", "path": path, "method": method, "headers": headers, "client": ("10.0.0.1", 1234)}
+
+
+async def _llamar(mw, scope):
+    enviados = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(msg):
+        enviados.append(msg)
+
+    await mw(scope, receive, send)
+    return enviados[0]
+
+
+def test_admision_429_por_ci_con_retry_after():
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    mw = app_module._AdmisionMiddleware(app, tasa_ci=0.5, rafaga_ci=1, tasa_ip=0)
+    assert asyncio.run(_llamar(mw, _scope("/reservas", "POST", ci="4.000.000-1")))["status"] == 200
+    rechazo = asyncio.run(_llamar(mw, _scope("/reservas", "POST", ci="40000001")))
+    assert rechazo["status"] == 429
+    assert (b"retry-after", b"2") in rechazo["headers"]
+    # otra CI no se ve afectada
+    assert asyncio.run(_llamar(mw, _scope("/reservas", "POST", ci="40000002")))["status"] == 200
+
+
+def test_admision_descarta_reportes_antes_que_reservas():
+    async def escenario():
+        liberar = asyncio.Event()
+
+        async def app_lenta(scope, receive, send):
+            await liberar.wait()
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+
+        mw = app_module._AdmisionMiddleware(
+            app_lenta,
+            tasa_ci=0,
+            tasa_ip=0,
+            max_concurrentes={"reportes": 5, "reservas": 5, "admin": 1, "lecturas": 5},
+            umbral_reportes=2,
+        )
+        en_vuelo = [asyncio.create_task(_llamar(mw, _scope("/salas"))) for _ in range(2)]
+        await asyncio.sleep(0)
+        reporte = await _llamar(mw, _scope("/reportes/salas-mas-usadas"))
+        reserva = asyncio.create_task(_llamar(mw, _scope("/reservas", "POST")))
+        await asyncio.sleep(0)
+        liberar.set()
+        await asyncio.gather(*en_vuelo)
+        return reporte, await reserva
+
+    reporte, reserva = asyncio.run(escenario())
+    assert reporte["status"] == 503
+    assert reserva["status"] == 200
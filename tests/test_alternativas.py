@@ -0,0 +1,56 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from src import app as app_module
+
+
+@pytest.fixture
+def client(backend_sqlite):
+    return TestClient(app_module.app)
+
+
+def _reservar(client, sala="Libre 2", fecha="2030-01-07", turno=2, participantes=("11111111",)):
+    return client.post(
+        "/reservas",
+        json={
+            "nombre_sala": sala,
+            "edificio": "Sede Central",
+            "fecha": fecha,
+            "id_turno": turno,
+            "participantes": list(participantes),
+        },
+    )
+
+
+def _resumen(resp):
+    return [(a["tipo"], a["nombre_sala"], a["fecha"], a["id_turno"]) for a in resp.json()["alternativas"]]
+
+
+def test_slot_ocupado_sugiere_turnos_salas_y_dia(client):
+    assert _reservar(client).status_code == 201
+    assert _reservar(client, fecha="2030-01-08").status_code == 201
+
+    resp = _reservar(client, participantes=("22222222",))
+    assert resp.status_code == 409
+    assert resp.json()["detail"] == "Ya existe una reserva para esa sala, edificio, fecha y turno"
+    # La sala docente no se ofrece a un grupo de estudiantes; el 08 ya está tomado.
+    assert _resumen(resp) == [
+        ("turno_adyacente", "Libre 2", "2030-01-07", 1),
+        ("turno_adyacente", "Libre 2", "2030-01-07", 3),
+        ("otra_sala", "Libre 1", "2030-01-07", 2),
+        ("otro_dia", "Libre 2", "2030-01-09", 2),
+    ]
+    assert resp.json()["alternativas"][0]["hora_inicio"] == "08:00:00"
+
+
+def test_capacidad_y_limite_semanal(client):
+    llena = _reservar(client, sala="Libre 1", participantes=("11111111", "22222222", "33333333"))
+    assert llena.status_code == 409
+    assert "capacidad 2" in llena.json()["detail"]
+    assert _resumen(llena) == [("otra_sala", "Libre 2", "2030-01-07", 2)]
+
+    for fecha in ("2030-01-07", "2030-01-08", "2030-01-09"):
+        assert _reservar(client, fecha=fecha).status_code == 201
+    cuarta = _reservar(client, sala="Libre 1", fecha="2030-01-10")
+    assert cuarta.status_code == 409
+    assert _resumen(cuarta) == [("otro_dia", "Libre 1", "2030-01-14", 2)]
@@ -1,3 +1,4 @@
+import pytest
 from fastapi.testclient import TestClient
 
 from src import app as app_module
@@ -30,3 +31,60 @@ def test_auth_login_returns_participante(monkeypatch):
     assert response.status_code == 200
     assert response.json()["ci"] == "41234567"
     assert response.json()["nombre"] == "Matihas"
+
+
+_ADA = {
+    "ci": "59876543",
+    "nombre": "Ada",
+    "apellido": "Lovelace",
+    "email": "ada@ucu.edu.uy",
+    "tipo_participante": "docente",
+    "es_admin": True,
+}
+
+
+def _sin_base():
+    raise AssertionError("no debería consultar la base")
+
+
+def test_token_de_sesion_evita_consultas_y_se_puede_revocar(monkeypatch):
+    monkeypatch.setattr(app_module, "get_conn", lambda: _DummyConn())
+    monkeypatch.setattr(app_module, "_fetch_participante", lambda conn, ci: dict(_ADA))
+    client = TestClient(app_module.app)
+    token = client.post("/auth/login", json={"ci": "59876543"}).json()["token"]
+
+    monkeypatch.setattr(app_module, "get_conn", _sin_base)
+    headers = {"Authorization": f"Bearer {token}"}
+    me = client.get("/auth/me", headers=headers)
+    assert me.status_code == 200
+    assert me.json()["es_admin"] is True and me.json()["nombre"] == "Ada"
+
+    assert client.post("/auth/logout", headers=headers).status_code == 200
+    revocado = client.get("/auth/me", headers=headers)
+    assert revocado.status_code == 401
+    assert revocado.json()["detail"] == "La sesión fue cerrada"
+
+
+def test_token_alterado_o_de_epoca_anterior_es_rechazado():
+    token, _ = app_module.emitir_token(_ADA)
+    cuerpo, firma = token.rsplit(".", 1)
+    alterado = cuerpo[:-2] + ("AA" if cuerpo[-2:] != "AA" else "BB") + "." + firma
+    with pytest.raises(app_module.HTTPException):
+        app_module.verificar_token(alterado)
+
+    assert app_module.verificar_token(token)["ci"] == "59876543"
+    app_module.rotar_epoca_sesion()
+    with pytest.raises(app_module.HTTPException) as exc:
+        app_module.verificar_token(token)
+    assert exc.value.status_code == 401
+
+
+def test_requerir_admin_usa_actor_del_token(monkeypatch):
+    monkeypatch.setattr(app_module, "get_conn", _sin_base)
+    ctx = app_module._ACTOR_ACTUAL.set({**_ADA, "es_admin": False})
+    try:
+        with pytest.raises(app_module.HTTPException) as exc:
+            app_module._requerir_admin("59876543")
+        assert exc.value.status_code == 403
+    finally:
+        app_module._ACTOR_ACTUAL.reset(ctx)
@@ -0,0 +1,120 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+
+from src import app as app_module
+
+ADMIN = {"X-Actor-CI": "59876543"}
+
+
+def _reservar(client, turno=1, participantes=("11111111",)):
+    resp = client.post(
+        "/reservas",
+        json={
+            "nombre_sala": "Libre 2",
+            "edificio": "Sede Central",
+            "fecha": "2030-01-07",
+            "id_turno": turno,
+            "participantes": list(participantes),
+        },
+    )
+    assert resp.status_code == 201
+    return resp.json()["id_reserva"]
+
+
+def test_feed_registra_reservas_y_sanciones(backend_sqlite):
+    client = TestClient(app_module.app)
+    id_1 = _reservar(client, turno=1)
+    id_2 = _reservar(client, turno=2, participantes=("22222222",))
+    client.patch(f"/reservas/{id_1}", json={"estado": "cancelada"})
+    client.post(f"/reservas/{id_2}/asistencia", json={"presentes": []})
+    # Una reserva rechazada por reglas no deja evento.
+    assert client.post(
+        "/reservas",
+        json={"nombre_sala": "Libre 1", "edificio": "Sede Central", "fecha": "2030-01-07",
+              "id_turno": 1, "participantes": ["11111111", "22222222", "33333333"]},
+    ).status_code == 409
+
+    assert client.get("/cambios").status_code == 401
+    resp = client.get("/cambios", headers=ADMIN).json()
+    eventos = [(c["tipo"], c["id_reserva"], c["estado"], c["ci_participante"]) for c in resp["cambios"]]
+    assert eventos == [
+        ("reserva_creada", id_1, "activa", None),
+        ("reserva_creada", id_2, "activa", None),
+        ("reserva_estado", id_1, "cancelada", None),
+        ("sancion_creada", None, None, "22222222"),
+        ("reserva_estado", id_2, "sin_asistencia", None),
+    ]
+    assert resp["cambios"][-2]["fecha_fin"] == "2030-03-07"
+    assert resp["ultimo_seq"] == resp["cambios"][-1]["seq"]
+
+    siguiente = client.get("/cambios", params={"since": resp["cambios"][2]["seq"], "limit": 1}, headers=ADMIN)
+    assert [c["tipo"] for c in siguiente.json()["cambios"]] == ["sancion_creada"]
+
+    client.delete("/sanciones/22222222/2030-01-07")
+    ultimo = client.get("/cambios", params={"since": resp["ultimo_seq"]}, headers=ADMIN).json()
+    assert [c["tipo"] for c in ultimo["cambios"]] == ["sancion_eliminada"]
+
+
+def test_long_polling_despierta_con_el_commit(backend_sqlite, monkeypatch):
+    monkeypatch.setattr(app_module, "_requerir_admin", lambda ci: {"es_admin": True})
+    payload = app_module.ReservaIn(
+        nombre_sala="Libre 2", edificio="Sede Central", fecha="2030-01-07", id_turno=1, participantes=["11111111"]
+    )
+
+    async def escenario():
+        espera = asyncio.create_task(app_module.listar_cambios(since=0, limit=10, espera=20, x_actor_ci=None))
+        await asyncio.sleep(0.2)
+        assert not espera.done()
+        threading.Thread(target=app_module.create_reserva, args=(payload,)).start()
+        inicio = time.monotonic()
+        resultado = await espera
+        return resultado, time.monotonic() - inicio
+
+    resultado, demora = asyncio.run(escenario())
+    assert [c["tipo"] for c in resultado["cambios"]] == ["reserva_creada"]
+    # Sin el aviso tendría que esperar el próximo sondeo (CAMBIOS_SONDEO_SEGUNDOS).
+    assert demora < 2
+
+
+def test_hueco_reciente_corta_la_respuesta(backend_sqlite):
+    ahora = datetime.now()
+    conn = app_module.get_conn()
+    cur = conn.cursor()
+    cur.executemany(
+        "INSERT INTO cambio (seq, creado, tipo) VALUES (%s, %s, %s)",
+        [(1, ahora, "reserva_creada"), (3, ahora, "reserva_creada")],
+    )
+    conn.close()
+
+    assert [c["seq"] for c in app_module._leer_cambios(0, 10)] == [1]
+
+    cur = app_module.get_conn().cursor()
+    cur.execute("UPDATE cambio SET creado = %s WHERE seq = 3", (ahora - timedelta(minutes=1),))
+    assert [c["seq"] for c in app_module._leer_cambios(0, 10)] == [1, 3]
+
+
+def test_ack_y_compactacion(backend_sqlite, monkeypatch):
+    client = TestClient(app_module.app)
+    for turno in (1, 2):
+        _reservar(client, turno=turno)
+    seqs = [c["seq"] for c in client.get("/cambios", headers=ADMIN).json()["cambios"]]
+
+    for consumidor, seq in (("tablero", seqs[1]), ("reportes", seqs[0]), ("reportes", 0)):
+        resp = client.post("/cambios/ack", json={"consumidor": consumidor, "seq": seq}, headers=ADMIN)
+        assert resp.status_code == 200
+    assert resp.json() == {"consumidor": "reportes", "ultimo_seq": seqs[0]}
+
+    # Solo se borra lo confirmado por todos los consumidores.
+    assert app_module.compactar_cambios() == {"eliminados": 1, "hasta_seq": seqs[0]}
+    quedan = client.get("/cambios", params={"since": seqs[0]}, headers=ADMIN).json()["cambios"]
+    assert [c["seq"] for c in quedan] == [seqs[1]]
+
+    # La retención borra aunque falte confirmación.
+    monkeypatch.setattr(app_module, "CAMBIOS_RETENCION_DIAS", 1)
+    cur = app_module.get_conn().cursor()
+    cur.execute("UPDATE cambio SET creado = %s", (datetime.now() - timedelta(days=2),))
+    assert app_module.compactar_cambios()["eliminados"] == 1
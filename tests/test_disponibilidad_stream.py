@@ -0,0 +1,137 @@
+import asyncio
+import json
+import threading
+
+from src import app as app_module
+
+FECHA = "2030-01-07"
+
+
+def test_suscripcion_coalesce_y_desborda(monkeypatch):
+    monkeypatch.setattr(app_module, "DISPONIBILIDAD_SSE_MAX_PENDIENTES", 2)
+
+    async def escenario():
+        sub = app_module._Suscripcion()
+        for turno, estado in ((1, "activa"), (1, "cancelada"), (2, "activa")):
+            assert sub.ofrecer({"nombre_sala": "Libre 2", "id_turno": turno, "estado": estado})
+        assert sub.evento.is_set()
+        desbordada, deltas = sub.tomar()
+        assert not desbordada and not sub.evento.is_set()
+        # Dos escrituras sobre el turno 1 llegan como un solo delta con el último estado.
+        assert [(d["id_turno"], d["estado"]) for d in deltas] == [(1, "cancelada"), (2, "activa")]
+
+        for turno in (1, 2, 3):
+            sub.ofrecer({"nombre_sala": "Libre 2", "id_turno": turno, "estado": "activa"})
+        assert not sub.ofrecer({"nombre_sala": "Libre 2", "id_turno": 4, "estado": "activa"})
+        assert sub.tomar() == (True, [])
+
+    asyncio.run(escenario())
+
+
+def _parsear(bloque: str) -> tuple[str | None, dict | None]:
+    evento = datos = None
+    for linea in bloque.splitlines():
+        if linea.startswith("event: "):
+            evento = linea[len("event: "):]
+        elif linea.startswith("data: "):
+            datos = json.loads(linea[len("data: "):])
+    return evento, datos
+
+
+def test_stream_envia_altas_y_cancelaciones_del_topico(backend_sqlite):
+    def reservar(turno, fecha=FECHA):
+        payload = app_module.ReservaIn(
+            nombre_sala="Libre 2", edificio="Sede Central", fecha=fecha, id_turno=turno,
+            participantes=["11111111"],
+        )
+        return app_module.create_reserva(payload)["id_reserva"]
+
+    def en_hilo(fn, *args):
+        resultado = {}
+        hilo = threading.Thread(target=lambda: resultado.setdefault("valor", fn(*args)))
+        hilo.start()
+        return hilo, resultado
+
+    async def escenario():
+        resp = await app_module.disponibilidad_stream(edificio="Sede Central", fecha=app_module.date(2030, 1, 7))
+        assert resp.media_type == "text/event-stream"
+        eventos = resp.body_iterator
+        assert _parsear(await eventos.__anext__()) == ("listo", {"edificio": "Sede Central", "fecha": FECHA})
+        assert app_module._DIFUSOR.suscriptores() == 1
+
+        # Otro día no es parte del tópico: solo llega el turno 1 del 2030-01-07.
+        for fecha in ("2030-01-08", FECHA):
+            hilo, resultado = en_hilo(reservar, 1, fecha)
+            await asyncio.to_thread(hilo.join)
+        id_reserva = resultado["valor"]
+        evento, datos = _parsear(await asyncio.wait_for(eventos.__anext__(), 5))
+        assert evento == "disponibilidad"
+        assert datos["cambios"] == [
+            {"nombre_sala": "Libre 2", "id_turno": 1, "id_reserva": id_reserva, "estado": "activa", "reservado": True}
+        ]
+
+        cancelar = app_module.ReservaEstadoIn(estado="cancelada")
+        hilo, _ = en_hilo(app_module.update_reserva_estado, id_reserva, cancelar)
+        await asyncio.to_thread(hilo.join)
+        _, datos = _parsear(await asyncio.wait_for(eventos.__anext__(), 5))
+        assert [(c["id_turno"], c["reservado"]) for c in datos["cambios"]] == [(1, False)]
+
+        await eventos.aclose()
+        assert app_module._DIFUSOR.suscriptores() == 0
+        assert app_module._DIFUSOR.tarea is None
+
+    asyncio.run(escenario())
+
+
+def test_stream_envia_retenciones_liberaciones_y_vencimientos(backend_sqlite, monkeypatch):
+    monkeypatch.setattr(app_module, "_RETENCIONES", app_module._Retenciones())
+    turno = lambda id_turno: ("Libre 2", "Sede Central", app_module.date(2030, 1, 7), id_turno)  # noqa: E731
+
+    async def escenario():
+        resp = await app_module.disponibilidad_stream(edificio="Sede Central", fecha=app_module.date(2030, 1, 7))
+        eventos = resp.body_iterator
+        assert _parsear(await eventos.__anext__())[0] == "listo"
+
+        async def siguiente():
+            evento, datos = _parsear(await asyncio.wait_for(eventos.__anext__(), 5))
+            assert evento == "disponibilidad"
+            return datos["cambios"]
+
+        def retener(id_turno, actor):
+            id_retencion = app_module._RETENCIONES.retener(turno(id_turno), actor)[0]
+            app_module._DIFUSOR.despertar()
+            return id_retencion
+
+        id_retencion = await asyncio.to_thread(retener, 1, "11111111")
+        assert await siguiente() == [{"nombre_sala": "Libre 2", "id_turno": 1, "retenido": True}]
+
+        # Mover la retención libera el turno anterior.
+        await asyncio.to_thread(retener, 2, "11111111")
+        assert sorted((c["id_turno"], c["retenido"]) for c in await siguiente()) == [(1, False), (2, True)]
+
+        await asyncio.to_thread(app_module._RETENCIONES.liberar, id_retencion)
+        await asyncio.to_thread(app_module._DIFUSOR.despertar)
+        assert await siguiente() == [{"nombre_sala": "Libre 2", "id_turno": 2, "retenido": False}]
+
+        # El vencimiento llega sin que nadie despierte al difusor.
+        monkeypatch.setattr(app_module, "RETENCION_TTL_SEGUNDOS", 0.2)
+        await asyncio.to_thread(retener, 3, "22222222")
+        assert await siguiente() == [{"nombre_sala": "Libre 2", "id_turno": 3, "retenido": True}]
+        assert await siguiente() == [{"nombre_sala": "Libre 2", "id_turno": 3, "retenido": False}]
+
+        await eventos.aclose()
+
+    asyncio.run(escenario())
+
+
+def test_suscripcion_combina_reserva_y_retencion():
+    async def escenario():
+        sub = app_module._Suscripcion()
+        sub.ofrecer({"nombre_sala": "Libre 2", "id_turno": 1, "id_reserva": 7, "estado": "activa", "reservado": True})
+        sub.ofrecer({"nombre_sala": "Libre 2", "id_turno": 1, "retenido": False})
+        return sub.tomar()
+
+    assert asyncio.run(escenario()) == (
+        False,
+        [{"nombre_sala": "Libre 2", "id_turno": 1, "id_reserva": 7, "estado": "activa", "reservado": True, "retenido": False}],
+    )
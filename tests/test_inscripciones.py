@@ -0,0 +1,104 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from src import app as app_module
+
+
+class _FakeCursorInscripciones:
+    def __init__(self, actuales):
+        self.actuales = actuales
+        self.escrituras = []
+
+    def execute(self, query, params=None):
+        q = " ".join(query.split())
+        if q.startswith("SELECT nombre_programa FROM programa_academico"):
+            self._rows = [("Ingeniería Informática",), ("MBA",)]
+        elif q.startswith("SELECT ci FROM participante"):
+            self._rows = [(ci,) for ci in params if ci != "40000009"]
+        elif q.startswith("SELECT id_alumno_programa"):
+            self._rows = list(self.actuales)
+        else:
+            self.escrituras.append((q, params))
+
+    def executemany(self, query, seq):
+        self.escrituras.append((" ".join(query.split()), list(seq)))
+
+    def fetchall(self):
+        return self._rows
+
+
+class _FakeConn:
+    def __init__(self, cur):
+        self.cur = cur
+
+    def cursor(self, dictionary=False):
+        return self.cur
+
+    def start_transaction(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def _sync(monkeypatch, cuerpo, actuales, query=""):
+    cur = _FakeCursorInscripciones(actuales)
+    monkeypatch.setattr(app_module, "get_conn", lambda: _FakeConn(cur))
+    monkeypatch.setattr(app_module, "_requerir_admin", lambda ci: {"ci": ci, "es_admin": True})
+    resp = TestClient(app_module.app).post(
+        f"/inscripciones/sync{query}",
+        content=cuerpo.encode("utf-8"),
+        headers={"Content-Type": "text/csv", "X-Actor-CI": "59876543"},
+    )
+    assert resp.status_code == 200
+    lineas = [json.loads(l) for l in resp.text.splitlines()]
+    return cur, lineas[:-1], lineas[-1]["resumen"]
+
+
+ACTUALES = [
+    (1, "50000001", "Ingeniería Informática", "alumno"),
+    (2, "50000002", "MBA", "alumno"),
+    (3, "50000003", "MBA", "alumno"),
+    (4, "50000001", "Ingeniería Informática", "alumno"),
+]
+
+
+def test_sync_escribe_solo_diferencias(monkeypatch):
+    cuerpo = (
+        "ci,programa,rol\n"
+        "50000001,ingeniería informática,alumno\n"
+        "50000002,MBA,docente\n"
+        "50000004,MBA,alumno\n"
+    )
+    cur, errores, resumen = _sync(monkeypatch, cuerpo, ACTUALES)
+
+    assert errores == []
+    assert resumen == {
+        "procesadas": 3,
+        "insertadas": 1,
+        "actualizadas": 1,
+        "eliminadas": 2,
+        "con_error": 0,
+        "aplicado": True,
+    }
+    insert, update, delete = cur.escrituras
+    assert insert[1] == [("50000004", "MBA", "alumno")]
+    assert update[1] == ("docente", 2)
+    # baja de la CI ausente y de la fila repetida
+    assert delete[1] == (3, 4)
+
+
+def test_sync_con_errores_no_aplica_sin_forzar(monkeypatch):
+    cuerpo = "ci,programa,rol\n50000001,Ingeniería Informática,alumno\n40000009,MBA,alumno\n50000002,Arte,alumno\n"
+    cur, errores, resumen = _sync(monkeypatch, cuerpo, ACTUALES)
+
+    assert [e["error"] for e in errores] == ["Participante no encontrado", "Programa no encontrado: Arte"]
+    assert resumen["aplicado"] is False
+    assert cur.escrituras == []
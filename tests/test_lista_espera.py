@@ -0,0 +1,81 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from src import app as app_module
+
+TURNO = {"nombre_sala": "Libre 2", "edificio": "Sede Central", "fecha": "2030-01-07", "id_turno": 1}
+
+
+@pytest.fixture
+def client(backend_sqlite):
+    return TestClient(app_module.app)
+
+
+def _reservar(client, participantes, **turno):
+    return client.post("/reservas", json={**TURNO, **turno, "participantes": list(participantes)})
+
+
+def _anotar(client, participantes):
+    return client.post("/reservas/espera", json={**TURNO, "participantes": list(participantes)})
+
+
+def test_turno_cancelado_se_puede_volver_a_reservar(client):
+    id_reserva = _reservar(client, ["11111111"]).json()["id_reserva"]
+    client.patch(f"/reservas/{id_reserva}", json={"estado": "cancelada"})
+
+    assert _reservar(client, ["22222222"]).status_code == 201
+    disponibilidad = client.get(
+        "/disponibilidad", params={"fecha": "2030-01-07", "edificio": "Sede Central", "nombre_sala": "Libre 2"}
+    ).json()
+    # Una fila por turno: la cancelada ya no aparece.
+    assert [(t["id_turno"], t["estado_reserva"]) for t in disponibilidad] == [(1, "activa"), (2, None), (3, None)]
+
+    # Reactivar la cancelada chocaría con la nueva.
+    resp = client.patch(f"/reservas/{id_reserva}", json={"estado": "activa"})
+    assert resp.status_code == 409
+
+
+def test_cancelacion_promueve_al_primero_de_la_lista(client):
+    assert _anotar(client, ["22222222"]).status_code == 409  # turno libre
+    id_reserva = _reservar(client, ["11111111"]).json()["id_reserva"]
+
+    primero = _anotar(client, ["22222222"])
+    assert primero.status_code == 201
+    assert primero.json()["posicion"] == 1
+    segundo = _anotar(client, ["33333333"]).json()
+    assert segundo["posicion"] == 2
+    assert _anotar(client, ["33333333", "59876543"]).status_code == 409  # ya espera
+    assert _anotar(client, ["11111111"]).status_code == 409  # ya tiene el turno
+
+    resp = client.patch(f"/reservas/{id_reserva}", json={"estado": "cancelada"})
+    assert resp.status_code == 200
+    promocion = resp.json()["promocion"]
+    assert promocion["id_espera"] == primero.json()["id_espera"]
+    assert promocion["reserva"]["estado"] == "activa"
+
+    reservas = client.get("/reservas").json()
+    nueva = next(r for r in reservas if r["id_reserva"] == promocion["reserva"]["id_reserva"])
+    assert nueva["participantes"] == "22222222"
+    estado = client.get(f"/reservas/espera/{primero.json()['id_espera']}").json()
+    assert (estado["estado"], estado["posicion"]) == ("promovida", None)
+    espera = client.get("/reservas/espera", params=TURNO).json()
+    assert [(e["id_espera"], e["posicion"]) for e in espera] == [(segundo["id_espera"], 1)]
+
+
+def test_promocion_saltea_grupos_que_no_cumplen(client):
+    id_reserva = _reservar(client, ["33333333"]).json()["id_reserva"]
+    id_espera_1 = _anotar(client, ["11111111"]).json()["id_espera"]
+    id_espera_2 = _anotar(client, ["22222222"]).json()["id_espera"]
+    # Después de anotarse, 11111111 queda sancionado para esa fecha.
+    client.post(
+        "/sanciones",
+        json={"ci_participante": "11111111", "fecha_inicio": "2030-01-01", "fecha_fin": "2030-02-01"},
+    )
+
+    promocion = client.patch(f"/reservas/{id_reserva}", json={"estado": "cancelada"}).json()["promocion"]
+    assert promocion["id_espera"] == id_espera_2
+    assert client.get(f"/reservas/espera/{id_espera_1}").json()["estado"] == "esperando"
+
+    assert client.delete(f"/reservas/espera/{id_espera_1}").status_code == 204
+    assert client.delete(f"/reservas/espera/{id_espera_2}").status_code == 409
+    assert client.get("/reservas/espera", params=TURNO).json() == []
@@ -0,0 +1,91 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from src import app as app_module
+
+
+def test_metrics_por_plantilla_de_ruta_y_status():
+    metricas = app_module._MetricasHTTP()
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 404, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(msg):
+        pass
+
+    mw = app_module._MetricasMiddleware(app, metricas)
+    for id_reserva in (1, 2):
+        scope = {"type": "http", "method": "GET", "path": f"/reservas/{id_reserva}", "headers": []}
+        asyncio.run(mw(scope, None, send))
+
+    texto = app_module._texto_metricas(metricas)
+    assert 'salas_http_requests_total{method="GET",route="/reservas/{id_reserva}",status="404"} 2' in texto
+    assert (
+        'salas_http_request_duration_seconds_bucket{method="GET",route="/reservas/{id_reserva}",'
+        'status="404",le="+Inf"} 2'
+    ) in texto
+    assert 'salas_http_requests_in_flight{clase="lecturas"} 0' in texto
+
+
+def test_metrics_endpoint_formato_prometheus():
+    client = TestClient(app_module.app)
+    client.get("/no-existe")
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'route="<sin_ruta>",status="404"' in resp.text
+    assert "# TYPE salas_threadpool_tasks_waiting gauge" in resp.text
+    assert 'salas_db_connections_total{origen="directas"}' in resp.text
+
+
+def test_huella_sql_quita_literales():
+    huella = app_module.huella_sql(
+        "SELECT *  FROM reserva\n WHERE id_reserva = 15 AND estado = 'activa' AND ci IN (%s, %s, %s)"
+    )
+    assert huella == "SELECT * FROM reserva WHERE id_reserva = ? AND estado = ? AND ci IN (?+)"
+
+
+class _FakeCursor:
+    def execute(self, sql, params=None):
+        pass
+
+    def fetchone(self):
+        return (1,)
+
+
+class _FakeConn:
+    def cursor(self, **kwargs):
+        return _FakeCursor()
+
+
+def test_instrumentacion_sql_headers_y_n_mas_1(caplog):
+    conn = app_module._ConexionInstrumentada(_FakeConn())
+
+    async def app(scope, receive, send):
+        cur = conn.cursor(dictionary=True)
+        for ci in range(12):
+            cur.execute("SELECT nombre FROM participante WHERE ci = %s", (ci,))
+            assert cur.fetchone() == (1,)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    enviados = []
+
+    async def send(msg):
+        enviados.append(msg)
+
+    mw = app_module._InstrumentacionSQLMiddleware(app)
+    scope = {"type": "http", "method": "GET", "path": "/reservas", "headers": []}
+    with caplog.at_level("WARNING"):
+        asyncio.run(mw(scope, None, send))
+
+    headers = dict(enviados[0]["headers"])
+    assert headers[b"x-db-statements"] == b"12"
+    assert headers[b"server-timing"].startswith(b"db;dur=")
+    assert float(headers[b"x-db-time"]) >= 0
+    assert headers[b"x-db-slowest"] == b"SELECT nombre FROM participante WHERE ci = ?"
+    assert b"db-lenta;dur=" in headers[b"server-timing"]
+    assert "Posible N+1 en GET /reservas: 12 ejecuciones" in caplog.text
+    assert "más lenta del request" in caplog.text
@@ -0,0 +1,98 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from src import app as app_module
+
+
+class _FakeCursorImport:
+    def __init__(self, existentes):
+        self.existentes = existentes
+        self.insertados = []
+        self.batches = 0
+
+    def execute(self, query, params=None):
+        self._rows = [(ci, email) for ci, email in self.existentes if ci in params or email in params]
+
+    def executemany(self, query, seq):
+        assert "ON DUPLICATE KEY UPDATE" in query
+        self.batches += 1
+        self.insertados.extend(seq)
+
+    def fetchall(self):
+        return self._rows
+
+
+class _FakeConnImport:
+    def __init__(self, cur):
+        self.cur = cur
+
+    def cursor(self, dictionary=False):
+        return self.cur
+
+    def start_transaction(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def _importar(monkeypatch, cuerpo, content_type, existentes=(), chunk=2):
+    cur = _FakeCursorImport(list(existentes))
+    monkeypatch.setattr(app_module, "get_conn", lambda: _FakeConnImport(cur))
+    monkeypatch.setattr(app_module, "_requerir_admin", lambda ci: {"ci": ci, "es_admin": True})
+    client = TestClient(app_module.app)
+    resp = client.post(
+        f"/participantes/import?chunk={chunk}",
+        content=cuerpo.encode("utf-8"),
+        headers={"Content-Type": content_type, "X-Actor-CI": "59876543"},
+    )
+    assert resp.status_code == 200
+    lineas = [json.loads(l) for l in resp.text.splitlines()]
+    return cur, lineas[:-1], lineas[-1]["resumen"]
+
+
+def test_import_csv_por_chunks_con_errores_por_linea(monkeypatch):
+    cuerpo = (
+        "ci,nombre,apellido,email,tipo_participante\n"
+        "5.000.000-1,Ana,Pérez,ana@ucu.edu.uy,estudiante\n"
+        "123,Beto,Gómez,beto@ucu.edu.uy,estudiante\n"
+        "50000002,Caro,Díaz,caro@ucu.edu.uy,docente\n"
+        "50000003,Dani,Ruiz,ocupado@ucu.edu.uy,estudiante\n"
+        "50000004,Eva,Sosa,eva@ucu.edu.uy\n"
+        "50000001,Ana,Pérez,ana2@ucu.edu.uy,posgrado\n"
+    )
+    cur, errores, resumen = _importar(
+        monkeypatch,
+        cuerpo,
+        "text/csv",
+        existentes=[("50000002", "caro@ucu.edu.uy"), ("40000009", "ocupado@ucu.edu.uy")],
+    )
+
+    assert [e["linea"] for e in errores] == [3, 5, 6]
+    assert "CI" in errores[0]["error"]
+    assert "40000009" in errores[1]["error"]
+    assert resumen == {"procesadas": 6, "insertadas": 2, "actualizadas": 1, "con_error": 3}
+    assert cur.batches == 2
+    assert ("50000001", "Ana", "Pérez", "ana2@ucu.edu.uy", "posgrado") in cur.insertados
+
+
+def test_import_ndjson(monkeypatch):
+    cuerpo = "\n".join(
+        [
+            json.dumps({"ci": "50000001", "nombre": "Ana", "apellido": "Pérez", "email": "a@ucu.edu.uy", "tipo_participante": "estudiante"}),
+            "{no es json",
+            json.dumps({"ci": "50000002", "nombre": "X", "apellido": "Pérez", "email": "b@ucu.edu.uy", "tipo_participante": "estudiante"}),
+        ]
+    )
+    cur, errores, resumen = _importar(monkeypatch, cuerpo, "application/x-ndjson")
+
+    assert [e["linea"] for e in errores] == [2, 3]
+    assert errores[1]["error"].startswith("nombre")
+    assert resumen["insertadas"] == 1 and resumen["con_error"] == 2
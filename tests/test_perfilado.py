@@ -0,0 +1,55 @@
+import marshal
+
+from fastapi.testclient import TestClient
+
+from src import app as app_module
+
+
+def _admin_si(ci):
+    if ci != "1":
+        raise app_module.HTTPException(status_code=403, detail="Solo administradores pueden realizar esta acción")
+    return {"ci": "1", "es_admin": True}
+
+
+def test_perfilado_de_un_request_para_admin(monkeypatch):
+    monkeypatch.setattr(app_module, "_requerir_admin", _admin_si)
+    client = TestClient(app_module.app)
+
+    resp = client.get("/health", headers={"X-Perfilar": "1", "X-Actor-CI": "1"})
+    assert resp.status_code == 200
+    id_perfil = resp.headers["x-perfil-id"]
+
+    listado = client.get("/admin/perfiles", headers={"X-Actor-CI": "1"}).json()
+    assert listado[0]["id"] == id_perfil
+    assert listado[0]["ruta"] == "/health"
+
+    texto = client.get(f"/admin/perfiles/{id_perfil}?formato=texto", headers={"X-Actor-CI": "1"})
+    assert "health" in texto.text
+
+    archivo = client.get(f"/admin/perfiles/{id_perfil}", headers={"X-Actor-CI": "1"})
+    assert archivo.headers["content-disposition"].endswith('.pstats"')
+    stats = marshal.loads(archivo.content)
+    assert any(funcion == "health" for (_, _, funcion) in stats)
+
+
+def test_perfilado_rechazado_sin_admin_y_sin_header_no_perfila(monkeypatch):
+    monkeypatch.setattr(app_module, "_requerir_admin", _admin_si)
+    client = TestClient(app_module.app)
+
+    resp = client.get("/health", headers={"X-Perfilar": "1", "X-Actor-CI": "2"})
+    assert resp.status_code == 403
+
+    resp = client.get("/health")
+    assert resp.status_code == 200
+    assert "x-perfil-id" not in resp.headers
+
+
+def test_perfilado_sin_handler_no_falla_ni_anuncia_perfil(monkeypatch):
+    monkeypatch.setattr(app_module, "_requerir_admin", _admin_si)
+    monkeypatch.setattr(app_module, "_PERFILES", app_module.OrderedDict())
+    client = TestClient(app_module.app)
+
+    resp = client.get("/no-existe", headers={"X-Perfilar": "1", "X-Actor-CI": "1"})
+    assert resp.status_code == 404
+    assert "x-perfil-id" not in resp.headers
+    assert client.get("/admin/perfiles", headers={"X-Actor-CI": "1"}).json() == []
@@ -123,3 +123,113 @@ def test_reporte_distribucion_semana_turno(monkeypatch):
     _setup(monkeypatch, rows)
     data = app_module.report_distribucion_semana_turno()
     assert data[0]["dia_semana"] == "Monday"
+
+
+class _CapturingCursor(_FakeCursorReport):
+    def __init__(self, rows, queries):
+        super().__init__(rows)
+        self.queries = queries
+
+    def execute(self, query, params=None):
+        self.queries.append((query, params))
+
+
+def test_rango_mensual_alineado():
+    assert app_module._rango_mensual("2024-03-01", "2024-04-30") == (
+        app_module.date(2024, 3, 1),
+        app_module.date(2024, 4, 1),
+    )
+    assert app_module._rango_mensual(None, None) == (None, None)
+    assert app_module._rango_mensual("2024-03-02", None) is None
+    assert app_module._rango_mensual(None, "2024-04-29") is None
+    assert app_module._rango_mensual("no-fecha", None) is None
+
+
+def test_top_participantes_mes_completo_usa_contadores(monkeypatch):
+    queries = []
+    rows = [{"ci": "50000001", "nombre": "Ana", "apellido": "Diaz", "total_reservas": 6}]
+    conn = _FakeConnReport(rows)
+    conn.cursor = lambda dictionary=False: _CapturingCursor(rows, queries)
+    monkeypatch.setattr(app_module, "get_conn", lambda: conn)
+
+    data = app_module.report_top_participantes(limit=5, desde="2024-03-01", hasta="2024-03-31")
+
+    assert data[0]["total_reservas"] == 6
+    assert "contador_participante_mes" in queries[0][0]
+    assert "reserva_participante" not in queries[0][0]
+    assert queries[0][1] == (app_module.date(2024, 3, 1), app_module.date(2024, 3, 1), 5)
+
+
+def test_salas_no_show_rango_parcial_usa_sql_exacto(monkeypatch):
+    queries = []
+    rows = [{"edificio": "Central", "nombre_sala": "Sala 1", "total_sin_asistencia": 2}]
+    conn = _FakeConnReport(rows)
+    conn.cursor = lambda dictionary=False: _CapturingCursor(rows, queries)
+    monkeypatch.setattr(app_module, "get_conn", lambda: conn)
+
+    app_module.report_salas_no_show(limit=5, desde="2024-03-05", hasta="2024-03-31")
+
+    assert "SELECT fecha, estado, edificio, nombre_sala, 1 AS total_reservas FROM reserva" in queries[-1][0]
+
+
+def test_deltas_contadores():
+    assert app_module._deltas_contadores(None, "activa") == (1, 0)
+    assert app_module._deltas_contadores("activa", "sin_asistencia") == (0, 1)
+    assert app_module._deltas_contadores("sin_asistencia", "cancelada") == (-1, -1)
+    assert app_module._deltas_contadores("activa", "finalizada") == (0, 0)
+
+
+def test_fuente_reservas_incluye_resumen_si_toca_archivo(monkeypatch):
+    monkeypatch.setattr(app_module, "_ARCHIVADO_HASTA", app_module.date(2023, 12, 31))
+    monkeypatch.setattr(app_module, "_ARCHIVADO_HASTA_CARGADO", True)
+    cur = _FakeCursorReport([])
+
+    assert "resumen_sala_dia" in app_module._fuente_reservas(cur, "2023-06-01")
+    assert "resumen_turno_dia" in app_module._fuente_reservas(cur, None, nivel="turno")
+    assert "resumen" not in app_module._fuente_reservas(cur, "2024-01-01")
+    assert app_module._fuentes_con_participantes(cur, "2024-02-01") == ("reserva", "reserva_participante")
+
+
+class _FakeCursorArchivo:
+    def __init__(self, filas):
+        self.filas = filas
+        self.queries = []
+
+    def execute(self, query, params=None):
+        self.queries.append(" ".join(query.split()))
+
+    def fetchall(self):
+        return self.filas
+
+
+class _FakeConnArchivo:
+    def __init__(self):
+        self.commits = 0
+
+    def start_transaction(self):
+        pass
+
+    def commit(self):
+        self.commits += 1
+
+
+def test_archivar_lote_mueve_resume_y_borra(monkeypatch):
+    monkeypatch.setattr(app_module, "_ARCHIVADO_HASTA", None)
+    cur = _FakeCursorArchivo([(7, app_module.date(2022, 5, 3)), (9, app_module.date(2022, 5, 4))])
+    conn = _FakeConnArchivo()
+
+    movidas = app_module._archivar_lote(conn, cur, app_module.date(2023, 1, 1), 2)
+
+    assert movidas == 2
+    assert conn.commits == 1
+    tablas = [q.split()[2] for q in cur.queries[1:]]
+    assert tablas == [
+        "reserva_historica",
+        "reserva_participante_historica",
+        "resumen_sala_dia",
+        "resumen_turno_dia",
+        "reserva_participante",
+        "reserva",
+        "archivo_estado",
+    ]
+    assert app_module._ARCHIVADO_HASTA == app_module.date(2022, 5, 4)
@@ -1,4 +1,4 @@
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta
 
 import pytest
 from fastapi import HTTPException
@@ -13,7 +13,7 @@ class _FakeCursorAsistencia:
 
     def execute(self, query, params=None):
         if "FROM reserva" in query and "reserva_participante" not in query and "id_turno" not in query:
-            self._next_one = {"id_reserva": params[0], "fecha": date(2024, 1, 10), "estado": "activa"}
+            self._next_one = {"id_reserva": params[0], "edificio": "Sede Central", "fecha": date(2024, 1, 10), "estado": "activa"}
         elif "FROM reserva_participante" in query and "COUNT" not in query:
             self._next_all = [{"ci_participante": "50000001"}]
         elif "COUNT(*) AS asistentes" in query:
@@ -49,6 +49,9 @@ class _FakeConnAsistencia:
     def cursor(self, dictionary=False):
         return self.cursor_obj
 
+    def start_transaction(self):
+        pass
+
     def commit(self):
         self.committed = True
 
@@ -107,6 +110,9 @@ class _FakeConnUpdate:
     def cursor(self, dictionary=False):
         return self.cursor_obj
 
+    def start_transaction(self):
+        pass
+
     def commit(self):
         self.committed = True
 
@@ -196,3 +202,166 @@ def test_reserva_rechazada_por_sancion_activa(monkeypatch):
         app_module.create_reserva(payload)
 
     assert "sanción activa" in str(excinfo.value.detail)
+
+
+class _FakeCursorLote:
+    def __init__(self, filas):
+        self.filas = filas
+        self.queries = []
+        self._next_all = []
+
+    def execute(self, query, params=None):
+        q = " ".join(query.split())
+        self.queries.append(q)
+        if q.startswith("SELECT r.id_reserva"):
+            self._next_all = [dict(f) for f in self.filas]
+        elif q.startswith("SELECT rp.id_reserva"):
+            self._next_all = [
+                {"id_reserva": 2, "ci": "50000002", "fecha_inicio": date(2024, 1, 10), "fecha_fin": date(2024, 3, 10)}
+            ]
+        else:
+            self._next_all = []
+
+    def fetchall(self):
+        return self._next_all
+
+    def close(self):
+        pass
+
+
+def test_asistencia_lote_sentencias_fijas_y_errores_por_reserva(monkeypatch):
+    base = {"nombre_sala": "Sala A-001", "edificio": "Sede Central", "fecha": date(2024, 1, 10), "id_turno": 1, "estado": "activa"}
+    filas = [
+        {**base, "id_reserva": 1, "ci_participante": "50000001"},
+        {**base, "id_reserva": 2, "id_turno": 2, "ci_participante": "50000002"},
+        {**base, "id_reserva": 3, "id_turno": 3, "ci_participante": "50000003"},
+    ]
+    cur = _FakeCursorLote(filas)
+    conn = _FakeConnAsistencia()
+    conn.cursor_obj = cur
+    monkeypatch.setattr(app_module, "get_reservas_connection", lambda: conn)
+
+    payload = app_module.AsistenciaLoteIn(
+        reservas=[
+            {"id_reserva": 1, "presentes": ["5.000.000-1"]},
+            {"id_reserva": 2, "presentes": []},
+            {"id_reserva": 3, "presentes": ["40000001"]},
+            {"id_reserva": 99, "presentes": []},
+        ]
+    )
+    resp = app_module.registrar_asistencia_lote(payload)
+
+    por_id = {r["id_reserva"]: r for r in resp}
+    assert por_id[1]["ok"] and por_id[1]["reserva"]["estado"] == "finalizada"
+    assert por_id[2]["ok"] and por_id[2]["reserva"]["estado"] == "sin_asistencia"
+    assert por_id[2]["sanciones_creadas"][0]["ci"] == "50000002"
+    assert not por_id[3]["ok"] and "no pertenecen" in por_id[3]["error"]
+    assert por_id[99]["error"] == "Reserva no encontrada"
+    assert conn.committed
+    # lectura, asistencia, estado, contador no-show, evento de reservas,
+    # selección e INSERT de sanciones, evento de sanciones
+    assert len(cur.queries) == 8
+    assert sum(q.startswith("INSERT INTO cambio") for q in cur.queries) == 2
+
+
+class _FakeCursorNoShow:
+    def __init__(self, lotes, checkpoint=None):
+        self.lotes = list(lotes)
+        self.checkpoint = checkpoint
+        self.queries = []
+        self.params = []
+        self._next_one = None
+        self._next_all = []
+
+    def execute(self, query, params=None):
+        q = " ".join(query.split())
+        self.queries.append(q)
+        self.params.append(params)
+        if q.startswith("SELECT marca FROM proceso_checkpoint"):
+            self._next_one = {"marca": self.checkpoint} if self.checkpoint else None
+        elif q.startswith("SELECT r.id_reserva"):
+            self._next_all = [{"id_reserva": i, "edificio": "Sede Central"} for i in (self.lotes.pop(0) if self.lotes else [])]
+        elif q.startswith("SELECT rp.id_reserva"):
+            self._next_all = [
+                {"id_reserva": 1, "ci": "50000001", "fecha_inicio": date(2024, 1, 10), "fecha_fin": date(2024, 3, 10)}
+            ]
+        else:
+            self._next_all = []
+
+    def fetchone(self):
+        return self._next_one
+
+    def fetchall(self):
+        return self._next_all
+
+    def close(self):
+        pass
+
+
+def test_barrido_no_show_procesa_por_lotes_y_guarda_checkpoint(monkeypatch):
+    cur = _FakeCursorNoShow([[1, 2], [3]], checkpoint=datetime(2024, 1, 20, 12, 0))
+    conn = _FakeConnAsistencia()
+    conn.cursor_obj = cur
+    monkeypatch.setattr(app_module, "get_conn", lambda: conn)
+
+    resultado = app_module.barrer_no_show(lote=2)
+
+    assert resultado["reservas_marcadas"] == 3
+    assert resultado["sanciones_emitidas"] == 2
+    seleccion = [p for q, p in zip(cur.queries, cur.params) if q.startswith("SELECT r.id_reserva")]
+    # el checkpoint (menos el margen) acota el rango de fechas del barrido
+    assert len(seleccion) == 2 and date(2024, 1, 13) in seleccion[0]
+    assert sum(q.startswith("INSERT IGNORE INTO sancion_participante") for q in cur.queries) == 2
+    assert cur.queries[-1].startswith("INSERT INTO proceso_checkpoint")
+    assert app_module._NO_SHOW_STATS["ultimo_resultado"] == resultado
+
+
+class _FakeCursorSanciones:
+    def __init__(self, filas):
+        self.filas = filas
+        self.queries = []
+        self.params = []
+
+    def execute(self, query, params=None):
+        self.queries.append(" ".join(query.split()))
+        self.params.append(params)
+
+    def fetchone(self):
+        return {"total": 3, "vigentes": 2}
+
+    def fetchall(self):
+        return [dict(f) for f in self.filas]
+
+    def close(self):
+        pass
+
+
+def test_listar_sanciones_pagina_keyset_con_conteos(monkeypatch):
+    filas = [
+        {"ci": f"5000000{i}", "ci_sancionado": f"5000000{i}", "fecha_inicio": date(2024, 1, 10 - i), "fecha_fin": date(2024, 3, 10)}
+        for i in range(3)
+    ]
+    cur = _FakeCursorSanciones(filas)
+    conn = _FakeConnAsistencia()
+    conn.cursor_obj = cur
+    monkeypatch.setattr(app_module, "get_conn", lambda: conn)
+
+    resp = app_module.listar_sanciones(
+        ci=None, vigente_en=date(2024, 2, 1), desde=None, hasta=None, limit=2, cursor="2024-01-11_50000009"
+    )
+
+    assert resp["total"] == 3 and resp["vigentes"] == 2
+    assert len(resp["items"]) == 2
+    assert resp["siguiente_cursor"] == "2024-01-09_50000001"
+    pagina = cur.queries[1]
+    assert "fecha_fin >= %s AND fecha_inicio <= %s" in pagina
+    assert "(fecha_inicio, ci_participante) < (%s, %s)" in pagina
+    assert cur.params[1][-3:] == (date(2024, 1, 11), "50000009", 3)
+    # el conteo ignora el cursor
+    assert "ci_participante) <" not in cur.queries[0]
+
+
+def test_listar_sanciones_cursor_invalido():
+    with pytest.raises(HTTPException) as exc:
+        app_module._parse_cursor_sancion("basura")
+    assert exc.value.status_code == 422
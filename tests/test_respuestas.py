@@ -0,0 +1,118 @@
+import json
+from datetime import date
+from decimal import Decimal
+
+from fastapi.testclient import TestClient
+
+from src import app as app_module
+
+
+class _FakeCursorParticipantes:
+    def execute(self, query, params=None):
+        pass
+
+    def fetchall(self):
+        return [
+            {
+                "ci": f"{50000000 + i}",
+                "nombre": "Ana",
+                "apellido": "Pérez",
+                "email": f"ana{i}@ucu.edu.uy",
+                "tipo_participante": "estudiante",
+            }
+            for i in range(200)
+        ]
+
+
+class _FakeConn:
+    def __init__(self, cur):
+        self.cur = cur
+
+    def cursor(self, dictionary=False):
+        return self.cur
+
+    def close(self):
+        pass
+
+
+def test_listado_confiable_se_comprime_y_conserva_forma(monkeypatch):
+    monkeypatch.setattr(app_module, "get_conn", lambda: _FakeConn(_FakeCursorParticipantes()))
+    client = TestClient(app_module.app)
+
+    resp = client.get("/participantes", headers={"Accept-Encoding": "gzip"})
+
+    assert resp.status_code == 200
+    assert resp.headers["content-encoding"] == "gzip"
+    assert int(resp.headers["content-length"]) < len(resp.content)
+    filas = resp.json()
+    assert len(filas) == 200
+    assert filas[0] == app_module.ParticipanteBase(**filas[0]).model_dump()
+    # la función del módulo sigue devolviendo filas, no una Response
+    assert isinstance(app_module.listar_participantes(), list)
+
+
+def test_respuesta_chica_no_se_comprime():
+    resp = TestClient(app_module.app).get("/openapi.json", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in resp.headers
+
+
+def test_json_rapida_serializa_tipos_de_mysql():
+    cuerpo = app_module.JSONRapida(
+        [{"total": Decimal("3"), "promedio": Decimal("2.50"), "fecha": date(2024, 1, 10)}]
+    ).body
+    assert json.loads(cuerpo) == [{"total": 3, "promedio": 2.5, "fecha": "2024-01-10"}]
+
+
+def test_codificacion_aceptada_respeta_q_cero():
+    assert app_module._codificacion_aceptada("gzip;q=0, deflate") is None
+    assert app_module._codificacion_aceptada("deflate, gzip") == "gzip"
+
+
+def test_batch_ejecuta_sub_requests_y_aisla_errores(monkeypatch):
+    monkeypatch.setattr(app_module, "get_conn", lambda: _FakeConn(_FakeCursorParticipantes()))
+    client = TestClient(app_module.app)
+
+    resp = client.post(
+        "/batch",
+        json={"requests": [{"url": "/participantes"}, {"url": "/participantes/123"}, {"url": "/no-existe"}]},
+    )
+
+    assert resp.status_code == 200
+    participantes, ci_invalida, inexistente = resp.json()["responses"]
+    assert participantes["status"] == 200 and len(participantes["body"]) == 200
+    assert ci_invalida["status"] == 422
+    assert ci_invalida["body"]["detail"] == "Formato de CI inválido"
+    assert inexistente["status"] == 404
+
+
+def test_batch_rechaza_rutas_no_relativas():
+    resp = TestClient(app_module.app).post("/batch", json={"requests": [{"url": "http://otro/"}]})
+    assert resp.status_code == 422
+
+
+def test_batch_rechaza_streams_y_long_polling():
+    client = TestClient(app_module.app)
+    for url in ("/cambios?desde=0", "/disponibilidad/stream?edificio=X&fecha=2030-01-01", "/batch"):
+        resp = client.post("/batch", json={"requests": [{"url": url}]})
+        assert resp.status_code == 422, url
+
+
+def test_batch_cobra_admision_por_sub_request(monkeypatch):
+    monkeypatch.setattr(app_module, "get_conn", lambda: _FakeConn(_FakeCursorParticipantes()))
+    for middleware in app_module._ADMISION_INSTANCIAS:
+        monkeypatch.setattr(middleware, "buckets", app_module._BucketsRayados())
+        monkeypatch.setattr(middleware, "rafaga_ci", 2)
+    client = TestClient(app_module.app)
+
+    resp = client.post(
+        "/batch",
+        json={"requests": [{"url": "/participantes"}] * 3},
+        headers={"X-Actor-CI": "44444444"},
+    )
+
+    assert resp.status_code == 200
+    estados = sorted(r["status"] for r in resp.json()["responses"])
+    assert estados == [200, 200, 429]
+    # cada sub-request queda en las métricas con su propia ruta
+    metricas = client.get("/metrics").text
+    assert 'route="/participantes"' in metricas
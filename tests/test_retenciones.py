@@ -0,0 +1,116 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from src import app as app_module
+
+TURNO = {"nombre_sala": "Libre 2", "edificio": "Sede Central", "fecha": "2030-01-07", "id_turno": 1}
+ANA = {"X-Actor-CI": "11111111"}
+BRUNO = {"X-Actor-CI": "22222222"}
+
+
+@pytest.fixture
+def client(backend_sqlite, monkeypatch):
+    monkeypatch.setattr(app_module, "_RETENCIONES", app_module._Retenciones())
+    return TestClient(app_module.app)
+
+
+def test_vencen_sin_tocar_la_base(monkeypatch):
+    reloj = [1000.0]
+    monkeypatch.setattr(app_module.time_mod, "monotonic", lambda: reloj[0])
+    retenciones = app_module._Retenciones()
+    turno = ("Libre 2", "Sede Central", "2030-01-07", 1)
+
+    id_1, segundos = retenciones.retener(turno, "11111111")
+    assert segundos == app_module.RETENCION_TTL_SEGUNDOS
+    with pytest.raises(app_module.HTTPException) as exc:
+        retenciones.retener(turno, "22222222")
+    assert exc.value.status_code == 409
+
+    # Renovar corre el vencimiento; la entrada vieja del heap se descarta.
+    reloj[0] += 100
+    assert retenciones.retener(turno, "11111111")[0] == id_1
+    reloj[0] += 100
+    assert retenciones.titular(turno) == id_1 and retenciones.activas() == 1
+
+    reloj[0] += 21
+    assert retenciones.titular(turno) is None
+    assert retenciones.activas() == 0
+    assert retenciones.estadisticas == {"creadas": 1, "vencidas": 1}
+    assert retenciones.retener(turno, "11111111")[0] != id_1
+
+
+def test_una_por_actor_y_vida_acotada(monkeypatch):
+    reloj = [1000.0]
+    monkeypatch.setattr(app_module.time_mod, "monotonic", lambda: reloj[0])
+    retenciones = app_module._Retenciones()
+    turno_1 = ("Libre 2", "Sede Central", "2030-01-07", 1)
+    turno_2 = ("Libre 2", "Sede Central", "2030-01-07", 2)
+
+    id_retencion, _ = retenciones.retener(turno_1, "11111111")
+    # Otra retención del mismo actor mueve la anterior.
+    assert retenciones.retener(turno_2, "11111111")[0] == id_retencion
+    assert retenciones.titular(turno_1) is None and retenciones.activas() == 1
+    # El id no se puede usar desde otro actor.
+    with pytest.raises(app_module.HTTPException) as exc:
+        retenciones.retener(turno_1, "22222222", id_retencion)
+    assert exc.value.status_code == 403
+    assert not retenciones.liberar(id_retencion, "22222222")
+
+    # Renovar no la estira más allá de RETENCION_VIDA_MAX_SEGUNDOS.
+    creada, vida = reloj[0], app_module.RETENCION_VIDA_MAX_SEGUNDOS
+    while reloj[0] + 100 < creada + vida - 60:
+        reloj[0] += 100
+        assert retenciones.retener(turno_2, "11111111")[0] == id_retencion
+    reloj[0] = creada + vida - 60
+    assert retenciones.retener(turno_2, "11111111") == (id_retencion, 60)
+    reloj[0] += 59.5
+    with pytest.raises(app_module.HTTPException) as exc:
+        retenciones.retener(turno_2, "11111111")
+    assert exc.value.status_code == 409
+    reloj[0] += 1
+    assert retenciones.titular(turno_2) is None
+
+
+def test_reserva_respeta_la_retencion(client):
+    retencion = client.post("/reservas/retenciones", json=TURNO, headers=ANA)
+    assert retencion.status_code == 201
+    id_retencion = retencion.json()["id_retencion"]
+    assert client.post("/reservas/retenciones", json=TURNO, headers=BRUNO).status_code == 409
+
+    disponibilidad = client.get(
+        "/disponibilidad", params={"fecha": "2030-01-07", "edificio": "Sede Central", "nombre_sala": "Libre 2"}
+    ).json()
+    assert [(t["reservado"], t["retenido"]) for t in disponibilidad] == [(False, True), (False, False), (False, False)]
+
+    ajena = client.post("/reservas", json={**TURNO, "participantes": ["22222222"]})
+    assert ajena.status_code == 409
+    assert "retenido" in ajena.json()["detail"]
+    # Las alternativas tampoco ofrecen turnos retenidos.
+    sugeridos = {(a["nombre_sala"], a["fecha"], a["id_turno"]) for a in ajena.json()["alternativas"]}
+    assert ("Libre 2", "2030-01-07", 1) not in sugeridos and ("Libre 1", "2030-01-07", 1) in sugeridos
+
+    propia = client.post("/reservas", json={**TURNO, "participantes": ["11111111"], "id_retencion": id_retencion})
+    assert propia.status_code == 201
+    # La reserva consumió la retención.
+    assert client.delete(f"/reservas/retenciones/{id_retencion}", headers=ANA).status_code == 404
+    assert client.post("/reservas/retenciones", json=TURNO, headers=BRUNO).status_code == 409
+
+
+def test_mover_y_liberar(client):
+    id_retencion = client.post("/reservas/retenciones", json=TURNO, headers=ANA).json()["id_retencion"]
+    movida = client.post("/reservas/retenciones", json={**TURNO, "id_turno": 2}, headers=ANA)
+    assert movida.json()["id_retencion"] == id_retencion
+    # El turno 1 quedó libre para otro, y solo su titular lo libera.
+    otra = client.post("/reservas/retenciones", json=TURNO, headers=BRUNO).json()["id_retencion"]
+    assert client.delete(f"/reservas/retenciones/{otra}", headers=ANA).status_code == 404
+    assert client.delete(f"/reservas/retenciones/{otra}", headers=BRUNO).status_code == 204
+    assert client.post("/reservas", json={**TURNO, "participantes": ["22222222"]}).status_code == 201
+
+
+def test_retencion_valida_actor_sala_turno_y_fecha(client):
+    assert client.post("/reservas/retenciones", json=TURNO).status_code == 401
+    assert client.post("/reservas/retenciones", json={**TURNO, "nombre_sala": "No existe"}, headers=ANA).status_code == 404
+    assert client.post("/reservas/retenciones", json={**TURNO, "id_turno": 99}, headers=ANA).status_code == 404
+    pasado = client.post("/reservas/retenciones", json={**TURNO, "fecha": "2020-01-06"}, headers=ANA)
+    assert pasado.status_code == 422
+    assert app_module._RETENCIONES.activas() == 0
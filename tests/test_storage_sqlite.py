@@ -0,0 +1,112 @@
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src import app as app_module
+from src import storage
+
+# Lunes de una semana ISO sin otras reservas.
+LUNES = "2030-01-07"
+
+
+@pytest.fixture
+def client(backend_sqlite):
+    return TestClient(app_module.app)
+
+
+def _reservar(client, sala="Libre 2", fecha=LUNES, turno=1, participantes=("11111111",)):
+    return client.post(
+        "/reservas",
+        json={
+            "nombre_sala": sala,
+            "edificio": "Sede Central",
+            "fecha": fecha,
+            "id_turno": turno,
+            "participantes": list(participantes),
+        },
+    )
+
+
+def test_traducir_sql_dialecto_mysql():
+    sql = storage.traducir_sql(
+        """
+        INSERT INTO contador_sala_mes (mes, edificio, total_sin_asistencia)
+        SELECT DATE_SUB(r.fecha, INTERVAL DAY(r.fecha) - 1 DAY), r.edificio, %s
+        FROM reserva r WHERE r.id_reserva IN (%s) FOR UPDATE
+        ON DUPLICATE KEY UPDATE total_sin_asistencia = total_sin_asistencia + VALUES(total_sin_asistencia)
+        """
+    )
+    assert "_FECHA_MAS(r.fecha, -(DAY(r.fecha) - 1), 'DAY')" in sql
+    assert "ON CONFLICT DO UPDATE SET total_sin_asistencia = total_sin_asistencia + excluded.total_sin_asistencia" in sql
+    assert "FOR UPDATE" not in sql and "%s" not in sql
+    assert storage._fecha_mas("2030-01-31", 1, "MONTH") == "2030-02-28"
+    sql = storage.traducir_sql("SELECT r.id_reserva FROM reserva r JOIN turno t LIMIT 5 FOR UPDATE OF r SKIP LOCKED")
+    assert sql == "SELECT r.id_reserva FROM reserva r JOIN turno t LIMIT 5"
+
+
+def test_reserva_y_tipos_como_mysql(client):
+    resp = _reservar(client)
+    assert resp.status_code == 201
+    assert resp.json()["fecha"] == LUNES
+
+    conn = app_module.get_conn()
+    cur = conn.cursor(dictionary=True)
+    cur.execute("SELECT fecha FROM reserva WHERE id_reserva = %s", (resp.json()["id_reserva"],))
+    assert cur.fetchone()["fecha"] == date(2030, 1, 7)
+    cur.execute("SELECT mes, total_reservas FROM contador_participante_mes")
+    assert cur.fetchall() == [{"mes": date(2030, 1, 1), "total_reservas": 1}]
+    conn.close()
+
+
+def test_slot_duplicado_y_capacidad(client):
+    assert _reservar(client).status_code == 201
+    duplicada = _reservar(client, participantes=("22222222",))
+    assert duplicada.status_code == 409
+    assert "Ya existe una reserva" in duplicada.json()["detail"]
+
+    llena = _reservar(client, sala="Libre 1", participantes=("11111111", "22222222", "33333333"))
+    assert llena.status_code == 409
+    assert "capacidad 2" in llena.json()["detail"]
+
+
+def test_limites_de_salas_libres(client):
+    assert _reservar(client, turno=1).status_code == 201
+    assert _reservar(client, turno=2).status_code == 201
+    tercera_hora = _reservar(client, turno=3)
+    assert tercera_hora.status_code == 409
+    assert "horas reservadas" in tercera_hora.json()["detail"]
+
+    assert _reservar(client, fecha="2030-01-08").status_code == 201
+    cuarta = _reservar(client, fecha="2030-01-09")
+    assert cuarta.status_code == 409
+    assert "3 reservas activas por semana" in cuarta.json()["detail"]
+    assert _reservar(client, fecha="2030-01-14").status_code == 201
+
+
+def test_exclusividad_de_sala_docente(client):
+    resp = _reservar(client, sala="Docentes", participantes=("11111111",))
+    assert resp.status_code == 409
+    assert "exclusiva para docente" in resp.json()["detail"]
+    assert _reservar(client, sala="Docentes", participantes=("33333333",)).status_code == 201
+
+
+def test_inasistencia_sanciona_y_bloquea(client):
+    id_reserva = _reservar(client, participantes=("11111111", "22222222")).json()["id_reserva"]
+
+    resp = client.post(f"/reservas/{id_reserva}/asistencia", json={"presentes": []})
+    assert resp.status_code == 200
+    assert resp.json()["reserva"]["estado"] == "sin_asistencia"
+
+    bloqueada = _reservar(client, fecha="2030-02-04")
+    assert bloqueada.status_code == 409
+    assert "sanción activa" in bloqueada.json()["detail"]
+    assert _reservar(client, fecha="2030-03-11").status_code == 201
+
+
+def test_cancelar_reserva(client):
+    id_reserva = _reservar(client).json()["id_reserva"]
+    resp = client.patch(f"/reservas/{id_reserva}", json={"estado": "cancelada"})
+    assert resp.status_code == 200
+    assert resp.json()["reserva"]["estado"] == "cancelada"
+    assert client.patch("/reservas/999", json={"estado": "cancelada"}).status_code == 404
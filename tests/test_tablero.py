@@ -0,0 +1,110 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+
+from src import app as app_module
+
+
+def _insertar_reserva(nombre_sala, id_turno, estado, participantes):
+    conn = app_module.get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        "INSERT INTO reserva (nombre_sala, edificio, fecha, id_turno, estado) VALUES (%s, %s, %s, %s, %s)",
+        (nombre_sala, "Sede Central", "2030-01-07", id_turno, estado),
+    )
+    id_reserva = cur.lastrowid
+    for ci in participantes:
+        cur.execute(
+            "INSERT INTO reserva_participante (ci_participante, id_reserva) VALUES (%s, %s)", (ci, id_reserva)
+        )
+    conn.close()
+    return id_reserva
+
+
+def test_snapshot_turno_actual_y_siguiente(backend_sqlite):
+    id_actual = _insertar_reserva("Libre 2", 2, "activa", ("11111111", "22222222"))
+    _insertar_reserva("Libre 1", 2, "cancelada", ("33333333",))
+    id_siguiente = _insertar_reserva("Libre 1", 3, "activa", ("33333333",))
+
+    snapshot = app_module._construir_tablero("Sede Central", datetime(2030, 1, 7, 9, 30))
+    cuerpo = json.loads(snapshot["variantes"]["identity"])
+    assert cuerpo["actual"] == {"id_turno": 2, "hora_inicio": "09:00:00", "hora_fin": "10:00:00"}
+    assert cuerpo["siguiente"]["id_turno"] == 3
+    salas = {s["nombre_sala"]: s for s in cuerpo["salas"]}
+    assert salas["Libre 2"]["actual"] == {"ocupada": True, "id_reserva": id_actual, "participantes": 2}
+    assert salas["Libre 1"]["actual"]["ocupada"] is False
+    assert salas["Libre 1"]["siguiente"] == {"ocupada": True, "id_reserva": id_siguiente, "participantes": 1}
+    # Vence en el próximo borde de turno, acotado por TABLERO_TTL_SEGUNDOS.
+    assert cuerpo["vigente_hasta"] == "2030-01-07T10:00:00"
+    assert snapshot["vence"] == datetime(2030, 1, 7, 9, 30, 10)
+
+    # Después del último turno no hay actual ni siguiente y vence a medianoche.
+    cuerpo = json.loads(app_module._construir_tablero("Sede Central", datetime(2030, 1, 7, 20))["variantes"]["identity"])
+    assert cuerpo["actual"] is None and cuerpo["siguiente"] is None
+    assert cuerpo["salas"][0]["actual"] is None
+    assert cuerpo["vigente_hasta"] == "2030-01-08T00:00:00"
+
+
+def test_etag_304_e_invalidacion(backend_sqlite, monkeypatch):
+    monkeypatch.setattr(app_module, "_TABLERO", {})
+    client = TestClient(app_module.app)
+    construidos = app_module._TABLERO_STATS["construidos"]
+
+    resp = client.get("/tablero/Sede Central", headers={"Accept-Encoding": "gzip"})
+    assert resp.status_code == 200
+    etag = resp.headers["etag"]
+    assert resp.json()["edificio"] == "Sede Central"
+    assert len(resp.json()["salas"]) == 3
+    assert resp.headers["content-encoding"] == "gzip"
+
+    assert client.get("/tablero/Sede Central", headers={"If-None-Match": etag}).status_code == 304
+    plano = client.get("/tablero/Sede Central", headers={"Accept-Encoding": "identity"})
+    assert plano.headers["etag"] == etag and "content-encoding" not in plano.headers
+    assert app_module._TABLERO_STATS["construidos"] == construidos + 1
+
+    # Un commit con cambios descarta el snapshot.
+    app_module.create_reserva(
+        app_module.ReservaIn(
+            nombre_sala="Libre 2", edificio="Sede Central", fecha="2030-01-07", id_turno=1,
+            participantes=["11111111"],
+        )
+    )
+    assert "Sede Central" not in app_module._TABLERO
+    client.get("/tablero/Sede Central")
+    assert app_module._TABLERO_STATS["construidos"] == construidos + 2
+
+    assert client.get("/tablero/Otro").status_code == 404
+
+
+def test_armado_unico_e_invalidacion_por_edificio(backend_sqlite, monkeypatch):
+    monkeypatch.setattr(app_module, "_TABLERO", {})
+    original = app_module._construir_tablero
+    armados = []
+    en_armado = threading.Event()
+    seguir = threading.Event()
+
+    def lento(edificio, ahora):
+        armados.append(edificio)
+        en_armado.set()
+        seguir.wait(5)
+        return original(edificio, ahora)
+
+    monkeypatch.setattr(app_module, "_construir_tablero", lento)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        pedidos = [pool.submit(app_module._tablero, "Sede Central") for _ in range(8)]
+        en_armado.wait(5)
+        seguir.set()
+        snapshots = [p.result() for p in pedidos]
+    assert armados == ["Sede Central"]
+    assert all(s is snapshots[0] for s in snapshots)
+
+    # Un cambio en otro edificio no descarta este snapshot; uno propio sí.
+    app_module._avisar_cambios(("Otro edificio",))
+    assert "Sede Central" in app_module._TABLERO
+    app_module._avisar_cambios(edificios=())
+    assert "Sede Central" in app_module._TABLERO
+    app_module._avisar_cambios(("Sede Central",))
+    assert "Sede Central" not in app_module._TABLERO
@@ -0,0 +1,39 @@
+import gzip
+import re
+
+from fastapi.testclient import TestClient
+
+from src import app as app_module
+
+
+def test_ui_apunta_a_estaticos_con_huella_inmutables():
+    client = TestClient(app_module.app)
+    ui = client.get("/ui")
+    assert ui.status_code == 200
+    assert ui.headers["cache-control"] == "no-cache"
+
+    ruta = re.search(r'src="(/static/app\.[0-9a-f]{12}\.js)"', ui.text).group(1)
+    js = client.get(ruta, headers={"Accept-Encoding": "gzip"})
+    assert js.status_code == 200
+    assert js.headers["cache-control"] == "public, max-age=31536000, immutable"
+    assert js.headers["content-encoding"] == "gzip"
+    assert js.content == (app_module.STATIC_DIR / "app.js").read_bytes()
+
+    # el nombre sin huella sigue funcionando, pero se revalida
+    plano = client.get("/static/app.js", headers={"Accept-Encoding": "identity"})
+    assert plano.headers["cache-control"] == "no-cache"
+    assert "content-encoding" not in plano.headers
+
+
+def test_estatico_responde_304_con_etag():
+    client = TestClient(app_module.app)
+    primera = client.get("/static/styles.css")
+    segunda = client.get("/static/styles.css", headers={"If-None-Match": primera.headers["etag"]})
+    assert segunda.status_code == 304
+    assert client.get("/static/no-existe.js").status_code == 404
+
+
+def test_variantes_precomprimidas():
+    variantes = app_module._variantes(b"x" * 1000, "text/css")
+    assert gzip.decompress(variantes["gzip"]) == b"x" * 1000
+    assert app_module._variantes(b"x" * 1000, "image/png").keys() == {"identity"}